@@ -1,5 +1,6 @@
 from constructs import Construct
 from aws_cdk import (
+    IgnoreMode,
     Stack,
     Duration,
     aws_lambda as _lambda,
@@ -26,6 +27,21 @@ project_root = stack_file.parents[2]
 lambda_dir = project_root / "control_panel_api"
 lambda_dir = str(lambda_dir)
 
+# The handlers import services.* and shared.*, so the asset is the project root
+# cut down to those packages; handlers are "control_panel_api.<module>.handler"
+ASSET_PACKAGES = ("control_panel_api", "services", "shared")
+ASSET_EXCLUDE = [
+    "*",
+    *(f"!{pkg}" for pkg in ASSET_PACKAGES),
+    *(f"!{pkg}/**" for pkg in ASSET_PACKAGES),
+    "**/tests",
+    "**/__pycache__",
+    "**/*.pyc",
+]
+
+# AWS-managed Powertools layer for handlers that emit metrics (get_quota)
+POWERTOOLS_LAYER_ARN = "arn:aws:lambda:{region}:017000801446:layer:AWSLambdaPowertoolsPythonV3-python312-x86_64:7"
+
 
 
 class ControlPanelApiStack(Stack):
@@ -40,13 +56,26 @@ class ControlPanelApiStack(Stack):
 
         print("DEBUG LAMBDA_DIR:", lambda_dir)
 
+        lambda_code = _lambda.Code.from_asset(
+            str(project_root), exclude=ASSET_EXCLUDE, ignore_mode=IgnoreMode.GIT,
+        )
+        powertools_layer = _lambda.LayerVersion.from_layer_version_arn(
+            self, "PowertoolsLayer",
+            self.node.try_get_context("powertoolsLayerArn") or POWERTOOLS_LAYER_ARN.format(region=self.region),
+        )
+
         # --------------------------------------------
         # IMPORT EXISTING TABLES (DO NOT RECREATE)
         # --------------------------------------------
-        tenants_table = dynamodb.Table.from_table_name(
+        # tenantRegistry=true once the TenantRegistryById / TenantRegistryByCreated
+        # GSIs exist on the (externally managed) tenants table and are backfilled
+        tenant_registry = str(self.node.try_get_context("tenantRegistry")).lower() == "true"
+        tenants_table = dynamodb.Table.from_table_attributes(
             self,
             "MerlinSigmaTenantsRef",
-            "MerlinSigmaTenants"
+            table_name="MerlinSigmaTenants",
+            # lets grant_read_data cover index/* for the registry queries
+            global_indexes=["TenantRegistryById", "TenantRegistryByCreated"] if tenant_registry else None,
         )
 
         plans_table = dynamodb.Table.from_table_name(
@@ -109,12 +138,13 @@ class ControlPanelApiStack(Stack):
             self,
             "ListTenantsFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="list_tenants.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.list_tenants.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "TENANTS_TABLE": tenants_table.table_name,
                 "ENV_NAME": env_name,
+                "TENANT_REGISTRY_ENABLED": "true" if tenant_registry else "false",
             }
         )
 
@@ -135,8 +165,8 @@ class ControlPanelApiStack(Stack):
             self,
             "GetTenantPlanFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="get_plan.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.get_plan.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "TENANTS_TABLE": tenants_table.table_name,
@@ -163,8 +193,8 @@ class ControlPanelApiStack(Stack):
             self,
             "PutTenantPlanFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="put_plan.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.put_plan.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "TENANTS_TABLE": tenants_table.table_name,
@@ -180,8 +210,8 @@ class ControlPanelApiStack(Stack):
             self,
             "GetTenantUsageFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="get_usage.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.get_usage.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "USAGE_TABLE_NAME": usage_table.table_name,
@@ -195,8 +225,9 @@ class ControlPanelApiStack(Stack):
             self,
             "GetTenantQuotaFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="get_quota.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.get_quota.handler",
+            code=lambda_code,
+            layers=[powertools_layer],
             timeout=Duration.seconds(15),
             environment={
                 "USAGE_TABLE_NAME": usage_table.table_name,
@@ -216,8 +247,8 @@ class ControlPanelApiStack(Stack):
             self,
             "AdminMeFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="admin_me.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.admin_me.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "ENV_NAME": env_name,
@@ -239,13 +270,21 @@ class ControlPanelApiStack(Stack):
             self,
             "AdminListUsersFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="list_users.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.list_users.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "ENV_NAME": env_name,
+                "COGNITO_USER_POOL_ID": user_pool.user_pool_id,
             },
         )
+        user_pool.grant(
+            list_users_fn,
+            "cognito-idp:ListUsers",
+            "cognito-idp:ListGroups",
+            "cognito-idp:ListUsersInGroup",
+            "cognito-idp:AdminListGroupsForUser",
+        )
 
         admin_users_resource.add_method(
             "GET",
@@ -260,8 +299,8 @@ class ControlPanelApiStack(Stack):
             self,
             "AdminCreateUserFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="create_user.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.create_user.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "ENV_NAME": env_name,
@@ -284,8 +323,8 @@ class ControlPanelApiStack(Stack):
             self,
             "AdminAssignRolesFn",
             runtime=_lambda.Runtime.PYTHON_3_12,
-            handler="assign_roles.handler",
-            code=_lambda.Code.from_asset(lambda_dir),
+            handler="control_panel_api.assign_roles.handler",
+            code=lambda_code,
             timeout=Duration.seconds(15),
             environment={
                 "ENV_NAME": env_name,
@@ -301,6 +340,34 @@ class ControlPanelApiStack(Stack):
             authorization_scopes=["aws.cognito.signin.user.admin"]
         )
 
+        # POST /admin/users/bulk  → provision many users (concurrent, rate limited)
+        bulk_users_fn = _lambda.Function(
+            self,
+            "AdminBulkCreateUsersFn",
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            handler="control_panel_api.bulk_create_users.handler",
+            code=lambda_code,
+            timeout=Duration.seconds(29),  # API Gateway integration limit
+            memory_size=512,
+            environment={
+                "ENV_NAME": env_name,
+                "COGNITO_USER_POOL_ID": user_pool.user_pool_id,
+            },
+        )
+        user_pool.grant(
+            bulk_users_fn,
+            "cognito-idp:AdminCreateUser",
+            "cognito-idp:AdminAddUserToGroup",
+        )
+
+        admin_users_resource.add_resource("bulk").add_method(
+            "POST",
+            apigw.LambdaIntegration(bulk_users_fn, proxy=True),
+            authorization_type=apigw.AuthorizationType.COGNITO,
+            authorizer=authorizer,
+            authorization_scopes=["aws.cognito.signin.user.admin"]
+        )
+
 
 
         usage_table.grant_read_data(get_usage_fn)
@@ -1,11 +1,15 @@
+from pathlib import Path
+
 from aws_cdk import (
     Stack,
     aws_dynamodb as dynamodb,
     aws_lambda as _lambda,
+    aws_logs as logs,
     aws_events as events,
     aws_events_targets as targets,
     CfnOutput,
     Duration,
+    RemovalPolicy,
 )
 from constructs import Construct
 
@@ -15,6 +19,8 @@ class MeteringStack(Stack):
     def __init__(self, scope: Construct, construct_id: str, *, usage_table, **kwargs) -> None:
         super().__init__(scope, construct_id, **kwargs)
 
+        services_dir = str(Path(__file__).resolve().parents[2] / "services")
+
         # Table for invoices
         invoices = dynamodb.Table(
             self, "UsageInvoices",
@@ -24,14 +30,46 @@ class MeteringStack(Stack):
             billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
         )
 
+        # Aggregator progress per period (kept out of UsageInvoices so listings only see invoices)
+        checkpoints = dynamodb.Table(
+            self, "MeteringCheckpoints",
+            partition_key=dynamodb.Attribute(name="period", type=dynamodb.AttributeType.STRING),
+            billing_mode=dynamodb.BillingMode.PAY_PER_REQUEST,
+            removal_policy=RemovalPolicy.DESTROY,  # transient; a finished run deletes its row
+        )
+
+        # Tenants to bill come from the control-panel registry index (see docs/tables.md)
+        registry = dynamodb.Table.from_table_attributes(
+            self, "MeteringTenantRegistry",
+            table_name=self.node.try_get_context("tenantRegistryTableName") or "MerlinSigmaTenants",
+            global_indexes=["TenantRegistryById"],
+        )
+
+        agg_lg = logs.LogGroup(
+            self, "MonthlyUsageAggregatorLogGroup",
+            retention=logs.RetentionDays.ONE_MONTH,
+            removal_policy=RemovalPolicy.DESTROY,
+        )
+
         # Lambda to aggregate usage → invoices
         aggregator = _lambda.Function(
             self, "MonthlyUsageAggregator",
-            code=_lambda.Code.from_inline("def handler(event, ctx): return {}"),
-            handler="index.handler",
-            runtime=_lambda.Runtime.PYTHON_3_9,
-            timeout=Duration.minutes(5),
+            runtime=_lambda.Runtime.PYTHON_3_12,
+            handler="metering.lambdas.aggregate.handler.handler",
+            code=_lambda.Code.from_asset(services_dir),
+            log_group=agg_lg,
+            timeout=Duration.minutes(15),  # runs that need longer checkpoint and resume
+            environment={
+                "USAGE_LOGS_TABLE_NAME": usage_table.table_name,
+                "USAGE_INVOICES_TABLE_NAME": invoices.table_name,
+                "METERING_CHECKPOINTS_TABLE_NAME": checkpoints.table_name,
+                "TENANT_REGISTRY_TABLE_NAME": registry.table_name,
+            },
         )
+        usage_table.grant_read_data(aggregator)
+        invoices.grant_read_write_data(aggregator)
+        checkpoints.grant_read_write_data(aggregator)
+        registry.grant_read_data(aggregator)
 
         # ✅ Context flag for scheduling
         enable_schedule = self.node.try_get_context("enable_metering_aggregation")
@@ -46,3 +84,4 @@ class MeteringStack(Stack):
         CfnOutput(self, "MonthlyUsageAggregatorName", value=aggregator.function_name)
         CfnOutput(self, "MeteringTableName", value=invoices.table_name)
         CfnOutput(self, "MeteringTableArn", value=invoices.table_arn)
+        CfnOutput(self, "MeteringCheckpointsTableName", value=checkpoints.table_name)
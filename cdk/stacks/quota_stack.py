@@ -26,6 +26,20 @@ class QuotaStack(Stack):
             removal_policy=removal,  # 🚨 Use RETAIN in prod
         )
 
+        # ✅ Context flag: per-user daily / per-minute counters for the counter-backed enforcer
+        enable_quota_counters = self.node.try_get_context("enable_quota_counters")
+        if str(enable_quota_counters).lower() == "true":
+            self.counters_table = ddb.Table(
+                self, "QuotaCounters",
+                table_name="QuotaCounters",
+                partition_key=ddb.Attribute(name="scope", type=ddb.AttributeType.STRING),
+                sort_key=ddb.Attribute(name="window", type=ddb.AttributeType.STRING),
+                billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",
+                removal_policy=removal,
+            )
+            CfnOutput(self, "QuotaCountersTableName", value=self.counters_table.table_name)
+
         quota_alerts_topic = sns.Topic(self, "QuotaAlertsTopic", display_name="Quota Alerts")
 
         # Attach to an alarm (this must exist in your stack)
@@ -11,6 +11,8 @@ from aws_cdk import (
     aws_sns as sns,
     aws_sns_subscriptions as subs,
     aws_cloudwatch_actions as cw_actions,
+    aws_sqs as sqs,
+    aws_lambda_event_sources as lambda_events,
 )
 from constructs import Construct
 
@@ -55,6 +57,56 @@ class UsageLambdaStack(Stack):
 
         log_table.grant_read_write_data(self.log_usage_lambda)
 
+        # ✅ Context flag: per-caller daily / burst counters (QuotaCounters lives in QuotaStack)
+        if str(self.node.try_get_context("enable_quota_counters")).lower() == "true":
+            counters_table = ddb.Table.from_table_name(self, "QuotaCountersRef", "QuotaCounters")
+            self.log_usage_lambda.add_environment("QUOTA_COUNTERS_ENABLED", "true")
+            self.log_usage_lambda.add_environment("QUOTA_COUNTERS_TABLE_NAME", counters_table.table_name)
+            counters_table.grant_read_write_data(self.log_usage_lambda)
+
+        # ✅ Context flag for the queue-buffered ingest path (cdk -c enable_async_usage_ingest=true)
+        enable_async = self.node.try_get_context("enable_async_usage_ingest")
+        if str(enable_async).lower() == "true":
+            usage_dlq = sqs.Queue(
+                self, "UsageIngestDLQ",
+                retention_period=Duration.days(14),
+            )
+            usage_queue = sqs.Queue(
+                self, "UsageIngestQueue",
+                visibility_timeout=Duration.seconds(60),  # >= consumer timeout
+                dead_letter_queue=sqs.DeadLetterQueue(max_receive_count=3, queue=usage_dlq),
+            )
+
+            consumer_lg = logs.LogGroup(
+                self, "UsageConsumerLogGroup",
+                retention=logs.RetentionDays.ONE_MONTH,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            self.usage_consumer_lambda = _lambda.Function(
+                self, "UsageConsumerFunction",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="usage.lambdas.usage_consumer.handler.handler",
+                code=_lambda.Code.from_asset(services_dir),
+                log_group=consumer_lg,
+                timeout=Duration.seconds(30),
+                environment={"USAGE_TABLE_NAME": log_table.table_name},
+            )
+            self.usage_consumer_lambda.add_event_source(
+                lambda_events.SqsEventSource(
+                    usage_queue,
+                    batch_size=100,
+                    max_batching_window=Duration.seconds(1),
+                    report_batch_item_failures=True,
+                )
+            )
+            log_table.grant_read_write_data(self.usage_consumer_lambda)
+
+            usage_queue.grant_send_messages(self.log_usage_lambda)
+            self.log_usage_lambda.add_environment("USAGE_INGEST_MODE", "async")
+            self.log_usage_lambda.add_environment("USAGE_QUEUE_URL", usage_queue.queue_url)
+
+            CfnOutput(self, "UsageIngestQueueUrl", value=usage_queue.queue_url)
+
         # Monthly aggregator Lambda (reads the same table)
         agg_lg = logs.LogGroup(
             self, "UsageAggregatorLogGroup",
@@ -70,6 +122,107 @@ class UsageLambdaStack(Stack):
         )
         log_table.grant_read_data(self.aggregate_lambda)
 
+        # ✅ Context flag for hourly/daily rollups (needs the UsageLogs stream, see UsageStack)
+        enable_rollups = self.node.try_get_context("enable_usage_rollups")
+        if str(enable_rollups).lower() == "true":
+            rollups_table = ddb.Table(
+                self, "UsageRollups",
+                partition_key=ddb.Attribute(name="scope", type=ddb.AttributeType.STRING),
+                sort_key=ddb.Attribute(name="bucket", type=ddb.AttributeType.STRING),
+                billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",  # applied# row markers
+                removal_policy=RemovalPolicy.DESTROY,  # rebuildable from UsageLogs
+            )
+
+            rollup_lg = logs.LogGroup(
+                self, "UsageRollupLogGroup",
+                retention=logs.RetentionDays.ONE_MONTH,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            self.rollup_stream_lambda = _lambda.Function(
+                self, "UsageRollupStreamFunction",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="usage.lambdas.rollup_stream.handler.handler",
+                code=_lambda.Code.from_asset(services_dir),
+                log_group=rollup_lg,
+                timeout=Duration.seconds(30),
+                environment={"USAGE_ROLLUPS_TABLE_NAME": rollups_table.table_name},
+            )
+            self.rollup_stream_lambda.add_event_source(
+                lambda_events.DynamoEventSource(
+                    log_table,
+                    starting_position=_lambda.StartingPosition.TRIM_HORIZON,
+                    batch_size=500,
+                    max_batching_window=Duration.seconds(5),
+                    retry_attempts=3,
+                    bisect_batch_on_error=True,
+                    report_batch_item_failures=True,
+                )
+            )
+            rollups_table.grant_read_write_data(self.rollup_stream_lambda)
+
+            # readers: the range API answers whole hours from buckets
+            self.aggregate_lambda.add_environment("USAGE_ROLLUPS_TABLE_NAME", rollups_table.table_name)
+            rollups_table.grant_read_data(self.aggregate_lambda)
+
+            CfnOutput(self, "UsageRollupsTableName", value=rollups_table.table_name)
+
+        # ✅ Context flag: keep QuotaState current from the UsageLogs stream
+        enable_quota_state = self.node.try_get_context("enable_quota_state_stream")
+        if str(enable_quota_state).lower() == "true":
+            quota_state_table = ddb.Table(
+                self, "QuotaState",
+                partition_key=ddb.Attribute(name="tenant_id", type=ddb.AttributeType.STRING),
+                sort_key=ddb.Attribute(name="period", type=ddb.AttributeType.STRING),
+                billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+                time_to_live_attribute="expires_at",  # applied# row markers
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            # control-panel tenants table (PK/SK): the plan is read from tenant#<id> / plan#current
+            tenants_table = ddb.Table.from_table_name(
+                self, "QuotaStateTenants",
+                self.node.try_get_context("tenantsTableName") or "MerlinSigmaTenants",
+            )
+            plans_table = ddb.Table.from_table_name(
+                self, "QuotaStatePlans",
+                self.node.try_get_context("quotaPlansTableName") or "QuotaPlans",
+            )
+
+            quota_state_lg = logs.LogGroup(
+                self, "QuotaStateStreamLogGroup",
+                retention=logs.RetentionDays.ONE_MONTH,
+                removal_policy=RemovalPolicy.DESTROY,
+            )
+            self.quota_state_lambda = _lambda.Function(
+                self, "QuotaStateStreamFunction",
+                runtime=_lambda.Runtime.PYTHON_3_12,
+                handler="quota.lambdas.state_stream.handler.handler",
+                code=_lambda.Code.from_asset(services_dir),
+                log_group=quota_state_lg,
+                timeout=Duration.seconds(30),
+                environment={
+                    "QUOTA_STATE_TABLE_NAME": quota_state_table.table_name,
+                    "TENANTS_TABLE_NAME": tenants_table.table_name,
+                    "QUOTA_PLANS_TABLE_NAME": plans_table.table_name,
+                },
+            )
+            self.quota_state_lambda.add_event_source(
+                lambda_events.DynamoEventSource(
+                    log_table,
+                    starting_position=_lambda.StartingPosition.LATEST,
+                    batch_size=1000,
+                    max_batching_window=Duration.seconds(2),
+                    retry_attempts=3,
+                    bisect_batch_on_error=True,
+                    report_batch_item_failures=True,
+                )
+            )
+            quota_state_table.grant_read_write_data(self.quota_state_lambda)
+            tenants_table.grant_read_data(self.quota_state_lambda)
+            plans_table.grant_read_data(self.quota_state_lambda)
+
+            CfnOutput(self, "QuotaStateTableName", value=quota_state_table.table_name)
+
         # Alarm on LogUsage Lambda errors (>0 in 1 minute)
         usage_err_alarm = cw.Alarm(
             self, "UsageLambdaErrors",
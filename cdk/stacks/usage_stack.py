@@ -24,6 +24,12 @@ class UsageStack(Stack):
         # stage-aware removal policy (optional)
         removal = RemovalPolicy.DESTROY if stage != "prod" else RemovalPolicy.RETAIN
 
+        # ✅ Context flags: stream consumers in UsageLambdaStack need the UsageLogs stream
+        enable_stream = any(
+            str(self.node.try_get_context(flag)).lower() == "true"
+            for flag in ("enable_usage_rollups", "enable_quota_state_stream")
+        )
+
         # Create the table exactly once in this owning stack
         self.usage_table = ddb.Table(
             self, "UsageLogs",
@@ -33,6 +39,7 @@ class UsageStack(Stack):
             point_in_time_recovery_specification=ddb.PointInTimeRecoverySpecification(
                 point_in_time_recovery_enabled=True),
             removal_policy=removal,
+            stream=ddb.StreamViewType.NEW_IMAGE if enable_stream else None,
         )
 
         # (Optional) GSIs you previously had
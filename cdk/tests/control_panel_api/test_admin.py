@@ -4,8 +4,9 @@ import json
 from types import SimpleNamespace
 
 import pytest
+from botocore.exceptions import ClientError
 
-from control_panel_api import admin_me, list_users, create_user, assign_roles
+from control_panel_api import admin_me, list_users, create_user, assign_roles, bulk_create_users
 from .utils.fake_cognito import FakeCognitoClient, FakeBoto3
 
 
@@ -129,6 +130,81 @@ def test_admin_list_users_empty(monkeypatch, lambda_context, user_pool_id):
     assert body["users"] == []
 
 
+def _many_users(n, groups_for):
+    users = {
+        f"u{i:03d}": {"Username": f"u{i:03d}", "Attributes": [{"Name": "email", "Value": f"u{i}@x.io"}]}
+        for i in range(n)
+    }
+    return users, {name: groups_for(i) for i, name in enumerate(users)}
+
+
+def test_admin_list_users_paginates_with_cursor(monkeypatch, lambda_context, user_pool_id):
+    users, user_groups = _many_users(130, lambda i: ["Admins"] if i % 2 else ["ReadOnly"])
+    fake_client = FakeCognitoClient(users=users, user_groups=user_groups)
+
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", user_pool_id)
+    monkeypatch.setattr(list_users, "boto3", FakeBoto3(fake_client))
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": "50"}
+        if cursor:
+            params["cursor"] = cursor
+        body = json.loads(list_users.handler({"queryStringParameters": params}, lambda_context)["body"])
+        seen.extend(body["users"])
+        cursor = body.get("next_cursor")
+        if not cursor:
+            break
+
+    assert [u["username"] for u in seen] == sorted(users)
+    assert next(u for u in seen if u["username"] == "u001")["groups"] == ["Admins"]
+    # two groups -> one cached join, no per-user lookups
+    assert fake_client.calls["list_groups"] == 1
+    assert fake_client.calls["list_users_in_group"] == 4  # 65 members per group -> 2 pages each
+    assert "list_groups_for_user" not in fake_client.calls
+
+    bad = list_users.handler({"queryStringParameters": {"cursor": "%%%"}}, lambda_context)
+    assert bad["statusCode"] == 400
+
+
+def test_admin_list_users_many_groups_fans_out(monkeypatch, lambda_context, user_pool_id):
+    users, user_groups = _many_users(20, lambda i: [f"G{i}"])
+    fake_client = FakeCognitoClient(users=users, user_groups=user_groups)
+
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", user_pool_id)
+    monkeypatch.setattr(list_users, "boto3", FakeBoto3(fake_client))
+    monkeypatch.setattr(list_users, "GROUP_JOIN_MAX", 5)
+
+    body = json.loads(list_users.handler({}, lambda_context)["body"])
+    assert body["count"] == 20
+    assert {u["username"]: u["groups"] for u in body["users"]}["u007"] == ["G7"]
+    assert fake_client.calls["list_groups_for_user"] == 20
+    assert "list_users_in_group" not in fake_client.calls
+
+    # per-user groups are cached across warm invocations
+    list_users.handler({}, lambda_context)
+    assert fake_client.calls["list_groups_for_user"] == 20
+
+
+def test_admin_list_users_large_groups_fall_back_to_per_user_lookups(monkeypatch, lambda_context, user_pool_id):
+    users, user_groups = _many_users(130, lambda i: ["Everyone"])
+    fake_client = FakeCognitoClient(users=users, user_groups=user_groups)
+
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", user_pool_id)
+    monkeypatch.setattr(list_users, "boto3", FakeBoto3(fake_client))
+    monkeypatch.setattr(list_users, "GROUP_JOIN_MAX_PAGES", 2)  # "Everyone" takes 3 pages
+
+    body = json.loads(list_users.handler({"queryStringParameters": {"limit": "10"}}, lambda_context)["body"])
+
+    assert [u["groups"] for u in body["users"]] == [["Everyone"]] * 10
+    assert fake_client.calls["list_users_in_group"] == 2  # the walk stops at the bound
+    assert fake_client.calls["list_groups_for_user"] == 10  # only the listed page
+
+    # the abandoned join is remembered for the cache TTL, not retried per request
+    list_users.handler({"queryStringParameters": {"limit": "10"}}, lambda_context)
+    assert fake_client.calls["list_users_in_group"] == 2
+
+
 # ---------------------------------------------------------------------
 # POST /admin/users
 # ---------------------------------------------------------------------
@@ -257,3 +333,119 @@ def test_assign_roles_user_not_found(monkeypatch, lambda_context, user_pool_id):
 
     body = json.loads(resp["body"])
     assert "user not found" in body["error"].lower()
+
+
+# ---------------------------------------------------------------------
+# POST /admin/users/bulk
+# ---------------------------------------------------------------------
+
+
+class ThrottlingCognito(FakeCognitoClient):
+    """Throttles the first `throttle` admin_create_user calls; knows some users already."""
+
+    def __init__(self, throttle=0, existing=(), **kw):
+        super().__init__(**kw)
+        self.throttle = throttle
+        self.existing = set(existing)
+
+    def admin_create_user(self, UserPoolId, Username, UserAttributes=None, MessageAction=None):
+        self._count("admin_create_user")
+        if self.throttle > 0:
+            self.throttle -= 1
+            raise ClientError({"Error": {"Code": "TooManyRequestsException", "Message": "rate"}}, "AdminCreateUser")
+        if Username in self.existing:
+            raise ClientError({"Error": {"Code": "UsernameExistsException", "Message": "exists"}}, "AdminCreateUser")
+        return super().admin_create_user(UserPoolId, Username, UserAttributes, MessageAction)
+
+
+def _bulk_event(users):
+    return {"httpMethod": "POST", "path": "/admin/users/bulk", "body": json.dumps({"users": users})}
+
+
+def test_bulk_create_users_ok(monkeypatch, lambda_context, user_pool_id):
+    fake_client = ThrottlingCognito(throttle=3, existing={"u02"}, users={"u02": {"Username": "u02"}})
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", user_pool_id)
+    monkeypatch.setattr(bulk_create_users, "boto3", FakeBoto3(fake_client))
+    monkeypatch.setattr(bulk_create_users, "BACKOFF_BASE_SECONDS", 0)
+
+    users = [{"username": f"u{i:02d}", "email": f"u{i}@x.io", "groups": ["Developers"]} for i in range(12)]
+    resp = bulk_create_users.handler(_bulk_event(users), lambda_context)
+    assert resp["statusCode"] == 200
+
+    body = json.loads(resp["body"])
+    assert [r["username"] for r in body["results"]] == [u["username"] for u in users]
+    assert body["summary"] == {"created": 11, "exists": 1}
+    assert all(fake_client.user_groups[u["username"]] == ["Developers"] for u in users)
+    # throttled calls were retried
+    assert fake_client.calls["admin_create_user"] == 12 + 3
+
+
+def test_bulk_create_users_partial_failures(monkeypatch, lambda_context, user_pool_id):
+    fake_client = ThrottlingCognito()
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", user_pool_id)
+    monkeypatch.setattr(bulk_create_users, "boto3", FakeBoto3(fake_client))
+
+    users = [
+        {"username": "ok", "email": "ok@x.io"},
+        {"username": "ok", "email": "dup@x.io"},
+        {"username": "nomail"},
+    ]
+    resp = bulk_create_users.handler(_bulk_event(users), lambda_context)
+    assert resp["statusCode"] == 207
+    statuses = [r["status"] for r in json.loads(resp["body"])["results"]]
+    assert statuses == ["created", "failed", "failed"]
+
+    # past the deadline nothing new is started
+    monkeypatch.setattr(bulk_create_users, "DEADLINE_SECONDS", 0)
+    resp = bulk_create_users.handler(_bulk_event([{"username": "late", "email": "l@x.io"}]), lambda_context)
+    assert json.loads(resp["body"])["summary"] == {"skipped": 1}
+    assert "late" not in fake_client.users
+
+    assert bulk_create_users.handler({"body": json.dumps({"users": []})}, lambda_context)["statusCode"] == 400
+
+
+def test_bulk_create_users_rejects_non_string_fields(monkeypatch, lambda_context, user_pool_id):
+    fake_client = ThrottlingCognito()
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", user_pool_id)
+    monkeypatch.setattr(bulk_create_users, "boto3", FakeBoto3(fake_client))
+
+    users = [
+        {"username": 7, "email": "n@x.io"},
+        {"username": ["a"], "email": "l@x.io"},
+        {"username": {"a": 1}, "email": "d@x.io"},
+        {"username": "m", "email": ["m@x.io"]},
+        {"username": "g", "email": "g@x.io", "groups": ["Developers", 3]},
+        {"username": "ok", "email": "ok@x.io", "groups": ["Developers"]},
+    ]
+    resp = bulk_create_users.handler(_bulk_event(users), lambda_context)
+
+    assert resp["statusCode"] == 207
+    results = json.loads(resp["body"])["results"]
+    assert [r["status"] for r in results] == ["failed"] * 5 + ["created"]
+    assert [r["username"] for r in results] == [None, None, None, "m", "g", "ok"]
+    assert set(fake_client.users) == {"ok"}
+
+
+def test_bulk_create_users_checks_the_deadline_between_groups(monkeypatch, lambda_context, user_pool_id):
+    clock = SimpleNamespace(now=0.0)
+    clock.monotonic = lambda: clock.now
+
+    class SlowGroups(ThrottlingCognito):
+        def admin_add_user_to_group(self, UserPoolId, Username, GroupName):
+            clock.now += 10
+            return super().admin_add_user_to_group(UserPoolId, Username, GroupName)
+
+    fake_client = SlowGroups()
+    monkeypatch.setenv("COGNITO_USER_POOL_ID", user_pool_id)
+    monkeypatch.setattr(bulk_create_users, "boto3", FakeBoto3(fake_client))
+    monkeypatch.setattr(bulk_create_users, "time", clock)
+    monkeypatch.setattr(bulk_create_users, "DEADLINE_SECONDS", 25)
+
+    users = [{"username": "slow", "email": "s@x.io", "groups": ["G1", "G2", "G3", "G4"]}]
+    resp = bulk_create_users.handler(_bulk_event(users), lambda_context)
+
+    assert resp["statusCode"] == 207
+    result = json.loads(resp["body"])["results"][0]
+    assert result["status"] == "skipped"
+    assert result["groups"] == ["G1", "G2", "G3"]
+    assert "G4" in result["error"]
@@ -45,6 +45,25 @@ def test_get_plans_ok(monkeypatch, lambda_context, plans_table_name):
     assert body["plans"][0]["plan_id"] == "plan_free"
 
 
+def test_get_plans_follows_scan_pages(monkeypatch, lambda_context, plans_table_name):
+    class PagedTable(FakeTable):
+        def scan(self, **kwargs):
+            if "ExclusiveStartKey" not in kwargs:
+                return {"Items": [{"plan_id": "plan_free"}], "LastEvaluatedKey": {"plan_id": "plan_free"}}
+            return {"Items": [{"plan_id": "plan_pro"}]}
+
+    fake_dynamo = FakeDynamoResource({plans_table_name: PagedTable()})
+    monkeypatch.setattr(
+        list_plans, "boto3", SimpleNamespace(resource=lambda *_: fake_dynamo)
+    )
+    monkeypatch.setenv("PLANS_TABLE_NAME", plans_table_name)
+
+    resp = list_plans.handler({"httpMethod": "GET", "path": "/plans"}, lambda_context)
+
+    body = json.loads(resp["body"])
+    assert [p["plan_id"] for p in body["plans"]] == ["plan_free", "plan_pro"]
+
+
 def test_get_plans_empty(monkeypatch, lambda_context, plans_table_name):
     fake_table = FakeTable(scan_items=[])
     fake_dynamo = FakeDynamoResource({plans_table_name: fake_table})
@@ -152,3 +152,50 @@ def test_get_quota_internal_error(monkeypatch, tenants_table_name, usage_table_n
 
     resp = get_quota.handler(event, lambda_context)
     assert resp["statusCode"] == 500
+
+
+# ----------------------------------------------------------------------
+# 5) Quota row is served from the warm-container cache
+# ----------------------------------------------------------------------
+def test_get_quota_caches_quota_row(monkeypatch, tenants_table_name, usage_table_name, lambda_context):
+    class CountingTable(FakeTable):
+        calls = 0
+
+        def get_item(self, Key=None, **kwargs):
+            CountingTable.calls += 1
+            return super().get_item(Key=Key, **kwargs)
+
+    fake_dynamo = FakeDynamoResource({
+        tenants_table_name: CountingTable(get_item={"max_requests_per_day": 5}),
+        usage_table_name: FakeTable(query_items=[]),
+    })
+
+    monkeypatch.setattr(get_quota, "dynamodb", fake_dynamo)
+    monkeypatch.setenv("TENANTS_TABLE_NAME", tenants_table_name)
+    monkeypatch.setenv("USAGE_TABLE_NAME", usage_table_name)
+
+    event = {"pathParameters": {"tenantId": "tenant3012"}}
+    first = get_quota.handler(event, lambda_context)
+    second = get_quota.handler(event, lambda_context)
+
+    assert first["statusCode"] == second["statusCode"] == 200
+    assert json.loads(second["body"])["allowed_requests_per_day"] == 5
+    assert CountingTable.calls == 1
+
+
+def test_get_quota_cache_emits_hit_miss_metrics(monkeypatch, tenants_table_name, usage_table_name, lambda_context):
+    emitted = []
+    monkeypatch.setattr(get_quota.metrics, "add_metric", lambda name, unit, value: emitted.append(name))
+    monkeypatch.setattr(get_quota, "dynamodb", FakeDynamoResource({
+        tenants_table_name: FakeTable(get_item={"max_requests_per_day": 5}),
+        usage_table_name: FakeTable(query_items=[]),
+    }))
+    monkeypatch.setenv("TENANTS_TABLE_NAME", tenants_table_name)
+    monkeypatch.setenv("USAGE_TABLE_NAME", usage_table_name)
+
+    event = {"pathParameters": {"tenantId": "tenant3012"}}
+    get_quota.handler(event, lambda_context)
+    get_quota.handler(event, lambda_context)
+
+    assert get_quota._QUOTA_ROW_CACHE.metrics is get_quota.metrics
+    assert emitted == ["QuotaRowCacheMiss", "QuotaRowCacheHit"]
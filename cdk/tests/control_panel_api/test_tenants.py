@@ -422,3 +422,88 @@ def test_put_plan_missing_plan_id(monkeypatch, tenants_table_name, plans_table_n
     assert "plan_id" in resp["body"].lower()
 
 
+
+
+# =====================================================================
+# TESTS: LIST TENANTS — COMPLETE PAGES
+# =====================================================================
+
+class PagingScanTable:
+    """Scan over fixed rows honouring Limit / ExclusiveStartKey; non-tenant rows count toward Limit."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.calls = 0
+
+    def scan(self, Limit, ExclusiveStartKey=None, **kwargs):
+        self.calls += 1
+        start = 0
+        if ExclusiveStartKey:
+            start = self.rows.index(ExclusiveStartKey) + 1
+        chunk = self.rows[start:start + Limit]
+        resp = {"Items": [r for r in chunk if r["PK"].startswith("tenant#")]}
+        if start + Limit < len(self.rows):
+            resp["LastEvaluatedKey"] = chunk[-1]
+        return resp
+
+
+def _tenant_rows(n):
+    rows = []
+    for i in range(n):
+        rows += [{"PK": f"tenant#t{i:02d}", "SK": sk} for sk in ("plan#current", "profile#v1", "quota#v1")]
+        if i % 5 == 0:
+            rows.append({"PK": f"config#{i}", "SK": "v1"})
+    return rows
+
+
+def _list(event_params, lambda_context):
+    resp = list_tenants.handler({"queryStringParameters": event_params}, lambda_context)
+    assert resp["statusCode"] == 200
+    return json.loads(resp["body"])
+
+
+def test_list_tenants_pages_hold_complete_tenants(monkeypatch, tenants_table_name, lambda_context):
+    table = PagingScanTable(_tenant_rows(23))
+    monkeypatch.setattr(list_tenants, "boto3", SimpleNamespace(resource=lambda *_: FakeDynamoResource({tenants_table_name: table})))
+    monkeypatch.setenv("TABLE_NAME", tenants_table_name)
+    # scan pages of 7 rows split tenants across pages
+    monkeypatch.setattr(list_tenants, "SCAN_PAGE_MIN", 7)
+    monkeypatch.setattr(list_tenants, "SCAN_PAGE_MAX", 7)
+
+    pages, cursor = [], None
+    while True:
+        params = {"limit": "5"}
+        if cursor:
+            params["cursor"] = cursor
+        body = _list(params, lambda_context)
+        pages.append(body["tenants"])
+        cursor = body.get("next_cursor")
+        if not cursor:
+            break
+
+    assert [len(p) for p in pages] == [5, 5, 5, 5, 3]
+    everyone = [t for p in pages for t in p]
+    assert [t["tenant_id"] for t in everyone] == [f"t{i:02d}" for i in range(23)]
+    assert all(set(t["entities"]) == {"plan", "profile", "quota"} for t in everyone)
+
+
+def test_list_tenants_cursor_carries_open_tenant(monkeypatch, tenants_table_name, lambda_context):
+    table = PagingScanTable(_tenant_rows(4))
+    monkeypatch.setattr(list_tenants, "boto3", SimpleNamespace(resource=lambda *_: FakeDynamoResource({tenants_table_name: table})))
+    monkeypatch.setenv("TABLE_NAME", tenants_table_name)
+    monkeypatch.setattr(list_tenants, "SCAN_PAGE_MIN", 2)
+    monkeypatch.setattr(list_tenants, "SCAN_PAGE_MAX", 2)
+    monkeypatch.setattr(list_tenants, "MAX_SCAN_PAGES", 1)
+
+    # one 2-row read stops inside t00: nothing complete yet, t00 rides in the cursor
+    first = _list({"limit": "10"}, lambda_context)
+    assert first["count"] == 0 and first["next_cursor"]
+
+    seen, cursor = [], first["next_cursor"]
+    while cursor:
+        body = _list({"limit": "10", "cursor": cursor}, lambda_context)
+        seen += body["tenants"]
+        cursor = body.get("next_cursor")
+
+    assert [t["tenant_id"] for t in seen] == ["t00", "t01", "t02", "t03"]
+    assert all(len(t["entities"]) == 3 for t in seen)
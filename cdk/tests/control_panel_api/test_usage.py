@@ -1,4 +1,5 @@
 import json
+import os
 import pytest
 from types import SimpleNamespace
 from .utils.fake_dynamo import (FakeTable,
@@ -101,3 +102,101 @@ def test_get_usage_table_error(monkeypatch, lambda_context, usage_table_name):
 
 
 
+
+
+# ------------------------------------------------------------------
+# GET /tenants/{tenantId}/usage — ranges, pages, size cap
+# ------------------------------------------------------------------
+
+@pytest.fixture
+def usage_ddb(monkeypatch, usage_table_name):
+    import boto3
+    from moto import mock_aws
+    from control_panel_api import get_usage
+
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName=usage_table_name,
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "PK", "AttributeType": "S"},
+                                  {"AttributeName": "SK", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with table.batch_writer() as bw:
+            for day in range(1, 31):
+                for hour in (0, 12):
+                    bw.put_item(Item={
+                        "PK": "tenant#3012",
+                        "SK": f"usage#2025-11-{day:02d}T{hour:02d}:00:00Z",
+                        "tokens_used": day * 10 + hour,
+                        "debug_blob": "x" * 200,  # not in the projection
+                    })
+            bw.put_item(Item={"PK": "tenant#3012", "SK": "profile#v1"})
+        monkeypatch.setattr(get_usage, "dynamodb", ddb)
+        monkeypatch.setenv("USAGE_TABLE_NAME", usage_table_name)
+        yield get_usage
+
+
+def _usage(get_usage, lambda_context, **params):
+    event = {"pathParameters": {"tenantId": "3012"}, "queryStringParameters": params}
+    resp = get_usage.handler(event, lambda_context)
+    return resp["statusCode"], json.loads(resp["body"])
+
+
+def test_get_usage_range_and_pages(usage_ddb, lambda_context):
+    status, body = _usage(usage_ddb, lambda_context, start="2025-11-03", end="2025-11-05", limit="4")
+    assert status == 200
+    assert [u["SK"] for u in body["usage"]] == [
+        "usage#2025-11-03T00:00:00Z", "usage#2025-11-03T12:00:00Z",
+        "usage#2025-11-04T00:00:00Z", "usage#2025-11-04T12:00:00Z",
+    ]
+    assert "debug_blob" not in body["usage"][0]
+
+    status, body = _usage(usage_ddb, lambda_context, start="2025-11-03", end="2025-11-05", limit="4",
+                          cursor=body["next_cursor"])
+    assert [u["tokens_used"] for u in body["usage"]] == [50, 62]  # end day is inclusive
+    assert "next_cursor" not in body
+
+    status, body = _usage(usage_ddb, lambda_context, order="desc", limit="1")
+    assert body["usage"][0]["SK"] == "usage#2025-11-30T12:00:00Z"
+
+    _, body = _usage(usage_ddb, lambda_context, limit="1000")
+    assert body["count"] == 60  # profile#v1 is not a usage row
+
+    assert _usage(usage_ddb, lambda_context, start="yesterday")[0] == 400
+    assert _usage(usage_ddb, lambda_context, start="2025-11-05", end="2025-11-01")[0] == 400
+    assert _usage(usage_ddb, lambda_context, cursor="bm9wZQ==")[0] == 400
+
+
+def test_get_usage_caps_response_size(usage_ddb, lambda_context, monkeypatch):
+    monkeypatch.setattr(usage_ddb, "MAX_RESPONSE_BYTES", 300)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": "50"}
+        if cursor:
+            params["cursor"] = cursor
+        _, body = _usage(usage_ddb, lambda_context, **params)
+        assert 0 < body["count"] < 50
+        seen += [u["SK"] for u in body["usage"]]
+        cursor = body.get("next_cursor")
+        if not cursor:
+            break
+    assert len(seen) == 60 and len(set(seen)) == 60
+
+
+def test_get_usage_size_cap_counts_utf8_bytes(usage_ddb, lambda_context, monkeypatch):
+    table = usage_ddb.dynamodb.Table(os.environ["USAGE_TABLE_NAME"])
+    for i in range(10):
+        table.put_item(Item={"PK": "tenant#wide", "SK": f"usage#2025-12-01T00:00:{i:02d}Z", "endpoint": "é" * 100})
+    monkeypatch.setattr(usage_ddb, "MAX_RESPONSE_BYTES", 1000)
+
+    event = {"pathParameters": {"tenantId": "wide"}, "queryStringParameters": {"limit": "10"}}
+    resp = usage_ddb.handler(event, lambda_context)
+    body = json.loads(resp["body"])
+
+    # ~265 bytes (but ~165 characters) per row: three rows fit, not six
+    assert body["count"] == 3 and "next_cursor" in body
+    rows = resp["body"][resp["body"].index("[") + 1:resp["body"].rindex("]")]
+    assert len(rows.encode("utf-8")) <= 1000
@@ -1,11 +1,14 @@
 # cdk/tests/control_panel_api/utils/fake_cognito.py
+import threading
+
 
 class FakeCognitoClient:
     """
     Minimal fake Cognito Identity Provider client for unit tests.
     Simulates:
-    - list_users
+    - list_users (Limit / PaginationToken)
     - list_groups_for_user
+    - list_groups / list_users_in_group (NextToken)
     - admin_create_user
     - admin_add_user_to_group
     """
@@ -15,13 +18,48 @@ class FakeCognitoClient:
         self.users = users or {}
         # user_groups: {username: ["Admins", "Developers", ...]}
         self.user_groups = user_groups or {}
+        # method name -> number of calls
+        self.calls = {}
+        self._lock = threading.Lock()  # handlers call concurrently
+
+    def _count(self, name):
+        with self._lock:
+            self.calls[name] = self.calls.get(name, 0) + 1
+
+    @staticmethod
+    def _page(items, limit, token, token_key):
+        start = int(token or 0)
+        out = {"items": items[start:start + limit]}
+        if start + limit < len(items):
+            out[token_key] = str(start + limit)
+        return out
 
     # ---- listing users ----
-    def list_users(self, UserPoolId, Limit=60):
-        return {"Users": list(self.users.values())}
+    def list_users(self, UserPoolId, Limit=60, PaginationToken=None):
+        self._count("list_users")
+        page = self._page(list(self.users.values()), Limit, PaginationToken, "PaginationToken")
+        page["Users"] = page.pop("items")
+        return page
+
+    # ---- groups ----
+    def list_groups(self, UserPoolId, Limit=60, NextToken=None):
+        self._count("list_groups")
+        names = sorted({g for groups in self.user_groups.values() for g in groups})
+        page = self._page([{"GroupName": g} for g in names], Limit, NextToken, "NextToken")
+        page["Groups"] = page.pop("items")
+        return page
+
+    def list_users_in_group(self, UserPoolId, GroupName, Limit=60, NextToken=None):
+        self._count("list_users_in_group")
+        members = [self.users[u] for u, groups in self.user_groups.items()
+                   if GroupName in groups and u in self.users]
+        page = self._page(members, Limit, NextToken, "NextToken")
+        page["Users"] = page.pop("items")
+        return page
 
     # ---- list groups for a user ----
     def list_groups_for_user(self, Username, UserPoolId):
+        self._count("list_groups_for_user")
         groups = self.user_groups.get(Username, [])
         return {"Groups": [{"GroupName": g} for g in groups]}
 
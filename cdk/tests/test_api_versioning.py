@@ -1,5 +1,5 @@
 import aws_cdk as cdk
-from aws_cdk.assertions import Template
+from aws_cdk.assertions import Match, Template
 from aws_cdk import aws_cognito as cognito
 from aws_cdk import aws_dynamodb as ddb
 
@@ -91,3 +91,114 @@ def test_usage_lambda_stack_synthesizes_handlers_and_alarms():
     t.resource_count_is("AWS::CloudWatch::Alarm", 2)  # usage + aggregator
     t.resource_count_is("AWS::SNS::Topic", 1)
 
+
+
+def test_usage_lambda_stack_async_ingest_flag_adds_queue_and_consumer():
+    app = cdk.App(context={"enable_async_usage_ingest": "true"})
+    env = cdk.Environment(account="111111111111", region="us-west-1")
+
+    owner = cdk.Stack(app, "OwnerStack", env=env)
+    usage_table = ddb.Table(
+        owner, "UsageLogs",
+        partition_key=ddb.Attribute(name="usage_id", type=ddb.AttributeType.STRING),
+        billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+    )
+
+    sut = UsageLambdaStack(app, "UsageLambdaStackAsync", usage_logs_table=usage_table, env=env)
+    t = Template.from_stack(sut)
+
+    funcs = t.find_resources("AWS::Lambda::Function")
+    handlers = {res["Properties"]["Handler"] for res in funcs.values()}
+    assert "usage.lambdas.usage_consumer.handler.handler" in handlers
+
+    t.resource_count_is("AWS::SQS::Queue", 2)  # ingest queue + DLQ
+    t.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "FunctionResponseTypes": ["ReportBatchItemFailures"],
+    })
+
+
+def test_usage_lambda_stack_rollups_flag_adds_table_and_stream_consumer():
+    app = cdk.App(context={"enable_usage_rollups": "true"})
+    env = cdk.Environment(account="111111111111", region="us-west-1")
+
+    owner = cdk.Stack(app, "OwnerStack", env=env)
+    usage_table = ddb.Table(
+        owner, "UsageLogs",
+        partition_key=ddb.Attribute(name="usage_id", type=ddb.AttributeType.STRING),
+        billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+        stream=ddb.StreamViewType.NEW_IMAGE,
+    )
+
+    sut = UsageLambdaStack(app, "UsageLambdaStackRollups", usage_logs_table=usage_table, env=env)
+    t = Template.from_stack(sut)
+
+    funcs = t.find_resources("AWS::Lambda::Function")
+    handlers = {res["Properties"]["Handler"] for res in funcs.values()}
+    assert "usage.lambdas.rollup_stream.handler.handler" in handlers
+
+    t.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [
+            {"AttributeName": "scope", "KeyType": "HASH"},
+            {"AttributeName": "bucket", "KeyType": "RANGE"},
+        ],
+        "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True},
+    })
+    t.resource_count_is("AWS::Lambda::EventSourceMapping", 1)
+    t.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BisectBatchOnFunctionError": True,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"],
+    })
+
+
+def test_usage_lambda_stack_quota_state_flag_adds_stream_consumer():
+    app = cdk.App(context={"enable_quota_state_stream": "true"})
+    env = cdk.Environment(account="111111111111", region="us-west-1")
+
+    owner = cdk.Stack(app, "OwnerStack", env=env)
+    usage_table = ddb.Table(
+        owner, "UsageLogs",
+        partition_key=ddb.Attribute(name="usage_id", type=ddb.AttributeType.STRING),
+        billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+        stream=ddb.StreamViewType.NEW_IMAGE,
+    )
+
+    sut = UsageLambdaStack(app, "UsageLambdaStackQuotaState", usage_logs_table=usage_table, env=env)
+    t = Template.from_stack(sut)
+
+    funcs = t.find_resources("AWS::Lambda::Function")
+    handlers = {res["Properties"]["Handler"] for res in funcs.values()}
+    assert "quota.lambdas.state_stream.handler.handler" in handlers
+    t.has_resource_properties("AWS::DynamoDB::Table", {
+        "KeySchema": [
+            {"AttributeName": "tenant_id", "KeyType": "HASH"},
+            {"AttributeName": "period", "KeyType": "RANGE"},
+        ],
+        "TimeToLiveSpecification": {"AttributeName": "expires_at", "Enabled": True},
+    })
+    t.has_resource_properties("AWS::Lambda::EventSourceMapping", {
+        "BisectBatchOnFunctionError": True,
+        "FunctionResponseTypes": ["ReportBatchItemFailures"],
+    })
+
+
+def test_usage_lambda_stack_quota_counters_flag_wires_log_usage():
+    app = cdk.App(context={"enable_quota_counters": "true"})
+    env = cdk.Environment(account="111111111111", region="us-west-1")
+
+    owner = cdk.Stack(app, "OwnerStack", env=env)
+    usage_table = ddb.Table(
+        owner, "UsageLogs",
+        partition_key=ddb.Attribute(name="usage_id", type=ddb.AttributeType.STRING),
+        billing_mode=ddb.BillingMode.PAY_PER_REQUEST,
+    )
+
+    sut = UsageLambdaStack(app, "UsageLambdaStackCounters", usage_logs_table=usage_table, env=env)
+    t = Template.from_stack(sut)
+
+    t.has_resource_properties("AWS::Lambda::Function", {
+        "Handler": "usage.lambdas.log_usage.handler.handler",
+        "Environment": {"Variables": Match.object_like({
+            "QUOTA_COUNTERS_ENABLED": "true",
+            "QUOTA_COUNTERS_TABLE_NAME": "QuotaCounters",
+        })},
+    })
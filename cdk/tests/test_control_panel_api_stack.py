@@ -0,0 +1,85 @@
+import ast
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import aws_cdk as cdk
+import aws_cdk.assertions as assertions
+import pytest
+
+from cdk.stacks.control_panel_api_stack import ASSET_PACKAGES, ControlPanelApiStack
+
+# provided by the Lambda Python runtime or a layer, not the asset
+RUNTIME_MODULES = {"boto3", "botocore", "aws_lambda_powertools"}
+
+
+@pytest.fixture(scope="module")
+def synth():
+    """(template, staged asset directory) for the ControlPanelApiStack."""
+    app = cdk.App()
+    env = cdk.Environment(account="111111111111", region="us-west-1")
+    stack = ControlPanelApiStack(app, "TestControlPanelApiStack", env=env)
+    template = assertions.Template.from_stack(stack)
+    assets = [p for p in Path(app.synth().directory).glob("asset.*") if p.is_dir()]
+    assert len(assets) == 1  # every handler shares one code asset
+    return template, assets[0]
+
+
+def _handlers(template):
+    return [fn["Properties"]["Handler"] for fn in template.find_resources("AWS::Lambda::Function").values()
+            if fn["Properties"].get("Runtime", "").startswith("python")]
+
+
+def test_handlers_are_package_paths(synth):
+    template, asset = synth
+    handlers = _handlers(template)
+    assert handlers
+    for handler in handlers:
+        assert handler.startswith("control_panel_api.") and handler.endswith(".handler")
+        module = handler.rsplit(".", 1)[0]
+        assert (asset / Path(*module.split("."))).with_suffix(".py").is_file()
+
+
+def test_asset_bundles_the_imported_packages(synth):
+    template, asset = synth
+    assert sorted(p.name for p in asset.iterdir()) == sorted(ASSET_PACKAGES)
+    assert not list(asset.rglob("tests")) and not list(asset.rglob("__pycache__"))
+
+    for handler in _handlers(template):
+        source = (asset / Path(*handler.rsplit(".", 1)[0].split("."))).with_suffix(".py")
+        for node in ast.walk(ast.parse(source.read_text())):
+            if isinstance(node, ast.ImportFrom) and node.level == 0:
+                names = [node.module]
+            elif isinstance(node, ast.Import):
+                names = [a.name for a in node.names]
+            else:
+                continue
+            for name in names:
+                top = name.split(".")[0]
+                if top in sys.stdlib_module_names or top in RUNTIME_MODULES:
+                    continue
+                assert top in ASSET_PACKAGES, f"{source.name} imports {name}"
+                path = asset / Path(*name.split("."))
+                assert path.with_suffix(".py").is_file() or path.is_dir(), f"{source.name}: {name} not bundled"
+
+
+def test_handlers_import_from_the_asset_alone(synth):
+    """Import every handler with only the staged asset on the path (as the Lambda runtime does)."""
+    template, asset = synth
+    modules = [h.rsplit(".", 1)[0] for h in _handlers(template)]
+    env = {**os.environ, "PYTHONPATH": str(asset), "AWS_DEFAULT_REGION": "us-west-1"}
+    proc = subprocess.run(
+        [sys.executable, "-c", "import importlib, sys; [importlib.import_module(m) for m in sys.argv[1:]]", *modules],
+        cwd=asset, env=env, capture_output=True, text=True,
+    )
+    assert proc.returncode == 0, proc.stderr
+
+
+def test_get_quota_gets_the_powertools_layer(synth):
+    template, _ = synth
+    fns = template.find_resources("AWS::Lambda::Function", {
+        "Properties": {"Handler": "control_panel_api.get_quota.handler"},
+    })
+    (fn,) = fns.values()
+    assert "AWSLambdaPowertoolsPython" in str(fn["Properties"]["Layers"])
@@ -25,14 +25,20 @@ def template():
     return assertions.Template.from_stack(stack)
 
 
+def _invoices_table(template):
+    resources = template.find_resources("AWS::DynamoDB::Table")
+    return next(t for t in resources.values()
+                if t["Properties"]["KeySchema"][0]["AttributeName"] == "invoice_id")
+
+
 # --- Infra Tests ---
 
 def test_invoices_table_created(template):
     """Ensure the invoices (metering) table exists with correct schema."""
     resources = template.find_resources("AWS::DynamoDB::Table")
-    assert len(resources) == 1
+    assert len(resources) == 2  # invoices + aggregator checkpoints
 
-    table = next(iter(resources.values()))
+    table = _invoices_table(template)
     props = table["Properties"]
 
     assert props.get("BillingMode") == "PAY_PER_REQUEST"
@@ -42,15 +48,13 @@ def test_invoices_table_created(template):
 
 def test_table_has_retain_policy(template):
     """Ensure the invoices table retains data when stack is deleted."""
-    resources = template.find_resources("AWS::DynamoDB::Table")
-    table = next(iter(resources.values()))
+    table = _invoices_table(template)
     assert table["DeletionPolicy"] == "Retain"
 
 
 def test_table_schema_matches_design(template):
     """Check explicitly for invoice_id key schema."""
-    resources = template.find_resources("AWS::DynamoDB::Table")
-    table = next(iter(resources.values()))
+    table = _invoices_table(template)
     props = table["Properties"]
     key_schema = props["KeySchema"]
     assert key_schema[0]["AttributeName"] == "invoice_id"
@@ -64,3 +68,14 @@ def test_outputs_present(template):
     assert any("MonthlyUsageAggregatorName" in k for k in keys)
     assert any("MeteringTableName" in k for k in keys)
     assert any("MeteringTableArn" in k for k in keys)
+
+
+def test_aggregator_runs_the_real_handler(template):
+    """The aggregator is the services/ handler, wired to its tables (not an inline stub)."""
+    fn = next(iter(template.find_resources("AWS::Lambda::Function").values()))["Properties"]
+    assert fn["Handler"] == "metering.lambdas.aggregate.handler.handler"
+    assert "ZipFile" not in fn["Code"]
+    assert set(fn["Environment"]["Variables"]) == {
+        "USAGE_LOGS_TABLE_NAME", "USAGE_INVOICES_TABLE_NAME",
+        "METERING_CHECKPOINTS_TABLE_NAME", "TENANT_REGISTRY_TABLE_NAME",
+    }
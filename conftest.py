@@ -25,6 +25,16 @@ def mock_env(monkeypatch):
     monkeypatch.setenv("COGNITO_USER_POOL_ID", "dummy")
     monkeypatch.setenv("SUBSCRIPTIONS_TABLE", "dummy")
 
+@pytest.fixture(autouse=True)
+def reset_ttl_caches():
+    # warm-container caches are module globals; don't leak rows between tests
+    from services.common import aws_clients
+    from services.common.ttl_cache import clear_all
+    clear_all()
+    aws_clients.clear()  # memoized clients must be rebuilt inside each test's mock_aws
+    yield
+
+
 @pytest.fixture
 def slack_mock():
     return SlackMock()
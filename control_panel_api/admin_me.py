@@ -1,4 +1,4 @@
-import json
+from shared.utils.json_encoders import ddb_dumps
 
 
 def handler(event, context):
@@ -17,7 +17,7 @@ def handler(event, context):
         return {
             "statusCode": 400,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "missing auth claims"}),
+            "body": ddb_dumps({"error": "missing auth claims"}),
         }
 
     username = claims.get("cognito:username") or claims.get("username")
@@ -42,5 +42,5 @@ def handler(event, context):
     return {
         "statusCode": 200,
         "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(body),
+        "body": ddb_dumps(body),
     }
@@ -3,6 +3,9 @@ import os
 
 import boto3
 
+from services.common import aws_clients
+from shared.utils.json_encoders import ddb_dumps
+
 
 def handler(event, context):
     """
@@ -16,7 +19,7 @@ def handler(event, context):
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "COGNITO_USER_POOL_ID not set"}),
+            "body": ddb_dumps({"error": "COGNITO_USER_POOL_ID not set"}),
         }
 
     path_params = event.get("pathParameters") or {}
@@ -26,7 +29,7 @@ def handler(event, context):
         return {
             "statusCode": 400,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "username is required"}),
+            "body": ddb_dumps({"error": "username is required"}),
         }
 
     try:
@@ -36,7 +39,7 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "invalid json payload"}),
+                "body": ddb_dumps({"error": "invalid json payload"}),
             }
 
         groups = body.get("groups")
@@ -44,10 +47,10 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "groups (non-empty list) is required"}),
+                "body": ddb_dumps({"error": "groups (non-empty list) is required"}),
             }
 
-        cognito = boto3.client("cognito-idp")
+        cognito = aws_clients.client("cognito-idp", boto3_module=boto3)
 
         for g in groups:
             try:
@@ -61,7 +64,7 @@ def handler(event, context):
                 return {
                     "statusCode": 404,
                     "headers": {"Content-Type": "application/json"},
-                    "body": json.dumps({"error": "user not found"}),
+                    "body": ddb_dumps({"error": "user not found"}),
                 }
 
         resp_body = {
@@ -72,12 +75,12 @@ def handler(event, context):
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(resp_body),
+            "body": ddb_dumps(resp_body),
         }
 
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}),
+            "body": ddb_dumps({"error": str(e)}),
         }
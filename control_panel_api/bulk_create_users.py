@@ -0,0 +1,179 @@
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+
+from services.common import aws_clients
+from services.common.rate_limit import RateLimiter, call_with_backoff, error_code
+from shared.utils.json_encoders import ddb_dumps
+
+MAX_USERS = int(os.getenv("BULK_USERS_MAX", "500"))
+MAX_WORKERS = int(os.getenv("BULK_USERS_MAX_WORKERS", "16"))
+BACKOFF_BASE_SECONDS = float(os.getenv("BULK_USERS_BACKOFF_BASE", "0.1"))
+# API Gateway gives up on the integration at 29s; stop starting new users before that
+DEADLINE_SECONDS = float(os.getenv("BULK_USERS_DEADLINE_SECONDS", "25"))
+DEADLINE_MARGIN_MS = 2000
+
+# Per-container pacing, kept under Cognito's default per-category request-rate
+# quotas for AdminCreateUser and AdminAddUserToGroup.
+_LIMITERS = {
+    "create": RateLimiter(float(os.getenv("COGNITO_CREATE_USER_TPS", "40"))),
+    "group": RateLimiter(float(os.getenv("COGNITO_GROUP_UPDATE_TPS", "20"))),
+}
+
+
+def _response(status, body):
+    return {
+        "statusCode": status,
+        "headers": {"Content-Type": "application/json"},
+        "body": ddb_dumps(body),
+    }
+
+
+def _deadline(context) -> float:
+    budget = DEADLINE_SECONDS
+    remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if callable(remaining):
+        budget = min(budget, (remaining() - DEADLINE_MARGIN_MS) / 1000)
+    return time.monotonic() + budget
+
+
+def _validate(users):
+    """
+    [(entry, error or None)] — every entry needs a unique username and an email
+    (non-empty strings) and a list of group names (strings).
+    """
+    seen = set()
+    out = []
+    for entry in users:
+        if not isinstance(entry, dict) or not entry.get("username") or not entry.get("email"):
+            out.append((entry, "username and email are required"))
+            continue
+        if not isinstance(entry["username"], str) or not isinstance(entry["email"], str):
+            out.append((entry, "username and email must be strings"))
+            continue
+        groups = entry.get("groups") or []
+        if not isinstance(groups, list) or not all(isinstance(g, str) and g for g in groups):
+            out.append((entry, "groups must be a list of group names"))
+            continue
+        if entry["username"] in seen:
+            out.append((entry, "duplicate username in request"))
+            continue
+        seen.add(entry["username"])
+        out.append((entry, None))
+    return out
+
+
+def _provision(cognito, user_pool_id, entry, deadline):
+    """
+    Create one user (an existing user is kept) and add it to its groups;
+    returns its result row. Throttle retries stop at `deadline`, and groups not
+    reached by then leave the user "skipped" (resubmitting is safe).
+    """
+    username = entry["username"]
+    groups = entry.get("groups") or []
+    result = {"username": username, "status": "created", "groups": []}
+
+    try:
+        call_with_backoff(
+            lambda: cognito.admin_create_user(
+                UserPoolId=user_pool_id,
+                Username=username,
+                UserAttributes=[{"Name": "email", "Value": entry["email"]}],
+                MessageAction="SUPPRESS",
+            ),
+            limiter=_LIMITERS["create"],
+            base_delay=BACKOFF_BASE_SECONDS,
+            deadline=deadline,
+            clock=time.monotonic,
+        )
+    except Exception as e:
+        if error_code(e) != "UsernameExistsException":
+            return {"username": username, "status": "failed", "error": str(e), "groups": []}
+        result["status"] = "exists"
+
+    for group in groups:
+        if time.monotonic() >= deadline:
+            result["status"] = "skipped"
+            result["error"] = f"deadline reached before adding to {group}"
+            break
+        try:
+            call_with_backoff(
+                lambda: cognito.admin_add_user_to_group(
+                    UserPoolId=user_pool_id,
+                    Username=username,
+                    GroupName=group,
+                ),
+                limiter=_LIMITERS["group"],
+                base_delay=BACKOFF_BASE_SECONDS,
+                deadline=deadline,
+                clock=time.monotonic,
+            )
+            result["groups"].append(group)
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = f"adding to {group}: {e}"
+            break
+    return result
+
+
+def handler(event, context):
+    """
+    POST /admin/users/bulk
+
+    Body:
+      {"users": [{"username": "charlie", "email": "charlie@example.com", "groups": ["Admins"]}, ...]}
+
+    Users are provisioned concurrently, paced by per-API rate limiters with
+    backoff on throttling. Returns one result per input user, in order, with
+    status created / exists / failed / skipped (not attempted before the
+    deadline; resubmit those). 200 when every user succeeded, else 207.
+    """
+    user_pool_id = os.getenv("COGNITO_USER_POOL_ID")
+    if not user_pool_id:
+        return _response(500, {"error": "COGNITO_USER_POOL_ID not set"})
+
+    try:
+        body = json.loads(event.get("body") or "")
+    except Exception:
+        return _response(400, {"error": "invalid json payload"})
+
+    users = body.get("users") if isinstance(body, dict) else None
+    if not isinstance(users, list) or not users:
+        return _response(400, {"error": "users (non-empty list) is required"})
+    if len(users) > MAX_USERS:
+        return _response(400, {"error": f"at most {MAX_USERS} users per request"})
+
+    try:
+        cognito = aws_clients.client("cognito-idp", boto3_module=boto3)
+        deadline = _deadline(context)
+        lock = threading.Lock()
+        late = []
+
+        def run(item):
+            entry, problem = item
+            if problem:
+                username = entry.get("username") if isinstance(entry, dict) else None
+                return {"username": username if isinstance(username, str) else None,
+                        "status": "failed", "error": problem, "groups": []}
+            with lock:
+                if late or time.monotonic() >= deadline:
+                    late.append(entry["username"])
+                    return {"username": entry["username"], "status": "skipped", "groups": []}
+            return _provision(cognito, user_pool_id, entry, deadline)
+
+        checked = _validate(users)
+        with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(checked)))) as pool:
+            results = list(pool.map(run, checked))
+
+        summary = {}
+        for r in results:
+            summary[r["status"]] = summary.get(r["status"], 0) + 1
+        ok = all(r["status"] in ("created", "exists") for r in results)
+        return _response(200 if ok else 207, {"results": results, "summary": summary})
+
+    except Exception as e:
+        return _response(500, {"error": str(e)})
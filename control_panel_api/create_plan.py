@@ -4,6 +4,9 @@ from uuid import uuid4
 
 import boto3
 
+from services.common import aws_clients
+from shared.utils.json_encoders import ddb_dumps
+
 PLANS_TABLE_NAME = os.getenv("PLANS_TABLE_NAME", "PlansTable")
 
 
@@ -21,7 +24,7 @@ def handler(event, context):
     """
     try:
         table_name = os.getenv("PLANS_TABLE_NAME", PLANS_TABLE_NAME)
-        dynamodb = boto3.resource("dynamodb")
+        dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
         table = dynamodb.Table(table_name)
 
         try:
@@ -30,7 +33,7 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "Invalid JSON payload"}),
+                "body": ddb_dumps({"error": "Invalid JSON payload"}),
             }
 
         plan_id = body.get("plan_id") or f"plan_{uuid4().hex[:8]}"
@@ -42,7 +45,7 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "name and limits are required"}),
+                "body": ddb_dumps({"error": "name and limits are required"}),
             }
 
         item = {
@@ -58,12 +61,12 @@ def handler(event, context):
         return {
             "statusCode": 201,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(item, default=str),
+            "body": ddb_dumps(item),
         }
 
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}, default=str),
+            "body": ddb_dumps({"error": str(e)}),
         }
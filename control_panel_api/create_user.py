@@ -3,6 +3,9 @@ import os
 
 import boto3
 
+from services.common import aws_clients
+from shared.utils.json_encoders import ddb_dumps
+
 
 def handler(event, context):
     """
@@ -20,7 +23,7 @@ def handler(event, context):
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "COGNITO_USER_POOL_ID not set"}),
+            "body": ddb_dumps({"error": "COGNITO_USER_POOL_ID not set"}),
         }
 
     try:
@@ -30,7 +33,7 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "invalid json payload"}),
+                "body": ddb_dumps({"error": "invalid json payload"}),
             }
 
         username = body.get("username")
@@ -41,10 +44,10 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "username and email are required"}),
+                "body": ddb_dumps({"error": "username and email are required"}),
             }
 
-        cognito = boto3.client("cognito-idp")
+        cognito = aws_clients.client("cognito-idp", boto3_module=boto3)
 
         attrs = [{"Name": "email", "Value": email}]
         cognito.admin_create_user(
@@ -70,12 +73,12 @@ def handler(event, context):
         return {
             "statusCode": 201,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(resp_body),
+            "body": ddb_dumps(resp_body),
         }
 
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}),
+            "body": ddb_dumps({"error": str(e)}),
         }
@@ -1,8 +1,10 @@
 import os
-import json
 import boto3
 from boto3.dynamodb.conditions import Key
 
+from services.common import aws_clients
+from shared.utils.json_encoders import ddb_dumps
+
 DEFAULT_PLAN = "plan_free"
 
 def handler(event, context):
@@ -17,7 +19,7 @@ def handler(event, context):
         raise RuntimeError("TENANTS_TABLE or PLANS_TABLE environment variable not set")
 
     # boto3 initialized INSIDE handler
-    dynamodb = boto3.resource("dynamodb")
+    dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
     tenants_table = dynamodb.Table(tenants_table_name)
     plans_table = dynamodb.Table(plans_table_name)
 
@@ -37,9 +39,9 @@ def handler(event, context):
 
     return {
         "statusCode": 200,
-        "body": json.dumps({
+        "body": ddb_dumps({
             "tenant_id": tenant_id,
             "plan_id": plan_id,
             "plan": plan_data
-        }, default=str)
+        })
     }
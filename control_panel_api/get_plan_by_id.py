@@ -1,8 +1,10 @@
-import json
 import os
 
 import boto3
 
+from services.common import aws_clients
+from shared.utils.json_encoders import ddb_dumps
+
 PLANS_TABLE_NAME = os.getenv("PLANS_TABLE_NAME", "PlansTable")
 
 
@@ -17,11 +19,11 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "planId is required"}),
+                "body": ddb_dumps({"error": "planId is required"}),
             }
 
         table_name = os.getenv("PLANS_TABLE_NAME", PLANS_TABLE_NAME)
-        dynamodb = boto3.resource("dynamodb")
+        dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
         table = dynamodb.Table(table_name)
 
         resp = table.get_item(Key={"plan_id": plan_id})
@@ -30,18 +32,18 @@ def handler(event, context):
             return {
                 "statusCode": 404,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "plan not found"}),
+                "body": ddb_dumps({"error": "plan not found"}),
             }
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(item, default=str),
+            "body": ddb_dumps(item),
         }
 
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}, default=str),
+            "body": ddb_dumps({"error": str(e)}),
         }
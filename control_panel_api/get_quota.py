@@ -1,15 +1,26 @@
 # control_panel_api/get_quota.py
 
-import json
 import os
 from datetime import datetime
 from decimal import Decimal
 
 import boto3
+from aws_lambda_powertools import Metrics
 from boto3.dynamodb.conditions import Key
 
-# Global dynamodb so tests can monkeypatch get_quota.dynamodb
-dynamodb = boto3.resource("dynamodb")
+from services.common.ddb_client import TENANT, USAGE_TABLE, codecs_from_env, dynamodb_resource
+from services.common.ttl_cache import TTLCache
+from services.usage.rollups import day_totals, get_rollups_table, tenant_scope, valid_since
+from shared.utils.json_encoders import ddb_dumps
+
+metrics = Metrics(namespace="MerlinSigma", service="control-panel")
+
+# Global dynamodb so tests can monkeypatch get_quota.dynamodb: the pooled
+# aws_clients resource (low-level client facade when DDB_LOW_LEVEL_CLIENT=true)
+dynamodb = dynamodb_resource(
+    codecs_from_env(USAGE_TABLE_NAME=USAGE_TABLE, TENANTS_TABLE_NAME=TENANT),
+    boto3_module=boto3,
+)
 
 # Default table names (used as fallbacks)
 USAGE_TABLE_DEFAULT = "UsageLogs"
@@ -18,6 +29,15 @@ TENANTS_TABLE_DEFAULT = "MerlinSigmaTenants"
 TENANT_GSI = "tenant_id-ts-index"
 DEFAULT_DAILY_LIMIT = 100  # simple default; plans-based limits can come later
 
+# quota#v1 rows change only on plan updates; keep them across warm invocations
+_QUOTA_ROW_CACHE = TTLCache(
+    "QuotaRow",
+    maxsize=2048,
+    ttl=float(os.getenv("QUOTA_CACHE_TTL_SECONDS", "60")),
+    negative_ttl=10,
+    metrics=metrics,
+)
+
 
 def _dec_int(v, default=0):
     if v is None:
@@ -27,6 +47,23 @@ def _dec_int(v, default=0):
     return int(v)
 
 
+def _count_today_rows(usage_table, tenant_id, today):
+    kwargs = {
+        "IndexName": TENANT_GSI,
+        "KeyConditionExpression": Key("tenant_id").eq(tenant_id)
+                                  & Key("timestamp").begins_with(today),
+        "Select": "COUNT",
+    }
+    used = 0
+    while True:
+        resp = usage_table.query(**kwargs)
+        used += resp.get("Count", len(resp.get("Items", [])))
+        if "LastEvaluatedKey" not in resp:
+            return used
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+@metrics.log_metrics
 def handler(event, context):
     try:
         tenant_id = event["pathParameters"]["tenantId"]
@@ -39,11 +76,12 @@ def handler(event, context):
         usage_table = dynamodb.Table(usage_table_name)
 
         # ---- Load quota row (missing is NOT a hard error here)
-        tenant_resp = tenants_table.get_item(
-            Key={"PK": f"tenant#{tenant_id}", "SK": "quota#v1"}
-        )
-
-        quota_item = tenant_resp.get("Item", {})  # fallback empty
+        quota_item = _QUOTA_ROW_CACHE.get_or_load(
+            (tenants_table_name, tenant_id),
+            lambda: tenants_table.get_item(
+                Key={"PK": f"tenant#{tenant_id}", "SK": "quota#v1"}
+            ).get("Item"),
+        ) or {}  # fallback empty
         daily_limit = _dec_int(
             quota_item.get("max_requests_per_day"),
             DEFAULT_DAILY_LIMIT,
@@ -52,15 +90,13 @@ def handler(event, context):
         # ---- Load today's usage
         today = datetime.utcnow().date().isoformat()
 
-        usage_resp = usage_table.query(
-            IndexName=TENANT_GSI,
-            KeyConditionExpression=Key("tenant_id").eq(tenant_id)
-                                  & Key("timestamp").begins_with(today),
-        )
-
-        usage_items = usage_resp.get("Items", [])
-
-        used_today = len(usage_items)
+        rollups = get_rollups_table(dynamodb)
+        since = valid_since(rollups) if rollups is not None else None
+        if since is not None and f"{since:%Y-%m-%d}" <= today:
+            # daily rollup bucket: one read regardless of request volume
+            used_today = day_totals(rollups, tenant_scope(tenant_id), today)["requests"]
+        else:
+            used_today = _count_today_rows(usage_table, tenant_id, today)
         remaining = max(daily_limit - used_today, 0)
 
         body = {
@@ -74,7 +110,7 @@ def handler(event, context):
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(body, default=str),
+            "body": ddb_dumps(body),
         }
 
     except Exception as e:
@@ -82,5 +118,5 @@ def handler(event, context):
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}),
+            "body": ddb_dumps({"error": str(e)}),
         }
@@ -1,25 +1,125 @@
 # control_panel_api/get_usage.py
 
+import base64
 import json
 import os
-from decimal import Decimal
+from datetime import date, datetime
 import boto3
 from boto3.dynamodb.conditions import Key
 
-dynamodb = boto3.resource("dynamodb")
+from services.common import aws_clients
+from shared.utils.json_encoders import ddb_dumps
 
+dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
 
-def _dec(value):
-    """Convert Decimal → int or float safely."""
-    if isinstance(value, Decimal):
+SK_PREFIX = "usage#"
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 1000
+# Lambda's synchronous response limit is 6 MB; leave room for headers / envelope
+MAX_RESPONSE_BYTES = int(os.getenv("GET_USAGE_MAX_RESPONSE_BYTES", str(5 * 1024 * 1024)))
+# attributes the console renders; PK / SK are always fetched (cursor keys)
+USAGE_FIELDS = [f.strip() for f in os.getenv(
+    "GET_USAGE_FIELDS", "tokens_used,requests,cost_usd,endpoint,timestamp").split(",") if f.strip()]
+
+
+def _decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
+        lek = json.loads(raw)
+        return lek if isinstance(lek, dict) and "PK" in lek and "SK" in lek else None
+    except Exception:
+        return None
+
+
+def _encode_cursor(lek: dict):
+    raw = json.dumps(lek, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+
+
+def _bound(value: str):
+    """Validated ISO date / datetime string (used verbatim in the sort key), or None if malformed."""
+    for parse in (date.fromisoformat, datetime.fromisoformat):
         try:
-            return int(value)
-        except:
-            return float(value)
-    return value
+            parse(value.replace("Z", "+00:00"))
+            return value
+        except ValueError:
+            continue
+    return None
+
+
+def _key_condition(tenant_id, start, end):
+    """PK = tenant#<id> plus an SK range; `end` is inclusive of anything it prefixes (a whole day, say)."""
+    cond = Key("PK").eq(f"tenant#{tenant_id}")
+    lo = f"{SK_PREFIX}{start}" if start else None
+    hi = f"{SK_PREFIX}{end}\uffff" if end else None
+    if lo and hi:
+        return cond & Key("SK").between(lo, hi)
+    if lo:
+        return cond & Key("SK").between(lo, f"{SK_PREFIX}\uffff")
+    if hi:
+        return cond & Key("SK").between(SK_PREFIX, hi)
+    return cond & Key("SK").begins_with(SK_PREFIX)
+
+
+def _projection():
+    names = {"#pk": "PK", "#sk": "SK"}
+    for i, field in enumerate(USAGE_FIELDS):
+        names[f"#f{i}"] = field  # several (timestamp, ...) are reserved words
+    return ", ".join(names), names
+
+
+def _query_page(table, key_condition, limit, eks, descending):
+    """
+    Up to `limit` items as pre-serialized JSON fragments, stopping early before
+    the body would pass MAX_RESPONSE_BYTES. Returns (fragments, cursor key of
+    the last row returned, or None when nothing is left).
+    """
+    projection, names = _projection()
+    kwargs = {
+        "KeyConditionExpression": key_condition,
+        "ProjectionExpression": projection,
+        "ExpressionAttributeNames": names,
+        "ScanIndexForward": not descending,
+    }
+    if eks:
+        kwargs["ExclusiveStartKey"] = eks
+
+    fragments = []
+    size = 0
+    last_key = None
+    while True:
+        kwargs["Limit"] = limit - len(fragments)
+        resp = table.query(**kwargs)
+        items = resp.get("Items", [])
+        lek = resp.get("LastEvaluatedKey")
+        for i, it in enumerate(items):
+            fragment = ddb_dumps(it)  # Decimals -> int / float in the same pass
+            nbytes = len(fragment.encode("utf-8")) + 1  # non-ASCII text is emitted unescaped
+            if fragments and size + nbytes > MAX_RESPONSE_BYTES:
+                return fragments, last_key
+            fragments.append(fragment)
+            size += nbytes
+            last_key = {"PK": it.get("PK"), "SK": it.get("SK")}
+            if len(fragments) == limit:
+                more = i < len(items) - 1 or lek
+                return fragments, last_key if more else None
+        if not lek:
+            return fragments, None
+        kwargs["ExclusiveStartKey"] = lek
+
+
+def _error(status, message):
+    return {"statusCode": status, "body": ddb_dumps({"error": message})}
 
 
 def handler(event, context):
+    """
+    GET /tenants/{tenantId}/usage?start=&end=&limit=&cursor=&order=asc|desc
+
+    `start` / `end` (ISO date or datetime, inclusive) bound the usage#<...>
+    sort key; pages hold up to `limit` rows (default 100, max 1000) and stay
+    under MAX_RESPONSE_BYTES; `next_cursor` is returned while rows remain.
+    """
     print("DEBUG get_usage loaded from:", __file__)
 
     # --------------------------------------------
@@ -27,41 +127,61 @@ def handler(event, context):
     # --------------------------------------------
     usage_table_name = os.environ.get("USAGE_TABLE_NAME")
     if not usage_table_name:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": "USAGE_TABLE_NAME not set"})
-        }
+        return _error(500, "USAGE_TABLE_NAME not set")
 
     table = dynamodb.Table(usage_table_name)
 
     # --------------------------------------------
-    # VALIDATE tenantId
+    # VALIDATE tenantId / query parameters
     # --------------------------------------------
-    tenant_id = event.get("pathParameters", {}).get("tenantId")
+    tenant_id = (event.get("pathParameters") or {}).get("tenantId")
     if not tenant_id:
-        return {
-            "statusCode": 400,
-            "body": json.dumps({"error": "tenantId is required"})
-        }
+        return _error(400, "tenantId is required")
+
+    params = event.get("queryStringParameters") or {}
+    try:
+        limit = max(1, min(int(params.get("limit", DEFAULT_LIMIT)), MAX_LIMIT))
+    except ValueError:
+        limit = DEFAULT_LIMIT
+
+    start = end = None
+    if params.get("start"):
+        start = _bound(params["start"])
+        if start is None:
+            return _error(400, "start must be an ISO date or datetime")
+    if params.get("end"):
+        end = _bound(params["end"])
+        if end is None:
+            return _error(400, "end must be an ISO date or datetime")
+    if start and end and start > end:
+        return _error(400, "start must not be after end")
+
+    eks = None
+    if params.get("cursor"):
+        eks = _decode_cursor(params["cursor"])
+        if eks is None:
+            return _error(400, "invalid cursor")
 
     # --------------------------------------------
-    # QUERY USAGE
+    # QUERY USAGE (one page)
     # --------------------------------------------
     try:
-        resp = table.query(
-            KeyConditionExpression=Key("PK").eq(f"tenant#{tenant_id}")
+        fragments, next_key = _query_page(
+            table,
+            _key_condition(tenant_id, start, end),
+            limit,
+            eks,
+            (params.get("order") or "asc").lower() == "desc",
         )
 
-        items = resp.get("Items", [])
-        items = [{k: _dec(v) for k, v in it.items()} for it in items]
-
+        # body assembled from the already-serialized rows
+        tail = f',"count":{len(fragments)}'
+        if next_key:
+            tail += f',"next_cursor":{ddb_dumps(_encode_cursor(next_key))}'
         return {
             "statusCode": 200,
-            "body": json.dumps({"usage": items}, default=str),
+            "body": '{"usage":[' + ",".join(fragments) + "]" + tail + "}",
         }
 
     except Exception as e:
-        return {
-            "statusCode": 500,
-            "body": json.dumps({"error": str(e)}),
-        }
+        return _error(500, str(e))
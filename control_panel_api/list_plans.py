@@ -1,8 +1,11 @@
-import json
 import os
 
 import boto3
 
+from services.common import aws_clients
+from services.common.parallel_scan import parallel_scan
+from shared.utils.json_encoders import ddb_dumps
+
 PLANS_TABLE_NAME = os.getenv("PLANS_TABLE_NAME", "PlansTable")
 
 
@@ -14,15 +17,16 @@ def handler(event, context):
 
     Test-friendly:
     - Table name comes from PLANS_TABLE_NAME env var.
-    - boto3 is imported at module level so tests can monkeypatch list_plans.boto3.
+    - boto3 is imported at module level so tests can monkeypatch list_plans.boto3
+      (aws_clients hands it the fake; the real resource is memoized per container).
     """
     try:
         table_name = os.getenv("PLANS_TABLE_NAME", PLANS_TABLE_NAME)
-        dynamodb = boto3.resource("dynamodb")
+        dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
         table = dynamodb.Table(table_name)
 
-        resp = table.scan()
-        items = resp.get("Items", [])
+        # follows every page (a single scan() stopped at 1 MB)
+        items = list(parallel_scan(table))
 
         body = {
             "plans": items,
@@ -32,12 +36,12 @@ def handler(event, context):
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(body, default=str),
+            "body": ddb_dumps(body),
         }
 
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}, default=str),
+            "body": ddb_dumps({"error": str(e)}),
         }
@@ -1,21 +1,119 @@
 import os
-import json
-import base64
 import boto3
 from boto3.dynamodb.conditions import Attr
 
+from services.common import aws_clients
+from services.tenants import registry as tenant_registry
+from services.tenants.registry import decode_cursor as _decode_cursor, encode_cursor as _encode_cursor
+from shared.utils.json_encoders import ddb_dumps
 
-def _decode_cursor(cursor: str):
+# scan page sizing: ~ROWS_PER_TENANT rows (profile / quota / plan) per wanted tenant
+ROWS_PER_TENANT = 4
+SCAN_PAGE_MIN = 25
+SCAN_PAGE_MAX = 1000
+# bounds one request on sparse tables; the cursor carries the partial tenant
+MAX_SCAN_PAGES = int(os.getenv("LIST_TENANTS_MAX_SCAN_PAGES", "10"))
+
+
+def _use_registry() -> bool:
+    """TENANT_REGISTRY_ENABLED=true once the registry GSIs exist and are backfilled."""
+    return os.getenv("TENANT_REGISTRY_ENABLED", "false").lower() == "true"
+
+
+def _list_from_registry(table, params, limit, eks):
+    """GET /tenants?limit=&cursor=&prefix=&sort=tenant_id|created_at&order=asc|desc via the registry GSIs."""
     try:
-        raw = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
-        return json.loads(raw)
-    except Exception:
+        if params.get("cursor") and eks is None:
+            raise ValueError("invalid cursor")
+        body = tenant_registry.query_tenants(
+            table,
+            limit=limit,
+            cursor=eks,
+            prefix=params.get("prefix") or None,
+            sort=params.get("sort") or "tenant_id",
+            descending=(params.get("order") or "asc").lower() == "desc",
+        )
+    except ValueError as e:
+        return {
+            "statusCode": 400,
+            "headers": {"Content-Type": "application/json"},
+            "body": ddb_dumps({"error": str(e)}),
+        }
+    return {
+        "statusCode": 200,
+        "headers": {"Content-Type": "application/json"},
+        "body": ddb_dumps(body),
+    }
+
+
+def _row(it):
+    """(tenant_id, entity kind, SK) for a tenant row, or None for registry bookkeeping rows."""
+    sk = it["SK"]               # profile#v1 / quota#v1 / usage#
+    if sk == tenant_registry.REGISTRY_SK:
         return None
+    return it["PK"].split("#", 1)[1], sk.split("#", 1)[0], sk
+
+
+def _scan_page(table, limit, eks):
+    """
+    Exactly `limit` complete tenants (fewer only at the end of the table or
+    after MAX_SCAN_PAGES reads), each as
+    {"tenant_id": "t1", "entities": {"profile": "profile#v1", ...}}.
+
+    A tenant's rows come back contiguously in scan order, so a tenant is
+    complete once a row of the next one shows up, and only that one open tenant
+    is buffered. A full page stops just before the next tenant's first row and
+    the cursor resumes there; if MAX_SCAN_PAGES runs out mid-tenant, the open
+    tenant travels in the cursor ({"k": <ExclusiveStartKey>, "o": <open tenant>})
+    and the next page continues it. A bare LastEvaluatedKey (older cursors) is
+    accepted too.
+    """
+    start, open_tenant = eks, None
+    if isinstance(eks, dict) and "k" in eks:
+        start, open_tenant = eks["k"], eks.get("o")
 
+    scan_kwargs = {
+        "ProjectionExpression": "PK, SK",
+        "FilterExpression": Attr("PK").begins_with("tenant#"),
+        "Limit": max(SCAN_PAGE_MIN, min(limit * ROWS_PER_TENANT, SCAN_PAGE_MAX)),
+    }
 
-def _encode_cursor(lek: dict):
-    raw = json.dumps(lek, separators=(",", ":"))
-    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+    tenants = []
+    last_key = start
+    pages = 0
+    while True:
+        if last_key:
+            scan_kwargs["ExclusiveStartKey"] = last_key
+        resp = table.scan(**scan_kwargs)
+        pages += 1
+
+        for it in resp.get("Items", []):
+            row = _row(it)
+            if row is not None:
+                tenant_id, kind, sk = row
+                if open_tenant is not None and open_tenant["tenant_id"] != tenant_id:
+                    tenants.append(open_tenant)
+                    open_tenant = None
+                if open_tenant is None:
+                    if len(tenants) == limit:
+                        # page is full: resume at this row (not yet consumed)
+                        body = {"tenants": sorted(tenants, key=lambda x: x["tenant_id"]), "count": limit}
+                        body["next_cursor"] = _encode_cursor({"k": last_key, "o": None})
+                        return body
+                    open_tenant = {"tenant_id": tenant_id, "entities": {}}
+                open_tenant["entities"][kind] = sk
+            last_key = {"PK": it["PK"], "SK": it["SK"]}
+
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            if open_tenant is not None:
+                tenants.append(open_tenant)
+            return {"tenants": sorted(tenants, key=lambda x: x["tenant_id"]), "count": len(tenants)}
+        last_key = lek
+        if pages >= MAX_SCAN_PAGES:
+            body = {"tenants": sorted(tenants, key=lambda x: x["tenant_id"]), "count": len(tenants)}
+            body["next_cursor"] = _encode_cursor({"k": last_key, "o": open_tenant})
+            return body
 
 
 def handler(event, context):
@@ -25,7 +123,7 @@ def handler(event, context):
     # --------------------------------------------------
     # ENVIRONMENT VARIABLE (set in CDK)
     # --------------------------------------------------
-    table_name = os.environ.get("TABLE_NAME")
+    table_name = os.environ.get("TABLE_NAME") or os.environ.get("TENANTS_TABLE")  # the stack sets TENANTS_TABLE
     if not table_name:
         raise RuntimeError("TABLE_NAME environment variable not set")
 
@@ -33,7 +131,7 @@ def handler(event, context):
     # IMPORTANT: allocate DynamoDB *inside* handler
     # (monkeypatch can override boto3 before this runs)
     # --------------------------------------------------
-    dynamodb = boto3.resource("dynamodb")
+    dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
     table = dynamodb.Table(table_name)
 
     # --------------------------------------------------
@@ -50,49 +148,17 @@ def handler(event, context):
     cursor = params.get("cursor")
     eks = _decode_cursor(cursor) if cursor else None
 
-    # --------------------------------------------------
-    # SCAN all tenants: PK begins with "tenant#"
-    # --------------------------------------------------
-    scan_kwargs = {
-        "ProjectionExpression": "PK, SK",
-        "FilterExpression": Attr("PK").begins_with("tenant#"),
-        "Limit": limit
-    }
-
-    if eks:
-        scan_kwargs["ExclusiveStartKey"] = eks
-
-    resp = table.scan(**scan_kwargs)
-    items = resp.get("Items", [])
+    if _use_registry():
+        return _list_from_registry(table, params, limit, eks)
 
     # --------------------------------------------------
-    # Aggregate into:
-    # {"tenant_id": "t1", "entities": {"profile": "profile#v1"}}
+    # SCAN all tenants: PK begins with "tenant#", reading
+    # until `limit` tenants are complete (see _scan_page)
     # --------------------------------------------------
-    by_tenant = {}
-
-    for it in items:
-        pk = it["PK"]               # tenant#someId
-        sk = it["SK"]               # profile#v1 / quota#v1 / usage#
-        tenant_id = pk.split("#", 1)[1]
-
-        ent_kind = sk.split("#", 1)[0]
-        entry = by_tenant.setdefault(tenant_id, {"tenant_id": tenant_id, "entities": {}})
-        entry["entities"][ent_kind] = sk
-
-    tenants = sorted(by_tenant.values(), key=lambda x: x["tenant_id"])
-
-    body = {
-        "tenants": tenants,
-        "count": len(tenants),
-    }
-
-    lek = resp.get("LastEvaluatedKey")
-    if lek:
-        body["next_cursor"] = _encode_cursor(lek)
+    body = _scan_page(table, limit, eks)
 
     return {
         "statusCode": 200,
         "headers": {"Content-Type": "application/json"},
-        "body": json.dumps(body)
+        "body": ddb_dumps(body)
     }
@@ -1,68 +1,209 @@
-import json
+import base64
+import itertools
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 import boto3
 
+from services.common import aws_clients
+from services.common.ttl_cache import TTLCache
+from shared.utils.json_encoders import ddb_dumps
+
+PAGE_SIZE = 60  # Cognito ListUsers / ListGroups / ListUsersInGroup maximum
+MAX_LIMIT = 200
+MAX_WORKERS = int(os.getenv("LIST_USERS_MAX_WORKERS", "8"))
+# with at most this many groups, one ListUsersInGroup walk per group + an
+# in-memory join beats one ListGroupsForUser call per listed user
+GROUP_JOIN_MAX = int(os.getenv("LIST_USERS_GROUP_JOIN_MAX", "10"))
+# ...as long as the groups are small: past this many ListUsersInGroup pages in
+# total the join is abandoned for per-user lookups of the listed page only
+GROUP_JOIN_MAX_PAGES = int(os.getenv("LIST_USERS_GROUP_JOIN_MAX_PAGES", "20"))
+
+# {(pool_id, "*"): {username: [groups]}} for the join, {(pool_id, username): [groups]} otherwise
+_GROUPS = TTLCache("AdminUserGroups", maxsize=4096, ttl=float(os.getenv("LIST_USERS_GROUP_TTL", "30")))
+
+
+def _decode_cursor(cursor: str):
+    try:
+        return base64.b64decode(cursor.encode("utf-8"), altchars=b"-_", validate=True).decode("utf-8") or None
+    except Exception:
+        return None
+
+
+def _encode_cursor(token: str):
+    return base64.urlsafe_b64encode(token.encode("utf-8")).decode("utf-8")
+
+
+def _email(user: dict):
+    for attr in user.get("Attributes", []):
+        if attr.get("Name") == "email":
+            return attr.get("Value")
+    return None
+
+
+def _list_users_page(cognito, user_pool_id, limit, token):
+    """Up to `limit` users starting at `token`; returns (users, next PaginationToken)."""
+    users = []
+    while len(users) < limit:
+        kwargs = {"UserPoolId": user_pool_id, "Limit": min(PAGE_SIZE, limit - len(users))}
+        if token:
+            kwargs["PaginationToken"] = token
+        resp = cognito.list_users(**kwargs)
+        users.extend(resp.get("Users", []))
+        token = resp.get("PaginationToken")
+        if not token:
+            break
+    return users, token
+
+
+def _paginate(call, key, **kwargs):
+    """Every item under `key` across NextToken pages."""
+    out = []
+    while True:
+        resp = call(**kwargs)
+        out.extend(resp.get(key, []))
+        token = resp.get("NextToken")
+        if not token:
+            return out
+        kwargs["NextToken"] = token
+
+
+class _JoinTooLarge(Exception):
+    pass
+
+
+def _membership_map(cognito, user_pool_id, group_names):
+    """
+    {username: [groups]} from one ListUsersInGroup walk per group, fanned out;
+    None once the walks need more than GROUP_JOIN_MAX_PAGES pages together.
+    """
+    pages = itertools.count(1)  # shared by the workers; next() is atomic
+
+    def members(group):
+        kwargs = {"UserPoolId": user_pool_id, "GroupName": group, "Limit": PAGE_SIZE}
+        usernames = []
+        while True:
+            if next(pages) > GROUP_JOIN_MAX_PAGES:
+                raise _JoinTooLarge(group)
+            resp = cognito.list_users_in_group(**kwargs)
+            usernames.extend(u["Username"] for u in resp.get("Users", []))
+            if not resp.get("NextToken"):
+                return group, usernames
+            kwargs["NextToken"] = resp["NextToken"]
+
+    by_user = {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(group_names)))) as pool:
+        try:
+            for group, usernames in pool.map(members, group_names):
+                for name in usernames:
+                    by_user.setdefault(name, []).append(group)
+        except _JoinTooLarge:
+            return None
+    return by_user
+
+
+def _groups_by_join(cognito, user_pool_id):
+    """
+    Cached membership map, or None when the pool has too many or too large
+    groups (or ListGroups isn't allowed).
+    """
+    def load():
+        try:
+            groups = _paginate(cognito.list_groups, "Groups", UserPoolId=user_pool_id, Limit=PAGE_SIZE)
+        except Exception:
+            return None
+        if len(groups) > GROUP_JOIN_MAX:
+            return None
+        return _membership_map(cognito, user_pool_id, [g["GroupName"] for g in groups])
+
+    return _GROUPS.get_or_load((user_pool_id, "*"), load)
+
+
+def _groups_per_user(cognito, user_pool_id, usernames):
+    """{username: [groups]} via ListGroupsForUser, cached per user and fanned out over a bounded pool."""
+    # the real API is AdminListGroupsForUser; the test fake only has list_groups_for_user
+    list_groups_for_user = getattr(cognito, "admin_list_groups_for_user", None) or cognito.list_groups_for_user
+
+    def lookup(username):
+        def load():
+            resp = list_groups_for_user(Username=username, UserPoolId=user_pool_id)
+            return [g["GroupName"] for g in resp.get("Groups", [])]
+        return username, _GROUPS.get_or_load((user_pool_id, username), load)
+
+    if not usernames:
+        return {}
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_WORKERS, len(usernames)))) as pool:
+        return dict(pool.map(lookup, usernames))
+
 
 def handler(event, context):
     """
-    GET /admin/users
+    GET /admin/users?limit=<n>&cursor=<opaque>
 
-    Lists Cognito users and their groups.
+    Lists Cognito users and their groups, one page at a time (default 60,
+    max 200); `next_cursor` is returned while more users remain. Group
+    membership comes from a short-TTL cached join (few, small groups) or
+    concurrent per-user lookups.
     """
     user_pool_id = os.getenv("COGNITO_USER_POOL_ID")
     if not user_pool_id:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": "COGNITO_USER_POOL_ID not set"}),
+            "body": ddb_dumps({"error": "COGNITO_USER_POOL_ID not set"}),
         }
 
+    params = (event or {}).get("queryStringParameters") or {}
     try:
-        cognito = boto3.client("cognito-idp")
-
-        resp = cognito.list_users(UserPoolId=user_pool_id, Limit=60)
-        users = resp.get("Users", [])
-
-        result = []
-        for u in users:
-            username = u.get("Username")
-            attrs = u.get("Attributes", [])
-
-            email = None
-            for attr in attrs:
-                if attr.get("Name") == "email":
-                    email = attr.get("Value")
-                    break
-
-            groups_resp = cognito.list_groups_for_user(
-                Username=username,
-                UserPoolId=user_pool_id,
-            )
-            groups = [g["GroupName"] for g in groups_resp.get("Groups", [])]
-
-            result.append(
-                {
-                    "username": username,
-                    "email": email,
-                    "groups": groups,
-                }
-            )
+        limit = max(1, min(int(params.get("limit", PAGE_SIZE)), MAX_LIMIT))
+    except ValueError:
+        limit = PAGE_SIZE
+
+    token = None
+    if params.get("cursor"):
+        token = _decode_cursor(params["cursor"])
+        if token is None:
+            return {
+                "statusCode": 400,
+                "headers": {"Content-Type": "application/json"},
+                "body": ddb_dumps({"error": "invalid cursor"}),
+            }
+
+    try:
+        cognito = aws_clients.client("cognito-idp", boto3_module=boto3)
+
+        users, next_token = _list_users_page(cognito, user_pool_id, limit, token)
+        usernames = [u.get("Username") for u in users]
+
+        groups_of = _groups_by_join(cognito, user_pool_id)
+        if groups_of is None:
+            groups_of = _groups_per_user(cognito, user_pool_id, usernames)
+
+        result = [
+            {
+                "username": u.get("Username"),
+                "email": _email(u),
+                "groups": list(groups_of.get(u.get("Username"), [])),
+            }
+            for u in users
+        ]
 
         body = {
             "users": result,
             "count": len(result),
         }
+        if next_token:
+            body["next_cursor"] = _encode_cursor(next_token)
 
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(body),
+            "body": ddb_dumps(body),
         }
 
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}),
+            "body": ddb_dumps({"error": str(e)}),
         }
@@ -2,6 +2,11 @@ import os
 import json
 import boto3
 
+from services.common import aws_clients
+from services.tenants.registry import register_tenant
+from shared.utils.json_encoders import ddb_dumps
+
+
 def handler(event, context):
     print("DEBUG put_plan loaded from:", __file__)
 
@@ -11,7 +16,7 @@ def handler(event, context):
     if not tenants_table_name or not plans_table_name:
         raise RuntimeError("TENANTS_TABLE or PLANS_TABLE environment variable not set")
 
-    dynamodb = boto3.resource("dynamodb")
+    dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
     tenants_table = dynamodb.Table(tenants_table_name)
     plans_table = dynamodb.Table(plans_table_name)
 
@@ -27,7 +32,7 @@ def handler(event, context):
         except json.JSONDecodeError:
             return {
                 "statusCode": 400,
-                "body": json.dumps({"error": "Invalid JSON payload"})
+                "body": ddb_dumps({"error": "Invalid JSON payload"})
             }
 
         # --------------------------------------------
@@ -37,7 +42,7 @@ def handler(event, context):
         if not new_plan_id:
             return {
                 "statusCode": 400,
-                "body": json.dumps({"error": "plan_id is required"})
+                "body": ddb_dumps({"error": "plan_id is required"})
             }
 
         # --------------------------------------------
@@ -51,7 +56,7 @@ def handler(event, context):
         if not tenant_item:
             return {
                 "statusCode": 404,
-                "body": json.dumps({"error": "tenant not found"})
+                "body": ddb_dumps({"error": "tenant not found"})
             }
 
         old_plan = tenant_item.get("plan_id")
@@ -63,9 +68,15 @@ def handler(event, context):
         if "Item" not in plan_resp:
             return {
                 "statusCode": 404,
-                "body": json.dumps({"error": "plan not found"})
+                "body": ddb_dumps({"error": "plan not found"})
             }
 
+        # --------------------------------------------
+        # Register the tenant (no-op once registered). Always written, so the
+        # registry index fills in before TENANT_REGISTRY_ENABLED reads from it
+        # --------------------------------------------
+        register_tenant(tenants_table, tenant_id)
+
         # --------------------------------------------
         # Update tenant plan
         # --------------------------------------------
@@ -79,7 +90,7 @@ def handler(event, context):
 
         return {
             "statusCode": 200,
-            "body": json.dumps({
+            "body": ddb_dumps({
                 "tenant_id": tenant_id,
                 "old_plan": old_plan,
                 "new_plan": new_plan_id,
@@ -90,5 +101,5 @@ def handler(event, context):
     except Exception as e:
         return {
             "statusCode": 500,
-            "body": json.dumps({"error": str(e)})
+            "body": ddb_dumps({"error": str(e)})
         }
@@ -3,6 +3,9 @@ import os
 
 import boto3
 
+from services.common import aws_clients
+from shared.utils.json_encoders import ddb_dumps
+
 PLANS_TABLE_NAME = os.getenv("PLANS_TABLE_NAME", "PlansTable")
 
 
@@ -24,7 +27,7 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "planId is required"}),
+                "body": ddb_dumps({"error": "planId is required"}),
             }
 
         try:
@@ -33,11 +36,11 @@ def handler(event, context):
             return {
                 "statusCode": 400,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "Invalid JSON payload"}),
+                "body": ddb_dumps({"error": "Invalid JSON payload"}),
             }
 
         table_name = os.getenv("PLANS_TABLE_NAME", PLANS_TABLE_NAME)
-        dynamodb = boto3.resource("dynamodb")
+        dynamodb = aws_clients.resource("dynamodb", boto3_module=boto3)
         table = dynamodb.Table(table_name)
 
         # Load existing
@@ -47,7 +50,7 @@ def handler(event, context):
             return {
                 "statusCode": 404,
                 "headers": {"Content-Type": "application/json"},
-                "body": json.dumps({"error": "plan not found"}),
+                "body": ddb_dumps({"error": "plan not found"}),
             }
 
         # Merge updates
@@ -62,12 +65,12 @@ def handler(event, context):
         return {
             "statusCode": 200,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps(updated, default=str),
+            "body": ddb_dumps(updated),
         }
 
     except Exception as e:
         return {
             "statusCode": 500,
             "headers": {"Content-Type": "application/json"},
-            "body": json.dumps({"error": str(e)}, default=str),
+            "body": ddb_dumps({"error": str(e)}),
         }
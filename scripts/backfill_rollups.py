@@ -0,0 +1,40 @@
+# scripts/backfill_rollups.py
+"""
+One-off migration: rebuild UsageRollups buckets from raw UsageLogs rows for the
+days before the "rollups valid since" watermark, then move the watermark back
+so readers use the buckets for those days too.
+
+    python -m scripts.backfill_rollups --usage-table UsageLogs --rollups-table UsageRollups --since 2025-01-01
+
+Run it at least an hour after the watermark (set by the rollup stream's first
+batch). Buckets are overwritten, so a rerun is harmless; walk back a month at a
+time on large tables.
+"""
+
+import argparse
+import sys
+from datetime import datetime, timezone
+
+import boto3
+
+from services.usage.rollups import backfill_rollups
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--usage-table", required=True)
+    parser.add_argument("--rollups-table", required=True)
+    parser.add_argument("--since", required=True, help="first UTC day to rebuild (YYYY-MM-DD)")
+    parser.add_argument("--region", default=None)
+    args = parser.parse_args(argv)
+
+    ddb = boto3.resource("dynamodb", region_name=args.region)
+    since = datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    result = backfill_rollups(ddb.Table(args.usage_table), ddb.Table(args.rollups_table), since)
+    print(f"{args.rollups_table}: {result['buckets']} buckets from {result['rows']} rows; "
+          f"valid since {result['valid_since']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
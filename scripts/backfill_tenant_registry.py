@@ -0,0 +1,35 @@
+# scripts/backfill_tenant_registry.py
+"""
+One-off migration: write a registry row for every tenant in the tenants table,
+so the TenantRegistryById / TenantRegistryByCreated GSIs list all of them.
+
+    python -m scripts.backfill_tenant_registry --table MerlinSigmaTenants
+    python -m scripts.backfill_tenant_registry --table MerlinSigmaTenants --created-at 2024-01-01T00:00:00+00:00
+
+Idempotent: tenants that already have a registry row are skipped.
+"""
+
+import argparse
+import sys
+
+import boto3
+
+from services.tenants.registry import backfill_registry
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--table", required=True)
+    parser.add_argument("--region", default=None)
+    parser.add_argument("--created-at", default=None,
+                        help="created_at for backfilled tenants (default: now)")
+    args = parser.parse_args(argv)
+
+    table = boto3.resource("dynamodb", region_name=args.region).Table(args.table)
+    written = backfill_registry(table, created_at=args.created_at)
+    print(f"{args.table}: registered {written} tenants")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
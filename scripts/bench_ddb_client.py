@@ -0,0 +1,89 @@
+# scripts/bench_ddb_client.py
+"""
+Low-level DynamoDB DAL vs the boto3 resource API.
+
+Per-item marshal / unmarshal time for a usage row (precompiled ItemCodec vs
+TypeSerializer / TypeDeserializer), and cold "import + build a table handle"
+time in fresh interpreters. No AWS calls are made.
+
+    python -m scripts.bench_ddb_client --items 20000 --runs 5
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+
+from services.common.ddb_client import USAGE_TABLE
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE_ROW = {
+    "usage_id": "9f2c0d6b3a",
+    "tenant_month": "tenant-123#2025-08",
+    "timestamp": "2025-08-25T10:00:00.000001Z",
+    "tenant_id": "tenant-123",
+    "token_count": 1234,
+    "endpoint": "/v1/chat",
+    "cost_usd": Decimal("0.0123"),
+}
+
+COLD_SNIPPETS = {
+    "resource": "import boto3; boto3.resource('dynamodb').Table('UsageLogs')",
+    "low_level": "from services.common.ddb_client import LowLevelTable; LowLevelTable('UsageLogs')",
+}
+
+
+def _per_item_us(fn, items) -> float:
+    started = time.perf_counter()
+    for it in items:
+        fn(it)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def marshal_bench(n_items: int) -> dict:
+    ser, de = TypeSerializer(), TypeDeserializer()
+    rows = [dict(SAMPLE_ROW, token_count=i) for i in range(n_items)]
+    wire = [USAGE_TABLE.encode(r) for r in rows]
+    return {
+        "marshal_resource_us": _per_item_us(lambda r: {k: ser.serialize(v) for k, v in r.items()}, rows),
+        "marshal_codec_us": _per_item_us(USAGE_TABLE.encode, rows),
+        "unmarshal_resource_us": _per_item_us(lambda w: {k: de.deserialize(v) for k, v in w.items()}, wire),
+        "unmarshal_codec_us": _per_item_us(USAGE_TABLE.decode, wire),
+    }
+
+
+def cold_ms(snippet: str) -> float:
+    env = dict(os.environ)
+    env.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    code = f"import time; t = time.perf_counter(); {snippet}; print((time.perf_counter() - t) * 1000)"
+    out = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, env=env, cwd=ROOT, check=True)
+    return float(out.stdout.strip().splitlines()[-1])
+
+
+def cold_bench(runs: int) -> dict:
+    return {name: statistics.median(cold_ms(snippet) for _ in range(runs)) for name, snippet in COLD_SNIPPETS.items()}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=20000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    m = marshal_bench(args.items)
+    print(f"marshal   per item: resource {m['marshal_resource_us']:.2f} us, codec {m['marshal_codec_us']:.2f} us")
+    print(f"unmarshal per item: resource {m['unmarshal_resource_us']:.2f} us, codec {m['unmarshal_codec_us']:.2f} us")
+    c = cold_bench(args.runs)
+    print(f"cold import + table handle (median of {args.runs}): "
+          f"resource {c['resource']:.1f} ms, low-level {c['low_level']:.1f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,106 @@
+# scripts/bench_ddb_safe.py
+"""
+Per-item cost of ddb_safe on representative usage rows.
+
+Compares the previous recursive converter (inlined below as `legacy`) with
+services.common.ddb_utils.ddb_safe on:
+
+    record      a UsageRecord.model_dump() row (datetime + Decimal, flat)
+    nested      a usage row with a float-bearing `meta` map and a tag list
+    safe        an already-converted row (the old write path converted twice)
+    write_path  UsageRecord.for_dynamodb() + the second conversion log_usage used to do
+
+    python -m scripts.bench_ddb_safe
+    python -m scripts.bench_ddb_safe --items 50000 --repeat 7
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from decimal import Decimal
+from typing import Any, Callable, Dict, List, Mapping
+
+from services.common.ddb_utils import ddb_safe
+from services.common.time_utils import to_iso_z
+from services.usage.models import UsageRecord
+
+
+def legacy(value: Any):
+    if isinstance(value, float):
+        return Decimal(str(value))
+    if isinstance(value, Decimal) or isinstance(value, int) or value is None or isinstance(value, (str, bool)):
+        return value
+    if isinstance(value, datetime):
+        return to_iso_z(value)
+    if isinstance(value, Mapping):
+        return {k: legacy(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        t = [legacy(v) for v in value]
+        return t if not isinstance(value, set) else set(t)
+    return str(value)
+
+
+def _records(n: int) -> List[UsageRecord]:
+    ts = datetime(2025, 11, 1, tzinfo=timezone.utc)
+    return [
+        UsageRecord(user_id=f"u{i % 50}", plan_id="plan_pro", endpoint="/v1/chat",
+                    tokens_used=100 + i % 900, duration_ms=20 + i % 300, success=i % 11 != 0,
+                    timestamp=ts, cost_usd=Decimal(f"0.{i % 1000:03d}"))
+        for i in range(n)
+    ]
+
+
+def workloads(n: int) -> Dict[str, tuple]:
+    records = _records(n)
+    dumped = [r.model_dump(mode="python") for r in records]
+    nested = [dict(d, meta={"latency_p50": 12.5, "region": "us-east-1", "weights": [0.25, 0.75]},
+                   tags=["chat", "prod"]) for d in dumped]
+    safe = [ddb_safe(d) for d in dumped]
+
+    def write_legacy(r):
+        d = r.model_dump(mode="python")
+        d["timestamp"] = to_iso_z(r.timestamp)
+        return legacy(legacy(d))
+
+    return {
+        "record": (dumped, legacy, ddb_safe),
+        "nested": (nested, legacy, ddb_safe),
+        "safe": (safe, legacy, ddb_safe),
+        "write_path": (records, write_legacy, UsageRecord.for_dynamodb),
+    }
+
+
+def _time(fn: Callable, items: list, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for it in items:
+            fn(it)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) / len(items) * 1e6
+
+
+def run(items: int = 20_000, repeat: int = 5) -> Dict[str, dict]:
+    results = {}
+    for name, (rows, old, new) in workloads(items).items():
+        results[name] = {"legacy_us": _time(old, rows, repeat), "ddb_safe_us": _time(new, rows, repeat)}
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=20_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    print(f"{args.items} rows, median of {args.repeat}, microseconds per item")
+    for name, r in run(args.items, args.repeat).items():
+        print(f"  {name:12s} legacy {r['legacy_us']:7.2f}  ddb_safe {r['ddb_safe_us']:7.2f}"
+              f"  {r['legacy_us'] / r['ddb_safe_us']:5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,99 @@
+# scripts/bench_import_time.py
+"""
+Cold-import benchmark for a Lambda handler module.
+
+Runs `python -X importtime -c "import <module>"` in fresh interpreters, parses
+the stderr report and fails (exit 1) when the median cumulative import time
+of the module exceeds the budget, or when a module that must stay lazy in
+production mode shows up in the import graph.
+
+    python -m scripts.bench_import_time                         # log_usage, default budget
+    python -m scripts.bench_import_time --budget-ms 300 --runs 7
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Optional, Tuple
+
+DEFAULT_MODULE = "services.usage.lambdas.log_usage.handler"
+DEFAULT_BUDGET_MS = float(os.getenv("LOG_USAGE_IMPORT_BUDGET_MS", "400"))
+# must not be imported on a production cold start (debug-only or mode-specific)
+DEFAULT_FORBIDDEN = ("dotenv", "services.usage.ingest_queue")
+
+
+def parse_importtime(stderr: str) -> Dict[str, Tuple[int, int]]:
+    """{module: (self_us, cumulative_us)} from `-X importtime` output."""
+    out = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3 or not parts[0].strip().isdigit():
+            continue  # header line
+        out[parts[2].strip()] = (int(parts[0]), int(parts[1]))
+    return out
+
+
+def measure(module: str, env: Optional[dict] = None) -> Dict[str, Tuple[int, int]]:
+    """Import `module` in a fresh interpreter and return its import-time report."""
+    run_env = dict(os.environ if env is None else env)
+    run_env.pop("LOG_USAGE_DEBUG", None)  # production import mode
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, env=run_env,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    return parse_importtime(proc.stderr)
+
+
+def run(module: str = DEFAULT_MODULE, budget_ms: float = DEFAULT_BUDGET_MS, runs: int = 5,
+        forbidden=DEFAULT_FORBIDDEN) -> dict:
+    """Median cumulative import time over `runs` cold imports, plus budget / laziness verdicts."""
+    samples: List[float] = []
+    report: Dict[str, Tuple[int, int]] = {}
+    for _ in range(runs):
+        report = measure(module)
+        samples.append(report[module][1] / 1000)
+    median_ms = statistics.median(samples)
+    leaked = sorted(m for m in report if any(m == f or m.startswith(f + ".") for f in forbidden))
+    slowest = sorted(report.items(), key=lambda kv: kv[1][0], reverse=True)[:10]
+    return {
+        "module": module,
+        "median_ms": median_ms,
+        "samples_ms": samples,
+        "budget_ms": budget_ms,
+        "over_budget": median_ms > budget_ms,
+        "forbidden_imported": leaked,
+        "slowest_self_ms": [(name, self_us / 1000) for name, (self_us, _) in slowest],
+    }
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--module", default=DEFAULT_MODULE)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    result = run(args.module, args.budget_ms, args.runs)
+    print(f"{result['module']}: median {result['median_ms']:.1f} ms "
+          f"(budget {result['budget_ms']:.0f} ms, runs {[round(s, 1) for s in result['samples_ms']]})")
+    for name, ms in result["slowest_self_ms"]:
+        print(f"  {ms:8.1f} ms  {name}")
+    ok = True
+    if result["forbidden_imported"]:
+        print(f"FAIL: lazy modules imported at cold start: {', '.join(result['forbidden_imported'])}")
+        ok = False
+    if result["over_budget"]:
+        print("FAIL: cold import over budget")
+        ok = False
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+# scripts/bench_json_encoding.py
+"""
+JSON encoding benchmark on a usage page of DynamoDB items (Decimal numbers).
+
+Compares the encoders the handlers used to rely on with ddb_dumps:
+
+    legacy_dec      per-item `_dec` loop + json.dumps(default=str) (old get_usage)
+    decimal_encoder json.dumps(cls=DecimalEncoder)
+    default_str     json.dumps(default=str) on raw items (Decimals become strings)
+    ddb_python      ddb_dumps, pure-Python path
+    ddb_orjson      ddb_dumps, orjson path (when installed)
+
+    python -m scripts.bench_json_encoding                  # 10k items
+    python -m scripts.bench_json_encoding --items 50000 --repeat 7
+"""
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from decimal import Decimal
+from typing import Callable, Dict, List
+
+from shared.utils import json_encoders
+from shared.utils.json_encoders import DecimalEncoder, ddb_dumps
+
+
+def usage_page(n: int) -> List[dict]:
+    return [
+        {
+            "PK": "tenant#t-42",
+            "SK": f"usage#2025-11-{1 + i % 30:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+            "tokens_used": Decimal(100 + i % 900),
+            "requests": Decimal(1 + i % 7),
+            "cost_usd": Decimal(f"0.{(i * 7919) % 100000:05d}"),
+            "endpoint": "/v1/chat" if i % 3 else "/v1/embed",
+            "timestamp": f"2025-11-{1 + i % 30:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+        }
+        for i in range(n)
+    ]
+
+
+def _legacy_dec(value):
+    if isinstance(value, Decimal):
+        try:
+            return int(value)
+        except Exception:
+            return float(value)
+    return value
+
+
+def _ddb_python(items):
+    saved = json_encoders._USE_ORJSON
+    json_encoders._USE_ORJSON = False
+    try:
+        return ddb_dumps({"usage": items})
+    finally:
+        json_encoders._USE_ORJSON = saved
+
+
+def encoders() -> Dict[str, Callable[[List[dict]], str]]:
+    out = {
+        "legacy_dec": lambda items: json.dumps(
+            {"usage": [{k: _legacy_dec(v) for k, v in it.items()} for it in items]}, default=str),
+        "decimal_encoder": lambda items: json.dumps({"usage": items}, cls=DecimalEncoder),
+        "default_str": lambda items: json.dumps({"usage": items}, default=str),
+        "ddb_python": _ddb_python,
+    }
+    if json_encoders.orjson is not None:
+        out["ddb_orjson"] = lambda items: ddb_dumps({"usage": items})
+    return out
+
+
+def run(items: int = 10_000, repeat: int = 5) -> Dict[str, dict]:
+    page = usage_page(items)
+    results = {}
+    for name, encode in encoders().items():
+        samples = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            body = encode(page)
+            samples.append((time.perf_counter() - start) * 1000)
+        results[name] = {"median_ms": statistics.median(samples), "bytes": len(body.encode("utf-8"))}
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--items", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    results = run(args.items, args.repeat)
+    base = results["legacy_dec"]["median_ms"]
+    print(f"{args.items} usage items, median of {args.repeat}")
+    for name, r in results.items():
+        print(f"  {name:16s} {r['median_ms']:8.2f} ms  {base / r['median_ms']:5.2f}x  {r['bytes']:>9d} bytes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
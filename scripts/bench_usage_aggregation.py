@@ -0,0 +1,147 @@
+# scripts/bench_usage_aggregation.py
+"""
+Usage aggregation benchmark: the per-row Decimal loops of the three
+aggregation call sites versus services.usage.engine.UsageAggregator (Python
+fold and, when numpy is installed, the vectorized page reduction).
+
+    invoice     monthly invoicing: token_count only (projected), totals
+    by_user     usage aggregate API: token_count grouped by user
+    summary     per-user daily summary: tokens + cost_usd totals
+    tenant_day  tokens + cost grouped by tenant and day (legacy: the same
+                Decimal loop written for that grouping)
+
+    python -m scripts.bench_usage_aggregation                  # 200k rows, 1k-row pages
+    python -m scripts.bench_usage_aggregation --rows 1000000 --page 1000
+"""
+
+import argparse
+import statistics
+import sys
+import time
+from decimal import Decimal
+from typing import Dict, List
+
+from services.usage import engine
+from services.usage.engine import UsageAggregator
+
+
+def usage_rows(n: int) -> List[dict]:
+    return [
+        {
+            "tenant_id": f"t{i % 40}",
+            "user_id": f"u{i % 400}",
+            "endpoint": "/v1/chat" if i % 3 else "/v1/embed",
+            "timestamp": f"2025-08-{1 + i % 28:02d}T{i % 24:02d}:{i % 60:02d}:00Z",
+            "token_count": Decimal(100 + i % 900),
+            "cost_usd": Decimal(f"0.{(i * 7919) % 100000:05d}"),
+        }
+        for i in range(n)
+    ]
+
+
+def legacy_invoice(pages):
+    tokens, rows = Decimal(0), 0
+    for page in pages:
+        for it in page:
+            ts = it.get("timestamp", "")
+            if ts == "AGG" or ts.startswith("IDEMP#"):
+                continue
+            rows += 1
+            tokens += Decimal(str(it.get("token_count", 0)))
+    return tokens, rows
+
+
+def legacy_by_user(pages):
+    total, by_user = Decimal(0), {}
+    for page in pages:
+        for it in page:
+            tk = Decimal(str(it.get("token_count", 0)))
+            total += tk
+            u = it.get("user_id", "unknown")
+            by_user[u] = by_user.get(u, Decimal(0)) + tk
+    return total, by_user
+
+
+def legacy_summary(pages):
+    items = [it for page in pages for it in page]
+    return (sum(int(it.get("token_count", 0)) for it in items), len(items),
+            sum(Decimal(str(it.get("cost_usd", "0.00"))) for it in items))
+
+
+def legacy_tenant_day(pages):
+    out = {}
+    for page in pages:
+        for it in page:
+            acc = out.setdefault((it.get("tenant_id"), it["timestamp"][:10]), [Decimal(0), 0, Decimal(0)])
+            acc[0] += Decimal(str(it.get("token_count", 0)))
+            acc[1] += 1
+            acc[2] += Decimal(str(it.get("cost_usd", "0")))
+    return out
+
+
+WORKLOADS = {
+    # name: (legacy loop, engine group_by, attributes the query returns)
+    "invoice": (legacy_invoice, (), ("timestamp", "token_count")),
+    "by_user": (legacy_by_user, ("user",), ("timestamp", "user_id", "token_count")),
+    "summary": (legacy_summary, (), None),
+    "tenant_day": (legacy_tenant_day, ("tenant", "day"), None),
+}
+
+
+def _engine(group_by, use_numpy: bool):
+    def run(pages):
+        saved = engine._USE_NUMPY
+        engine._USE_NUMPY = use_numpy
+        try:
+            agg = UsageAggregator(group_by)
+            for page in pages:
+                agg.add_items(page)
+            return agg.results()
+        finally:
+            engine._USE_NUMPY = saved
+    return run
+
+
+def _median_us(fn, pages, rows: int, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(pages)
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) / rows * 1e6
+
+
+def run(rows: int = 200_000, page: int = 1000, repeat: int = 3) -> Dict[str, Dict[str, float]]:
+    items = usage_rows(rows)
+    results = {}
+    for name, (legacy, group_by, projection) in WORKLOADS.items():
+        projected = items if projection is None else [{k: it[k] for k in projection} for it in items]
+        pages = [projected[i:i + page] for i in range(0, rows, page)]
+        runners = {"legacy": legacy, "engine_python": _engine(group_by, False)}
+        if engine.np is not None:
+            runners["engine_numpy"] = _engine(group_by, True)
+        results[name] = {label: _median_us(fn, pages, rows, repeat) for label, fn in runners.items()}
+    return results
+
+
+
+
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--page", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    print(f"{args.rows} rows in {args.page}-row pages, median of {args.repeat}, microseconds per row")
+    for workload, results in run(args.rows, args.page, args.repeat).items():
+        print(f"  {workload}")
+        for name, us in results.items():
+            print(f"    {name:14s} {us:6.2f}  {results['legacy'] / us:5.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
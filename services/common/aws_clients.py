@@ -0,0 +1,136 @@
+# services/common/aws_clients.py
+"""
+Per-container AWS client / resource factory.
+
+Handlers used to build `boto3.client(...)` / `boto3.resource(...)` on every
+invocation, paying endpoint resolution and a fresh TCP + TLS handshake each
+time. `client()` and `resource()` memoize one instance per (service, region)
+for the life of the container, with a shared botocore Config:
+
+- `max_pool_connections` (AWS_MAX_POOL_CONNECTIONS, default 32) for fan-out
+- TCP keepalive, so idle pooled connections survive between invocations
+- adaptive retries (AWS_MAX_ATTEMPTS, default 4)
+- tight connect / read timeouts (AWS_CONNECT_TIMEOUT / AWS_READ_TIMEOUT, default 1s / 5s)
+
+Tests keep injecting fakes the usual way: a handler passes its module-level
+`boto3` as `boto3_module`, so `monkeypatch.setattr(handler, "boto3", fake)`
+still routes calls to the fake (never cached). `clear()` drops memoized
+instances (the root conftest calls it between tests).
+
+`thread_table()` hands each worker thread its own copy of a resource Table
+(boto3 resources are not thread-safe; clients are). Worker pools are built per
+invocation, so when a worker thread ends its copies go back to an idle list
+and the next invocation's workers reuse them (and their warm connections)
+instead of building a new session each time.
+"""
+
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import boto3
+from boto3.resources.base import ServiceResource
+from botocore.config import Config
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+CLIENT_CONFIG = Config(
+    max_pool_connections=_env_int("AWS_MAX_POOL_CONNECTIONS", 32),
+    tcp_keepalive=True,
+    retries={"mode": "adaptive", "max_attempts": _env_int("AWS_MAX_ATTEMPTS", 4)},
+    connect_timeout=_env_float("AWS_CONNECT_TIMEOUT", 1.0),
+    read_timeout=_env_float("AWS_READ_TIMEOUT", 5.0),
+)
+
+_CLIENTS: Dict[Tuple[str, Optional[str]], object] = {}
+_RESOURCES: Dict[Tuple[str, Optional[str]], object] = {}
+_LOCK = threading.Lock()
+_LOCAL = threading.local()
+# per-thread Table copies not held by any live thread, by (table name, region)
+_IDLE_TABLES: Dict[Tuple[str, Optional[str]], List[object]] = {}
+
+
+def _region(region: Optional[str]) -> Optional[str]:
+    return region or os.getenv("AWS_REGION") or os.getenv("AWS_DEFAULT_REGION")
+
+
+def _memoized(cache: dict, kind: str, service: str, region: Optional[str]):
+    key = (service, _region(region))
+    found = cache.get(key)
+    if found is not None:
+        return found
+    with _LOCK:  # boto3's default session isn't safe to build clients from concurrently
+        found = cache.get(key)
+        if found is None:
+            factory = getattr(boto3, kind)
+            found = factory(service, region_name=key[1], config=CLIENT_CONFIG)
+            cache[key] = found
+    return found
+
+
+def client(service: str, region: Optional[str] = None, *, boto3_module=None):
+    """Memoized low-level client for `service`; an injected `boto3_module` fake is called directly."""
+    if boto3_module is not None and boto3_module is not boto3:
+        return boto3_module.client(service)
+    return _memoized(_CLIENTS, "client", service, region)
+
+
+def resource(service: str, region: Optional[str] = None, *, boto3_module=None):
+    """Memoized resource for `service`; an injected `boto3_module` fake is called directly."""
+    if boto3_module is not None and boto3_module is not boto3:
+        return boto3_module.resource(service)
+    return _memoized(_RESOURCES, "resource", service, region)
+
+
+def clear() -> None:
+    """Forget memoized clients / resources (tests, or after changing credentials)."""
+    with _LOCK:
+        _CLIENTS.clear()
+        _RESOURCES.clear()
+        _IDLE_TABLES.clear()
+
+
+class _ThreadTables(dict):
+    """A thread's Table copies; CPython drops it when the thread ends, returning them to the idle list."""
+
+    def __del__(self):
+        # no lock: this can run from GC on a thread that already holds one; list ops are atomic
+        for key, table in self.items():
+            _IDLE_TABLES.setdefault(key, []).append(table)
+
+
+def thread_table(table):
+    """
+    `table` for the calling thread: a resource Table gets a per-thread twin
+    (same name and region, its own session), reused by later threads once this
+    one ends; anything else (low-level tables over a thread-safe client, fakes)
+    is returned as is.
+    """
+    if not isinstance(table, ServiceResource):
+        return table
+    key = (table.name, table.meta.client.meta.region_name)
+    tables = _LOCAL.__dict__.get("tables")
+    if tables is None:
+        tables = _LOCAL.tables = _ThreadTables()
+    found = tables.get(key)
+    if found is None:
+        try:
+            found = _IDLE_TABLES.get(key, []).pop()
+        except IndexError:
+            resource = boto3.session.Session().resource("dynamodb", region_name=key[1], config=CLIENT_CONFIG)
+            found = resource.Table(table.name)
+        tables[key] = found
+    return found
@@ -0,0 +1,472 @@
+# services/common/ddb_client.py
+"""
+Low-level DynamoDB data-access layer.
+
+`LowLevelTable` exposes the subset of the boto3 resource `Table` API our
+handlers use (get/put/update/delete_item, query, scan, batch_writer,
+meta.client for transactions and BatchGetItem), on top of a plain
+`boto3.client("dynamodb")`. Items go in and come out as native Python values
+(str / Decimal / bool / dict / list / set), so code written against resource
+tables runs unchanged.
+
+Marshaling uses `ItemCodec`s precompiled for our known item shapes (usage rows,
+AGG / IDEMP rows, tenants, plans): one dict lookup per attribute instead of the
+TypeSerializer / TypeDeserializer isinstance chain. Unknown attributes fall back
+to a generic exact-type dispatch.
+
+`dynamodb_resource()` returns the low-level facade when DDB_LOW_LEVEL_CLIENT=true
+and `boto3.resource("dynamodb")` otherwise, so handlers switch with an env var.
+"""
+
+import os
+import time
+from decimal import Decimal
+from typing import Any, Callable, Dict, Optional
+
+import boto3
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import Binary
+
+from services.common import aws_clients
+from services.common.rate_limit import backoff_delay
+
+LOW_LEVEL_ENV = "DDB_LOW_LEVEL_CLIENT"
+BATCH_WRITE_MAX_ITEMS = 25
+# consecutive BatchWriteItem calls that may leave UnprocessedItems before giving up
+BATCH_WRITE_MAX_RETRIES = int(os.getenv("DDB_BATCH_WRITE_MAX_RETRIES", "8"))
+
+
+class UnprocessedItemsError(RuntimeError):
+    """BatchWriteItem kept returning UnprocessedItems; `requests` are the writes not applied."""
+
+    def __init__(self, table_name: str, requests: list):
+        super().__init__(f"{len(requests)} writes to {table_name} still unprocessed after retries")
+        self.table_name = table_name
+        self.requests = requests
+
+
+# ---- Marshaling ----
+
+def _enc_s(v):
+    return {"S": v}
+
+
+def _enc_n(v):
+    return {"N": str(v)}
+
+
+def _enc_bool(v):
+    return {"BOOL": v}
+
+
+def _enc_null(_v):
+    return {"NULL": True}
+
+
+def _enc_map(v):
+    return {"M": {k: marshal_value(x) for k, x in v.items()}}
+
+
+def _enc_list(v):
+    return {"L": [marshal_value(x) for x in v]}
+
+
+def _enc_set(v):
+    if not v:
+        raise ValueError("DynamoDB sets cannot be empty")
+    first = next(iter(v))
+    if isinstance(first, str):
+        return {"SS": list(v)}
+    if isinstance(first, (bytes, bytearray, Binary)):
+        return {"BS": [bytes(x) for x in v]}
+    return {"NS": [str(x) for x in v]}
+
+
+def _enc_float(_v):
+    # same contract as the resource API: floats must be Decimals
+    raise TypeError("Float types are not supported. Use Decimal types instead.")
+
+
+_ENCODERS: Dict[type, Callable[[Any], dict]] = {
+    str: _enc_s,
+    int: _enc_n,
+    Decimal: _enc_n,
+    bool: _enc_bool,
+    type(None): _enc_null,
+    dict: _enc_map,
+    list: _enc_list,
+    tuple: _enc_list,
+    set: _enc_set,
+    frozenset: _enc_set,
+    bytes: lambda v: {"B": v},
+    bytearray: lambda v: {"B": bytes(v)},
+    Binary: lambda v: {"B": v.value},
+    float: _enc_float,
+}
+
+
+def marshal_value(v) -> dict:
+    """Native value -> AttributeValue (exact-type dispatch; bool is not treated as int)."""
+    enc = _ENCODERS.get(type(v))
+    if enc is None:
+        if isinstance(v, dict):
+            return _enc_map(v)
+        if isinstance(v, (list, tuple)):
+            return _enc_list(v)
+        raise TypeError(f"Unsupported type {type(v)!r} for value {v!r}")
+    return enc(v)
+
+
+def _dec_map(av):
+    return {k: unmarshal_value(x) for k, x in av["M"].items()}
+
+
+_DECODERS: Dict[str, Callable[[dict], Any]] = {
+    "S": lambda av: av["S"],
+    "N": lambda av: Decimal(av["N"]),
+    "BOOL": lambda av: av["BOOL"],
+    "NULL": lambda av: None,
+    "M": _dec_map,
+    "L": lambda av: [unmarshal_value(x) for x in av["L"]],
+    "SS": lambda av: set(av["SS"]),
+    "NS": lambda av: {Decimal(x) for x in av["NS"]},
+    "B": lambda av: Binary(av["B"]),
+    "BS": lambda av: {Binary(x) for x in av["BS"]},
+}
+
+
+def unmarshal_value(av: dict):
+    """AttributeValue -> native value (numbers as Decimal, like the resource API)."""
+    return _DECODERS[next(iter(av))](av)
+
+
+class ItemCodec:
+    """
+    Marshaler precompiled for a known item shape.
+
+    `fields` maps attribute name -> DynamoDB scalar type ("S" / "N" / "BOOL").
+    Declared attributes take a direct path; a value whose runtime type doesn't
+    match its declaration, and any undeclared attribute, go through the
+    generic dispatch.
+    """
+
+    _SCALAR = {
+        "S": (str, _enc_s, lambda av: av["S"] if "S" in av else unmarshal_value(av)),
+        "N": ((int, Decimal), _enc_n, lambda av: Decimal(av["N"]) if "N" in av else unmarshal_value(av)),
+        "BOOL": (bool, _enc_bool, lambda av: av["BOOL"] if "BOOL" in av else unmarshal_value(av)),
+    }
+
+    def __init__(self, name: str, fields: Dict[str, str]):
+        self.name = name
+        self.fields = dict(fields)
+        self._enc = {}
+        self._dec = {}
+        for attr, kind in self.fields.items():
+            types, enc, dec = self._SCALAR[kind]
+            self._enc[attr] = self._checked(types, enc)
+            self._dec[attr] = dec
+
+    @staticmethod
+    def _checked(types, enc):
+        exact = types if isinstance(types, tuple) else (types,)
+
+        def encode(v):
+            return enc(v) if type(v) in exact else marshal_value(v)
+        return encode
+
+    def merged(self, other: "ItemCodec", name: Optional[str] = None) -> "ItemCodec":
+        return ItemCodec(name or f"{self.name}+{other.name}", {**self.fields, **other.fields})
+
+    def encode(self, item: dict) -> dict:
+        enc = self._enc
+        return {k: (enc[k] if k in enc else marshal_value)(v) for k, v in item.items()}
+
+    def decode(self, av_item: dict) -> dict:
+        dec = self._dec
+        return {k: (dec[k] if k in dec else unmarshal_value)(av) for k, av in av_item.items()}
+
+
+GENERIC = ItemCodec("generic", {})
+
+# Known shapes
+USAGE_ROW = ItemCodec("UsageRow", {
+    "tenant_month": "S", "timestamp": "S", "usage_id": "S", "tenant_id": "S",
+    "user_id": "S", "endpoint": "S", "token_count": "N", "tokens_used": "N",
+})
+COUNTER_ROW = ItemCodec("CounterRow", {  # AGG items, counter shards, IDEMP markers
+    "tenant_month": "S", "timestamp": "S", "token_total": "N", "remaining": "N", "created_at": "S",
+})
+TENANT = ItemCodec("Tenant", {
+    "tenant_id": "S", "client_id": "S", "app_id": "S", "plan_id": "S", "subscription_status": "S",
+    "PK": "S", "SK": "S", "max_requests_per_day": "N", "created_at": "S",
+})
+PLAN = ItemCodec("Plan", {
+    "plan_id": "S", "quota_limit": "N", "counter_shards": "N", "lease_tokens": "N", "lease_pct": "N",
+})
+USAGE_TABLE = USAGE_ROW.merged(COUNTER_ROW, "UsageLogs")
+
+
+def _marshal_values(values: Optional[dict]) -> Optional[dict]:
+    if not values:
+        return values
+    return {k: marshal_value(v) for k, v in values.items()}
+
+
+def _build_params(params: dict, codec: ItemCodec) -> dict:
+    """Resource-style kwargs -> low-level kwargs (conditions built, values marshaled)."""
+    out = dict(params)
+    builder = ConditionExpressionBuilder()
+    names = dict(out.pop("ExpressionAttributeNames", None) or {})
+    values = dict(out.pop("ExpressionAttributeValues", None) or {})
+    for field, is_key in (("KeyConditionExpression", True), ("FilterExpression", False),
+                          ("ConditionExpression", False)):
+        cond = out.get(field)
+        if isinstance(cond, ConditionBase):
+            built = builder.build_expression(cond, is_key_condition=is_key)
+            out[field] = built.condition_expression
+            names.update(built.attribute_name_placeholders)
+            values.update(built.attribute_value_placeholders)
+    if names:
+        out["ExpressionAttributeNames"] = names
+    if values:
+        out["ExpressionAttributeValues"] = _marshal_values(values)
+    for field in ("Key", "ExclusiveStartKey"):
+        if field in out:
+            out[field] = codec.encode(out[field])
+    if "Item" in out:
+        out["Item"] = codec.encode(out["Item"])
+    return out
+
+
+class _NativeClient:
+    """
+    `table.meta.client` stand-in: the multi-item calls our code makes
+    (transact_write_items, batch_get_item, batch_write_item) with native values,
+    like the resource API's injected client. Everything else is the raw client.
+    """
+
+    def __init__(self, client, codecs: Dict[str, ItemCodec]):
+        self._client = client
+        self._codecs = codecs
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    def _codec(self, table_name: str) -> ItemCodec:
+        return self._codecs.get(table_name, GENERIC)
+
+    def transact_write_items(self, TransactItems, **kwargs):
+        items = []
+        for action in TransactItems:
+            (op, params), = action.items()
+            items.append({op: _build_params(params, self._codec(params["TableName"]))})
+        return self._client.transact_write_items(TransactItems=items, **kwargs)
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        request = {}
+        for name, spec in RequestItems.items():
+            codec = self._codec(name)
+            request[name] = {**spec, "Keys": [codec.encode(k) for k in spec["Keys"]]}
+        resp = self._client.batch_get_item(RequestItems=request, **kwargs)
+        out = dict(resp)
+        out["Responses"] = {
+            name: [self._codec(name).decode(it) for it in items]
+            for name, items in resp.get("Responses", {}).items()
+        }
+        out["UnprocessedKeys"] = {
+            name: {**spec, "Keys": [self._codec(name).decode(k) for k in spec["Keys"]]}
+            for name, spec in (resp.get("UnprocessedKeys") or {}).items()
+        }
+        return out
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        request = {name: [self._encode_write(name, w) for w in writes] for name, writes in RequestItems.items()}
+        resp = self._client.batch_write_item(RequestItems=request, **kwargs)
+        out = dict(resp)
+        out["UnprocessedItems"] = {
+            name: [self._decode_write(name, w) for w in writes]
+            for name, writes in (resp.get("UnprocessedItems") or {}).items()
+        }
+        return out
+
+    def _encode_write(self, name, write):
+        codec = self._codec(name)
+        if "PutRequest" in write:
+            return {"PutRequest": {"Item": codec.encode(write["PutRequest"]["Item"])}}
+        return {"DeleteRequest": {"Key": codec.encode(write["DeleteRequest"]["Key"])}}
+
+    def _decode_write(self, name, write):
+        codec = self._codec(name)
+        if "PutRequest" in write:
+            return {"PutRequest": {"Item": codec.decode(write["PutRequest"]["Item"])}}
+        return {"DeleteRequest": {"Key": codec.decode(write["DeleteRequest"]["Key"])}}
+
+
+class _Meta:
+    def __init__(self, client):
+        self.client = client
+
+
+class _BatchWriter:
+    """
+    Buffered BatchWriteItem (25 per request). UnprocessedItems are re-sent
+    after a capped, jittered exponential backoff; after `max_retries`
+    consecutive partial writes the rest is raised as UnprocessedItemsError.
+    """
+
+    def __init__(self, table: "LowLevelTable", *, max_retries: int = BATCH_WRITE_MAX_RETRIES,
+                 sleep: Callable[[float], None] = time.sleep):
+        self._table = table
+        self._buffer = []
+        self._max_retries = max_retries
+        self._sleep = sleep
+
+    def put_item(self, Item):
+        self._buffer.append({"PutRequest": {"Item": Item}})
+        self._maybe_flush()
+
+    def delete_item(self, Key):
+        self._buffer.append({"DeleteRequest": {"Key": Key}})
+        self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._buffer) >= BATCH_WRITE_MAX_ITEMS:
+            self._flush()
+
+    def _flush(self):
+        client = self._table.meta.client
+        name = self._table.name
+        retries = 0
+        while self._buffer:
+            chunk, self._buffer = self._buffer[:BATCH_WRITE_MAX_ITEMS], self._buffer[BATCH_WRITE_MAX_ITEMS:]
+            resp = client.batch_write_item(RequestItems={name: chunk})
+            unprocessed = (resp.get("UnprocessedItems") or {}).get(name, [])
+            if not unprocessed:
+                retries = 0
+                continue
+            if retries >= self._max_retries:
+                pending, self._buffer = unprocessed + self._buffer, []
+                raise UnprocessedItemsError(name, pending)
+            self._buffer.extend(unprocessed)
+            self._sleep(backoff_delay(retries))
+            retries += 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._flush()
+        return False
+
+
+class LowLevelTable:
+    """Resource-`Table`-compatible wrapper over a low-level DynamoDB client."""
+
+    def __init__(self, name: str, client=None, codec: ItemCodec = GENERIC, codecs: Optional[Dict[str, ItemCodec]] = None):
+        self.name = name
+        self.table_name = name
+        self._client = client if client is not None else boto3.client("dynamodb")
+        self.codec = codec
+        self.meta = _Meta(_NativeClient(self._client, {**(codecs or {}), name: codec}))
+        self._description = None
+
+    def _decode(self, av_item):
+        return self.codec.decode(av_item) if av_item is not None else None
+
+    def get_item(self, **kwargs):
+        resp = self._client.get_item(TableName=self.name, **_build_params(kwargs, self.codec))
+        if "Item" in resp:
+            resp["Item"] = self._decode(resp["Item"])
+        return resp
+
+    def put_item(self, **kwargs):
+        resp = self._client.put_item(TableName=self.name, **_build_params(kwargs, self.codec))
+        if "Attributes" in resp:
+            resp["Attributes"] = self._decode(resp["Attributes"])
+        return resp
+
+    def update_item(self, **kwargs):
+        resp = self._client.update_item(TableName=self.name, **_build_params(kwargs, self.codec))
+        if "Attributes" in resp:
+            resp["Attributes"] = self._decode(resp["Attributes"])
+        return resp
+
+    def delete_item(self, **kwargs):
+        resp = self._client.delete_item(TableName=self.name, **_build_params(kwargs, self.codec))
+        if "Attributes" in resp:
+            resp["Attributes"] = self._decode(resp["Attributes"])
+        return resp
+
+    def _page(self, op, kwargs):
+        resp = op(TableName=self.name, **_build_params(kwargs, self.codec))
+        if "Items" in resp:
+            resp["Items"] = [self.codec.decode(it) for it in resp["Items"]]
+        if "LastEvaluatedKey" in resp:
+            resp["LastEvaluatedKey"] = self.codec.decode(resp["LastEvaluatedKey"])
+        return resp
+
+    def query(self, **kwargs):
+        return self._page(self._client.query, kwargs)
+
+    def scan(self, **kwargs):
+        return self._page(self._client.scan, kwargs)
+
+    def batch_writer(self):
+        return _BatchWriter(self)
+
+    # parallel_scan sizing reads these, like the resource attributes (DescribeTable)
+    def _describe(self):
+        if self._description is None:
+            self._description = self._client.describe_table(TableName=self.name)["Table"]
+        return self._description
+
+    @property
+    def table_size_bytes(self):
+        return self._describe().get("TableSizeBytes")
+
+    @property
+    def item_count(self):
+        return self._describe().get("ItemCount")
+
+
+class LowLevelDynamoDB:
+    """`boto3.resource("dynamodb")` stand-in: `.Table(name)` returns LowLevelTables sharing one client."""
+
+    def __init__(self, client=None, codecs: Optional[Dict[str, ItemCodec]] = None):
+        self._client = client if client is not None else boto3.client("dynamodb")
+        self._codecs = dict(codecs or {})
+        self.meta = _Meta(_NativeClient(self._client, self._codecs))
+
+    def register(self, table_name: str, codec: ItemCodec) -> None:
+        """Use `codec` for `table_name` (tables created afterwards, and meta.client calls)."""
+        self._codecs[table_name] = codec
+
+    def Table(self, name: str) -> LowLevelTable:  # noqa: N802 - mirrors the resource API
+        return LowLevelTable(name, self._client, self._codecs.get(name, GENERIC), self._codecs)
+
+
+def use_low_level_client() -> bool:
+    return os.getenv(LOW_LEVEL_ENV, "false").lower() == "true"
+
+
+def dynamodb_resource(codecs: Optional[Dict[str, ItemCodec]] = None, *, boto3_module=None, **client_kwargs):
+    """
+    DynamoDB entry point for handlers: LowLevelDynamoDB when DDB_LOW_LEVEL_CLIENT=true,
+    else the boto3 resource. `codecs` maps table names to item shapes.
+
+    Without `client_kwargs` the pooled per-container client / resource from
+    aws_clients is used (an injected `boto3_module` fake is called directly).
+    """
+    if use_low_level_client():
+        if client_kwargs:
+            return LowLevelDynamoDB(boto3.client("dynamodb", **client_kwargs), codecs)
+        return LowLevelDynamoDB(aws_clients.client("dynamodb", boto3_module=boto3_module), codecs)
+    if client_kwargs:
+        return boto3.resource("dynamodb", **client_kwargs)
+    return aws_clients.resource("dynamodb", boto3_module=boto3_module)
+
+
+def codecs_from_env(**shapes: ItemCodec) -> Dict[str, ItemCodec]:
+    """{table name: codec} for env vars that are set, e.g. codecs_from_env(USAGE_TABLE_NAME=USAGE_TABLE)."""
+    return {os.environ[env]: codec for env, codec in shapes.items() if os.getenv(env)}
+
@@ -1,19 +1,168 @@
 # services/common/ddb_utils.py
+import os
+import time
 from datetime import datetime
 from decimal import Decimal
-from typing import Any, Mapping
+from typing import Any, Callable, Dict, Iterator, List, Mapping, Optional
+from services.common.rate_limit import backoff_delay
 from services.common.time_utils import to_iso_z
 
+
+# ddb_safe: floats -> Decimal, datetimes -> ISO-8601 Z, tuples -> lists,
+# other Mappings -> dicts, unknown types -> str(). Containers whose contents
+# need no conversion are returned as-is (no copy), so an item that is already
+# DynamoDB-safe comes back as the same object after one read-only walk.
+
+_PASS = None
+_MAP, _SEQ, _SET = "map", "seq", "set"
+_CONTAINERS = (_MAP, _SEQ, _SET)
+_UNRESOLVED = object()
+
+
+def _float_to_decimal(value: float) -> Decimal:
+    return Decimal(str(value))
+
+
+# exact type -> _PASS, a container kind or a converter; subclasses are
+# resolved once by _resolve and cached here
+_DISPATCH: Dict[type, Any] = {
+    str: _PASS,
+    int: _PASS,
+    bool: _PASS,
+    type(None): _PASS,
+    Decimal: _PASS,
+    float: _float_to_decimal,
+    datetime: to_iso_z,
+    dict: _MAP,
+    list: _SEQ,
+    tuple: _SEQ,
+    set: _SET,
+}
+
+
+def _resolve(t: type):
+    if issubclass(t, float):
+        handler = _float_to_decimal
+    elif issubclass(t, (Decimal, int, str, bool)):
+        handler = _PASS
+    elif issubclass(t, datetime):
+        handler = to_iso_z
+    elif issubclass(t, Mapping):
+        handler = _MAP
+    elif issubclass(t, (list, tuple)):
+        handler = _SEQ
+    elif issubclass(t, set):
+        handler = _SET
+    else:
+        handler = str
+    _DISPATCH[t] = handler
+    return handler
+
+
+def _frame(value, kind):
+    """[kind, source, children, converted children, changed]"""
+    children = list(value.values()) if kind is _MAP else list(value)
+    # only plain dict / list / set can be handed back unchanged
+    return [kind, value, children, [], type(value) not in (dict, list, set)]
+
+
+def _build(frame):
+    kind, src, _, out, changed = frame
+    if not changed:
+        return src
+    if kind is _MAP:
+        return dict(zip(src.keys(), out))
+    if kind is _SET:
+        return set(out)
+    return out
+
+
 def ddb_safe(value: Any):
-    if isinstance(value, float):
-        return Decimal(str(value))
-    if isinstance(value, Decimal) or isinstance(value, int) or value is None or isinstance(value, (str, bool)):
+    """
+    `value` in a form boto3 can write to DynamoDB. Iterative (no recursion
+    limit on nesting); returns `value` itself when nothing needs converting.
+    """
+    handler = _DISPATCH.get(type(value), _UNRESOLVED)
+    if handler is _UNRESOLVED:
+        handler = _resolve(type(value))
+    if handler is _PASS:
         return value
-    if isinstance(value, datetime):
-        return to_iso_z(value)
-    if isinstance(value, Mapping):
-        return {k: ddb_safe(v) for k, v in value.items()}
-    if isinstance(value, (list, tuple, set)):
-        t = [ddb_safe(v) for v in value]
-        return t if not isinstance(value, set) else set(t)
-    return str(value)
+    if handler not in _CONTAINERS:
+        return handler(value)
+
+    lookup = _DISPATCH.get
+    stack = [_frame(value, handler)]
+    while True:
+        frame = stack[-1]
+        children, out = frame[2], frame[3]
+        append = out.append
+        for i in range(len(out), len(children)):
+            child = children[i]
+            handler = lookup(type(child), _UNRESOLVED)
+            if handler is _UNRESOLVED:
+                handler = _resolve(type(child))
+            if handler is _PASS:
+                append(child)
+            elif handler in _CONTAINERS:
+                stack.append(_frame(child, handler))
+                break
+            else:
+                append(handler(child))
+                frame[4] = True
+        else:
+            stack.pop()
+            result = _build(frame)
+            if not stack:
+                return result
+            parent = stack[-1]
+            if result is not parent[2][len(parent[3])]:
+                parent[4] = True
+            parent[3].append(result)
+
+
+BATCH_GET_MAX_KEYS = 100  # BatchGetItem hard limit per request
+# consecutive BatchGetItem calls that may leave UnprocessedKeys before giving up
+BATCH_GET_MAX_RETRIES = int(os.getenv("DDB_BATCH_GET_MAX_RETRIES", "8"))
+
+
+class UnprocessedKeysError(RuntimeError):
+    """BatchGetItem kept returning UnprocessedKeys; `keys` are the ones never read."""
+
+    def __init__(self, table_name: str, keys: list):
+        super().__init__(f"{len(keys)} keys of {table_name} still unprocessed after retries")
+        self.table_name = table_name
+        self.keys = keys
+
+
+def batch_get(table, keys: List[dict], *, projection: Optional[str] = None,
+              names: Optional[Dict[str, str]] = None, consistent: bool = False,
+              max_retries: int = BATCH_GET_MAX_RETRIES,
+              sleep: Callable[[float], None] = time.sleep) -> Iterator[dict]:
+    """
+    Items for `keys` via BatchGetItem in 100-key chunks. UnprocessedKeys are
+    re-requested after a capped, jittered exponential backoff; after
+    `max_retries` consecutive partial reads the rest is raised as
+    UnprocessedKeysError. Order is not preserved; missing keys are simply absent.
+    """
+    client = table.meta.client
+    name = table.name
+    for start in range(0, len(keys), BATCH_GET_MAX_KEYS):
+        spec: Dict[str, Any] = {"Keys": keys[start:start + BATCH_GET_MAX_KEYS]}
+        if projection:
+            spec["ProjectionExpression"] = projection
+        if names:
+            spec["ExpressionAttributeNames"] = names
+        if consistent:
+            spec["ConsistentRead"] = True
+        request = {name: spec}
+        retries = 0
+        while request:
+            resp = client.batch_get_item(RequestItems=request)
+            yield from resp.get("Responses", {}).get(name, [])
+            request = resp.get("UnprocessedKeys") or None
+            if not request:
+                break
+            if retries >= max_retries:
+                raise UnprocessedKeysError(name, request.get(name, {}).get("Keys", []))
+            sleep(backoff_delay(retries))
+            retries += 1
@@ -0,0 +1,215 @@
+# services/common/parallel_scan.py
+from __future__ import annotations
+
+import math
+import queue
+import threading
+from typing import Any, Dict, Iterator, Optional
+
+from services.common import aws_clients
+from services.common.ddb_client import marshal_value, unmarshal_value
+from services.common.ttl_cache import TTLCache
+
+# DynamoDB guidance: roughly one segment per 2 GB of table data
+SEGMENT_BYTES = 2 * 1024 ** 3
+ITEMS_PER_SEGMENT = 10_000
+MAX_TOTAL_SEGMENTS = 1_000_000  # service limit
+
+_DONE = object()
+
+# DescribeTable sizes refresh about every 6h; don't pay for the call on every job
+_SEGMENTS_CACHE = TTLCache("ScanSegments", maxsize=256, ttl=3600)
+
+
+def _encode_key(lek: Optional[dict]) -> Optional[dict]:
+    """LastEvaluatedKey -> DynamoDB JSON ({"N": "42"}), so numeric (Decimal) keys serialize exactly."""
+    return None if lek is None else {k: marshal_value(v) for k, v in lek.items()}
+
+
+def _decode_key(token: Optional[dict]) -> Optional[dict]:
+    if token is None:
+        return None
+    # plain values are accepted as-is (tokens saved before keys were encoded)
+    return {k: unmarshal_value(v) if isinstance(v, dict) and len(v) == 1 else v for k, v in token.items()}
+
+
+class _Failure:
+    def __init__(self, exc: BaseException):
+        self.exc = exc
+
+
+def suggest_total_segments(table, max_workers: int = 8) -> int:
+    """
+    Segment count for `table` from its (approximate, ~6h stale) DescribeTable size.
+
+    Small tables get one segment; mid-size tables up to one per worker; large
+    tables one per SEGMENT_BYTES. Unknown sizes (fakes, missing permission) -> 1.
+    """
+    name = getattr(table, "name", None)
+    if not isinstance(name, str):
+        return _segments_for(table, max_workers)
+    return _SEGMENTS_CACHE.get_or_load((name, max_workers), lambda: _segments_for(table, max_workers))
+
+
+def _segments_for(table, max_workers: int) -> int:
+    try:
+        size = table.table_size_bytes
+        count = table.item_count
+    except Exception:
+        return 1
+    if not isinstance(size, int) or not isinstance(count, int):
+        return 1
+    by_size = math.ceil(size / SEGMENT_BYTES)
+    by_items = min(count // ITEMS_PER_SEGMENT, max_workers)
+    return max(1, min(MAX_TOTAL_SEGMENTS, max(by_size, by_items)))
+
+
+class ParallelScan:
+    """
+    Segmented Scan (`Segment` / `TotalSegments`) over a thread pool, iterated as
+    a flat stream of items.
+
+    - Memory is bounded: workers block once `max_buffered_pages` pages are waiting.
+    - `resume_tokens` is a JSON-serializable snapshot of unfinished segments
+      (start keys in DynamoDB JSON, so numeric keys round-trip exactly), advanced
+      only after a page has been fully yielded; pass it back to continue a job
+      (pages in flight when the job stopped are read again, so consumers must be
+      idempotent).
+    - Each worker thread scans through its own resource Table (boto3 resources
+      are not thread-safe).
+    - Closing the iterator early stops the workers.
+    """
+
+    def __init__(
+        self,
+        table,
+        *,
+        total_segments: Optional[int] = None,
+        max_workers: int = 8,
+        projection: Optional[str] = None,
+        expression_attribute_names: Optional[Dict[str, str]] = None,
+        filter_expression: Any = None,
+        expression_attribute_values: Optional[Dict[str, Any]] = None,
+        page_size: Optional[int] = None,
+        max_buffered_pages: Optional[int] = None,
+        resume_tokens: Optional[dict] = None,
+    ):
+        self.table = table
+        if resume_tokens is not None:
+            self.total_segments = int(resume_tokens["total_segments"])
+            self._pending = {int(seg): _decode_key(lek) for seg, lek in resume_tokens["pending"].items()}
+        else:
+            self.total_segments = total_segments or suggest_total_segments(table, max_workers)
+            self._pending = {seg: None for seg in range(self.total_segments)}
+        self.max_workers = max(1, min(max_workers, self.total_segments))
+        self.max_buffered_pages = max_buffered_pages or self.max_workers * 2
+        self.items_read = 0
+        self.pages_read = 0
+
+        self._base_kwargs: Dict[str, Any] = {}
+        if projection:
+            self._base_kwargs["ProjectionExpression"] = projection
+        if expression_attribute_names:
+            self._base_kwargs["ExpressionAttributeNames"] = expression_attribute_names
+        if filter_expression is not None:
+            self._base_kwargs["FilterExpression"] = filter_expression
+        if expression_attribute_values:
+            self._base_kwargs["ExpressionAttributeValues"] = expression_attribute_values
+        if page_size:
+            self._base_kwargs["Limit"] = page_size
+
+    @property
+    def done(self) -> bool:
+        return not self._pending
+
+    @property
+    def resume_tokens(self) -> dict:
+        return {
+            "total_segments": self.total_segments,
+            "pending": {str(seg): _encode_key(lek) for seg, lek in sorted(self._pending.items())},
+        }
+
+    def _scan_kwargs(self, segment: int, start_key) -> dict:
+        kwargs = dict(self._base_kwargs)
+        if self.total_segments > 1:
+            kwargs["Segment"] = segment
+            kwargs["TotalSegments"] = self.total_segments
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        return kwargs
+
+    @staticmethod
+    def _put(out: queue.Queue, msg, stop: threading.Event) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(msg, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _worker(self, work: queue.Queue, starts: dict, out: queue.Queue, stop: threading.Event) -> None:
+        try:
+            table = aws_clients.thread_table(self.table)
+            while not stop.is_set():
+                try:
+                    segment = work.get_nowait()
+                except queue.Empty:
+                    return
+                start_key = starts[segment]
+                while not stop.is_set():
+                    resp = table.scan(**self._scan_kwargs(segment, start_key))
+                    start_key = resp.get("LastEvaluatedKey")
+                    if not self._put(out, (segment, resp.get("Items", []), start_key), stop):
+                        return
+                    if not start_key:
+                        break
+        except BaseException as exc:  # surfaced to the consumer thread
+            self._put(out, _Failure(exc), stop)
+        finally:
+            self._put(out, _DONE, stop)
+
+    def __iter__(self) -> Iterator[dict]:
+        if not self._pending:
+            return
+        starts = dict(self._pending)
+        work: queue.Queue = queue.Queue()
+        for segment in sorted(starts):
+            work.put(segment)
+        out: queue.Queue = queue.Queue(maxsize=self.max_buffered_pages)
+        stop = threading.Event()
+
+        n_workers = min(self.max_workers, len(starts))
+        threads = [
+            threading.Thread(target=self._worker, args=(work, starts, out, stop), daemon=True)
+            for _ in range(n_workers)
+        ]
+        for t in threads:
+            t.start()
+
+        finished = 0
+        try:
+            while finished < n_workers:
+                msg = out.get()
+                if msg is _DONE:
+                    finished += 1
+                    continue
+                if isinstance(msg, _Failure):
+                    raise msg.exc
+                segment, items, last_key = msg
+                yield from items
+                self.items_read += len(items)
+                self.pages_read += 1
+                if last_key:
+                    self._pending[segment] = last_key
+                else:
+                    self._pending.pop(segment, None)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+
+
+def parallel_scan(table, **kwargs) -> Iterator[dict]:
+    """Generator over every item of `table`; see ParallelScan for options."""
+    return iter(ParallelScan(table, **kwargs))
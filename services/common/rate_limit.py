@@ -0,0 +1,90 @@
+# services/common/rate_limit.py
+"""
+Client-side rate limiting for APIs with per-operation TPS quotas (Cognito
+admin calls, mostly).
+
+`RateLimiter` is a thread-safe token bucket: callers reserve a token under the
+lock and sleep outside it, so N workers sharing one limiter are paced to
+`rate` calls per second in aggregate (bursting up to `burst`).
+`call_with_backoff` retries throttling errors with capped, fully jittered
+exponential backoff (`backoff_delay`), taking a limiter token before every
+attempt.
+
+Limits are per container: concurrent Lambda containers each get their own
+bucket, so size `rate` below the account quota.
+"""
+
+import random
+import threading
+import time
+from typing import Callable, Optional
+
+THROTTLE_CODES = frozenset({
+    "TooManyRequestsException",
+    "ThrottlingException",
+    "Throttling",
+    "RequestLimitExceeded",
+})
+
+
+class RateLimiter:
+    def __init__(self, rate: float, burst: Optional[float] = None, *,
+                 clock: Callable[[], float] = time.monotonic, sleep: Callable[[float], None] = time.sleep):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = float(rate)
+        self.burst = float(burst if burst is not None else max(1.0, rate))
+        self._tokens = self.burst
+        self._clock = clock
+        self._sleep = sleep
+        self._last = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """Block until `tokens` are available; returns the seconds waited."""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= tokens  # may go negative: later callers queue behind this reservation
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+
+def error_code(exc: BaseException) -> Optional[str]:
+    """AWS error code of a botocore ClientError (None for anything else)."""
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):
+        return response.get("Error", {}).get("Code")
+    return None
+
+
+def backoff_delay(attempt: int, *, base_delay: float = 0.1, max_delay: float = 2.0) -> float:
+    """Full-jitter delay before retry number `attempt` (0-based): uniform in [0, min(max, base * 2**attempt)]."""
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_backoff(fn: Callable[[], object], *, limiter: Optional[RateLimiter] = None,
+                      max_attempts: int = 5, base_delay: float = 0.1, max_delay: float = 2.0,
+                      retry_codes=THROTTLE_CODES, sleep: Callable[[float], None] = time.sleep,
+                      deadline: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+    """
+    `fn()` paced by `limiter`, retried on throttling (`retry_codes`) up to
+    `max_attempts` times, and not past `deadline` (a `clock()` value): a retry
+    whose backoff would end after it is not attempted. Other errors, and the
+    last throttle, propagate.
+    """
+    for attempt in range(max_attempts):
+        if limiter is not None:
+            limiter.acquire()
+        try:
+            return fn()
+        except Exception as e:
+            if error_code(e) not in retry_codes or attempt == max_attempts - 1:
+                raise
+            delay = backoff_delay(attempt, base_delay=base_delay, max_delay=max_delay)
+            if deadline is not None and clock() + delay >= deadline:
+                raise
+            sleep(delay)
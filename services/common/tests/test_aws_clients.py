@@ -0,0 +1,61 @@
+# services/common/tests/test_aws_clients.py
+from types import SimpleNamespace
+
+import boto3
+from moto import mock_aws
+
+from services.common import aws_clients
+
+
+def test_clients_are_memoized_per_service_and_region():
+    with mock_aws():
+        a = aws_clients.client("dynamodb", "us-east-1")
+        assert aws_clients.client("dynamodb", "us-east-1") is a
+        assert aws_clients.client("dynamodb", "eu-west-1") is not a
+        assert aws_clients.client("sqs", "us-east-1") is not a
+        assert aws_clients.resource("dynamodb", "us-east-1") is aws_clients.resource("dynamodb", "us-east-1")
+
+        aws_clients.clear()
+        assert aws_clients.client("dynamodb", "us-east-1") is not a
+
+
+def test_shared_config_is_applied():
+    with mock_aws():
+        cfg = aws_clients.client("dynamodb", "us-east-1").meta.config
+    assert cfg.max_pool_connections == aws_clients.CLIENT_CONFIG.max_pool_connections
+    assert cfg.tcp_keepalive is True
+    assert cfg.retries["mode"] == "adaptive"
+    assert cfg.connect_timeout == aws_clients.CLIENT_CONFIG.connect_timeout
+
+
+def test_injected_fake_module_is_used_and_not_cached():
+    calls = []
+    fake = SimpleNamespace(resource=lambda *a: calls.append(a) or object(),
+                           client=lambda *a: calls.append(a) or object())
+
+    first = aws_clients.resource("dynamodb", boto3_module=fake)
+    assert aws_clients.resource("dynamodb", boto3_module=fake) is not first
+    aws_clients.client("cognito-idp", boto3_module=fake)
+    assert calls == [("dynamodb",), ("dynamodb",), ("cognito-idp",)]
+
+    # the real module goes through the memoized path
+    with mock_aws():
+        assert aws_clients.resource("dynamodb", boto3_module=boto3) is aws_clients.resource("dynamodb")
+
+
+def test_thread_tables_outlive_their_worker_pool():
+    from concurrent.futures import ThreadPoolExecutor
+
+    with mock_aws():
+        table = boto3.session.Session(region_name="us-east-1").resource("dynamodb").Table("UsageLogs")
+
+        def run():
+            with ThreadPoolExecutor(max_workers=2) as pool:
+                return set(map(id, pool.map(lambda _: aws_clients.thread_table(table), range(8))))
+
+        first = run()
+        # a later invocation's fresh threads pick up the copies the first pool's threads left behind
+        assert run() <= first
+        assert aws_clients.thread_table(table) is aws_clients.thread_table(table)
+        assert aws_clients.thread_table(table) is not table
+        assert aws_clients.thread_table("fake") == "fake"
@@ -0,0 +1,186 @@
+# services/common/tests/test_ddb_client.py
+import json
+import types
+from decimal import Decimal
+
+import boto3
+import pytest
+from boto3.dynamodb.conditions import Attr, Key
+from boto3.dynamodb.types import TypeDeserializer, TypeSerializer
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+from services.common import ddb_client
+from services.common.ddb_client import USAGE_TABLE, LowLevelDynamoDB, LowLevelTable
+from services.common.ddb_utils import batch_get
+from services.usage import counters
+
+ROW = {
+    "tenant_month": "t1#2025-08",
+    "timestamp": "2025-08-25T10:00:00.000001Z",
+    "usage_id": "abc",
+    "tenant_id": "t1",
+    "token_count": 42,
+    "endpoint": "/x",
+    "meta": {"retried": True, "tags": ["a", "b"], "none": None},
+    "labels": {"x", "y"},
+    "cost_usd": Decimal("0.25"),
+}
+
+
+def test_codec_matches_type_serializer_round_trip():
+    ser, de = TypeSerializer(), TypeDeserializer()
+    expected = {k: ser.serialize(v) for k, v in ROW.items()}
+
+    encoded = USAGE_TABLE.encode(ROW)
+    assert {k: v for k, v in encoded.items() if k != "labels"} == \
+        {k: v for k, v in expected.items() if k != "labels"}
+    assert sorted(encoded["labels"]["SS"]) == ["x", "y"]
+
+    assert USAGE_TABLE.decode(encoded) == {k: de.deserialize(v) for k, v in expected.items()}
+    # declared N attribute holding an unexpected type still goes through the generic path
+    assert USAGE_TABLE.encode({"token_count": "7"}) == {"token_count": {"S": "7"}}
+    with pytest.raises(TypeError):
+        ddb_client.marshal_value(1.5)
+
+
+@pytest.fixture
+def dal():
+    with mock_aws():
+        client = boto3.session.Session(region_name="us-east-1").client("dynamodb")
+        client.create_table(
+            TableName="UsageLogs",
+            KeySchema=[
+                {"AttributeName": "tenant_month", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_month", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield LowLevelDynamoDB(client, {"UsageLogs": USAGE_TABLE}).Table("UsageLogs")
+
+
+def test_table_api_with_native_values(dal):
+    with dal.batch_writer() as bw:
+        for i in range(30):  # two BatchWriteItem requests
+            bw.put_item(Item={**ROW, "timestamp": f"2025-08-25T10:00:{i:02d}Z", "token_count": i})
+
+    got = dal.get_item(Key={"tenant_month": "t1#2025-08", "timestamp": "2025-08-25T10:00:03Z"})["Item"]
+    assert got["token_count"] == Decimal(3) and got["meta"]["tags"] == ["a", "b"]
+
+    pages, items = 0, []
+    kwargs = {
+        "KeyConditionExpression": Key("tenant_month").eq("t1#2025-08") & Key("timestamp").begins_with("2025-08-25"),
+        "FilterExpression": Attr("token_count").gte(10),
+        "Limit": 7,
+    }
+    while True:
+        resp = dal.query(**kwargs)
+        pages += 1
+        items.extend(resp["Items"])
+        if "LastEvaluatedKey" not in resp:
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    assert pages > 1
+    assert sorted(int(it["token_count"]) for it in items) == list(range(10, 30))
+
+    with pytest.raises(ClientError) as exc:
+        dal.put_item(Item=ROW | {"timestamp": "2025-08-25T10:00:01Z"},
+                     ConditionExpression="attribute_not_exists(#ts)",
+                     ExpressionAttributeNames={"#ts": "timestamp"})
+    assert exc.value.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+    keys = [{"tenant_month": "t1#2025-08", "timestamp": f"2025-08-25T10:00:{i:02d}Z"} for i in (1, 2, 99)]
+    assert sorted(int(it["token_count"]) for it in batch_get(dal, keys)) == [1, 2]
+
+
+class _FlakyBatchClient:
+    """batch_write_item that leaves the last item of each request unprocessed `flaky` times."""
+
+    def __init__(self, flaky):
+        self.flaky = flaky
+        self.calls = []
+
+    def batch_write_item(self, RequestItems):
+        (name, writes), = RequestItems.items()
+        self.calls.append(len(writes))
+        if self.flaky:
+            self.flaky -= 1
+            return {"UnprocessedItems": {name: writes[-1:]}}
+        return {"UnprocessedItems": {}}
+
+
+def _flaky_writer(flaky, sleeps, **kwargs):
+    table = types.SimpleNamespace(name="UsageLogs", meta=types.SimpleNamespace(client=_FlakyBatchClient(flaky)))
+    return table.meta.client, ddb_client._BatchWriter(table, sleep=sleeps.append, **kwargs)
+
+
+def test_batch_writer_backs_off_before_resending_unprocessed_items():
+    sleeps = []
+    client, bw = _flaky_writer(2, sleeps)
+    with bw:
+        for i in range(3):
+            bw.put_item(Item={"i": i})
+
+    assert client.calls == [3, 1, 1]
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 0.1 and 0 <= sleeps[1] <= 0.2
+
+
+def test_batch_writer_gives_up_after_max_retries():
+    sleeps = []
+    _client, bw = _flaky_writer(10, sleeps, max_retries=3)
+    with pytest.raises(ddb_client.UnprocessedItemsError) as exc:
+        with bw:
+            bw.put_item(Item={"i": 1})
+
+    assert exc.value.requests == [{"PutRequest": {"Item": {"i": 1}}}]
+    assert len(sleeps) == 3
+
+
+def test_counter_logic_runs_unchanged_on_the_low_level_table(dal):
+    tm = "t9#2025-08"
+    admitted = sum(30 for i in range(6) if counters.try_consume_sharded(dal, tm, 3, 100, 30, f"r{i}"))
+
+    assert admitted == 90
+    assert counters.read_month_total(dal, tm, shards=3) == 90
+
+
+def test_log_usage_fused_path_on_the_low_level_client(dal, monkeypatch):
+    from services.usage.lambdas.log_usage import handler as mod
+
+    client = dal.meta.client._client
+    for name, key in (("Tenants", "tenant_id"), ("QuotaPlans", "plan_id")):
+        client.create_table(
+            TableName=name,
+            KeySchema=[{"AttributeName": key, "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": key, "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+    ddb = LowLevelDynamoDB(client)
+    tenants, plans = ddb.Table("Tenants"), ddb.Table("QuotaPlans")
+    tenants.put_item(Item={"tenant_id": "t1", "plan_id": "pro", "subscription_status": "active"})
+    plans.put_item(Item={"plan_id": "pro", "quota_limit": 50})
+
+    monkeypatch.setenv("USAGE_TABLE_NAME", "UsageLogs")
+    monkeypatch.setenv("HARD_QUOTA", "true")
+    monkeypatch.setenv("HARD_QUOTA_FUSED", "true")
+    monkeypatch.setattr(mod, "_get_tables", lambda: (dal, tenants, plans))
+    ctx = types.SimpleNamespace(function_name="f", aws_request_id="r", memory_limit_in_mb=128,
+                                invoked_function_arn="arn:aws:lambda:local:test")
+
+    def call(req):
+        event = {"requestContext": {"requestId": req},
+                 "body": json.dumps({"tenant_id": "t1", "token_count": 20, "endpoint": "/x"})}
+        return mod.handler(event, ctx)["statusCode"]
+
+    assert [call("a"), call("a"), call("b"), call("c")] == [200, 200, 200, 403]
+    assert counters.read_month_total(dal, counters.tenant_month_key("t1", mod.month_key())) == 40
+
+
+def test_dynamodb_resource_switches_on_env(monkeypatch):
+    monkeypatch.setenv("AWS_DEFAULT_REGION", "us-east-1")
+    monkeypatch.setenv(ddb_client.LOW_LEVEL_ENV, "true")
+    assert isinstance(ddb_client.dynamodb_resource().Table("x"), LowLevelTable)
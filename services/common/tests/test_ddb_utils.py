@@ -3,7 +3,9 @@ from datetime import datetime, timezone
 from decimal import Decimal
 from types import SimpleNamespace
 
-from services.common.ddb_utils import ddb_safe
+import pytest
+
+from services.common.ddb_utils import UnprocessedKeysError, batch_get, ddb_safe
 
 def test_float_to_decimal():
     out = ddb_safe(3.14)
@@ -47,3 +49,74 @@ def test_fallback_to_str_for_unknown_types():
     out = ddb_safe(obj)
     # ddb_safe falls back to str(x), which for SimpleNamespace looks like this:
     assert out == "namespace(foo='bar')"
+
+def test_already_safe_values_are_returned_without_copying():
+    item = {"PK": "tenant#t1", "n": 3, "cost": Decimal("0.5"), "tags": {"a"}, "rows": [{"x": None}]}
+    assert ddb_safe(item) is item
+
+    item["rows"].append({"y": 1.5})
+    out = ddb_safe(item)
+    assert out is not item and out["rows"][1] == {"y": Decimal("1.5")}
+    assert out["tags"] is item["tags"] and out["rows"][0] is item["rows"][0]
+    assert item["rows"][1]["y"] == 1.5  # input left untouched
+
+def test_deep_nesting_has_no_recursion_limit():
+    deep = leaf = {}
+    for _ in range(10_000):
+        leaf["next"] = {}
+        leaf = leaf["next"]
+    leaf["v"] = 0.25
+    out = ddb_safe(deep)
+    for _ in range(10_000):
+        out = out["next"]
+    assert out == {"v": Decimal("0.25")}
+
+def test_subclasses_follow_their_base_type():
+    from collections import OrderedDict
+    from enum import IntEnum
+
+    class Level(IntEnum):
+        HIGH = 2
+
+    out = ddb_safe(OrderedDict(a=1.5, b=Level.HIGH))
+    assert type(out) is dict and out == {"a": Decimal("1.5"), "b": 2}
+    assert ddb_safe([(1, 2)]) == [[1, 2]]
+
+
+class _FlakyGetClient:
+    """BatchGetItem that leaves the last key unprocessed `flaky` times."""
+
+    def __init__(self, flaky):
+        self.flaky = flaky
+        self.calls = []
+
+    def batch_get_item(self, RequestItems):
+        (name, spec), = RequestItems.items()
+        keys = spec["Keys"]
+        self.calls.append(len(keys))
+        if self.flaky:
+            self.flaky -= 1
+            return {"Responses": {name: keys[:-1]}, "UnprocessedKeys": {name: dict(spec, Keys=keys[-1:])}}
+        return {"Responses": {name: keys}, "UnprocessedKeys": {}}
+
+
+def _flaky_table(flaky):
+    return SimpleNamespace(name="UsageLogs", meta=SimpleNamespace(client=_FlakyGetClient(flaky)))
+
+
+def test_batch_get_backs_off_before_re_requesting_unprocessed_keys():
+    table, sleeps = _flaky_table(2), []
+    items = list(batch_get(table, [{"k": i} for i in range(3)], sleep=sleeps.append))
+
+    assert sorted(it["k"] for it in items) == [0, 1, 2]
+    assert table.meta.client.calls == [3, 1, 1]
+    assert len(sleeps) == 2 and 0 <= sleeps[0] <= 0.1 and 0 <= sleeps[1] <= 0.2
+
+
+def test_batch_get_gives_up_after_max_retries():
+    table, sleeps = _flaky_table(10), []
+    with pytest.raises(UnprocessedKeysError) as exc:
+        list(batch_get(table, [{"k": 1}], max_retries=3, sleep=sleeps.append))
+
+    assert exc.value.keys == [{"k": 1}]
+    assert len(sleeps) == 3
@@ -0,0 +1,129 @@
+# services/common/tests/test_parallel_scan.py
+import json
+import threading
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from services.common import aws_clients
+from services.common.parallel_scan import ParallelScan, parallel_scan, suggest_total_segments
+
+
+@pytest.fixture
+def table():
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        tbl = ddb.create_table(
+            TableName="Items",
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with tbl.batch_writer() as bw:
+            for i in range(120):
+                bw.put_item(Item={"pk": f"k{i:03d}", "n": i, "blob": "x" * 10})
+        yield tbl
+
+
+def test_reads_every_item_once_across_segments(table):
+    scan = ParallelScan(table, total_segments=4, max_workers=3, page_size=10)
+
+    keys = [it["pk"] for it in scan]
+
+    assert sorted(keys) == [f"k{i:03d}" for i in range(120)]
+    assert scan.done
+    assert scan.items_read == 120
+
+
+def test_projection_is_applied(table):
+    items = list(parallel_scan(table, total_segments=2, projection="pk, #n",
+                               expression_attribute_names={"#n": "n"}))
+
+    assert len(items) == 120
+    assert all(set(it) == {"pk", "n"} for it in items)
+
+
+def test_resume_tokens_continue_an_interrupted_job(table):
+    first = ParallelScan(table, total_segments=3, max_workers=2, page_size=5)
+    seen = set()
+    for it in first:
+        seen.add(it["pk"])
+        if len(seen) >= 40:
+            break
+
+    tokens = first.resume_tokens
+    assert not first.done
+    assert tokens["total_segments"] == 3
+
+    rest = ParallelScan(table, resume_tokens=tokens)
+    seen.update(it["pk"] for it in rest)
+
+    assert len(seen) == 120
+    assert rest.done
+    assert rest.resume_tokens["pending"] == {}
+
+
+def test_resume_tokens_with_numeric_sort_key_survive_json():
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        tbl = ddb.create_table(
+            TableName="Numbered",
+            KeySchema=[{"AttributeName": "pk", "KeyType": "HASH"}, {"AttributeName": "n", "KeyType": "RANGE"}],
+            AttributeDefinitions=[{"AttributeName": "pk", "AttributeType": "S"},
+                                  {"AttributeName": "n", "AttributeType": "N"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with tbl.batch_writer() as bw:
+            for i in range(30):
+                bw.put_item(Item={"pk": f"p{i % 3}", "n": i})
+
+        first = ParallelScan(tbl, total_segments=2, max_workers=2, page_size=4)
+        seen = set()
+        for it in first:
+            seen.add(int(it["n"]))
+            if len(seen) >= 8:
+                break
+
+        saved = json.dumps(first.resume_tokens)  # LastEvaluatedKey holds a Decimal
+        rest = ParallelScan(tbl, resume_tokens=json.loads(saved))
+        seen.update(int(it["n"]) for it in rest)
+
+        assert seen == set(range(30))
+
+
+def test_workers_scan_through_their_own_table(table, monkeypatch):
+    used = []
+    real = aws_clients.thread_table
+
+    def tracking(tbl):
+        twin = real(tbl)
+        used.append((threading.get_ident(), twin))
+        return twin
+
+    monkeypatch.setattr(aws_clients, "thread_table", tracking)
+    assert len(list(parallel_scan(table, total_segments=3, max_workers=3))) == 120
+
+    assert all(twin is not table for _, twin in used)
+    assert len({id(twin) for _, twin in used}) == len({tid for tid, _ in used})
+
+
+def test_worker_errors_surface_to_the_caller():
+    class Broken:
+        def scan(self, **_kwargs):
+            raise RuntimeError("throttled")
+
+    with pytest.raises(RuntimeError, match="throttled"):
+        list(parallel_scan(Broken(), total_segments=2))
+
+
+def test_suggest_total_segments_scales_with_table_size():
+    small = SimpleNamespace(table_size_bytes=10_000, item_count=50)
+    medium = SimpleNamespace(table_size_bytes=500 * 1024 ** 2, item_count=200_000)
+    large = SimpleNamespace(table_size_bytes=40 * 1024 ** 3, item_count=90_000_000)
+
+    assert suggest_total_segments(small, max_workers=8) == 1
+    assert suggest_total_segments(medium, max_workers=8) == 8
+    assert suggest_total_segments(large, max_workers=8) == 20
+    assert suggest_total_segments(object(), max_workers=8) == 1
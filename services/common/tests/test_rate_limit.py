@@ -0,0 +1,79 @@
+# services/common/tests/test_rate_limit.py
+import pytest
+from botocore.exceptions import ClientError
+
+from services.common.rate_limit import RateLimiter, call_with_backoff
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+def _throttle(code="TooManyRequestsException"):
+    return ClientError({"Error": {"Code": code, "Message": "slow down"}}, "AdminCreateUser")
+
+
+def test_rate_limiter_paces_after_burst():
+    clock = FakeClock()
+    limiter = RateLimiter(10, burst=5, clock=clock, sleep=clock.sleep)
+
+    for _ in range(5):
+        assert limiter.acquire() == 0.0
+    # bucket empty: each further call waits one token's worth (0.1s)
+    waits = [limiter.acquire() for _ in range(10)]
+    assert waits == pytest.approx([0.1] * 10)
+    assert clock.now == pytest.approx(1.0)
+
+    clock.now += 10  # idle refills up to the burst, not beyond
+    assert [limiter.acquire() for _ in range(6)][-1] == pytest.approx(0.1)
+
+
+def test_call_with_backoff_retries_throttles_only():
+    slept = []
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _throttle()
+        return "ok"
+
+    assert call_with_backoff(flaky, sleep=slept.append, base_delay=0.1) == "ok"
+    assert len(calls) == 3 and len(slept) == 2
+    assert all(0 <= s <= 0.2 for s in slept)
+
+    def broken():
+        raise _throttle("UserNotFoundException")
+
+    with pytest.raises(ClientError):
+        call_with_backoff(broken, sleep=slept.append)
+    assert len(slept) == 2  # not retried
+
+    with pytest.raises(ClientError):
+        call_with_backoff(lambda: (_ for _ in ()).throw(_throttle()), max_attempts=3, sleep=slept.append)
+    assert len(slept) == 4  # 3 attempts, 2 sleeps
+
+
+def test_call_with_backoff_stops_retrying_at_the_deadline():
+    clock = FakeClock()
+    calls = []
+
+    def throttled():
+        calls.append(clock.now)
+        raise _throttle()
+
+    with pytest.raises(ClientError):
+        call_with_backoff(throttled, base_delay=1.0, max_delay=1.0, max_attempts=50,
+                          sleep=clock.sleep, clock=clock, deadline=3.0)
+    # every retry that ran started before the deadline, and no sleep ran past it
+    assert all(t < 3.0 for t in calls)
+    assert clock.now < 3.0
@@ -0,0 +1,89 @@
+from unittest.mock import MagicMock
+
+import pytest
+
+from services.common.ttl_cache import TTLCache, clear_all
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_get_or_load_caches_until_ttl_expires():
+    clock = FakeClock()
+    cache = TTLCache("T", ttl=30, clock=clock)
+    loader = MagicMock(side_effect=["v1", "v2"])
+
+    assert cache.get_or_load("k", loader) == "v1"
+    assert cache.get_or_load("k", loader) == "v1"
+    clock.now += 31
+    assert cache.get_or_load("k", loader) == "v2"
+    assert loader.call_count == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_none_is_negatively_cached_with_its_own_ttl():
+    clock = FakeClock()
+    cache = TTLCache("T", ttl=300, negative_ttl=5, clock=clock)
+    loader = MagicMock(side_effect=[None, {"tenant_id": "t1"}])
+
+    assert cache.get_or_load("t1", loader) is None
+    assert cache.get_or_load("t1", loader) is None
+    clock.now += 6
+    assert cache.get_or_load("t1", loader) == {"tenant_id": "t1"}
+    assert loader.call_count == 2
+
+
+def test_per_key_ttl_override():
+    clock = FakeClock()
+    cache = TTLCache("T", ttl=300, clock=clock)
+    cache.put("short", 1, ttl=1)
+    cache.put("long", 2)
+    clock.now += 2
+    assert cache.get("short", None) is None
+    assert cache.get("long") == 2
+
+
+def test_lru_eviction_respects_maxsize():
+    cache = TTLCache("T", maxsize=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")          # a is now most recently used
+    cache.put("c", 3)
+
+    assert len(cache) == 2
+    assert cache.get("b", None) is None
+    assert cache.get("a") == 1 and cache.get("c") == 3
+    assert cache.evictions == 1
+
+
+def test_loader_exceptions_are_not_cached():
+    cache = TTLCache("T")
+    loader = MagicMock(side_effect=[RuntimeError("ddb down"), "ok"])
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_load("k", loader)
+    assert cache.get_or_load("k", loader) == "ok"
+
+
+def test_hit_and_miss_metrics_are_emitted():
+    metrics = MagicMock()
+    cache = TTLCache("Tenant", metrics=metrics)
+
+    cache.get_or_load("k", lambda: 1)
+    cache.get_or_load("k", lambda: 1)
+
+    names = [c.kwargs["name"] for c in metrics.add_metric.call_args_list]
+    assert names == ["TenantCacheMiss", "TenantCacheHit"]
+
+
+def test_get_without_default_raises_keyerror_and_clear_all_empties():
+    cache = TTLCache("T")
+    cache.put("k", 1)
+    clear_all()
+    with pytest.raises(KeyError):
+        cache.get("k")
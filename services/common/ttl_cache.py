@@ -0,0 +1,111 @@
+# services/common/ttl_cache.py
+from __future__ import annotations
+
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+_MISSING = object()
+_NOT_CACHED = object()
+_CACHES: "weakref.WeakSet[TTLCache]" = weakref.WeakSet()
+
+
+class TTLCache:
+    """
+    Bounded LRU cache with per-entry TTL, for rows that survive warm invocations
+    (tenant, plan, quota rows).
+
+    - `None` results from a loader are cached as negatives with `negative_ttl`.
+    - Size is capped at `maxsize`; the least recently used entry is evicted.
+    - If a Powertools `metrics` object is given, every lookup emits
+      `<name>CacheHit` / `<name>CacheMiss`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        maxsize: int = 1024,
+        ttl: float = 60.0,
+        negative_ttl: Optional[float] = None,
+        metrics: Any = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = ttl if negative_ttl is None else negative_ttl
+        self.metrics = metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._clock = clock
+        self._data: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        _CACHES.add(self)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def _emit(self, kind: str) -> None:
+        if self.metrics is None:
+            return
+        try:
+            self.metrics.add_metric(name=f"{self.name}Cache{kind}", unit="Count", value=1)
+        except Exception:
+            # metrics are best-effort; never fail a lookup on them
+            pass
+
+    def get(self, key: Hashable, default: Any = _MISSING) -> Any:
+        """Cached value for `key`, or `default` (raises KeyError if no default)."""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._data.move_to_end(key)
+                self.hits += 1
+                hit, value = True, entry[1]
+            else:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                hit, value = False, default
+        self._emit("Hit" if hit else "Miss")
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, *, ttl: Optional[float] = None) -> None:
+        if ttl is None:
+            ttl = self.negative_ttl if value is None else self.ttl
+        with self._lock:
+            self._data[key] = (self._clock() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any], *, ttl: Optional[float] = None) -> Any:
+        """Return the cached value, or call `loader()` and cache its result (exceptions are not cached)."""
+        value = self.get(key, _NOT_CACHED)
+        if value is not _NOT_CACHED:
+            return value
+        value = loader()
+        self.put(key, value, ttl=ttl)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+
+def clear_all() -> None:
+    """Empty every live cache (tests, or after an admin write that must be visible at once)."""
+    for cache in list(_CACHES):
+        cache.clear()
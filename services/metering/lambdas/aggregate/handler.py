@@ -1,60 +1,210 @@
 # services/metering/lambdas/aggregate/handler.py
+"""
+Monthly invoice aggregator.
 
-import os, uuid, decimal, boto3
+Bills one period ("YYYY-MM", default: current month) from the tenant-month
+partitions of UsageLogs: one paginated query per tenant, fanned out over a
+bounded thread pool, invoices written with batch_writer. Progress is
+checkpointed in its own table after every chunk of tenants, so a run that
+runs out of Lambda time returns early and the next invocation resumes.
+
+Tenants come from the event or, failing that, the tenant registry index
+(TENANT_REGISTRY_TABLE_NAME) cross-checked against the period's UsageLogs
+partitions (one projected parallel scan on the first invocation of a period).
+Tenants with usage but no registry row are billed as well and logged; their
+ids ride along in the checkpoint so a resumed run doesn't scan again.
+
+Event (all optional):
+  {"period": "2025-08", "tenant_ids": ["t1", ...]}
+"""
+
+import os, time, decimal, logging, boto3
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 
+from boto3.dynamodb.conditions import Key
+
+from services.common import aws_clients
+from services.common.ddb_client import TENANT, USAGE_TABLE, codecs_from_env, dynamodb_resource
+from services.tenants.registry import iter_tenant_ids
+from services.usage.counters import month_partitions, tenant_month_key
+from services.usage.engine import UsageAggregator
+
+MAX_WORKERS = int(os.getenv("AGGREGATE_MAX_WORKERS", "8"))
+CHUNK_SIZE = int(os.getenv("AGGREGATE_CHUNK_SIZE", "50"))
+# stop starting new chunks when less than this is left on the Lambda clock
+SAFETY_MARGIN_MS = int(os.getenv("AGGREGATE_SAFETY_MARGIN_MS", "30000"))
+
+logger = logging.getLogger(__name__)
+
 _DDB = None
 _USAGE_TBL = None
 _INVOICES_TBL = None
+_CHECKPOINTS_TBL = None
+_REGISTRY_TBL = None
 
-def _get_tables():
-    global _DDB, _USAGE_TBL, _INVOICES_TBL
+def _ddb():
+    global _DDB
     if _DDB is None:
-        _DDB = boto3.resource("dynamodb")
+        _DDB = dynamodb_resource(codecs_from_env(USAGE_LOGS_TABLE_NAME=USAGE_TABLE, TENANTS_TABLE_NAME=TENANT),
+                                 boto3_module=boto3)
+    return _DDB
+
+def _required_table(env):
+    name = os.getenv(env)
+    if not name:
+        raise RuntimeError(f"{env} not set")
+    return _ddb().Table(name)
+
+def _get_tables():
+    """(UsageLogs, UsageInvoices, MeteringCheckpoints) tables."""
+    global _USAGE_TBL, _INVOICES_TBL, _CHECKPOINTS_TBL
     if _USAGE_TBL is None:
-        name = os.getenv("USAGE_LOGS_TABLE_NAME")
-        if not name:
-            raise RuntimeError("USAGE_LOGS_TABLE_NAME not set")
-        _USAGE_TBL = _DDB.Table(name)
+        _USAGE_TBL = _required_table("USAGE_LOGS_TABLE_NAME")
     if _INVOICES_TBL is None:
-        name = os.getenv("USAGE_INVOICES_TABLE_NAME")
+        _INVOICES_TBL = _required_table("USAGE_INVOICES_TABLE_NAME")
+    if _CHECKPOINTS_TBL is None:
+        _CHECKPOINTS_TBL = _required_table("METERING_CHECKPOINTS_TABLE_NAME")
+    return _USAGE_TBL, _INVOICES_TBL, _CHECKPOINTS_TBL
+
+def _get_registry_table():
+    """Control-panel tenants table with the TenantRegistryById index (TENANT_REGISTRY_TABLE_NAME), or None."""
+    global _REGISTRY_TBL
+    if _REGISTRY_TBL is None:
+        name = os.getenv("TENANT_REGISTRY_TABLE_NAME")
         if not name:
-            raise RuntimeError("USAGE_INVOICES_TABLE_NAME not set")
-        _INVOICES_TBL = _DDB.Table(name)
-    return _USAGE_TBL, _INVOICES_TBL
+            return None
+        _REGISTRY_TBL = _ddb().Table(name)
+    return _REGISTRY_TBL
 
-def handler(event, context):
-    usage_tbl, invoices_tbl = _get_tables()
+def _usage_tenant_ids(usage_tbl, period):
+    """Tenants with a UsageLogs partition for `period` (shard counter partitions excluded)."""
+    return {tenant_month.rsplit("#", 1)[0] for tenant_month in month_partitions(usage_tbl, period)}
+
+def _list_tenant_ids(usage_tbl, period, checkpoint):
+    """
+    (tenants to bill, unregistered tenants), both sorted (the checkpoint relies
+    on a stable order): the registry index plus every tenant with usage in the
+    period. A resumed run takes the unregistered ones from its checkpoint.
+    """
+    registry = _get_registry_table()
+    registered = set(iter_tenant_ids(registry)) if registry is not None else set()
+    if "unregistered" in checkpoint:
+        unregistered = set(checkpoint["unregistered"])
+    else:
+        unregistered = _usage_tenant_ids(usage_tbl, period) - registered
+        if unregistered and registry is not None:
+            logger.warning("billing %d tenant(s) with %s usage but no registry row: %s",
+                           len(unregistered), period, ", ".join(sorted(unregistered)[:20]))
+    return sorted(registered | unregistered), sorted(unregistered)
 
-    # Aggregate tokens by tenant_id (fallback to "unknown")
-    totals = {}
-    scan_kwargs = {}
+def _sum_tenant_period(usage_tbl, tenant_id, period):
+    """
+    Sum token_count over one tenant-month partition ->
+    (tenant_id, tokens, usage rows billed, items DynamoDB read incl. AGG / IDEMP# markers).
+    """
+    usage_tbl = aws_clients.thread_table(usage_tbl)  # resource Tables aren't thread-safe
+    agg = UsageAggregator()  # skips the AGG / IDEMP# marker rows
+    scanned = 0
+    kwargs = {
+        "KeyConditionExpression": Key("tenant_month").eq(tenant_month_key(tenant_id, period)),
+        "ProjectionExpression": "#ts, token_count",
+        "ExpressionAttributeNames": {"#ts": "timestamp"},
+    }
     while True:
-        resp = usage_tbl.scan(**scan_kwargs)
-        for it in resp.get("Items", []):
-            tenant = it.get("tenant_id", "unknown")
-            tokens = decimal.Decimal(str(it.get("token_count", 0)))
-            totals[tenant] = totals.get(tenant, decimal.Decimal(0)) + tokens
+        resp = usage_tbl.query(**kwargs)
+        items = resp.get("Items", [])
+        scanned += resp.get("ScannedCount", len(items))
+        agg.add_items(items)
         if "LastEvaluatedKey" not in resp:
-            break
-        scan_kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+            return tenant_id, decimal.Decimal(agg.tokens), agg.requests, scanned
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+def _load_checkpoint(checkpoints_tbl, period):
+    return (checkpoints_tbl.get_item(Key={"period": period}) or {}).get("Item") or {}
+
+def _save_checkpoint(checkpoints_tbl, period, last_tenant, processed, usage_rows, rows_read, now, unregistered=None):
+    item = {
+        "period": period,
+        "last_tenant": last_tenant,
+        "tenants_processed": processed,
+        "usage_rows": usage_rows,
+        "rows_read": rows_read,
+        "updated_at": now.isoformat(),
+    }
+    if unregistered is not None:
+        item["unregistered"] = unregistered
+    checkpoints_tbl.put_item(Item=item)
+
+def _out_of_time(context):
+    if context is None or not hasattr(context, "get_remaining_time_in_millis"):
+        return False
+    return context.get_remaining_time_in_millis() < SAFETY_MARGIN_MS
+
+def handler(event, context):
+    started = time.monotonic()
+    event = event or {}
+    usage_tbl, invoices_tbl, checkpoints_tbl = _get_tables()
 
     now = datetime.now(timezone.utc)
-    period_label = now.strftime("%Y-%m")
+    period_label = event.get("period") or now.strftime("%Y-%m")
+
+    checkpoint = _load_checkpoint(checkpoints_tbl, period_label)
+    if event.get("tenant_ids"):
+        tenant_ids, unregistered = sorted(set(event["tenant_ids"])), None
+    else:
+        tenant_ids, unregistered = _list_tenant_ids(usage_tbl, period_label, checkpoint)
+
+    last_done = checkpoint.get("last_tenant")
+    if last_done is not None:
+        tenant_ids = [t for t in tenant_ids if t > last_done]
+    processed = int(checkpoint.get("tenants_processed", 0))
+    usage_rows = int(checkpoint.get("usage_rows", 0))
+    rows_read = int(checkpoint.get("rows_read", 0))
+
     created = 0
+    complete = True
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        for start in range(0, len(tenant_ids), CHUNK_SIZE):
+            if _out_of_time(context):
+                complete = False
+                break
+            chunk = tenant_ids[start:start + CHUNK_SIZE]
+            results = list(pool.map(lambda t: _sum_tenant_period(usage_tbl, t, period_label), chunk))
+
+            # batch_writer isn't thread-safe; write from this thread only
+            with invoices_tbl.batch_writer() as bw:
+                for tenant_id, token_sum, rows, scanned in results:
+                    usage_rows += rows
+                    rows_read += scanned
+                    if not rows:
+                        continue
+                    bw.put_item(Item={
+                        "invoice_id": f"{tenant_id}-{period_label}",  # deterministic per (tenant, month)
+                        "tenant_id": tenant_id,
+                        "period_label": period_label,
+                        "tokens": str(token_sum),              # keep as string to avoid float issues
+                        "status": "DRAFT",
+                        "estimated_aws_cost_usd": "0.00",
+                        "created_at": now.isoformat(),
+                    })
+                    created += 1
+            processed += len(chunk)
+            _save_checkpoint(checkpoints_tbl, period_label, chunk[-1], processed, usage_rows, rows_read, now,
+                             unregistered)
+
+    if complete:
+        # finished: a later run for the same period recomputes from scratch
+        checkpoints_tbl.delete_item(Key={"period": period_label})
 
-    for tenant_id, token_sum in totals.items():
-        invoice_id = f"{tenant_id}-{period_label}"  # deterministic per (tenant, month)
-        item = {
-            "invoice_id": invoice_id,
-            "tenant_id": tenant_id,
-            "period_label": period_label,
-            "tokens": str(token_sum),              # keep as string to avoid float issues
-            "status": "DRAFT",
-            "estimated_aws_cost_usd": "0.00",
-            "created_at": now.isoformat(),
-        }
-        invoices_tbl.put_item(Item=item)
-        created += 1
-
-    return {"message": "ok", "period": period_label, "tenants": created}
+    return {
+        "message": "ok" if complete else "partial",
+        "period": period_label,
+        "tenants": created,
+        "tenants_processed": processed,
+        "usage_rows": usage_rows,
+        "rows_read": rows_read,
+        "unregistered_tenants": len(unregistered or ()),
+        "complete": complete,
+        "elapsed_ms": int((time.monotonic() - started) * 1000),
+    }
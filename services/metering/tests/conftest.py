@@ -7,3 +7,4 @@ def metering_env(monkeypatch):
     monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-1")
     monkeypatch.setenv("USAGE_LOGS_TABLE_NAME", "UsageLogs-dev")
     monkeypatch.setenv("USAGE_INVOICES_TABLE_NAME", "UsageInvoices-dev")
+    monkeypatch.setenv("METERING_CHECKPOINTS_TABLE_NAME", "MeteringCheckpoints-dev")
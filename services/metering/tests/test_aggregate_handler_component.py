@@ -4,6 +4,7 @@ from datetime import datetime, timezone
 import boto3
 from moto import mock_aws
 import services.metering.lambdas.aggregate.handler as agg_mod
+from .utils import create_metering_tables
 
 class _FakeDatetime:
     @staticmethod
@@ -20,29 +21,35 @@ def test_aggregate_with_moto_creates_invoices(monkeypatch):
 
     ddb.create_table(
         TableName="UsageLogs-dev",
-        KeySchema=[{"AttributeName": "usage_id", "KeyType": "HASH"}],
-        AttributeDefinitions=[{"AttributeName": "usage_id", "AttributeType": "S"}],
-        BillingMode="PAY_PER_REQUEST",
-    )
-    ddb.create_table(
-        TableName="UsageInvoices-dev",
-        KeySchema=[{"AttributeName": "invoice_id", "KeyType": "HASH"}],
-        AttributeDefinitions=[{"AttributeName": "invoice_id", "AttributeType": "S"}],
+        KeySchema=[
+            {"AttributeName": "tenant_month", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "tenant_month", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"},
+        ],
         BillingMode="PAY_PER_REQUEST",
     )
+    create_metering_tables(ddb)
 
     # Seed usage items
     ddb_res = boto3.resource("dynamodb", region_name="us-west-1")
     usage = ddb_res.Table("UsageLogs-dev")
-    usage.put_item(Item={"usage_id": "u1", "tenant_id": "t1", "token_count": 100})
-    usage.put_item(Item={"usage_id": "u2", "tenant_id": "t2", "token_count": 200})
-    usage.put_item(Item={"usage_id": "u3", "tenant_id": "t1", "token_count": 50})
+    usage.put_item(Item={"tenant_month": "t1#2025-08", "timestamp": "2025-08-01T00:00:00Z", "tenant_id": "t1", "token_count": 100})
+    usage.put_item(Item={"tenant_month": "t2#2025-08", "timestamp": "2025-08-01T00:00:00Z", "tenant_id": "t2", "token_count": 200})
+    usage.put_item(Item={"tenant_month": "t1#2025-08", "timestamp": "2025-08-02T00:00:00Z", "tenant_id": "t1", "token_count": 50})
+    usage.put_item(Item={"tenant_month": "t1#2025-08", "timestamp": "AGG", "token_total": 150})
+    # Other months are not billed into 2025-08
+    usage.put_item(Item={"tenant_month": "t1#2025-07", "timestamp": "2025-07-30T00:00:00Z", "tenant_id": "t1", "token_count": 999})
 
     # Run handler
-    resp = agg_mod.handler({}, None)
+    resp = agg_mod.handler({"tenant_ids": ["t1", "t2"]}, None)
     assert resp["message"] == "ok"
     assert resp["period"] == "2025-08"
     assert resp["tenants"] == 2
+    assert resp["usage_rows"] == 3
+    assert resp["rows_read"] == 4  # t1's AGG item is read too
 
     # Verify invoices
     invoices = ddb_res.Table("UsageInvoices-dev")
@@ -50,3 +57,8 @@ def test_aggregate_with_moto_creates_invoices(monkeypatch):
     t2 = invoices.get_item(Key={"invoice_id": "t2-2025-08"})["Item"]
     assert t1["tenant_id"] == "t1" and t1["tokens"] == "150" and t1["status"] == "DRAFT"
     assert t2["tenant_id"] == "t2" and t2["tokens"] == "200" and t2["status"] == "DRAFT"
+    assert "Item" not in invoices.get_item(Key={"invoice_id": "t1-2025-07"})
+    assert invoices.scan()["Count"] == 2  # invoices only; checkpoints live in their own table
+    checkpoints = ddb_res.Table("MeteringCheckpoints-dev")
+    assert "Item" not in checkpoints.get_item(Key={"period": "2025-08"})
+
@@ -10,41 +10,151 @@ class _FakeDatetime:
         # Fixed time for deterministic invoice_id "YYYY-MM"
         return datetime(2025, 8, 25, 12, 0, 0, tzinfo=timezone.utc)
 
-def _mk_scan_pages():
-    # Two scan pages to exercise pagination
-    page1 = {"Items": [
-        {"tenant_id": "t1", "token_count": 100},
-        {"tenant_id": "t2", "token_count": 200},
-    ], "LastEvaluatedKey": {"k": "1"}}
-    page2 = {"Items": [
-        {"tenant_id": "t1", "token_count": 50},
-    ]}
-    return [page1, page2]
+def _mk_partition_pages():
+    # t1 spans two query pages to exercise pagination; AGG/IDEMP rows are not usage
+    return {
+        "t1#2025-08": [
+            {"Items": [
+                {"timestamp": "2025-08-01T00:00:00Z", "token_count": 100},
+                {"timestamp": "AGG", "token_total": 150},
+            ], "LastEvaluatedKey": {"k": "1"}},
+            {"Items": [
+                {"timestamp": "2025-08-02T00:00:00Z", "token_count": 50},
+                {"timestamp": "IDEMP#abc"},
+            ]},
+        ],
+        "t2#2025-08": [
+            {"Items": [{"timestamp": "2025-08-03T00:00:00Z", "token_count": 200}]},
+        ],
+        "t3#2025-08": [{"Items": []}],
+    }
 
-def test_aggregate_creates_invoices_per_tenant(monkeypatch):
+def _mk_usage_tbl(pages):
     usage_tbl = MagicMock()
-    invoices_tbl = MagicMock()
+    remaining = {k: list(v) for k, v in pages.items()}
 
-    pages = _mk_scan_pages()
-    usage_tbl.scan.side_effect = pages
+    def fake_query(**kwargs):
+        # Key("tenant_month").eq(x) -> values are (Key, x)
+        tenant_month = kwargs["KeyConditionExpression"].get_expression()["values"][1]
+        return remaining[tenant_month].pop(0)
 
-    # Patch the module to return our MagicMocks
-    monkeypatch.setattr(agg_mod, "_get_tables", lambda: (usage_tbl, invoices_tbl))
+    usage_tbl.query.side_effect = fake_query
+    return usage_tbl
 
+def _mk_invoices_tbl():
+    invoices_tbl = MagicMock()
+    writer = invoices_tbl.batch_writer.return_value.__enter__.return_value
+    return invoices_tbl, writer
+
+def _mk_checkpoints_tbl(checkpoint=None):
+    checkpoints_tbl = MagicMock()
+    checkpoints_tbl.get_item.return_value = {"Item": checkpoint} if checkpoint else {}
+    return checkpoints_tbl
+
+@pytest.fixture(autouse=True)
+def _patch(monkeypatch):
     # Patch datetime used inside the module so month is deterministic
     monkeypatch.setattr(agg_mod, "datetime", _FakeDatetime)
+    monkeypatch.setattr(agg_mod, "_get_registry_table", lambda: None)
 
-    resp = agg_mod.handler({}, None)
+def test_aggregate_creates_invoices_per_tenant(monkeypatch):
+    usage_tbl = _mk_usage_tbl(_mk_partition_pages())
+    invoices_tbl, writer = _mk_invoices_tbl()
+    checkpoints_tbl = _mk_checkpoints_tbl()
+
+    # Patch the module to return our MagicMocks
+    monkeypatch.setattr(agg_mod, "_get_tables", lambda: (usage_tbl, invoices_tbl, checkpoints_tbl))
+
+    resp = agg_mod.handler({"tenant_ids": ["t2", "t1", "t3"]}, None)
     assert resp["message"] == "ok"
     assert resp["period"] == "2025-08"
     assert resp["tenants"] == 2
+    assert resp["tenants_processed"] == 3
+    assert resp["usage_rows"] == 3
+    assert resp["rows_read"] == 5  # what DynamoDB read, AGG / IDEMP# markers included
+    assert resp["complete"] is True
+    assert "elapsed_ms" in resp
 
-    # We expect two put_item calls: t1 with 150, t2 with 200
-    assert invoices_tbl.put_item.call_count == 2
-    calls = [kwargs["Item"] for _, kwargs in invoices_tbl.put_item.call_args_list]
+    # One invoice per tenant with usage (t3 had none): t1 with 150, t2 with 200
+    assert writer.put_item.call_count == 2
+    calls = [kwargs["Item"] for _, kwargs in writer.put_item.call_args_list]
     items = {c["tenant_id"]: c for c in calls}
     assert items["t1"]["invoice_id"] == "t1-2025-08"
     assert items["t1"]["tokens"] == "150"
     assert items["t1"]["status"] == "DRAFT"
     assert items["t2"]["invoice_id"] == "t2-2025-08"
     assert items["t2"]["tokens"] == "200"
+
+    # No scans: every read is a partition query
+    usage_tbl.scan.assert_not_called()
+    # Finished run clears its checkpoint; no checkpoint rows among the invoices
+    checkpoints_tbl.delete_item.assert_called_once_with(Key={"period": "2025-08"})
+    invoices_tbl.put_item.assert_not_called()
+
+def test_aggregate_resumes_after_checkpoint(monkeypatch):
+    usage_tbl = _mk_usage_tbl(_mk_partition_pages())
+    invoices_tbl, writer = _mk_invoices_tbl()
+    checkpoints_tbl = _mk_checkpoints_tbl(
+        {"period": "2025-08", "last_tenant": "t1", "tenants_processed": 1, "usage_rows": 2, "rows_read": 4}
+    )
+    monkeypatch.setattr(agg_mod, "_get_tables", lambda: (usage_tbl, invoices_tbl, checkpoints_tbl))
+
+    resp = agg_mod.handler({"tenant_ids": ["t1", "t2", "t3"]}, None)
+
+    assert resp["tenants_processed"] == 3
+    assert resp["usage_rows"] == 3
+    assert resp["rows_read"] == 5
+    assert [kw["Item"]["tenant_id"] for _, kw in writer.put_item.call_args_list] == ["t2"]
+
+def test_aggregate_stops_early_when_lambda_time_runs_out(monkeypatch):
+    usage_tbl = _mk_usage_tbl(_mk_partition_pages())
+    invoices_tbl, writer = _mk_invoices_tbl()
+    checkpoints_tbl = _mk_checkpoints_tbl()
+    monkeypatch.setattr(agg_mod, "_get_tables", lambda: (usage_tbl, invoices_tbl, checkpoints_tbl))
+    monkeypatch.setattr(agg_mod, "CHUNK_SIZE", 1)
+
+    ctx = MagicMock()
+    # enough time for the first chunk only
+    ctx.get_remaining_time_in_millis.side_effect = [60_000, 1_000]
+
+    resp = agg_mod.handler({"tenant_ids": ["t1", "t2", "t3"]}, ctx)
+
+    assert resp["message"] == "partial"
+    assert resp["complete"] is False
+    assert resp["tenants_processed"] == 1
+    checkpoints_tbl.delete_item.assert_not_called()
+    checkpoint = checkpoints_tbl.put_item.call_args.kwargs["Item"]
+    assert checkpoint["period"] == "2025-08"
+    assert checkpoint["last_tenant"] == "t1"
+
+def test_aggregate_bills_usage_from_unregistered_tenants(monkeypatch, caplog):
+    usage_tbl = _mk_usage_tbl(_mk_partition_pages())
+    invoices_tbl, writer = _mk_invoices_tbl()
+    checkpoints_tbl = _mk_checkpoints_tbl()
+    monkeypatch.setattr(agg_mod, "_get_tables", lambda: (usage_tbl, invoices_tbl, checkpoints_tbl))
+    monkeypatch.setattr(agg_mod, "_get_registry_table", lambda: MagicMock())
+    monkeypatch.setattr(agg_mod, "iter_tenant_ids", lambda registry: iter(["t1", "t3"]))
+    # t2 has usage but no registry row
+    monkeypatch.setattr(agg_mod, "month_partitions", lambda tbl, period: ["t1#2025-08", "t2#2025-08"])
+    monkeypatch.setattr(agg_mod, "CHUNK_SIZE", 2)
+
+    resp = agg_mod.handler({}, None)
+
+    assert resp["tenants_processed"] == 3
+    assert resp["unregistered_tenants"] == 1
+    assert sorted(kw["Item"]["tenant_id"] for _, kw in writer.put_item.call_args_list) == ["t1", "t2"]
+    assert "no registry row: t2" in caplog.text
+    # the checkpoint carries them, so a resumed run doesn't scan again
+    assert checkpoints_tbl.put_item.call_args_list[0].kwargs["Item"]["unregistered"] == ["t2"]
+
+def test_aggregate_resume_reuses_unregistered_tenants_from_checkpoint(monkeypatch):
+    usage_tbl = _mk_usage_tbl(_mk_partition_pages())
+    invoices_tbl, writer = _mk_invoices_tbl()
+    checkpoints_tbl = _mk_checkpoints_tbl({"period": "2025-08", "last_tenant": "t1", "unregistered": ["t2"]})
+    monkeypatch.setattr(agg_mod, "_get_tables", lambda: (usage_tbl, invoices_tbl, checkpoints_tbl))
+    monkeypatch.setattr(agg_mod, "month_partitions", MagicMock(side_effect=AssertionError("rescanned")))
+
+    resp = agg_mod.handler({}, None)
+
+    assert [kw["Item"]["tenant_id"] for _, kw in writer.put_item.call_args_list] == ["t2"]
+    assert resp["unregistered_tenants"] == 1
@@ -3,6 +3,8 @@ import boto3
 from moto import mock_aws
 from datetime import datetime, timezone
 import services.metering.lambdas.aggregate.handler as agg_handler_mod
+from .utils import create_metering_tables
+from services.tenants.registry import registry_item
 
 class _FixedDatetime:
     @staticmethod
@@ -16,6 +18,8 @@ def test_aggregator_writes_invoices_per_tenant(monkeypatch):
     monkeypatch.setenv("AWS_DEFAULT_REGION", "us-west-1")
     monkeypatch.setenv("USAGE_LOGS_TABLE_NAME", "UsageLogs-dev")
     monkeypatch.setenv("USAGE_INVOICES_TABLE_NAME", "UsageInvoices-dev")
+    monkeypatch.setenv("TENANT_REGISTRY_TABLE_NAME", "MerlinSigmaTenants-dev")
+    monkeypatch.setattr(agg_handler_mod, "_REGISTRY_TBL", None)
 
     # Fix time for deterministic "YYYY-MM"
     monkeypatch.setattr(agg_handler_mod, "datetime", _FixedDatetime)
@@ -25,23 +29,31 @@ def test_aggregator_writes_invoices_per_tenant(monkeypatch):
 
     ddb.create_table(
         TableName="UsageLogs-dev",
-        KeySchema=[{"AttributeName": "usage_id", "KeyType": "HASH"}],
-        AttributeDefinitions=[{"AttributeName": "usage_id", "AttributeType": "S"}],
-        BillingMode="PAY_PER_REQUEST",
-    )
-    ddb.create_table(
-        TableName="UsageInvoices-dev",
-        KeySchema=[{"AttributeName": "invoice_id", "KeyType": "HASH"}],
-        AttributeDefinitions=[{"AttributeName": "invoice_id", "AttributeType": "S"}],
+        KeySchema=[
+            {"AttributeName": "tenant_month", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "tenant_month", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"},
+        ],
         BillingMode="PAY_PER_REQUEST",
     )
+    create_metering_tables(ddb, registry_table="MerlinSigmaTenants-dev")
 
     # Sanity: ensure tables exist in this moto context
-    assert set(ddb.list_tables()["TableNames"]) >= {"UsageLogs-dev", "UsageInvoices-dev"}
+    assert set(ddb.list_tables()["TableNames"]) >= {"UsageLogs-dev", "UsageInvoices-dev", "MerlinSigmaTenants-dev"}
+
+    # Seed the tenant registry (tC has no usage this period -> no invoice); profile rows stay out of the index
+    registry = boto3.resource("dynamodb", region_name="us-west-1").Table("MerlinSigmaTenants-dev")
+    for tenant_id in ("tA", "tB", "tC"):
+        registry.put_item(Item=registry_item(tenant_id))
+        registry.put_item(Item={"PK": f"tenant#{tenant_id}", "SK": "profile#v1", "tenant_id": tenant_id})
 
     # Seed usage items
     put = ddb.put_item
     put(TableName="UsageLogs-dev", Item={
+        "tenant_month": {"S": "tA#2025-08"},
         "usage_id": {"S": "u1"},
         "tenant_id": {"S": "tA"},
         "token_count": {"N": "5"},
@@ -49,6 +61,7 @@ def test_aggregator_writes_invoices_per_tenant(monkeypatch):
         "timestamp": {"S": "2025-08-01T00:00:00Z"},
     })
     put(TableName="UsageLogs-dev", Item={
+        "tenant_month": {"S": "tA#2025-08"},
         "usage_id": {"S": "u2"},
         "tenant_id": {"S": "tA"},
         "token_count": {"N": "7"},
@@ -56,6 +69,7 @@ def test_aggregator_writes_invoices_per_tenant(monkeypatch):
         "timestamp": {"S": "2025-08-01T01:00:00Z"},
     })
     put(TableName="UsageLogs-dev", Item={
+        "tenant_month": {"S": "tB#2025-08"},
         "usage_id": {"S": "u3"},
         "tenant_id": {"S": "tB"},
         "token_count": {"N": "3"},
@@ -68,6 +82,8 @@ def test_aggregator_writes_invoices_per_tenant(monkeypatch):
     assert resp["message"] == "ok"
     assert resp["period"] == "2025-08"
     assert resp["tenants"] == 2
+    assert resp["tenants_processed"] == 3
+    assert resp["usage_rows"] == 3
 
     # Verify invoices were written
     ddb_res = boto3.resource("dynamodb", region_name="us-west-1")
@@ -18,8 +18,8 @@ def test_metering_stack_resources_without_schedule():
     meter = MeteringStack(app, "MeteringStackTestNoSched", usage_table=usage_table)
     template = Template.from_stack(meter)
 
-    # Has a DynamoDB table for invoices
-    template.resource_count_is("AWS::DynamoDB::Table", 1)
+    # DynamoDB tables for invoices and aggregator checkpoints
+    template.resource_count_is("AWS::DynamoDB::Table", 2)
     # Has the Lambda function
     template.resource_count_is("AWS::Lambda::Function", 1)
     # No EventBridge Rule by default
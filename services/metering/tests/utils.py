@@ -0,0 +1,38 @@
+# services/metering/tests/utils.py
+def create_metering_tables(ddb, registry_table=None):
+    """Invoices + checkpoints tables, and optionally a tenant registry table with its GSI (moto)."""
+    ddb.create_table(
+        TableName="UsageInvoices-dev",
+        KeySchema=[{"AttributeName": "invoice_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "invoice_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    ddb.create_table(
+        TableName="MeteringCheckpoints-dev",
+        KeySchema=[{"AttributeName": "period", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "period", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    if registry_table:
+        ddb.create_table(
+            TableName=registry_table,
+            KeySchema=[
+                {"AttributeName": "PK", "KeyType": "HASH"},
+                {"AttributeName": "SK", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "PK", "AttributeType": "S"},
+                {"AttributeName": "SK", "AttributeType": "S"},
+                {"AttributeName": "entity_type", "AttributeType": "S"},
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+            ],
+            GlobalSecondaryIndexes=[{
+                "IndexName": "TenantRegistryById",
+                "KeySchema": [
+                    {"AttributeName": "entity_type", "KeyType": "HASH"},
+                    {"AttributeName": "tenant_id", "KeyType": "RANGE"},
+                ],
+                "Projection": {"ProjectionType": "ALL"},
+            }],
+            BillingMode="PAY_PER_REQUEST",
+        )
@@ -1,9 +1,12 @@
 # services/quota/enforcer.py
 
+import math
 import os
+from datetime import datetime, timedelta, timezone
 import boto3
+from botocore.exceptions import ClientError
 from decimal import Decimal, getcontext
-from typing import Optional
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 
 from services.common.ddb_utils import ddb_safe
 from services.common.time_utils import now_utc, now_utc_iso  # <- use now_utc for date
@@ -17,8 +20,20 @@ class QuotaStatus:
     BLOCKED = "blocked"
 
 QUOTA_TABLE_NAME = os.getenv("QUOTA_TABLE_NAME", "QuotaState")
+QUOTA_COUNTERS_TABLE_NAME = os.getenv("QUOTA_COUNTERS_TABLE_NAME", "QuotaCounters")
 _dynamo = boto3.resource("dynamodb")
 _quota_tbl = _dynamo.Table(QUOTA_TABLE_NAME)
+_counters_tbl = _dynamo.Table(QUOTA_COUNTERS_TABLE_NAME)
+
+WARNING_RATIO = Decimal("0.8")
+DAY_PREFIX = "D#"
+MINUTE_PREFIX = "M#"
+# counter rows expire via DynamoDB TTL (`expires_at`); keep days a little past midnight
+DAY_COUNTER_TTL = timedelta(days=2)
+# per-row markers of the QuotaState stream consumer; stream records live 24h
+APPLIED_PREFIX = "applied#"
+APPLIED_TTL = timedelta(days=3)
+TRANSACT_MAX_ACTIONS = 100
 
 getcontext().prec = 28
 def _dec(x):
@@ -43,6 +58,124 @@ def write_quota_state(*, tenant_id: str, period_label: str, plan_cap, used_token
     _quota_tbl.put_item(Item=ddb_safe(item))  # DDB-safe: no floats/datetimes
 
 
+def _usage_update(tenant_id: str, period_label: str, limit: Decimal, inc: Decimal) -> dict:
+    return {
+        "Key": {"tenant_id": tenant_id, "period": period_label},
+        "UpdateExpression": (
+            "ADD #used :inc "
+            "SET #limit = :limit, #rem = :limit_minus_inc - if_not_exists(#used, :zero), #ts = :now"
+        ),
+        "ExpressionAttributeNames": {"#used": "used", "#limit": "limit", "#rem": "remaining", "#ts": "updated_at"},
+        "ExpressionAttributeValues": {
+            ":inc": inc,
+            ":limit": limit,
+            ":limit_minus_inc": limit - inc,
+            ":zero": _dec(0),
+            ":now": now_utc_iso(),
+        },
+    }
+
+
+def _set_used_pct(tbl, tenant_id: str, period_label: str, limit: Decimal, used: Decimal) -> Decimal:
+    used_pct = _dec(0) if limit == 0 else (used / limit * _dec(100))
+    try:
+        tbl.update_item(
+            Key={"tenant_id": tenant_id, "period": period_label},
+            UpdateExpression="SET #pct = :pct",
+            ConditionExpression="#used = :used",
+            ExpressionAttributeNames={"#pct": "used_pct", "#used": "used"},
+            ExpressionAttributeValues={":pct": used_pct, ":used": used},
+        )
+    except ClientError as e:
+        # a newer batch already moved `used`; its own follow-up sets the percentage
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+    return used_pct
+
+
+def add_quota_usage(*, tenant_id: str, period_label: str, plan_cap, inc_tokens, table=None) -> dict:
+    """
+    Incremental counterpart of write_quota_state: one ADD for a batch's worth
+    of tokens. `remaining` is derived in the same expression (limit - inc is
+    precomputed, DynamoDB allows one operator per operand); `used_pct` needs a
+    division, so it follows as a SET guarded on `used` not having moved again.
+    Returns the new state.
+    """
+    tbl = table if table is not None else _quota_tbl
+    limit = _dec(plan_cap)
+    inc = _dec(inc_tokens)
+    resp = tbl.update_item(**_usage_update(tenant_id, period_label, limit, inc), ReturnValues="ALL_NEW")
+    state = resp.get("Attributes", {})
+    used_pct = _set_used_pct(tbl, tenant_id, period_label, limit, _dec(state.get("used", inc)))
+    return {**state, "used_pct": used_pct}
+
+
+# (marker id, tenant_id, period_label, tokens) for one usage row
+UsageEntry = Tuple[str, str, str, int]
+
+
+def quota_usage_chunks(entries: Iterable[UsageEntry]) -> Iterator[List[UsageEntry]]:
+    """Split usage rows, in order, into chunks of one marker per row plus one update per (tenant, period)."""
+    chunk: List[UsageEntry] = []
+    pairs: set = set()
+    for entry in entries:
+        pair = (entry[1], entry[2])
+        if chunk and len(chunk) + 1 + len(pairs | {pair}) > TRANSACT_MAX_ACTIONS:
+            yield chunk
+            chunk, pairs = [], set()
+        chunk.append(entry)
+        pairs.add(pair)
+    if chunk:
+        yield chunk
+
+
+def add_quota_usage_once(chunk: List[UsageEntry], plan_caps: Dict[str, object], *, table=None) -> Tuple[int, int]:
+    """
+    Idempotent add_quota_usage for a `quota_usage_chunks` chunk: one
+    TransactWriteItems with a conditional applied#<id> marker per row
+    (expiring via `expires_at`) and one ADD per (tenant, period). Rows whose
+    marker exists were applied by an earlier delivery; they are dropped and
+    the rest retried. Returns (rows applied, states updated).
+    """
+    tbl = table if table is not None else _quota_tbl
+    pending = list(chunk)
+    while pending:
+        totals: Dict[Tuple[str, str], int] = {}
+        for _, tenant_id, period_label, tokens in pending:
+            totals[(tenant_id, period_label)] = totals.get((tenant_id, period_label), 0) + tokens
+        expires_at = int((now_utc() + APPLIED_TTL).timestamp())
+        actions = [{
+            "Put": {
+                "TableName": tbl.name,
+                "Item": {"tenant_id": f"{APPLIED_PREFIX}{marker_id}", "period": "applied",
+                         "created_at": now_utc_iso(), "expires_at": expires_at},
+                "ConditionExpression": "attribute_not_exists(tenant_id)",
+            }
+        } for marker_id, _, _, _ in pending]
+        actions.extend(
+            {"Update": {"TableName": tbl.name,
+                        **_usage_update(tenant_id, period_label, _dec(plan_caps[tenant_id]), _dec(tokens))}}
+            for (tenant_id, period_label), tokens in totals.items()
+        )
+        try:
+            tbl.meta.client.transact_write_items(TransactItems=actions)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                raise
+            reasons = [r.get("Code") for r in e.response.get("CancellationReasons", [])]
+            applied = {i for i, code in enumerate(reasons[:len(pending)]) if code == "ConditionalCheckFailed"}
+            if not applied:
+                raise
+            pending = [entry for i, entry in enumerate(pending) if i not in applied]
+            continue
+        for tenant_id, period_label in totals:
+            key = {"tenant_id": tenant_id, "period": period_label}
+            state = (tbl.get_item(Key=key, ConsistentRead=True) or {}).get("Item") or {}
+            _set_used_pct(tbl, tenant_id, period_label, _dec(plan_caps[tenant_id]), _dec(state.get("used", 0)))
+        return len(pending), len(totals)
+    return 0, 0
+
+
 def check_quota(user_id: str, plan_id: str, tokens_to_use: int, dynamodb: Optional[object] = None) -> str:
     # Use a DATE for aggregation window, not a full ISO timestamp
     today = now_utc().date().isoformat()      # e.g. "2025-08-16"
@@ -65,3 +198,199 @@ def check_quota(user_id: str, plan_id: str, tokens_to_use: int, dynamodb: Option
         return QuotaStatus.WARNING
 
     return QuotaStatus.ALLOWED
+
+
+# ---- Counter-backed enforcement ----
+# QuotaCounters table: PK `scope` ("user#<id>"), SK `window` ("D#YYYY-MM-DD" for
+# the daily counter, "M#YYYY-MM-DDTHH:MM" for per-minute burst buckets). Each
+# check is one conditional ADD of tokens + requests (1, or a batch's share); a
+# refused check leaves the counter untouched, so blocked calls are not charged.
+
+def _utc(now: Optional[datetime]) -> datetime:
+    """`now` (default: the current time) in UTC; a naive datetime is taken as UTC."""
+    if now is None:
+        return now_utc()
+    if now.tzinfo is None:
+        return now.replace(tzinfo=timezone.utc)
+    return now.astimezone(timezone.utc)
+
+
+def _finite(limit) -> bool:
+    return limit is not None and not (isinstance(limit, float) and math.isinf(limit))
+
+
+def _status(ratios) -> str:
+    return QuotaStatus.WARNING if ratios and max(ratios) > WARNING_RATIO else QuotaStatus.ALLOWED
+
+
+def _conditional_add(tbl, key: dict, tokens: int, requests: int, max_tokens, max_requests,
+                     expires_at: int, prior_tokens: int = 0, prior_requests: int = 0) -> Optional[dict]:
+    """
+    ADD tokens/requests on one counter row while both stay within their limits
+    (minus what earlier buckets of the window already used). Returns the new
+    attributes, or None when the limit would be exceeded.
+    """
+    conditions = []
+    values = {":tok": _dec(tokens), ":req": _dec(requests), ":exp": expires_at}
+    for attr, limit, inc, prior, name in (
+        ("#tok", max_tokens, tokens, prior_tokens, "tok"),
+        ("#req", max_requests, requests, prior_requests, "req"),
+    ):
+        if not _finite(limit):
+            continue
+        headroom = _dec(limit) - _dec(prior) - _dec(inc)
+        if headroom < 0:
+            return None
+        values[f":{name}_headroom"] = headroom
+        conditions.append(f"(attribute_not_exists({attr}) OR {attr} <= :{name}_headroom)")
+
+    kwargs = {
+        "Key": key,
+        "UpdateExpression": "ADD #tok :tok, #req :req SET #exp = :exp",
+        "ExpressionAttributeNames": {"#tok": "tokens", "#req": "requests", "#exp": "expires_at"},
+        "ExpressionAttributeValues": values,
+        "ReturnValues": "UPDATED_NEW",
+    }
+    if conditions:
+        kwargs["ConditionExpression"] = " AND ".join(conditions)
+    try:
+        return tbl.update_item(**kwargs).get("Attributes", {})
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return None
+        raise
+
+
+def consume_daily_quota(user_id: str, plan_id: str, tokens_to_use: int, *, table=None,
+                        now: Optional[datetime] = None, requests: int = 1) -> str:
+    """
+    Counter-backed counterpart of check_quota: charges the user's daily counter
+    and answers from the update result in one call (no query over today's rows).
+    `requests` > 1 charges several calls at once (a batch's share).
+    """
+    tbl = table if table is not None else _counters_tbl
+    now = _utc(now)
+    limits = get_plan_limits(plan_id)
+    max_tokens = limits["max_tokens_per_day"]
+    max_requests = limits["max_requests_per_day"]
+
+    day = now.date()
+    expires = datetime(day.year, day.month, day.day, tzinfo=timezone.utc) + DAY_COUNTER_TTL
+    new = _conditional_add(
+        tbl,
+        {"scope": f"user#{user_id}", "window": f"{DAY_PREFIX}{day.isoformat()}"},
+        tokens_to_use, requests, max_tokens, max_requests, int(expires.timestamp()),
+    )
+    if new is None:
+        return QuotaStatus.BLOCKED
+
+    ratios = []
+    if _finite(max_tokens) and max_tokens:
+        ratios.append(_dec(new.get("tokens", 0)) / _dec(max_tokens))
+    if _finite(max_requests) and max_requests:
+        ratios.append(_dec(new.get("requests", 0)) / _dec(max_requests))
+    return _status(ratios)
+
+
+def _minute_window(ts: datetime) -> str:
+    return f"{MINUTE_PREFIX}{ts:%Y-%m-%dT%H:%M}"
+
+
+def _burst_limits(limits: dict):
+    """(window_minutes, max_tokens, max_requests), or None when the plan has no burst window."""
+    minutes = int(limits.get("window_minutes") or 0)
+    max_tokens = limits.get("max_tokens_per_window")
+    max_requests = limits.get("max_requests_per_window")
+    if minutes <= 0 or not (_finite(max_tokens) or _finite(max_requests)):
+        return None
+    return minutes, max_tokens, max_requests
+
+
+def consume_burst_quota(user_id: str, plan_id: str, tokens_to_use: int, *, table=None,
+                        now: Optional[datetime] = None, requests: int = 1) -> str:
+    """
+    Sliding-window burst limit over per-minute buckets.
+
+    Plans opt in with `window_minutes` plus `max_tokens_per_window` and/or
+    `max_requests_per_window`. The closed buckets of the window are read with
+    one BatchGetItem; the current minute is charged with a conditional ADD whose
+    headroom subtracts them. Plans without window limits are always ALLOWED.
+    """
+    burst = _burst_limits(get_plan_limits(plan_id))
+    if burst is None:
+        return QuotaStatus.ALLOWED
+    minutes, max_tokens, max_requests = burst
+
+    tbl = table if table is not None else _counters_tbl
+    now = _utc(now)
+    scope = f"user#{user_id}"
+
+    prior_tokens = prior_requests = 0
+    previous = [_minute_window(now - timedelta(minutes=i)) for i in range(1, minutes)]
+    if previous:
+        resp = tbl.meta.client.batch_get_item(RequestItems={
+            tbl.name: {"Keys": [{"scope": scope, "window": w} for w in previous], "ConsistentRead": True},
+        })
+        for item in resp.get("Responses", {}).get(tbl.name, []):
+            prior_tokens += int(item.get("tokens", 0))
+            prior_requests += int(item.get("requests", 0))
+
+    expires = now + timedelta(minutes=minutes + 1)
+    new = _conditional_add(
+        tbl, {"scope": scope, "window": _minute_window(now)},
+        tokens_to_use, requests, max_tokens, max_requests, int(expires.timestamp()),
+        prior_tokens=prior_tokens, prior_requests=prior_requests,
+    )
+    if new is None:
+        return QuotaStatus.BLOCKED
+
+    ratios = []
+    if _finite(max_tokens) and max_tokens:
+        ratios.append(_dec(prior_tokens + int(new.get("tokens", 0))) / _dec(max_tokens))
+    if _finite(max_requests) and max_requests:
+        ratios.append(_dec(prior_requests + int(new.get("requests", 0))) / _dec(max_requests))
+    return _status(ratios)
+
+
+def _refund(tbl, key: dict, tokens_to_use: int, requests: int = 1) -> None:
+    tbl.update_item(
+        Key=key,
+        UpdateExpression="ADD #tok :tok, #req :req",
+        ExpressionAttributeNames={"#tok": "tokens", "#req": "requests"},
+        ExpressionAttributeValues={":tok": -_dec(tokens_to_use), ":req": -_dec(requests)},
+    )
+
+
+def consume_quota(user_id: str, plan_id: str, tokens_to_use: int, *, table=None,
+                  now: Optional[datetime] = None, requests: int = 1) -> str:
+    """
+    Burst window first, then the daily counter. A daily refusal hands the burst
+    charge back so blocked calls don't eat into the window. Returns the stricter
+    of the two statuses.
+    """
+    tbl = table if table is not None else _counters_tbl
+    now = _utc(now)
+    burst = consume_burst_quota(user_id, plan_id, tokens_to_use, table=tbl, now=now, requests=requests)
+    if burst == QuotaStatus.BLOCKED:
+        return burst
+
+    daily = consume_daily_quota(user_id, plan_id, tokens_to_use, table=tbl, now=now, requests=requests)
+    if daily == QuotaStatus.BLOCKED:
+        if _burst_limits(get_plan_limits(plan_id)) is not None:
+            _refund(tbl, {"scope": f"user#{user_id}", "window": _minute_window(now)}, tokens_to_use, requests)
+        return daily
+    return QuotaStatus.WARNING if QuotaStatus.WARNING in (burst, daily) else QuotaStatus.ALLOWED
+
+
+def release_quota(user_id: str, plan_id: str, tokens_to_use: int, *, now: datetime, table=None,
+                  requests: int = 1) -> None:
+    """
+    Hand back an admitted consume_quota charge (same `now`), or part of a
+    batch charge, when calls are refused or deduplicated further down the line.
+    """
+    tbl = table if table is not None else _counters_tbl
+    now = _utc(now)
+    scope = f"user#{user_id}"
+    _refund(tbl, {"scope": scope, "window": f"{DAY_PREFIX}{now.date().isoformat()}"}, tokens_to_use, requests)
+    if _burst_limits(get_plan_limits(plan_id)) is not None:
+        _refund(tbl, {"scope": scope, "window": _minute_window(now)}, tokens_to_use, requests)
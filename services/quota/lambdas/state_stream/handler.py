@@ -0,0 +1,133 @@
+# services/quota/lambdas/state_stream/handler.py
+"""
+DynamoDB Streams consumer (UsageLogs, NEW_IMAGE) that keeps QuotaState current.
+
+A batch is coalesced to one token increment per (tenant, period) and applied
+with a single ADD per pair, so control-panel reads are one get_item on
+QuotaState. Plan limits come from the tenant's `plan#current` row in the
+control-panel tenants table (PK/SK) -> QuotaPlans and are cached across warm
+invocations.
+
+Delivery is at-least-once: each row's conditional marker (usage_id, else the
+stream sequence number) is written in the same transaction as the ADDs
+(enforcer.add_quota_usage_once), so a retried batch is not counted twice. A
+failing chunk is reported via `batchItemFailures`.
+"""
+
+import os
+from collections import defaultdict
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+from aws_lambda_powertools import Logger, Metrics
+from aws_lambda_powertools.metrics import MetricUnit
+
+from services.common.ttl_cache import TTLCache
+from services.quota.enforcer import add_quota_usage_once, quota_usage_chunks
+from services.usage.rollups import parse_usage_row
+
+logger = Logger(service="quota-state")
+metrics = Metrics(namespace="MerlinSigma", service="quota-state")
+
+_deser = TypeDeserializer()
+_LIMIT_CACHE = TTLCache(
+    "QuotaLimit",
+    maxsize=2048,
+    ttl=float(os.getenv("PLAN_CACHE_TTL_SECONDS", "300")),
+    negative_ttl=10,
+    metrics=metrics,
+)
+
+_DDB = None
+_TABLES = None
+
+
+def _get_tables():
+    """(QuotaState, Tenants, QuotaPlans)."""
+    global _DDB, _TABLES
+    if _TABLES is None:
+        names = [os.getenv(v) for v in ("QUOTA_STATE_TABLE_NAME", "TENANTS_TABLE_NAME", "QUOTA_PLANS_TABLE_NAME")]
+        if not all(names):
+            raise RuntimeError("QUOTA_STATE_TABLE_NAME, TENANTS_TABLE_NAME and QUOTA_PLANS_TABLE_NAME must be set")
+        if _DDB is None:
+            _DDB = boto3.resource("dynamodb")
+        _TABLES = tuple(_DDB.Table(n) for n in names)
+    return _TABLES
+
+
+def _plan_key(tenant_id) -> dict:
+    """Current-plan row of a tenant in the control-panel tenants table (see control_panel_api.put_plan)."""
+    return {"PK": f"tenant#{tenant_id}", "SK": "plan#current"}
+
+
+def _plan_limit(tenant_id, tenants_table, plans_table) -> int:
+    def load():
+        tenant = tenants_table.get_item(Key=_plan_key(tenant_id)).get("Item") or {}
+        plan_id = tenant.get("plan_id", "free-plan-dev")
+        plan = plans_table.get_item(Key={"plan_id": plan_id}).get("Item") or {}
+        return int(plan.get("quota_limit", 0))
+    return _LIMIT_CACHE.get_or_load(tenant_id, load)
+
+
+def _usage_entries(records):
+    """(sequence number, (marker id, tenant_id, "YYYY-MM", tokens)) per usage-row INSERT, in stream order."""
+    for record in records:
+        if record.get("eventName") != "INSERT":
+            continue
+        stream = record.get("dynamodb") or {}
+        image = stream.get("NewImage")
+        if not image:
+            continue
+        item = {k: _deser.deserialize(v) for k, v in image.items()}
+        row = parse_usage_row(item)
+        if row is None or not row["tenant_id"]:
+            continue
+        seq = stream.get("SequenceNumber")
+        if item.get("usage_id"):
+            marker_id = str(item["usage_id"])
+        elif seq:
+            marker_id = f"seq:{seq}"
+        else:
+            marker_id = f"key:{item.get('tenant_month')}#{item.get('timestamp')}"
+        yield seq, (marker_id, row["tenant_id"], row["ts"][:7], row["tokens"])
+
+
+def coalesce(records) -> dict:
+    """{(tenant_id, "YYYY-MM"): tokens} for the usage-row INSERTs of a stream batch."""
+    totals = defaultdict(int)
+    for _, (_, tenant_id, period, tokens) in _usage_entries(records):
+        totals[(tenant_id, period)] += tokens
+    return totals
+
+
+@logger.inject_lambda_context
+@metrics.log_metrics
+def handler(event, context):
+    state_table, tenants_table, plans_table = _get_tables()
+
+    seqs = {}
+    entries = []
+    for seq, entry in _usage_entries(event.get("Records", [])):
+        if entry[0] in seqs:
+            continue  # one transaction can't touch a marker twice
+        seqs[entry[0]] = seq
+        entries.append(entry)
+
+    caps = {tenant_id: _plan_limit(tenant_id, tenants_table, plans_table) for _, tenant_id, _, _ in entries}
+    updated = 0
+    failures = []
+    for chunk in quota_usage_chunks(entries):
+        try:
+            _, states = add_quota_usage_once(chunk, caps, table=state_table)
+        except Exception:
+            logger.exception("QuotaState chunk failed")
+            # the stream retries from the first failed record; applied rows are skipped by their markers
+            failures.append({"itemIdentifier": seqs[chunk[0][0]]})
+            break
+        updated += states
+
+    metrics.add_metric(name="QuotaStateUpdates", unit=MetricUnit.Count, value=updated)
+    if failures:
+        metrics.add_metric(name="QuotaStateChunkFailures", unit=MetricUnit.Count, value=len(failures))
+    return {"updated": updated, "batchItemFailures": failures}
@@ -3,11 +3,17 @@
 PLAN_LIMITS = {
     "plan_free": {
         "max_tokens_per_day": 1000,
-        "max_requests_per_day": 100
+        "max_requests_per_day": 100,
+        # burst control: sliding window over per-minute buckets
+        "window_minutes": 5,
+        "max_requests_per_window": 30,
     },
     "plan_pro": {
         "max_tokens_per_day": 100_000,
-        "max_requests_per_day": 5_000
+        "max_requests_per_day": 5_000,
+        "window_minutes": 5,
+        "max_tokens_per_window": 20_000,
+        "max_requests_per_window": 1_000,
     },
     "plan_enterprise": {
         "max_tokens_per_day": float("inf"),
@@ -16,5 +22,27 @@ PLAN_LIMITS = {
 }
 
 
+# plan ids as stored on tenant / QuotaPlans rows -> PLAN_LIMITS keys
+PLAN_ALIASES = {
+    "free-plan-dev": "plan_free",
+    "free": "plan_free",
+    "pro": "plan_pro",
+    "enterprise": "plan_enterprise",
+}
+
+
+class UnknownPlanError(KeyError):
+    """A plan id with no PLAN_LIMITS entry (or alias); never silently treated as free."""
+
+
+def plan_limits_key(plan_id: str) -> str:
+    if plan_id in PLAN_LIMITS:
+        return plan_id
+    try:
+        return PLAN_ALIASES[plan_id]
+    except (KeyError, TypeError):
+        raise UnknownPlanError(plan_id) from None
+
+
 def get_plan_limits(plan_id: str) -> dict:
-    return PLAN_LIMITS.get(plan_id, PLAN_LIMITS["plan_free"])
+    return PLAN_LIMITS[plan_limits_key(plan_id)]
@@ -0,0 +1,86 @@
+# services/quota/tests/test_bulk.py
+import time
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from services.quota import bulk
+from services.quota.enforcer import QuotaStatus
+
+
+def test_evaluate_bulk_matches_check_quota_rule():
+    res = bulk.evaluate_bulk(
+        ["a", "b", "c", "d", "e"],
+        limits=[100, 100, 100, 0, float("inf")],
+        used=[10, 75, 95, 0, 10 ** 9],
+        tokens=[5, 10, 10, 1, 1],
+        use_numpy=False,
+    )
+
+    assert res.status_names() == [
+        QuotaStatus.ALLOWED, QuotaStatus.WARNING, QuotaStatus.BLOCKED, QuotaStatus.BLOCKED, QuotaStatus.ALLOWED,
+    ]
+    assert list(res.remaining[:3]) == [85, 15, -5]
+    assert res.to_records()[1] == {"tenant_id": "b", "status": "warning", "ratio": 0.85, "remaining": 15.0}
+
+
+def test_numpy_and_python_paths_agree():
+    pytest.importorskip("numpy")
+    n = 50_000
+    ids = [f"t{i}" for i in range(n)]
+    limits = [1000 + (i % 7) * 100 for i in range(n)]
+    used = [(i * 37) % 1800 for i in range(n)]
+    tokens = [i % 50 for i in range(n)]
+
+    started = time.perf_counter()
+    fast = bulk.evaluate_bulk(ids, limits, used, tokens, use_numpy=True)
+    assert time.perf_counter() - started < 1.0
+
+    slow = bulk.evaluate_bulk(ids, limits, used, tokens, use_numpy=False)
+    assert fast.status.tolist() == slow.status
+    assert fast.remaining.tolist() == slow.remaining
+
+
+def test_mismatched_lengths_are_rejected():
+    with pytest.raises(ValueError):
+        bulk.evaluate_bulk(["a", "b"], [1], [0, 0])
+
+
+def _table(ddb, name, *keys):
+    return ddb.create_table(
+        TableName=name,
+        KeySchema=[{"AttributeName": k, "KeyType": kt} for k, kt in zip(keys, ("HASH", "RANGE"))],
+        AttributeDefinitions=[{"AttributeName": k, "AttributeType": "S"} for k in keys],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+def test_loader_batches_tenants_plans_and_counters():
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        tenants = _table(ddb, "Tenants", "tenant_id")
+        plans = _table(ddb, "QuotaPlans", "plan_id")
+        usage = _table(ddb, "UsageLogs", "tenant_month", "timestamp")
+
+        plans.put_item(Item={"plan_id": "pro", "quota_limit": 1000})
+        plans.put_item(Item={"plan_id": "hot", "quota_limit": 5000, "counter_shards": 2})
+        with tenants.batch_writer() as tw, usage.batch_writer() as uw:
+            for i in range(250):  # > 100 keys: several BatchGetItem chunks
+                tw.put_item(Item={"tenant_id": f"t{i:03d}", "plan_id": "pro"})
+                uw.put_item(Item={"tenant_month": f"t{i:03d}#2025-08", "timestamp": "AGG", "token_total": i * 4})
+        tenants.put_item(Item={"tenant_id": "big", "plan_id": "hot"})
+        for i, total in enumerate((1000, 3000)):
+            usage.put_item(Item={"tenant_month": f"big#2025-08#S{i}", "timestamp": "AGG", "token_total": total})
+
+        ids = [f"t{i:03d}" for i in range(250)] + ["big", "ghost"]
+        inputs = bulk.load_bulk_inputs(ids, "2025-08", tenants_table=tenants, plans_table=plans, usage_table=usage)
+        res = bulk.evaluate_bulk(inputs["tenant_ids"], inputs["limits"], inputs["used"], use_numpy=False)
+
+    assert inputs["used"][:3] == [0, 4, 8]
+    assert inputs["used"][-2:] == [4000, 0]
+    assert inputs["limits"][-2:] == [5000, 0]  # "ghost" -> default plan, which has no row
+    statuses = dict(zip(ids, res.status_names()))
+    assert statuses["t010"] == QuotaStatus.ALLOWED
+    assert statuses["t249"] == QuotaStatus.WARNING  # 996 / 1000
+    assert statuses["big"] == QuotaStatus.ALLOWED
@@ -0,0 +1,115 @@
+# services/quota/tests/test_counter_enforcer.py
+from datetime import datetime, timedelta, timezone
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from services.quota import enforcer
+from services.quota.enforcer import QuotaStatus
+
+NOON = datetime(2025, 8, 16, 12, 0, 30, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def counters_table():
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        yield ddb.create_table(
+            TableName="QuotaCounters",
+            KeySchema=[
+                {"AttributeName": "scope", "KeyType": "HASH"},
+                {"AttributeName": "window", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "scope", "AttributeType": "S"},
+                {"AttributeName": "window", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    plan = {"max_tokens_per_day": 100, "max_requests_per_day": 10}
+    monkeypatch.setattr(enforcer, "get_plan_limits", lambda plan_id: plan)
+    return plan
+
+
+def test_daily_counter_allows_warns_then_blocks_without_charging(counters_table, limits):
+    statuses = [
+        enforcer.consume_daily_quota("u1", "pro", 30, table=counters_table, now=NOON)
+        for _ in range(4)
+    ]
+
+    assert statuses == [QuotaStatus.ALLOWED, QuotaStatus.ALLOWED, QuotaStatus.WARNING, QuotaStatus.BLOCKED]
+    row = counters_table.get_item(Key={"scope": "user#u1", "window": "D#2025-08-16"})["Item"]
+    assert row["tokens"] == 90 and row["requests"] == 3
+    # a new day starts a new counter
+    assert enforcer.consume_daily_quota("u1", "pro", 30, table=counters_table,
+                                        now=NOON + timedelta(days=1)) == QuotaStatus.ALLOWED
+
+
+def test_infinite_plan_limits_are_not_conditioned(counters_table, monkeypatch):
+    monkeypatch.setattr(enforcer, "get_plan_limits", lambda plan_id: {
+        "max_tokens_per_day": float("inf"), "max_requests_per_day": float("inf"),
+    })
+    assert enforcer.consume_quota("u1", "plan_enterprise", 10 ** 9, table=counters_table, now=NOON) \
+        == QuotaStatus.ALLOWED
+
+
+def test_sliding_window_counts_previous_minutes(counters_table, limits):
+    limits.update({"window_minutes": 3, "max_requests_per_window": 4})
+
+    def burst(now):
+        return enforcer.consume_burst_quota("u1", "pro", 1, table=counters_table, now=now)
+
+    assert [burst(NOON), burst(NOON), burst(NOON + timedelta(minutes=1))] == [QuotaStatus.ALLOWED] * 3
+    assert burst(NOON + timedelta(minutes=2)) == QuotaStatus.WARNING
+    assert burst(NOON + timedelta(minutes=2)) == QuotaStatus.BLOCKED
+    # NOON's two requests slide out of the window
+    assert burst(NOON + timedelta(minutes=3)) != QuotaStatus.BLOCKED
+
+
+def test_daily_refusal_hands_the_burst_charge_back(counters_table, limits):
+    limits.update({"max_tokens_per_day": 50, "window_minutes": 5, "max_tokens_per_window": 1000})
+
+    assert enforcer.consume_quota("u1", "pro", 45, table=counters_table, now=NOON) == QuotaStatus.WARNING
+    assert enforcer.consume_quota("u1", "pro", 45, table=counters_table, now=NOON) == QuotaStatus.BLOCKED
+
+    minute = counters_table.get_item(Key={"scope": "user#u1", "window": "M#2025-08-16T12:00"})["Item"]
+    assert minute["tokens"] == 45 and minute["requests"] == 1
+
+
+def test_naive_and_offset_times_are_counted_in_utc(counters_table, limits):
+    naive = NOON.replace(tzinfo=None)
+    plus_two = (NOON + timedelta(hours=11)).astimezone(timezone(timedelta(hours=2)))  # 01:00 next day local
+
+    enforcer.consume_daily_quota("u1", "pro", 10, table=counters_table, now=naive)
+    enforcer.consume_daily_quota("u1", "pro", 10, table=counters_table, now=plus_two)
+
+    row = counters_table.get_item(Key={"scope": "user#u1", "window": "D#2025-08-16"})["Item"]
+    assert row["tokens"] == 20
+    midnight = datetime(2025, 8, 16, tzinfo=timezone.utc)
+    assert row["expires_at"] == int((midnight + enforcer.DAY_COUNTER_TTL).timestamp())
+
+
+def test_release_hands_back_an_admitted_charge(counters_table, limits):
+    limits.update({"window_minutes": 5, "max_tokens_per_window": 1000})
+
+    assert enforcer.consume_quota("u1", "pro", 40, table=counters_table, now=NOON) == QuotaStatus.ALLOWED
+    enforcer.release_quota("u1", "pro", 40, table=counters_table, now=NOON)
+
+    for window in ("D#2025-08-16", "M#2025-08-16T12:00"):
+        row = counters_table.get_item(Key={"scope": "user#u1", "window": window})["Item"]
+        assert row["tokens"] == 0 and row["requests"] == 0
+
+
+def test_plan_ids_map_to_limit_keys():
+    from services.quota.plans_limits import PLAN_LIMITS, UnknownPlanError, get_plan_limits
+
+    assert get_plan_limits("pro") is PLAN_LIMITS["plan_pro"]
+    assert get_plan_limits("free-plan-dev") is PLAN_LIMITS["plan_free"]
+    assert get_plan_limits("plan_enterprise") is PLAN_LIMITS["plan_enterprise"]
+    with pytest.raises(UnknownPlanError):
+        get_plan_limits("gold")
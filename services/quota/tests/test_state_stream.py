@@ -0,0 +1,127 @@
+# services/quota/tests/test_state_stream.py
+import types
+from decimal import Decimal
+
+import boto3
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from moto import mock_aws
+
+from services.quota.lambdas.state_stream import handler as mod
+
+_ser = TypeSerializer()
+
+
+def _insert(row, name="INSERT", seq=None):
+    stream = {"NewImage": {k: _ser.serialize(v) for k, v in row.items()}}
+    if seq is not None:
+        stream["SequenceNumber"] = seq
+    return {"eventName": name, "dynamodb": stream}
+
+
+@pytest.fixture
+def lambda_ctx():
+    return types.SimpleNamespace(
+        function_name="test-func",
+        aws_request_id="req-123",
+        memory_limit_in_mb=128,
+        invoked_function_arn="arn:aws:lambda:local:test",
+    )
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        state = ddb.create_table(
+            TableName="QuotaState",
+            KeySchema=[
+                {"AttributeName": "tenant_id", "KeyType": "HASH"},
+                {"AttributeName": "period", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_id", "AttributeType": "S"},
+                {"AttributeName": "period", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        # same schema as the control-panel MerlinSigmaTenants table the stack points at
+        tenants = ddb.create_table(
+            TableName="MerlinSigmaTenants",
+            KeySchema=[
+                {"AttributeName": "PK", "KeyType": "HASH"},
+                {"AttributeName": "SK", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "PK", "AttributeType": "S"},
+                {"AttributeName": "SK", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        plans = ddb.create_table(
+            TableName="QuotaPlans",
+            KeySchema=[{"AttributeName": "plan_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "plan_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants.put_item(Item={"PK": "tenant#t1", "SK": "plan#current", "tenant_id": "t1", "plan_id": "pro"})
+        plans.put_item(Item={"plan_id": "pro", "quota_limit": 200})
+
+        monkeypatch.setattr(mod, "_get_tables", lambda: (state, tenants, plans))
+        yield state
+
+
+def test_coalesces_a_batch_into_one_update_per_tenant_period(tables, lambda_ctx):
+    rows = [
+        {"tenant_id": "t1", "timestamp": "2025-08-25T10:00:00Z", "token_count": 30},
+        {"tenant_id": "t1", "timestamp": "2025-08-25T10:00:01Z", "token_count": 20},
+        {"tenant_id": "t1", "timestamp": "2025-09-01T00:00:00Z", "token_count": 5},
+        {"tenant_month": "t1#2025-08", "timestamp": "AGG", "token_total": 50},
+    ]
+    event = {"Records": [_insert(r) for r in rows] + [_insert(rows[0], "MODIFY")]}
+
+    assert mod.coalesce(event["Records"]) == {("t1", "2025-08"): 50, ("t1", "2025-09"): 5}
+    assert mod.handler(event, lambda_ctx) == {"updated": 2, "batchItemFailures": []}
+
+    aug = tables.get_item(Key={"tenant_id": "t1", "period": "2025-08"})["Item"]
+    assert aug["used"] == 50
+    assert aug["limit"] == 200
+    assert aug["remaining"] == 150
+    assert aug["used_pct"] == Decimal("25")
+
+
+def test_successive_batches_accumulate(tables, lambda_ctx):
+    for ts, tokens in (("2025-08-25T10:00:00Z", 60), ("2025-08-25T11:00:00Z", 100)):
+        mod.handler({"Records": [_insert({"tenant_id": "t1", "timestamp": ts, "token_count": tokens})]}, lambda_ctx)
+
+    state = tables.get_item(Key={"tenant_id": "t1", "period": "2025-08"})["Item"]
+    assert state["used"] == 160
+    assert state["remaining"] == 40
+    assert state["used_pct"] == Decimal("80")
+
+
+def test_redelivered_rows_are_counted_once(tables, lambda_ctx):
+    rows = [
+        {"tenant_id": "t1", "timestamp": "2025-08-25T10:00:00Z", "token_count": 30, "usage_id": "a"},
+        {"tenant_id": "t1", "timestamp": "2025-08-25T10:00:01Z", "token_count": 20, "usage_id": "b"},
+    ]
+    mod.handler({"Records": [_insert(rows[0], seq="1")]}, lambda_ctx)
+    # the retried batch replays row "a" before the new row
+    resp = mod.handler({"Records": [_insert(r, seq=str(i + 1)) for i, r in enumerate(rows)]}, lambda_ctx)
+
+    assert resp == {"updated": 1, "batchItemFailures": []}
+    state = tables.get_item(Key={"tenant_id": "t1", "period": "2025-08"})["Item"]
+    assert state["used"] == 50
+    assert state["used_pct"] == Decimal("25")
+
+
+def test_failed_chunk_is_reported_by_sequence_number(tables, lambda_ctx, monkeypatch):
+    def boom(chunk, caps, table=None):
+        raise RuntimeError("throttled")
+
+    monkeypatch.setattr(mod, "add_quota_usage_once", boom)
+    row = {"tenant_id": "t1", "timestamp": "2025-08-25T10:00:00Z", "token_count": 30}
+
+    resp = mod.handler({"Records": [_insert(row, seq="42")]}, lambda_ctx)
+
+    assert resp == {"updated": 0, "batchItemFailures": [{"itemIdentifier": "42"}]}
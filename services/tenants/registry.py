@@ -0,0 +1,164 @@
+# services/tenants/registry.py
+"""
+Tenant registry rows for the control-panel tenants table (PK "tenant#<id>", SK "registry").
+
+Registry rows are the only items carrying `entity_type`, so the two GSIs keyed
+on it are sparse and hold exactly one entry per tenant:
+
+  TenantRegistryById       PK entity_type, SK tenant_id   (prefix search)
+  TenantRegistryByCreated  PK entity_type, SK created_at  (newest / oldest first)
+
+Listing tenants is then a Query whose cost and latency follow the page size,
+instead of a filtered Scan over every profile / plan / quota row.
+"""
+
+import base64
+import json
+from datetime import datetime, timezone
+
+from boto3.dynamodb.conditions import Attr, Key
+
+ENTITY_TYPE = "tenant"
+REGISTRY_SK = "registry"
+BY_ID_INDEX = "TenantRegistryById"
+BY_CREATED_INDEX = "TenantRegistryByCreated"
+SORT_INDEXES = {"tenant_id": BY_ID_INDEX, "created_at": BY_CREATED_INDEX}
+
+
+def encode_cursor(lek: dict) -> str:
+    raw = json.dumps(lek, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("utf-8")
+
+
+def decode_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode("utf-8")).decode("utf-8")
+        return json.loads(raw)
+    except Exception:
+        return None
+
+
+def check_cursor(cursor, *, sort: str = "tenant_id", prefix: str = None) -> dict:
+    """
+    A decoded client cursor, validated as an ExclusiveStartKey of the `sort`
+    index: exactly the table key (PK, SK) plus that GSI's key (entity_type and
+    the sort attribute), all strings, on a registry row (and inside `prefix`).
+    Raises ValueError otherwise, so a forged or stale cursor is a 400 rather
+    than a DynamoDB ValidationException.
+    """
+    if sort not in SORT_INDEXES:
+        raise ValueError(f"sort must be one of {sorted(SORT_INDEXES)}")
+    expected = {"PK", "SK", "entity_type", sort}
+    if (
+        not isinstance(cursor, dict)
+        or set(cursor) != expected
+        or not all(isinstance(v, str) for v in cursor.values())
+        or cursor["entity_type"] != ENTITY_TYPE
+        or cursor["SK"] != REGISTRY_SK
+        or not cursor["PK"].startswith("tenant#")
+        or (sort == "tenant_id" and cursor["PK"] != f"tenant#{cursor['tenant_id']}")
+        or (prefix and not cursor.get("tenant_id", "").startswith(prefix))
+    ):
+        raise ValueError(f"cursor does not belong to this listing (sort={sort})")
+    return cursor
+
+
+def registry_item(tenant_id: str, created_at: str = None, **attrs) -> dict:
+    item = {
+        "PK": f"tenant#{tenant_id}",
+        "SK": REGISTRY_SK,
+        "entity_type": ENTITY_TYPE,
+        "tenant_id": tenant_id,
+        "created_at": created_at or datetime.now(timezone.utc).isoformat(),
+    }
+    item.update(attrs)
+    return item
+
+
+def register_tenant(table, tenant_id: str, created_at: str = None, **attrs) -> bool:
+    """Write the registry row once; returns False if the tenant is already registered."""
+    try:
+        table.put_item(
+            Item=registry_item(tenant_id, created_at, **attrs),
+            ConditionExpression=Attr("PK").not_exists(),
+        )
+        return True
+    except table.meta.client.exceptions.ConditionalCheckFailedException:
+        return False
+
+
+def backfill_registry(table, *, created_at: str = None) -> int:
+    """
+    Register every tenant found by scanning its existing rows (one-off
+    migration). Tenants already registered are left alone; returns the number
+    of rows written.
+    """
+    tenant_ids = set()
+    kwargs = {
+        "ProjectionExpression": "PK",
+        "FilterExpression": Attr("PK").begins_with("tenant#"),
+    }
+    while True:
+        resp = table.scan(**kwargs)
+        tenant_ids.update(it["PK"].split("#", 1)[1] for it in resp.get("Items", []))
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            break
+        kwargs["ExclusiveStartKey"] = lek
+    return sum(register_tenant(table, t, created_at) for t in sorted(tenant_ids))
+
+
+def iter_tenant_ids(table, *, page_size: int = 1000):
+    """Every registered tenant_id in ascending order (paged Query on TenantRegistryById)."""
+    kwargs = {
+        "IndexName": BY_ID_INDEX,
+        "KeyConditionExpression": Key("entity_type").eq(ENTITY_TYPE),
+        "ProjectionExpression": "tenant_id",
+        "Limit": page_size,
+    }
+    while True:
+        resp = table.query(**kwargs)
+        for it in resp.get("Items", []):
+            yield it["tenant_id"]
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            return
+        kwargs["ExclusiveStartKey"] = lek
+
+
+def query_tenants(table, *, limit: int, cursor: dict = None, prefix: str = None,
+                  sort: str = "tenant_id", descending: bool = False) -> dict:
+    """
+    One page of registry rows from the matching GSI.
+
+    Returns {"tenants": [...], "count", "next_cursor"?}. Pages are exactly
+    `limit` rows except the last. `prefix` requires sort="tenant_id".
+    """
+    if sort not in SORT_INDEXES:
+        raise ValueError(f"sort must be one of {sorted(SORT_INDEXES)}")
+    if prefix and sort != "tenant_id":
+        raise ValueError("prefix search requires sort=tenant_id")
+
+    condition = Key("entity_type").eq(ENTITY_TYPE)
+    if prefix:
+        condition = condition & Key("tenant_id").begins_with(prefix)
+
+    kwargs = {
+        "IndexName": SORT_INDEXES[sort],
+        "KeyConditionExpression": condition,
+        "ScanIndexForward": not descending,
+        "Limit": limit,
+    }
+    if cursor:
+        kwargs["ExclusiveStartKey"] = check_cursor(cursor, sort=sort, prefix=prefix)
+
+    resp = table.query(**kwargs)
+    tenants = [
+        {k: v for k, v in it.items() if k not in ("PK", "SK", "entity_type")}
+        for it in resp.get("Items", [])
+    ]
+    body = {"tenants": tenants, "count": len(tenants)}
+    lek = resp.get("LastEvaluatedKey")
+    if lek:
+        body["next_cursor"] = encode_cursor(lek)
+    return body
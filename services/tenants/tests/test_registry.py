@@ -0,0 +1,156 @@
+# services/tenants/tests/test_registry.py
+import json
+from types import SimpleNamespace
+
+import boto3
+import pytest
+from moto import mock_aws
+
+from control_panel_api import list_tenants
+from services.tenants import registry
+
+
+def _gsi(name, sort_key):
+    return {
+        "IndexName": name,
+        "KeySchema": [
+            {"AttributeName": "entity_type", "KeyType": "HASH"},
+            {"AttributeName": sort_key, "KeyType": "RANGE"},
+        ],
+        "Projection": {"ProjectionType": "ALL"},
+    }
+
+
+@pytest.fixture
+def tenants():
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName="Tenants",
+            KeySchema=[{"AttributeName": "PK", "KeyType": "HASH"}, {"AttributeName": "SK", "KeyType": "RANGE"}],
+            AttributeDefinitions=[
+                {"AttributeName": a, "AttributeType": "S"}
+                for a in ("PK", "SK", "entity_type", "tenant_id", "created_at")
+            ],
+            GlobalSecondaryIndexes=[
+                _gsi(registry.BY_ID_INDEX, "tenant_id"),
+                _gsi(registry.BY_CREATED_INDEX, "created_at"),
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        with table.batch_writer() as bw:
+            for i in range(12):
+                for sk in ("profile#v1", "quota#v1", "plan#current"):
+                    bw.put_item(Item={"PK": f"tenant#{'acme' if i < 4 else 'beta'}-{i:02d}", "SK": sk})
+            bw.put_item(Item={"PK": "config#global", "SK": "v1"})
+        yield ddb, table
+
+
+def test_backfill_is_idempotent_and_sparse(tenants):
+    _, table = tenants
+    assert registry.backfill_registry(table, created_at="2025-01-01T00:00:00+00:00") == 12
+    assert registry.backfill_registry(table) == 0
+    assert registry.register_tenant(table, "gamma-99", created_at="2025-06-01T00:00:00+00:00") is True
+
+    page = registry.query_tenants(table, limit=50)
+    assert page["count"] == 13
+    assert page["tenants"][0] == {"tenant_id": "acme-00", "created_at": "2025-01-01T00:00:00+00:00"}
+
+
+def test_query_pages_are_exact_and_support_prefix_and_created_sort(tenants):
+    _, table = tenants
+    for i in range(12):
+        tid = f"{'acme' if i < 4 else 'beta'}-{i:02d}"
+        registry.register_tenant(table, tid, created_at=f"2025-01-{i + 1:02d}T00:00:00+00:00")
+
+    seen, cursor = [], None
+    while True:
+        page = registry.query_tenants(table, limit=5, cursor=cursor)
+        seen.append(page["count"])
+        if "next_cursor" not in page:
+            break
+        cursor = registry.decode_cursor(page["next_cursor"])
+    assert seen[:2] == [5, 5] and sum(seen) == 12
+
+    acme = registry.query_tenants(table, limit=10, prefix="acme")
+    assert [t["tenant_id"] for t in acme["tenants"]] == ["acme-00", "acme-01", "acme-02", "acme-03"]
+
+    newest = registry.query_tenants(table, limit=2, sort="created_at", descending=True)
+    assert [t["tenant_id"] for t in newest["tenants"]] == ["beta-11", "beta-10"]
+
+    with pytest.raises(ValueError):
+        registry.query_tenants(table, limit=2, sort="created_at", prefix="acme")
+
+
+def test_list_tenants_handler_uses_registry(tenants, monkeypatch):
+    ddb, table = tenants
+    registry.backfill_registry(table, created_at="2025-01-01T00:00:00+00:00")
+    monkeypatch.setattr(list_tenants, "boto3", SimpleNamespace(resource=lambda *_: ddb))
+    monkeypatch.setenv("TABLE_NAME", "Tenants")
+    monkeypatch.setenv("TENANT_REGISTRY_ENABLED", "true")
+
+    event = {"queryStringParameters": {"limit": "3", "prefix": "beta"}}
+    body = json.loads(list_tenants.handler(event, SimpleNamespace())["body"])
+    assert [t["tenant_id"] for t in body["tenants"]] == ["beta-04", "beta-05", "beta-06"]
+    assert body["count"] == 3 and "next_cursor" in body
+
+    event["queryStringParameters"]["cursor"] = body["next_cursor"]
+    body = json.loads(list_tenants.handler(event, SimpleNamespace())["body"])
+    assert [t["tenant_id"] for t in body["tenants"]] == ["beta-07", "beta-08", "beta-09"]
+
+    bad = list_tenants.handler({"queryStringParameters": {"sort": "name"}}, SimpleNamespace())
+    assert bad["statusCode"] == 400
+
+
+def test_registry_cursor_must_match_the_index_key_schema(tenants, monkeypatch):
+    ddb, table = tenants
+    registry.backfill_registry(table, created_at="2025-01-01T00:00:00+00:00")
+    monkeypatch.setattr(list_tenants, "boto3", SimpleNamespace(resource=lambda *_: ddb))
+    monkeypatch.setenv("TABLE_NAME", "Tenants")
+    monkeypatch.setenv("TENANT_REGISTRY_ENABLED", "true")
+
+    page = registry.query_tenants(table, limit=2)
+    by_id = registry.decode_cursor(page["next_cursor"])
+    assert set(by_id) == {"PK", "SK", "entity_type", "tenant_id"}
+
+    forged = [
+        {"PK": "tenant#acme-00", "SK": "profile#v1"},                        # base-table key only
+        {**by_id, "entity_type": "plan"},
+        {**by_id, "tenant_id": 7},
+        {**by_id, "extra": "x"},
+        {**by_id, "tenant_id": "zzz"},                                      # PK / tenant_id disagree
+    ]
+    for cursor in forged:
+        with pytest.raises(ValueError):
+            registry.query_tenants(table, limit=2, cursor=cursor)
+        event = {"queryStringParameters": {"cursor": registry.encode_cursor(cursor)}}
+        assert list_tenants.handler(event, SimpleNamespace())["statusCode"] == 400
+
+    # a tenant_id cursor replayed against the created_at index, or outside the prefix
+    for params in ({"sort": "created_at"}, {"prefix": "beta"}):
+        event = {"queryStringParameters": {**params, "cursor": page["next_cursor"]}}
+        assert list_tenants.handler(event, SimpleNamespace())["statusCode"] == 400
+    assert list_tenants.handler({"queryStringParameters": {"cursor": "%%%"}}, SimpleNamespace())["statusCode"] == 400
+
+
+def test_put_plan_registers_the_tenant(tenants, monkeypatch):
+    from control_panel_api import put_plan
+
+    ddb, table = tenants
+    plans = ddb.create_table(
+        TableName="Plans",
+        KeySchema=[{"AttributeName": "plan_id", "KeyType": "HASH"}],
+        AttributeDefinitions=[{"AttributeName": "plan_id", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    plans.put_item(Item={"plan_id": "plan_pro"})
+    monkeypatch.setattr(put_plan, "boto3", SimpleNamespace(resource=lambda *_: ddb))
+    monkeypatch.setenv("TENANTS_TABLE", "Tenants")
+    monkeypatch.setenv("PLANS_TABLE", "Plans")
+    monkeypatch.delenv("TENANT_REGISTRY_ENABLED", raising=False)  # registering doesn't wait for the read flag
+
+    event = {"pathParameters": {"tenantId": "acme-01"}, "body": json.dumps({"plan_id": "plan_pro"})}
+    assert put_plan.handler(event, SimpleNamespace())["statusCode"] == 200
+    assert put_plan.handler(event, SimpleNamespace())["statusCode"] == 200  # already registered
+
+    assert list(registry.iter_tenant_ids(table)) == ["acme-01"]
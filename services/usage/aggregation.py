@@ -1,11 +1,12 @@
 # services/usage/aggregation.py
 
 import os
-from decimal import Decimal
-from typing import Optional, List
+from typing import Optional
 from boto3.resources.base import ServiceResource
 from boto3.dynamodb.conditions import Key
+from services.usage.engine import UsageAggregator
 from services.usage.models import UsageSummary
+from services.usage.rollups import day_totals, get_rollups_table, user_scope, valid_since
 
 DEFAULT_USAGE_TABLE_NAME = "UsageLogs"
 
@@ -17,20 +18,38 @@ def aggregate_usage_for_user(user_id: str, date_str: str, dynamodb: Optional[Ser
         import boto3
         dynamodb = boto3.resource("dynamodb")
 
+    # Daily rollup bucket: one get_item instead of every row of the day (days the buckets cover)
+    rollups = get_rollups_table(dynamodb)
+    since = valid_since(rollups) if rollups is not None else None
+    if since is not None and len(date_str) == 10 and f"{since:%Y-%m-%d}" <= date_str:
+        totals = day_totals(rollups, user_scope(user_id), date_str)
+        return UsageSummary(
+            user_id=user_id,
+            date=date_str,
+            tokens_used=totals["tokens"],
+            requests=totals["requests"],
+            cost_usd=totals["cost_usd"],
+        )
+
     table = dynamodb.Table(get_usage_table_name())
-    resp = table.query(
-        IndexName="user_id-index",
-        KeyConditionExpression=Key("user_id").eq(user_id) & Key("timestamp").begins_with(date_str),
-    )
-    items: List[dict] = resp.get("Items", [])
-    total_tokens = sum(int(it.get("tokens_used", 0)) for it in items)
-    total_requests = len(items)
-    total_cost = sum(Decimal(str(it.get("cost_usd", "0.00"))) for it in items)
+    kwargs = {
+        "IndexName": "user_id-index",
+        "KeyConditionExpression": Key("user_id").eq(user_id) & Key("timestamp").begins_with(date_str),
+    }
+    # each page is reduced as it arrives; no per-row dicts or models are kept
+    agg = UsageAggregator()
+    while True:
+        resp = table.query(**kwargs)
+        agg.add_items(resp.get("Items", []))
+        if not resp.get("LastEvaluatedKey"):
+            break
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    totals = agg.totals()
 
     return UsageSummary(
         user_id=user_id,
         date=date_str,
-        tokens_used=total_tokens,
-        requests=total_requests,
-        cost_usd=total_cost,
+        tokens_used=totals["tokens"],
+        requests=totals["requests"],
+        cost_usd=totals["cost_usd"],
     )
@@ -0,0 +1,306 @@
+# services/usage/columnar.py
+"""
+Compact usage rows for bulk paths (aggregation jobs, backfills).
+
+`UsageRecord` validates and serializes every field, which is right for one API
+call and far too heavy for hundreds of thousands of rows. `UsageRow` is a
+plain `__slots__` record and `UsageBatch` holds rows column-wise in typed
+arrays; both are built straight from DynamoDB items (log_usage or crud shape;
+AGG / IDEMP# marker rows are skipped) without per-row validation, and convert
+to / from `UsageRecord` on demand. UsageAggregator (engine.py) reads grouped
+query pages into a `UsageBatch` to reduce them with NumPy.
+
+Columns: tokens, duration_ms and timestamps (epoch microseconds) are int64
+arrays, success a byte array, cost_usd int64 micro-dollars (exact to $0.000001,
+finer amounts are rounded half-even and counted in `rounded_costs`). Timestamps
+may be any ISO-8601 date or datetime; a date alone is midnight UTC, and one
+that does not parse raises ValueError. Label strings (tenant / user / plan /
+endpoint) are interned, so repeated values are stored once.
+"""
+
+import sys
+from array import array
+from datetime import datetime, timedelta
+from decimal import ROUND_HALF_EVEN, Decimal
+from typing import Iterable, Iterator, Optional, Tuple
+
+from services.common.time_utils import UTC, to_iso_z
+from services.usage.counters import AGG_SK, IDEMP_PREFIX
+from services.usage.models import UsageRecord
+
+COST_SCALE = 10 ** 6  # cost_usd column unit: micro-dollars
+_CENT = Decimal("0.01")
+_MICRO = Decimal("0.000001")
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+_US = timedelta(microseconds=1)
+
+
+def _dt_us(dt: datetime) -> int:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=UTC)
+    return (dt - _EPOCH) // _US
+
+
+def is_marker_ts(ts) -> bool:
+    """True for the sort keys of the AGG counter and IDEMP# rows that share UsageLogs partitions."""
+    return ts.__class__ is str and (ts == AGG_SK or ts.startswith(IDEMP_PREFIX))
+
+
+def epoch_us(ts: str) -> Optional[int]:
+    """Microseconds since the epoch for an ISO-8601 date or datetime (naive = UTC); None if it isn't one."""
+    if not isinstance(ts, str) or not ts[:4].isdigit():
+        return None
+    try:
+        dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return _dt_us(dt)
+
+
+def usage_ts_us(ts) -> int:
+    """Epoch microseconds of a usage row's timestamp (0 when absent); ValueError if it doesn't parse."""
+    if ts is None:
+        return 0
+    us = epoch_us(ts)
+    if us is None:
+        raise ValueError(f"malformed usage timestamp: {ts!r}")
+    return us
+
+
+def _item_ts(item: dict) -> Optional[int]:
+    """Row timestamp in epoch microseconds: 0 when absent (projected away), None for marker rows."""
+    ts = item.get("timestamp")
+    return None if is_marker_ts(ts) else usage_ts_us(ts)
+
+
+def iso_from_us(us: int) -> str:
+    return to_iso_z(_EPOCH + timedelta(microseconds=us), timespec="microseconds" if us % 1_000_000 else "seconds")
+
+
+def _micros(value) -> Tuple[int, bool]:
+    """(cost in micro-dollars, whether that was exact)."""
+    if value is None or value == "":
+        return 0, True
+    d = (value if isinstance(value, Decimal) else Decimal(str(value))).scaleb(6)
+    micros = d.to_integral_value(ROUND_HALF_EVEN)
+    return int(micros), micros == d
+
+
+def cost_micros(value) -> int:
+    return _micros(value)[0]
+
+
+def usd(micros: int) -> Decimal:
+    """Micro-dollars as a Decimal: cents when exact ("1.20"), else micro-dollars ("0.000150")."""
+    return Decimal(micros).scaleb(-6).quantize(_CENT if micros % 10_000 == 0 else _MICRO)
+
+
+def _label(value) -> Optional[str]:
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class UsageRow:
+    """One usage row, unvalidated. `ts_us` / `cost_micros` use the batch units."""
+
+    __slots__ = ("usage_id", "tenant_id", "user_id", "plan_id", "endpoint",
+                 "tokens", "duration_ms", "success", "ts_us", "cost_micros")
+
+    def __init__(self, usage_id, tenant_id, user_id, plan_id, endpoint,
+                 tokens, duration_ms, success, ts_us, cost_micros):
+        self.usage_id = usage_id
+        self.tenant_id = tenant_id
+        self.user_id = user_id
+        self.plan_id = plan_id
+        self.endpoint = endpoint
+        self.tokens = tokens
+        self.duration_ms = duration_ms
+        self.success = success
+        self.ts_us = ts_us
+        self.cost_micros = cost_micros
+
+    def __repr__(self):
+        return f"UsageRow({', '.join(f'{s}={getattr(self, s)!r}' for s in self.__slots__)})"
+
+    def __eq__(self, other):
+        if not isinstance(other, UsageRow):
+            return NotImplemented
+        return all(getattr(self, s) == getattr(other, s) for s in self.__slots__)
+
+    @property
+    def timestamp(self) -> str:
+        return iso_from_us(self.ts_us)
+
+    @property
+    def cost_usd(self) -> Decimal:
+        return usd(self.cost_micros)
+
+    @classmethod
+    def from_item(cls, item: dict) -> Optional["UsageRow"]:
+        """Row for a UsageLogs item; None for non-usage items (AGG / IDEMP# markers)."""
+        ts = _item_ts(item)
+        if ts is None:
+            return None
+        return cls(
+            item.get("usage_id"),
+            _label(item.get("tenant_id")),
+            _label(item.get("user_id")),
+            _label(item.get("plan_id")),
+            _label(item.get("endpoint")),
+            int(item.get("token_count", item.get("tokens_used", 0)) or 0),
+            int(item.get("duration_ms", 0) or 0),
+            bool(item.get("success", True)),
+            ts,
+            cost_micros(item.get("cost_usd")),
+        )
+
+    @classmethod
+    def from_record(cls, record: UsageRecord, tenant_id: Optional[str] = None) -> "UsageRow":
+        return cls(
+            record.usage_id,
+            _label(tenant_id),
+            _label(record.user_id),
+            _label(record.plan_id),
+            _label(record.endpoint),
+            record.tokens_used,
+            record.duration_ms,
+            record.success,
+            _dt_us(record.timestamp),
+            cost_micros(record.cost_usd),
+        )
+
+    def to_record(self) -> UsageRecord:
+        """Validated UsageRecord (a fresh usage_id when the row has none)."""
+        fields = dict(
+            user_id=self.user_id or "",
+            plan_id=self.plan_id or "",
+            endpoint=self.endpoint or "",
+            tokens_used=self.tokens,
+            duration_ms=self.duration_ms,
+            success=self.success,
+            timestamp=_EPOCH + timedelta(microseconds=self.ts_us),
+            cost_usd=self.cost_usd,
+        )
+        if self.usage_id:
+            fields["usage_id"] = self.usage_id
+        return UsageRecord(**fields)
+
+
+class UsageBatch:
+    """
+    Usage rows stored column-wise. Append items (or rows / records) and read
+    the columns directly; `row(i)` / `records()` materialize on demand.
+
+    `with_ids=False` drops usage_id (the largest per-row string) for jobs
+    that only aggregate, and `with_ts=False` the timestamp column (rows then
+    read as the epoch) for jobs that don't bucket by time; timestamps are
+    then only checked for marker rows, not parsed. `rounded_costs` counts appended items whose cost_usd
+    was finer than a micro-dollar.
+    """
+
+    __slots__ = ("with_ids", "with_ts", "rounded_costs", "usage_ids", "tenant_ids", "user_ids", "plan_ids", "endpoints",
+                 "tokens", "duration_ms", "success", "ts_us", "cost_micros")
+
+    def __init__(self, *, with_ids: bool = True, with_ts: bool = True):
+        self.with_ids = with_ids
+        self.with_ts = with_ts
+        self.rounded_costs = 0
+        self.usage_ids = []
+        self.tenant_ids = []
+        self.user_ids = []
+        self.plan_ids = []
+        self.endpoints = []
+        self.tokens = array("q")
+        self.duration_ms = array("q")
+        self.success = array("B")
+        self.ts_us = array("q")
+        self.cost_micros = array("q")
+
+    def __len__(self) -> int:
+        return len(self.tokens)
+
+    @classmethod
+    def from_items(cls, items: Iterable[dict], *, with_ids: bool = True, with_ts: bool = True) -> "UsageBatch":
+        batch = cls(with_ids=with_ids, with_ts=with_ts)
+        batch.extend_items(items)
+        return batch
+
+    @classmethod
+    def from_records(cls, records: Iterable[UsageRecord], *, tenant_id: Optional[str] = None,
+                     with_ids: bool = True) -> "UsageBatch":
+        batch = cls(with_ids=with_ids)
+        for record in records:
+            batch.append_row(UsageRow.from_record(record, tenant_id))
+        return batch
+
+    def append_item(self, item: dict) -> bool:
+        """Append one UsageLogs item; False (nothing appended) for non-usage items."""
+        if self.with_ts:
+            ts = _item_ts(item)
+            if ts is None:
+                return False
+        elif is_marker_ts(item.get("timestamp")):
+            return False
+        # convert everything before appending so a bad value can't leave ragged columns
+        tokens = int(item.get("token_count", item.get("tokens_used", 0)) or 0)
+        duration = int(item.get("duration_ms", 0) or 0)
+        cost, exact = _micros(item.get("cost_usd"))
+        if not exact:
+            self.rounded_costs += 1
+        if self.with_ids:
+            self.usage_ids.append(item.get("usage_id"))
+        self.tenant_ids.append(_label(item.get("tenant_id")))
+        self.user_ids.append(_label(item.get("user_id")))
+        self.plan_ids.append(_label(item.get("plan_id")))
+        self.endpoints.append(_label(item.get("endpoint")))
+        self.tokens.append(tokens)
+        self.duration_ms.append(duration)
+        self.success.append(1 if item.get("success", True) else 0)
+        if self.with_ts:
+            self.ts_us.append(ts)
+        self.cost_micros.append(cost)
+        return True
+
+    def extend_items(self, items: Iterable[dict]) -> int:
+        """Append every usage item of `items`; returns how many were appended."""
+        append = self.append_item
+        return sum(1 for item in items if append(item))
+
+    def append_row(self, row: UsageRow) -> None:
+        if self.with_ids:
+            self.usage_ids.append(row.usage_id)
+        self.tenant_ids.append(row.tenant_id)
+        self.user_ids.append(row.user_id)
+        self.plan_ids.append(row.plan_id)
+        self.endpoints.append(row.endpoint)
+        self.tokens.append(row.tokens)
+        self.duration_ms.append(row.duration_ms)
+        self.success.append(1 if row.success else 0)
+        if self.with_ts:
+            self.ts_us.append(row.ts_us)
+        self.cost_micros.append(row.cost_micros)
+
+    def row(self, i: int) -> UsageRow:
+        return UsageRow(
+            self.usage_ids[i] if self.with_ids else None,
+            self.tenant_ids[i],
+            self.user_ids[i],
+            self.plan_ids[i],
+            self.endpoints[i],
+            self.tokens[i],
+            self.duration_ms[i],
+            bool(self.success[i]),
+            self.ts_us[i] if self.with_ts else 0,
+            self.cost_micros[i],
+        )
+
+    def rows(self) -> Iterator[UsageRow]:
+        return (self.row(i) for i in range(len(self)))
+
+    def records(self) -> Iterator[UsageRecord]:
+        return (row.to_record() for row in self.rows())
+
+    def total_tokens(self) -> int:
+        return sum(self.tokens)
+
+    def total_cost(self) -> Decimal:
+        return usd(sum(self.cost_micros))
@@ -0,0 +1,376 @@
+# services/usage/counters.py
+"""
+Per-tenant-month token counters.
+
+Every tenant-month partition of UsageLogs carries one aggregator item,
+{tenant_month: "<tenant>#<YYYY-MM>", timestamp: "AGG", token_total: N},
+kept current on each usage write. Quota checks read it with one get_item
+instead of summing the month's raw rows.
+"""
+
+import hashlib
+import random
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from services.common.ddb_utils import batch_get
+from services.common.parallel_scan import parallel_scan
+from services.common.time_utils import iso_utc_now, parse_iso, to_iso_z
+
+AGG_SK = "AGG"
+IDEMP_PREFIX = "IDEMP#"
+
+
+def tenant_month_key(tenant_id: str, m_key: str) -> str:
+    return f"{tenant_id}#{m_key}"
+
+
+def agg_key(tenant_month: str) -> dict:
+    return {"tenant_month": tenant_month, "timestamp": AGG_SK}
+
+
+def read_month_total(usage_table, tenant_month: str, shards: int = 1) -> int:
+    """Current token_total of the AGG item (0 if the month has no counter yet); sums shards if sharded."""
+    if shards > 1:
+        return read_sharded_total(usage_table, tenant_month, shards)
+    resp = usage_table.get_item(
+        Key=agg_key(tenant_month),
+        ProjectionExpression="token_total",
+    ) or {}
+    return int((resp.get("Item") or {}).get("token_total", 0))
+
+
+def increment_month_total(usage_table, tenant_month: str, inc_tokens: int) -> None:
+    """Unconditional ADD on the AGG item (soft-quota writes; hard quota increments conditionally)."""
+    usage_table.update_item(
+        Key=agg_key(tenant_month),
+        UpdateExpression="ADD #tt :inc",
+        ExpressionAttributeNames={"#tt": "token_total"},
+        ExpressionAttributeValues={":inc": inc_tokens},
+    )
+
+
+# 1 AGG update + 2 puts per record must fit the 100-action transaction limit
+TRANSACT_MAX_RECORDS = 49
+# fresh sort keys tried for a row whose timestamp another writer already took
+ROW_KEY_RETRIES = 5
+
+
+def _fresh_timestamp(ts: str) -> str:
+    """`ts` moved a few random microseconds later: a new sort key for a row that collided."""
+    return to_iso_z(parse_iso(ts) + timedelta(microseconds=random.randint(1, 999)), timespec="microseconds")
+
+
+def write_usage_chunk(usage_table, tenant_month: str, items: List[dict], *, increment: bool = True) -> List[dict]:
+    """
+    Write up to TRANSACT_MAX_RECORDS usage rows of one partition in a
+    TransactWriteItems call: a conditional IDEMP marker and the row per record,
+    plus (with `increment`) one AGG ADD for the new rows' tokens. Records whose
+    marker already exists are dropped and the rest retried, so nothing is
+    written or counted twice. Rows are put only if their (tenant_month,
+    timestamp) key is free; a row that collides with another writer's row gets
+    a fresh timestamp and is retried (up to ROW_KEY_RETRIES times). Returns the
+    items actually written, with the timestamps they were stored under.
+    """
+    table_name = usage_table.name
+    pending = list(items)
+    collisions = 0
+    while pending:
+        actions = []
+        if increment:
+            actions.append({
+                "Update": {
+                    "TableName": table_name,
+                    "Key": agg_key(tenant_month),
+                    "UpdateExpression": "ADD #tt :inc",
+                    "ExpressionAttributeNames": {"#tt": "token_total"},
+                    "ExpressionAttributeValues": {":inc": sum(it["token_count"] for it in pending)},
+                }
+            })
+        first_marker = len(actions)
+        for it in pending:
+            actions.append({
+                "Put": {
+                    "TableName": table_name,
+                    "Item": {
+                        "tenant_month": tenant_month,
+                        "timestamp": f"{IDEMP_PREFIX}{it['usage_id']}",
+                        "created_at": iso_utc_now(),
+                    },
+                    "ConditionExpression": "attribute_not_exists(#ts)",
+                    "ExpressionAttributeNames": {"#ts": "timestamp"},
+                }
+            })
+            actions.append({
+                "Put": {
+                    "TableName": table_name,
+                    "Item": it,
+                    "ConditionExpression": "attribute_not_exists(#ts)",
+                    "ExpressionAttributeNames": {"#ts": "timestamp"},
+                }
+            })
+        try:
+            usage_table.meta.client.transact_write_items(TransactItems=actions)
+            return pending
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                raise
+            reasons = [r.get("Code") for r in e.response.get("CancellationReasons", [])]
+            # marker puts sit at every other position from first_marker, each followed by its row
+            failed = [
+                divmod(pos - first_marker, 2)
+                for pos, code in enumerate(reasons)
+                if pos >= first_marker and code == "ConditionalCheckFailed"
+            ]
+            dupes = {i for i, is_row in failed if not is_row}
+            taken = {i for i, is_row in failed if is_row} - dupes
+            if not failed or (taken and collisions >= ROW_KEY_RETRIES):
+                raise
+            collisions += bool(taken)
+            pending = [
+                dict(it, timestamp=_fresh_timestamp(it["timestamp"])) if i in taken else it
+                for i, it in enumerate(pending) if i not in dupes
+            ]
+    return []
+
+
+def _is_usage_row(item: dict) -> bool:
+    ts = item.get("timestamp", "")
+    return ts != AGG_SK and not ts.startswith(IDEMP_PREFIX)
+
+
+def sum_raw_month(usage_table, tenant_month: str) -> int:
+    """Sum token_count over the raw usage rows of one partition (paginated)."""
+    total = 0
+    kwargs = {
+        "KeyConditionExpression": Key("tenant_month").eq(tenant_month),
+        "ProjectionExpression": "#ts, token_count",
+        "ExpressionAttributeNames": {"#ts": "timestamp"},
+    }
+    while True:
+        resp = usage_table.query(**kwargs)
+        total += sum(int(it.get("token_count", 0)) for it in resp.get("Items", []) if _is_usage_row(it))
+        lek = resp.get("LastEvaluatedKey")
+        if not lek:
+            return total
+        kwargs["ExclusiveStartKey"] = lek
+
+
+def rebuild_month_total(usage_table, tenant_month: str, max_attempts: int = 3) -> int:
+    """
+    Recompute the AGG item from raw rows and store it.
+
+    Shard items of a sharded tenant (see below) are zeroed in the same
+    transaction, with their allowance cleared so the next sharded write
+    rebalances against the new total; the month is then counted once by
+    read_sharded_total. Every write is conditional on its counter not having
+    moved since it was read, so a rebuild racing live traffic retries instead
+    of clobbering increments. Returns the stored total.
+    """
+    for _ in range(max_attempts):
+        before, by_shard = _read_counter_items(usage_table, tenant_month)
+        total = sum_raw_month(usage_table, tenant_month)
+
+        if before is None:
+            condition = "attribute_not_exists(#tt)"
+            values = {":total": total}
+        else:
+            condition = "#tt = :before"
+            values = {":total": total, ":before": before}
+        base = {
+            "Key": agg_key(tenant_month),
+            "UpdateExpression": "SET #tt = :total",
+            "ConditionExpression": condition,
+            "ExpressionAttributeNames": {"#tt": "token_total"},
+            "ExpressionAttributeValues": values,
+        }
+        try:
+            if not by_shard:
+                usage_table.update_item(**base)
+                return total
+            actions = [{"Update": {"TableName": usage_table.name, **base}}]
+            for i, item in sorted(by_shard.items()):
+                actions.append({"Update": {
+                    "TableName": usage_table.name,
+                    "Key": shard_key(tenant_month, i),
+                    "UpdateExpression": "SET #tt = :zero, #rem = :zero",
+                    "ConditionExpression": "#tt = :seen",
+                    "ExpressionAttributeNames": {"#tt": "token_total", "#rem": "remaining"},
+                    "ExpressionAttributeValues": {":zero": 0, ":seen": item.get("token_total", 0)},
+                }})
+            usage_table.meta.client.transact_write_items(TransactItems=actions)
+            return total
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") not in ("ConditionalCheckFailedException",
+                                                               "TransactionCanceledException"):
+                raise
+    raise RuntimeError(f"AGG counter for {tenant_month} kept changing; retry later")
+
+
+def month_partitions(usage_table, m_key: str) -> List[str]:
+    """Distinct tenant_month keys for one month (full parallel scan; backfill only)."""
+    suffix = f"#{m_key}"
+    items = parallel_scan(
+        usage_table,
+        projection="tenant_month",
+        filter_expression=Attr("tenant_month").contains(suffix),
+    )
+    return sorted({
+        it["tenant_month"] for it in items
+        if it.get("tenant_month", "").endswith(suffix)
+    })
+
+
+def backfill_month_totals(usage_table, m_key: str, tenant_ids: Optional[Iterable[str]] = None) -> dict:
+    """
+    Rebuild AGG items for one month ("YYYY-MM").
+
+    Pass `tenant_ids` when known; otherwise the month's partitions are
+    discovered with a projected scan. Returns {tenant_month: token_total}.
+    """
+    if tenant_ids is None:
+        partitions = month_partitions(usage_table, m_key)
+    else:
+        partitions = [tenant_month_key(t, m_key) for t in tenant_ids]
+    return {tm: rebuild_month_total(usage_table, tm) for tm in partitions}
+
+
+# ---- Sharded counters (hot tenants) ----
+# A plan with `counter_shards` > 1 spreads its hard-quota increments over N
+# shard items {tenant_month: "<tenant>#<YYYY-MM>#S<i>", timestamp: "AGG"}.
+# Distinct partition keys, so the per-item / per-partition write ceiling
+# scales with N. Each shard holds `token_total` and its own `remaining`
+# allowance; an exhausted shard triggers a rebalance that re-splits the
+# month's headroom across all shards.
+
+MAX_SHARDS = 32  # a rebalance is one transaction; stay well below its action limit
+_SHARD_ATTEMPTS = 3
+
+
+def plan_counter_shards(plan: dict) -> int:
+    """AGG counter shards for a plan row: `counter_shards`, 1 (unsharded) by default, at most MAX_SHARDS."""
+    try:
+        shards = int(plan.get("counter_shards", 1) or 1)
+    except (TypeError, ValueError):
+        return 1
+    return max(1, min(shards, MAX_SHARDS))
+
+
+def shard_partition(tenant_month: str, shard: int) -> str:
+    return f"{tenant_month}#S{shard}"
+
+
+def shard_key(tenant_month: str, shard: int) -> dict:
+    return {"tenant_month": shard_partition(tenant_month, shard), "timestamp": AGG_SK}
+
+
+def pick_shard(request_id: str, shards: int) -> int:
+    """Stable shard for a request id (retries of one request land on the same shard); random without one."""
+    if not request_id:
+        return random.randrange(shards)
+    return int(hashlib.sha256(request_id.encode("utf-8")).hexdigest()[:8], 16) % shards
+
+
+def _read_counter_items(usage_table, tenant_month: str,
+                        shards: int = MAX_SHARDS) -> Tuple[Optional[int], Dict[int, dict]]:
+    """(base AGG token_total or None, {shard: item} for the shard items that exist) via consistent BatchGetItem."""
+    keys = [agg_key(tenant_month)] + [shard_key(tenant_month, i) for i in range(shards)]
+    base, by_shard = None, {}
+    prefix = f"{tenant_month}#S"
+    for item in batch_get(usage_table, keys, consistent=True):
+        pk = item["tenant_month"]
+        if pk == tenant_month:
+            base = item.get("token_total")
+        elif pk.startswith(prefix):
+            by_shard[int(pk[len(prefix):])] = item
+    return base, by_shard
+
+
+def _read_shards(usage_table, tenant_month: str, shards: int) -> Tuple[int, Dict[int, dict]]:
+    """(base AGG total, {shard: item}) via consistent BatchGetItem."""
+    base, by_shard = _read_counter_items(usage_table, tenant_month, shards)
+    return int(base or 0), by_shard
+
+
+def read_sharded_total(usage_table, tenant_month: str, shards: int) -> int:
+    """Month total for a sharded tenant: base AGG item plus every shard."""
+    base, by_shard = _read_shards(usage_table, tenant_month, shards)
+    return base + sum(int(it.get("token_total", 0)) for it in by_shard.values())
+
+
+def shard_increment_args(tenant_month: str, shard: int, inc_tokens: int) -> dict:
+    """Conditional increment against the shard's own allowance."""
+    return {
+        "Key": shard_key(tenant_month, shard),
+        "UpdateExpression": "ADD #tt :inc SET #rem = #rem - :inc",
+        "ConditionExpression": "#rem >= :inc",
+        "ExpressionAttributeNames": {"#tt": "token_total", "#rem": "remaining"},
+        "ExpressionAttributeValues": {":inc": inc_tokens},
+    }
+
+
+def rebalance_shards(usage_table, tenant_month: str, shards: int, limit: int,
+                     prefer: Optional[int] = None, need: int = 0) -> int:
+    """
+    Re-split the month's headroom (limit - everything used) across the shards.
+
+    `prefer` / `need` reserve `need` tokens on one shard first so a single
+    large increment isn't refused just because headroom is fragmented. Each
+    shard write is conditional on its token_total being unchanged, so racing
+    increments are never lost; the whole split retries on contention.
+    Returns the total headroom.
+    """
+    for _ in range(_SHARD_ATTEMPTS):
+        base, by_shard = _read_shards(usage_table, tenant_month, shards)
+        used = base + sum(int(it.get("token_total", 0)) for it in by_shard.values())
+        headroom = max(limit - used, 0)
+
+        reserved = need if prefer is not None and 0 < need <= headroom else 0
+        rest = headroom - reserved
+        shares = [rest // shards + (1 if i < rest % shards else 0) for i in range(shards)]
+        if reserved:
+            shares[prefer] += reserved
+
+        actions = []
+        for i in range(shards):
+            current = by_shard.get(i)
+            update = {
+                "TableName": usage_table.name,
+                "Key": shard_key(tenant_month, i),
+                "UpdateExpression": "SET #rem = :share, #tt = if_not_exists(#tt, :zero)",
+                "ExpressionAttributeNames": {"#rem": "remaining", "#tt": "token_total"},
+                "ExpressionAttributeValues": {":share": shares[i], ":zero": 0},
+            }
+            if current is None:
+                update["ConditionExpression"] = "attribute_not_exists(#tt)"
+            else:
+                update["ConditionExpression"] = "#tt = :seen"
+                update["ExpressionAttributeValues"][":seen"] = int(current.get("token_total", 0))
+            actions.append({"Update": update})
+        try:
+            usage_table.meta.client.transact_write_items(TransactItems=actions)
+            return headroom
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                raise
+    raise RuntimeError(f"shards for {tenant_month} kept changing during rebalance")
+
+
+def try_consume_sharded(usage_table, tenant_month: str, shards: int, limit: int,
+                        inc_tokens: int, request_id: str) -> bool:
+    """Hard-quota increment on one shard; rebalances once when that shard runs dry."""
+    shard = pick_shard(request_id, shards)
+    for attempt in range(2):
+        try:
+            usage_table.update_item(**shard_increment_args(tenant_month, shard, inc_tokens))
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+                raise
+        if attempt or rebalance_shards(usage_table, tenant_month, shards, limit,
+                                       prefer=shard, need=inc_tokens) < inc_tokens:
+            return False
+    return False
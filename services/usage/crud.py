@@ -5,7 +5,6 @@ from typing import Optional
 
 from boto3.resources.base import ServiceResource
 from services.usage.models import UsageRecord
-from services.common.ddb_utils import ddb_safe  # <- ensure this file exists
 
 DEFAULT_USAGE_TABLE_NAME = "UsageLogs"  # fallback for local/dev; prefer env var in tests/CDK
 
@@ -19,6 +18,6 @@ def log_usage(record: UsageRecord, dynamodb: Optional[ServiceResource] = None) -
         dynamodb = boto3.resource("dynamodb")
 
     table = dynamodb.Table(get_usage_table_name())
-    item = record.for_dynamodb()
-    table.put_item(Item=ddb_safe(item))
+    item = record.for_dynamodb()  # already DynamoDB-safe
+    table.put_item(Item=item)
     return item
\ No newline at end of file
@@ -0,0 +1,331 @@
+# services/usage/engine.py
+"""
+Columnar usage aggregation shared by the aggregation paths (per-user daily
+summary, the usage aggregate API, monthly invoicing).
+
+Each page of UsageLogs items is read into just the columns the grouping
+needs (tokens, cost_usd, label and time-bucket keys) and immediately reduced
+to per-group sums, so memory is bounded by the number of groups, not rows.
+Groups are any combination of tenant, user, endpoint and one time bucket
+(hour, day or month); the bucket of a UTC timestamp comes from its ISO
+prefix, cached per distinct prefix. `UsageBatch` pages (columnar.py) can be
+folded in as well.
+
+Rows whose sort key is an AGG / IDEMP# marker are skipped; every other row
+counts. A missing timestamp falls in the epoch bucket and a date alone at
+midnight UTC; a timestamp that can't be bucketed raises ValueError.
+
+Sums are exact: tokens are integers, cost_usd is summed as Decimal (micro-
+dollar integers for UsageBatch input) and returned as a Decimal.
+
+With NumPy installed (and USAGE_AGG_NUMPY not "false") grouped pages are
+read into a UsageBatch (int64 tokens, micro-dollar costs) and reduced
+vectorized: key columns are lexsorted and token / cost columns summed with
+`add.reduceat`. Without it, for pages carrying costs finer than a micro-
+dollar, and for ungrouped totals (one C-level sum already), the same
+reduction runs as a dict fold over the items; results are identical.
+"""
+
+import os
+from array import array
+from datetime import date, timedelta
+from decimal import Decimal
+from itertools import compress
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from services.usage.columnar import UsageBatch, is_marker_ts, usage_ts_us, usd
+
+try:  # optional: vectorized page reduction
+    import numpy as np
+except ImportError:  # pragma: no cover - exercised where numpy is absent
+    np = None
+
+_USE_NUMPY = np is not None and os.getenv("USAGE_AGG_NUMPY", "true").lower() != "false"
+
+HOUR_US = 3600 * 10 ** 6
+DAY_US = 24 * HOUR_US
+_EPOCH_DAY = date(1970, 1, 1)
+_ZERO = Decimal(0)
+
+# group key -> (item attribute, UsageBatch column)
+LABEL_KEYS = {"tenant": ("tenant_id", "tenant_ids"), "user": ("user_id", "user_ids"),
+              "endpoint": ("endpoint", "endpoints")}
+# time bucket -> length of the ISO prefix that names it
+BUCKET_KEYS = {"hour": 13, "day": 10, "month": 7}
+_UTC_SUFFIXES = ("Z", "+00:00")
+
+
+def _month_of_day(day: int) -> int:
+    d = _EPOCH_DAY + timedelta(days=day)
+    return (d.year - 1970) * 12 + d.month - 1
+
+
+def _bucket_of_us(kind: str, us: int) -> int:
+    if kind == "hour":
+        return us // HOUR_US
+    if kind == "day":
+        return us // DAY_US
+    return _month_of_day(us // DAY_US)
+
+
+def _bucket_of_prefix(kind: str, prefix: str) -> Optional[int]:
+    """Bucket index for an ISO prefix ("YYYY-MM-DDTHH" / "YYYY-MM-DD" / "YYYY-MM"); None if malformed."""
+    try:
+        if kind == "month":
+            return (int(prefix[:4]) - 1970) * 12 + int(prefix[5:7]) - 1 if prefix[4] == "-" else None
+        days = (date.fromisoformat(prefix[:10]) - _EPOCH_DAY).days
+        return days * 24 + int(prefix[11:13]) if kind == "hour" else days
+    except (ValueError, IndexError):
+        return None
+
+
+def _is_usage_ts(ts) -> bool:
+    """False for AGG / IDEMP# marker rows; a missing timestamp still counts, a non-string one is rejected."""
+    if ts is None or ts.__class__ is str:
+        return not is_marker_ts(ts)
+    raise ValueError(f"malformed usage timestamp: {ts!r}")
+
+
+def _all_usage_ts(stamps: list) -> bool:
+    """
+    True when no row of the page is a marker. ISO timestamps start with a
+    digit and markers (AGG / IDEMP#) with a letter, so the page's min / max
+    string (C-speed) settles the common case.
+    """
+    if stamps and None not in stamps:
+        try:
+            lo, hi = min(stamps), max(stamps)
+            return lo[:1].isdigit() and hi[:1].isdigit()
+        except TypeError:  # non-string timestamps
+            pass
+    return all(map(_is_usage_ts, stamps))
+
+
+def bucket_label(kind: str, value: int) -> str:
+    """Hour / day / month index since the epoch as "YYYY-MM-DDTHH" / "YYYY-MM-DD" / "YYYY-MM"."""
+    if kind == "month":
+        return f"{1970 + value // 12:04d}-{value % 12 + 1:02d}"
+    if kind == "day":
+        return (_EPOCH_DAY + timedelta(days=value)).isoformat()
+    return f"{(_EPOCH_DAY + timedelta(days=value // 24)).isoformat()}T{value % 24:02d}"
+
+
+def _tokens(values: list) -> Tuple[list, int]:
+    """(per-row token counts, their total); ints / Decimals are used as-is."""
+    try:
+        return values, int(sum(values))
+    except TypeError:  # None / str values
+        values = [int(v or 0) for v in values]
+        return values, sum(values)
+
+
+def _costs(values: list) -> Optional[list]:
+    """Per-row cost_usd as Decimal, or None when the page carries no costs (projected away)."""
+    if not any(values):
+        return None
+    return [v if v.__class__ is Decimal else Decimal(str(v)) if v else _ZERO for v in values]
+
+
+# -- page reductions: {raw key: [tokens, rows, cost]} -----------------------
+
+def _fold_python(columns: list, tokens, costs) -> dict:
+    groups: Dict[tuple, list] = {}
+    get = groups.get
+    keys = zip(*columns) if len(columns) > 1 else columns[0]  # single key: no per-row tuples
+    if costs is None:
+        for key, t in zip(keys, tokens):
+            acc = get(key)
+            if acc is None:
+                groups[key] = [t, 1, 0]
+            else:
+                acc[0] += t
+                acc[1] += 1
+    else:
+        for key, t, c in zip(keys, tokens, costs):
+            acc = get(key)
+            if acc is None:
+                groups[key] = [t, 1, c]
+            else:
+                acc[0] += t
+                acc[1] += 1
+                acc[2] += c
+    if len(columns) == 1:
+        return {(key,): acc for key, acc in groups.items()}
+    return groups
+
+
+def _fold_numpy(columns: list, bucket_at: Optional[int], tokens, costs, n: int) -> dict:
+    codes, decoders = [], []
+    for j, col in enumerate(columns):
+        if j == bucket_at:
+            codes.append(np.asarray(col, dtype=np.int64))
+            decoders.append(None)
+        else:
+            index: Dict[object, int] = {}
+            get = index.setdefault
+            codes.append(np.fromiter((get(v, len(index)) for v in col), dtype=np.int64, count=n))
+            decoders.append(list(index))
+
+    order = np.lexsort(codes[::-1])
+    change = np.zeros(n - 1, dtype=bool)
+    for col in codes:
+        s = col[order]
+        change |= s[1:] != s[:-1]
+    starts = np.concatenate(([0], np.flatnonzero(change) + 1))
+    group_tokens = np.add.reduceat(np.asarray(tokens, dtype=np.int64)[order], starts).tolist()
+    group_rows = np.diff(np.append(starts, n)).tolist()
+    if costs is None:
+        group_costs = [0] * len(starts)
+    else:
+        # micro-dollar ints stay int64; Decimals are summed exactly as objects
+        values = np.asarray(costs, dtype=np.int64) if isinstance(costs, array) else np.array(costs, dtype=object)
+        group_costs = np.add.reduceat(values[order], starts).tolist()
+
+    groups = {}
+    for g, row in enumerate(order[starts].tolist()):
+        key = tuple(
+            decode[int(col[row])] if decode is not None else int(col[row])
+            for col, decode in zip(codes, decoders)
+        )
+        groups[key] = [group_tokens[g], group_rows[g], group_costs[g]]
+    return groups
+
+
+class UsageAggregator:
+    """
+    Running token / request / cost sums, optionally grouped.
+
+        agg = UsageAggregator(group_by=("tenant", "day"))
+        for page in pages:
+            agg.add_items(page["Items"])
+        agg.results()  # {("t1", "2025-08-01"): {"tokens": 150, "requests": 2, "cost_usd": Decimal("0.25")}}
+
+    Rows missing a label group under None; rows without a timestamp fall in
+    the epoch bucket. AGG / IDEMP# marker rows are skipped.
+    """
+
+    def __init__(self, group_by: Sequence[str] = ()):
+        group_by = tuple(group_by)
+        unknown = [k for k in group_by if k not in LABEL_KEYS and k not in BUCKET_KEYS]
+        if unknown:
+            raise ValueError(f"unknown group keys: {unknown}")
+        buckets = [k for k in group_by if k in BUCKET_KEYS]
+        if len(buckets) > 1:
+            raise ValueError("at most one time bucket per aggregation")
+        self.group_by = group_by
+        self.bucket = buckets[0] if buckets else None
+        self._bucket_at = group_by.index(self.bucket) if self.bucket else None
+        self.tokens = 0
+        self.requests = 0
+        self.cost = _ZERO
+        self._groups: Dict[tuple, list] = {}  # raw key -> [tokens, requests, cost Decimal]
+        self._prefixes: Dict[str, Optional[int]] = {}  # ISO prefix -> bucket index
+
+    def _buckets(self, stamps: list) -> list:
+        """Bucket index per row timestamp; None for marker rows, ValueError for timestamps that don't parse."""
+        width = BUCKET_KEYS[self.bucket]
+        cache = self._prefixes
+        out = [cache.get(ts[:width]) if ts.__class__ is str and ts.endswith(_UTC_SUFFIXES) else None
+               for ts in stamps]
+        for i in [i for i, b in enumerate(out) if b is None]:  # first sight of a prefix, offsets, markers
+            ts = stamps[i]
+            if not _is_usage_ts(ts):
+                continue
+            if ts is not None and ts.endswith(_UTC_SUFFIXES):  # the prefix usually names the UTC bucket
+                prefix = ts[:width]
+                if prefix not in cache:
+                    cache[prefix] = _bucket_of_prefix(self.bucket, prefix)
+                out[i] = cache[prefix]
+            if out[i] is None:  # missing, other offsets, dates and short timestamps: parse
+                out[i] = _bucket_of_us(self.bucket, usage_ts_us(ts))
+        return out
+
+    def add_items(self, items: Iterable[dict]) -> int:
+        """Fold one page of UsageLogs items in; returns the usage rows counted."""
+        items = items if isinstance(items, list) else list(items)
+        if _USE_NUMPY and self.group_by:
+            batch = UsageBatch.from_items(items, with_ids=False, with_ts=self.bucket is not None)
+            if not batch.rounded_costs:  # else keep the page's sub-micro-dollar costs exact below
+                self.add_batch(batch)
+                return len(batch)
+        stamps = [it.get("timestamp") for it in items]
+        buckets: List[Optional[int]] = []
+        if self.bucket:
+            buckets = self._buckets(stamps)
+            if None in buckets:
+                keep = [b is not None for b in buckets]
+                items, buckets = list(compress(items, keep)), list(compress(buckets, keep))
+        elif not _all_usage_ts(stamps):
+            items = [it for it, ts in zip(items, stamps) if _is_usage_ts(ts)]
+        n = len(items)
+        if not n:
+            return 0
+
+        tokens, token_total = _tokens([it.get("token_count", it.get("tokens_used", 0)) for it in items])
+        costs = _costs([it.get("cost_usd") for it in items])
+        self.tokens += token_total
+        self.requests += n
+        if costs is not None:
+            self.cost += sum(costs, _ZERO)
+        if self.group_by:
+            columns = [buckets if key == self.bucket else [it.get(LABEL_KEYS[key][0]) for it in items]
+                       for key in self.group_by]
+            self._merge(_fold_python(columns, tokens, costs), micros=False)
+        return n
+
+    def add_batch(self, batch: UsageBatch) -> None:
+        """Fold in rows already held in a UsageBatch."""
+        if self.bucket and not batch.with_ts:
+            raise ValueError("time-bucketed aggregation needs a batch with timestamps")
+        n = len(batch)
+        if not n:
+            return
+        self.tokens += sum(batch.tokens)
+        self.requests += n
+        self.cost += usd(sum(batch.cost_micros))
+        if not self.group_by:
+            return
+        columns = []
+        for key in self.group_by:
+            if key != self.bucket:
+                columns.append(getattr(batch, LABEL_KEYS[key][1]))
+            elif _USE_NUMPY:
+                ts = np.frombuffer(batch.ts_us, dtype=np.int64)
+                if key == "month":
+                    columns.append(ts.astype("datetime64[us]").astype("datetime64[M]").astype(np.int64))
+                else:
+                    columns.append(ts // (HOUR_US if key == "hour" else DAY_US))
+            else:
+                columns.append([_bucket_of_us(key, us) for us in batch.ts_us])
+        if _USE_NUMPY:
+            page = _fold_numpy(columns, self._bucket_at, batch.tokens, batch.cost_micros, n)
+        else:
+            page = _fold_python(columns, batch.tokens, batch.cost_micros)
+        self._merge(page, micros=True)
+
+    def _merge(self, page: dict, *, micros: bool) -> None:
+        groups = self._groups
+        for key, (tokens, rows, cost) in page.items():
+            cost = usd(cost) if micros else cost
+            acc = groups.get(key)
+            if acc is None:
+                groups[key] = [int(tokens), rows, cost + _ZERO]
+            else:
+                acc[0] += int(tokens)
+                acc[1] += rows
+                acc[2] += cost
+
+    # -- results --------------------------------------------------------------
+
+    def totals(self) -> dict:
+        """{"tokens": int, "requests": int, "cost_usd": Decimal} over everything added."""
+        return {"tokens": self.tokens, "requests": self.requests, "cost_usd": self.cost}
+
+    def results(self) -> Dict[Tuple, dict]:
+        """{group key tuple (in group_by order, buckets as ISO prefixes): totals}."""
+        kinds = [k if k in BUCKET_KEYS else None for k in self.group_by]
+        out = {}
+        for raw, (tokens, requests, cost) in self._groups.items():
+            key = tuple(v if kind is None else bucket_label(kind, v) for kind, v in zip(kinds, raw))
+            out[key] = {"tokens": tokens, "requests": requests, "cost_usd": cost}
+        return out
@@ -0,0 +1,96 @@
+# services/usage/ingest_queue.py
+"""
+Queue used by the async usage pipeline (log_usage -> queue -> usage_consumer).
+
+SqsUsageQueue is the production implementation. InMemoryUsageQueue mimics the
+SQS -> Lambda event source mapping (batches, partial-batch failures, redelivery)
+so the whole pipeline can be exercised locally without AWS.
+"""
+
+import json
+import uuid
+from collections import deque
+from typing import Callable, Iterable, List, Optional
+
+SQS_SEND_BATCH = 10  # SendMessageBatch hard limit
+
+
+class SqsUsageQueue:
+    def __init__(self, queue_url: str, client=None):
+        if client is None:
+            import boto3
+            client = boto3.client("sqs")
+        self.queue_url = queue_url
+        self.client = client
+
+    def send(self, messages: Iterable[dict]) -> None:
+        """Enqueue JSON messages; raises if SQS rejects any of them."""
+        messages = list(messages)
+        for start in range(0, len(messages), SQS_SEND_BATCH):
+            chunk = messages[start:start + SQS_SEND_BATCH]
+            resp = self.client.send_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[
+                    {"Id": str(i), "MessageBody": json.dumps(m, default=str)}
+                    for i, m in enumerate(chunk)
+                ],
+            )
+            failed = resp.get("Failed") or []
+            if failed:
+                raise RuntimeError(f"SQS rejected {len(failed)} usage message(s): {failed[0].get('Message')}")
+
+
+class InMemoryUsageQueue:
+    """Local stand-in for SQS plus its Lambda event source mapping."""
+
+    def __init__(self, max_receive_count: int = 3):
+        self.max_receive_count = max_receive_count
+        self._messages = deque()
+        self.dead_letters: List[dict] = []
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def send(self, messages: Iterable[dict]) -> None:
+        for m in messages:
+            self._messages.append({
+                "messageId": str(uuid.uuid4()),
+                "receiptHandle": str(uuid.uuid4()),
+                "body": json.dumps(m, default=str),
+                "attributes": {"ApproximateReceiveCount": "0"},
+                "eventSource": "aws:sqs",
+            })
+
+    def receive_event(self, batch_size: int = 10) -> dict:
+        """Pop up to `batch_size` messages as an SQS Lambda event."""
+        records = []
+        while self._messages and len(records) < batch_size:
+            msg = self._messages.popleft()
+            count = int(msg["attributes"]["ApproximateReceiveCount"]) + 1
+            msg["attributes"]["ApproximateReceiveCount"] = str(count)
+            records.append(msg)
+        return {"Records": records}
+
+    def drain(self, consumer: Callable, context=None, batch_size: int = 10,
+              max_batches: Optional[int] = None) -> dict:
+        """
+        Feed batches to `consumer(event, context)` until the queue is empty.
+        Messages listed in `batchItemFailures` are redelivered, then dead-lettered
+        after `max_receive_count` receives.
+        """
+        batches = 0
+        failed = 0
+        while self._messages and (max_batches is None or batches < max_batches):
+            event = self.receive_event(batch_size)
+            resp = consumer(event, context) or {}
+            batches += 1
+            failed_ids = {f["itemIdentifier"] for f in resp.get("batchItemFailures", [])}
+            for msg in event["Records"]:
+                if msg["messageId"] not in failed_ids:
+                    continue
+                failed += 1
+                if int(msg["attributes"]["ApproximateReceiveCount"]) >= self.max_receive_count:
+                    self.dead_letters.append(msg)
+                else:
+                    self._messages.append(msg)
+        return {"batches": batches, "failed": failed, "dead_letters": len(self.dead_letters)}
@@ -2,11 +2,16 @@ import os, json, decimal, boto3
 from datetime import datetime, timezone, timedelta
 from boto3.dynamodb.conditions import Key, Attr
 
-_DDB = None; _TBL = None; _TENANTS = None
+from services.common.ddb_client import TENANT, USAGE_TABLE, codecs_from_env, dynamodb_resource
+from services.usage.engine import UsageAggregator
+from services.usage.rollups import get_rollups_table, range_totals, tenant_scope, user_scope, valid_since
+
+_DDB = None; _TBL = None; _TENANTS = None; _ROLLUPS = None
 
 def _ddb():
     global _DDB
-    if _DDB is None: _DDB = boto3.resource("dynamodb")
+    if _DDB is None:
+        _DDB = dynamodb_resource(codecs_from_env(USAGE_TABLE_NAME=USAGE_TABLE, TENANTS_TABLE_NAME=TENANT))
     return _DDB
 
 def _tables():
@@ -19,6 +24,13 @@ def _tables():
         _TENANTS = _ddb().Table(os.environ["TENANTS_TABLE_NAME"])
     return _TBL, _TENANTS
 
+def _rollups():
+    """UsageRollups table when USAGE_ROLLUPS_TABLE_NAME is set, else None (raw rows only)."""
+    global _ROLLUPS
+    if _ROLLUPS is None:
+        _ROLLUPS = get_rollups_table(_ddb()) if os.getenv("USAGE_ROLLUPS_TABLE_NAME") else None
+    return _ROLLUPS
+
 def _resolve_tenant(event, tenants_tbl):
     claims = (event.get("requestContext", {}).get("authorizer", {}).get("claims", {}))
     client_id = claims.get("client_id") or claims.get("aud")
@@ -47,24 +59,53 @@ def handler(event, context):
     start = start_dt.isoformat(); end = end_dt.isoformat()
     tenant_id = _resolve_tenant(event, tenants_tbl)
 
-    params = {
-        "IndexName": "tenant_id-ts-index",
-        "KeyConditionExpression": Key("tenant_id").eq(tenant_id) & Key("timestamp").between(start, end),
-    }
-    if user_filter:
-        params["FilterExpression"] = Attr("user_id").eq(user_filter)
-
     total = decimal.Decimal(0); by_user = {}; count = 0
-    while True:
-        resp = tbl.query(**params)
-        for it in resp.get("Items", []):
-            tk = decimal.Decimal(str(it.get("token_count", 0)))
-            total += tk
-            u = it.get("user_id", "unknown")
-            by_user[u] = by_user.get(u, decimal.Decimal(0)) + tk
-            count += 1
-        if "LastEvaluatedKey" not in resp: break
-        params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+    raw = UsageAggregator(group_by=("user",))
+
+    def add_rows(lo, hi):
+        params = {
+            "IndexName": "tenant_id-ts-index",
+            "KeyConditionExpression": Key("tenant_id").eq(tenant_id) & Key("timestamp").between(lo, hi),
+        }
+        if user_filter:
+            params["FilterExpression"] = Attr("user_id").eq(user_filter)
+        while True:
+            resp = tbl.query(**params)
+            raw.add_items(resp.get("Items", []))
+            if "LastEvaluatedKey" not in resp: break
+            params["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+    # Whole hours since the rollups watermark come from buckets; the partial hours at
+    # the edges and anything older than the watermark read raw rows
+    rollups = _rollups()
+    since = valid_since(rollups) if rollups is not None else None
+    first_hour = start_dt.replace(minute=0, second=0, microsecond=0)
+    if first_hour < start_dt:
+        first_hour += timedelta(hours=1)
+    if since is not None:
+        first_hour = max(first_hour, since)
+    last_hour = end_dt.replace(minute=0, second=0, microsecond=0)
+    if since is not None and first_hour < last_hour:
+        scope = user_scope(user_filter) if user_filter else tenant_scope(tenant_id)
+        rolled = range_totals(rollups, scope, first_hour, last_hour)
+        total += rolled["tokens"]; count += rolled["requests"]
+        if user_filter:
+            if rolled["tokens"]:
+                by_user[user_filter] = by_user.get(user_filter, decimal.Decimal(0)) + rolled["tokens"]
+        else:
+            for u, tk in rolled["by_user"].items():
+                by_user[u] = by_user.get(u, decimal.Decimal(0)) + tk
+        if start_dt < first_hour:
+            add_rows(start, first_hour.isoformat())
+        if last_hour < end_dt:
+            add_rows(last_hour.isoformat(), end)
+    else:
+        add_rows(start, end)
+
+    total += raw.tokens; count += raw.requests
+    for (u,), sums in raw.results().items():
+        u = u or "unknown"
+        by_user[u] = by_user.get(u, decimal.Decimal(0)) + sums["tokens"]
 
     body = {
         "tenant_id": tenant_id, "start": start, "end": end,
@@ -1,12 +1,15 @@
 import hashlib
 import json
+import atexit
 import os
+import signal
 import sys
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from decimal import Decimal
 
 import boto3
 from boto3.dynamodb.conditions import Key
+from botocore.config import Config
 from botocore.exceptions import ClientError
 
 from aws_lambda_powertools import Logger, Metrics
@@ -15,30 +18,46 @@ from aws_lambda_powertools.metrics import MetricUnit
 logger = Logger(service="usage")
 metrics = Metrics(namespace="MerlinSigma", service="usage")
 
-from services.common.time_utils import month_key, iso_utc_now
+from services.common.ddb_client import PLAN, TENANT, USAGE_TABLE, codecs_from_env, dynamodb_resource
+from services.common.ddb_utils import batch_get
+from services.common.time_utils import month_key, iso_utc_now, now_utc, to_iso_z
+from services.common.ttl_cache import TTLCache
+from services.usage.counters import (
+    TRANSACT_MAX_RECORDS,
+    agg_key,
+    increment_month_total,
+    pick_shard,
+    plan_counter_shards,
+    read_month_total,
+    rebalance_shards,
+    shard_increment_args,
+    tenant_month_key,
+    try_consume_sharded,
+    write_usage_chunk,
+)
+from services.usage.quota_leases import QuotaLeases, lease_size, reserve_lease
 
 
 ###############################################
 # DEBUG / LOCAL RUNNING SUPPORT
+# LOG_USAGE_DEBUG=true: local layer path, .env.local and get_item tracing.
+# Off in production so cold starts skip the filesystem probes and dotenv import.
+_DEBUG = os.getenv("LOG_USAGE_DEBUG", "false").lower() == "true"
 
-def _trace_get_item(table, *args, **kwargs):
-    resp = table._original_get_item(*args, **kwargs)
-    print(f"🧩 DDB get_item called with: {kwargs.get('Key')}, returned: {resp}")
-    return resp
+if _DEBUG:
+    # Add local layer path for testing (e.g. moto or stripe)
+    layer_path = os.path.join(os.path.dirname(__file__), "..", "python")
+    if os.path.isdir(layer_path):
+        sys.path.insert(0, layer_path)
 
-###############################################
-
-# Add local layer path for testing (e.g. moto or stripe)
-layer_path = os.path.join(os.path.dirname(__file__), "..", "python")
-if os.path.isdir(layer_path):
-    sys.path.insert(0, layer_path)
+    # Optional: Load dotenv if running locally
+    try:
+        from dotenv import load_dotenv
+        load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env.local"))
+    except ImportError:
+        pass
 
-# Optional: Load dotenv if running locally
-try:
-    from dotenv import load_dotenv
-    load_dotenv(dotenv_path=os.path.join(os.path.dirname(__file__), ".env.local"))
-except ImportError:
-    pass
+###############################################
 
 # ---- Lazy globals ----
 _DDB = None
@@ -47,15 +66,30 @@ _TENANTS_TBL = None
 _QUOTA_TBL = None
 
 
+# Short timeouts + standard retries: a slow DynamoDB call should retry, not eat the API Gateway budget
+_BOTO_CONFIG = Config(
+    connect_timeout=2,
+    read_timeout=3,
+    retries={"max_attempts": 3, "mode": "standard"},
+    tcp_keepalive=True,
+)
+
+
 def _get_tables():
-    """Return DynamoDB tables, instrumented for debugging."""
+    """Return DynamoDB tables (get_item tracing only with LOG_USAGE_DEBUG)."""
     global _DDB, _USAGE_TBL, _TENANTS_TBL, _QUOTA_TBL
 
     if _DDB is None:
-        _DDB = boto3.resource("dynamodb")
+        # DDB_LOW_LEVEL_CLIENT=true: plain client + precompiled item codecs instead of the resource model
+        _DDB = dynamodb_resource(
+            codecs_from_env(USAGE_TABLE_NAME=USAGE_TABLE, TENANTS_TABLE_NAME=TENANT, QUOTA_TABLE_NAME=PLAN),
+            config=_BOTO_CONFIG,
+        )
 
     # --- helper to wrap get_item with debug print ---
     def _wrap_table_get_item(table, name):
+        if not _DEBUG:
+            return
         try:
             orig = table.get_item
 
@@ -90,11 +124,89 @@ def _get_tables():
     return _USAGE_TBL, _TENANTS_TBL, _QUOTA_TBL
 
 
-class DecimalEncoder(json.JSONEncoder):
-    def default(self, obj):
-        if isinstance(obj, Decimal):
-            return float(obj)
-        return super().default(obj)
+# ---- Warm-container cache for tenant / plan rows ----
+# Plans change rarely and subscription status is already eventually consistent
+# (Stripe webhook -> Tenants), so a short TTL is safe on the hot path.
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+_TENANT_CACHE = TTLCache(
+    "Tenant",
+    maxsize=int(_env_float("TENANT_CACHE_MAX_ENTRIES", 2048)),
+    ttl=_env_float("TENANT_CACHE_TTL_SECONDS", 60),
+    negative_ttl=_env_float("TENANT_CACHE_NEGATIVE_TTL_SECONDS", 10),
+    metrics=metrics,
+)
+_PLAN_CACHE = TTLCache(
+    "Plan",
+    maxsize=256,
+    ttl=_env_float("PLAN_CACHE_TTL_SECONDS", 300),
+    negative_ttl=_env_float("TENANT_CACHE_NEGATIVE_TTL_SECONDS", 10),
+    metrics=metrics,
+)
+
+
+# Async mode checks quota against a briefly cached AGG counter instead of reading it per request
+_COUNTER_CACHE = TTLCache(
+    "MonthCounter",
+    maxsize=int(_env_float("TENANT_CACHE_MAX_ENTRIES", 2048)),
+    ttl=_env_float("COUNTER_CACHE_TTL_SECONDS", 5),
+    metrics=metrics,
+)
+
+_QUEUE = None
+
+# Lease mode: quota reserved ahead by this container, handed back on expiry / shutdown
+_LEASES = QuotaLeases(ttl=_env_float("QUOTA_LEASE_TTL_SECONDS", 30))
+_LEASE_TABLE = None
+
+
+def _get_queue():
+    global _QUEUE
+    if _QUEUE is None:
+        from services.usage.ingest_queue import SqsUsageQueue  # async mode only
+        _QUEUE = SqsUsageQueue(os.environ["USAGE_QUEUE_URL"])
+    return _QUEUE
+
+
+def _load_tenant(tenant_id: str, tenants_table) -> dict:
+    """Tenant row (subscription_status, plan_id); missing tenants are negatively cached."""
+    item = _TENANT_CACHE.get_or_load(
+        tenant_id,
+        lambda: (tenants_table.get_item(Key={"tenant_id": tenant_id}) or {}).get("Item"),
+    )
+    return item or {}
+
+
+def _load_plan(plan_id: str, quota_table) -> dict:
+    """Plan row (quota_limit, counter_shards); missing plans are negatively cached."""
+    item = _PLAN_CACHE.get_or_load(
+        plan_id,
+        lambda: (quota_table.get_item(Key={"plan_id": plan_id}) or {}).get("Item"),
+    )
+    return item or {}
+
+
+def _load_quota_limit(plan_id: str, quota_table) -> int:
+    """Monthly token limit for a plan (0 when the plan row is missing)."""
+    return int(_load_plan(plan_id, quota_table).get("quota_limit", 0))
+
+
+def _counter_shards(plan: dict) -> int:
+    """AGG counter shards for a plan: `counter_shards` on the plan row, 1 (unsharded) by default."""
+    return plan_counter_shards(plan)
+
+
+def _tenant_shards(tenant_id: str, tenants_table, quota_table) -> int:
+    if tenants_table is None or quota_table is None:
+        return 1
+    plan_id = _load_tenant(tenant_id, tenants_table).get("plan_id", "free-plan-dev")
+    return _counter_shards(_load_plan(plan_id, quota_table))
+
 
 def _now_iso():
     return datetime.now(timezone.utc).isoformat()
@@ -138,35 +250,51 @@ def _get_monthly_usage(usage_tbl, tenant_id):
         return Decimal("0")
 
 
-def _try_consume_quota(tenant_id: str, inc_tokens: int, tenants_table, quota_table, usage_table) -> bool:
+def _agg_increment_args(tenant_month: str, inc_tokens: int, quota_limit: int) -> dict:
+    """
+    Conditional ADD on the tenant-month aggregator item (timestamp='AGG').
+    DynamoDB conditions cannot do arithmetic, so the headroom is precomputed:
+    the increment applies only while token_total <= limit - inc.
+    """
+    return {
+        "Key": agg_key(tenant_month),
+        "UpdateExpression": "SET #tt = if_not_exists(#tt, :zero) + :inc",
+        "ConditionExpression": "(attribute_not_exists(#tt) AND :inc <= :limit) OR #tt <= :headroom",
+        "ExpressionAttributeNames": {"#tt": "token_total"},
+        "ExpressionAttributeValues": {
+            ":inc": inc_tokens,
+            ":zero": 0,
+            ":limit": quota_limit,
+            ":headroom": quota_limit - inc_tokens,
+        },
+    }
+
+
+def _try_consume_quota(tenant_id: str, inc_tokens: int, tenants_table, quota_table, usage_table,
+                       request_id: str = "") -> bool:
     """
     Atomically add `inc_tokens` to this tenant's monthly total.
-    Uses a per-tenant-month aggregator item (timestamp='AGG').
+    Uses a per-tenant-month aggregator item (timestamp='AGG'), or one of the
+    plan's counter shards when `counter_shards` > 1.
     Returns True if within limit (update applied), False if it would exceed.
     """
-    # 1) find plan + limit
-    tenant_resp = tenants_table.get_item(Key={"tenant_id": tenant_id})
-    plan_id = (tenant_resp.get("Item") or {}).get("plan_id", "free-plan-dev")
-
-    plan_resp = quota_table.get_item(Key={"plan_id": plan_id})
-    quota_limit = int(plan_resp.get("Item", {}).get("quota_limit", 0))
+    # 1) find plan + limit (warm-cached)
+    plan_id = _load_tenant(tenant_id, tenants_table).get("plan_id", "free-plan-dev")
+    plan = _load_plan(plan_id, quota_table)
+    quota_limit = int(plan.get("quota_limit", 0))
+    tenant_month = tenant_month_key(tenant_id, month_key())
+
+    shards = _counter_shards(plan)
+    if _use_quota_leases():
+        return _consume_from_lease(usage_table, tenant_month, plan, quota_limit, shards, inc_tokens, request_id)
+    if shards > 1:
+        return try_consume_sharded(usage_table, tenant_month, shards, quota_limit, inc_tokens, request_id)
 
     # 2) conditional atomic update
     # month_key = datetime.now(timezone.utc).strftime("%Y-%m")
-    m_key = month_key()
-    agg_key = {"tenant_month": f"{tenant_id}#{m_key}", "timestamp": "AGG"}
-
     try:
         usage_table.update_item(
-            Key=agg_key,
-            UpdateExpression="SET #tt = if_not_exists(#tt, :zero) + :inc",
-            ConditionExpression="(attribute_not_exists(#tt) AND :inc <= :limit) OR (#tt + :inc) <= :limit",
-            ExpressionAttributeNames={"#tt": "token_total"},
-            ExpressionAttributeValues={
-                ":inc": inc_tokens,
-                ":zero": 0,
-                ":limit": quota_limit,
-            },
+            **_agg_increment_args(tenant_month, inc_tokens, quota_limit),
             ReturnValues="UPDATED_NEW",
         )
         return True
@@ -176,17 +304,525 @@ def _try_consume_quota(tenant_id: str, inc_tokens: int, tenants_table, quota_tab
         raise
 
 
+def _use_quota_leases() -> bool:
+    """QUOTA_LEASE_MODE=true (with HARD_QUOTA): admit from per-container quota leases."""
+    return os.getenv("QUOTA_LEASE_MODE", "false").lower() == "true"
+
+
+def _conditional_increment(usage_table, tenant_month, tokens, quota_limit) -> bool:
+    try:
+        usage_table.update_item(**_agg_increment_args(tenant_month, tokens, quota_limit))
+        return True
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
+            return False
+        raise
+
+
+def _release_leases(usage_table, leases) -> None:
+    """Hand unused lease tokens back to the base AGG item (sums with any shards)."""
+    for tenant_month, unused in leases:
+        if unused > 0:
+            increment_month_total(usage_table, tenant_month, -unused)
+            metrics.add_metric(name="QuotaLeaseReleased", unit=MetricUnit.Count, value=unused)
+
+
+def _release_all_leases(*_args) -> None:
+    if _LEASE_TABLE is None:
+        return
+    try:
+        _release_leases(_LEASE_TABLE, _LEASES.drain())
+    except Exception:
+        # best effort at shutdown; a lease that is not returned stays counted for the rest of the month
+        logger.exception("lease_release_failed")
+
+
+def _install_lease_shutdown_hook(usage_table) -> None:
+    """Return outstanding leases on SIGTERM (sent when an extension is registered) or interpreter exit."""
+    global _LEASE_TABLE
+    if _LEASE_TABLE is not None:
+        return
+    _LEASE_TABLE = usage_table
+    atexit.register(_release_all_leases)
+    if os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def _on_sigterm(signum, frame):
+            _release_all_leases()
+            if callable(previous):
+                previous(signum, frame)
+
+        signal.signal(signal.SIGTERM, _on_sigterm)
+
+
+def _consume_from_lease(usage_table, tenant_month, plan, quota_limit, shards, inc_tokens, request_id) -> bool:
+    """
+    Admit from this container's lease; on a miss reserve a new one (plan lease
+    size, shrunk to the remaining headroom) with one conditional increment.
+    """
+    _release_leases(usage_table, _LEASES.pop_expired())
+    if _LEASES.take(tenant_month, inc_tokens):
+        metrics.add_metric(name="QuotaLeaseHit", unit=MetricUnit.Count, value=1)
+        return True
+
+    need = inc_tokens - _LEASES.remaining(tenant_month)
+    if shards > 1:
+        def consume(tokens):
+            return try_consume_sharded(usage_table, tenant_month, shards, quota_limit, tokens, request_id)
+    else:
+        def consume(tokens):
+            return _conditional_increment(usage_table, tenant_month, tokens, quota_limit)
+
+    granted = reserve_lease(
+        consume,
+        lambda: quota_limit - read_month_total(usage_table, tenant_month, shards),
+        want=max(lease_size(plan, quota_limit), need),
+        need=need,
+    )
+    if not granted:
+        return False
+    metrics.add_metric(name="QuotaLeaseGranted", unit=MetricUnit.Count, value=granted)
+    _install_lease_shutdown_hook(usage_table)
+    _LEASES.grant(tenant_month, granted)
+    return _LEASES.take(tenant_month, inc_tokens)
+
+
 def _is_subscription_active(tenant_id: str, tenants_table) -> bool:
     if tenants_table is None:
         return True
     try:
-        resp = tenants_table.get_item(Key={"tenant_id": tenant_id}) or {}
-        status = (resp.get("Item") or {}).get("subscription_status", "active")
+        status = _load_tenant(tenant_id, tenants_table).get("subscription_status", "active")
         return status in {"active", "trialing"}
     except Exception:
         return True
 
 
+# ---- Per-caller daily / burst counters (QuotaCounters, enable_quota_counters) ----
+# QUOTA_COUNTERS_ENABLED=true: every request is charged against the caller's
+# (body / record user_id, else the tenant) daily and burst counters with
+# enforcer.consume_quota before it is admitted; batches charge each caller's
+# records as one share. Records refused or deduplicated afterwards hand their
+# charge back. Limits come from the tenant's plan_id (see
+# quota.plans_limits.PLAN_ALIASES); a plan with no limits entry is a 500, not free tier.
+_COUNTERS_TBL = None
+
+
+def _use_quota_counters() -> bool:
+    return os.getenv("QUOTA_COUNTERS_ENABLED", "false").lower() == "true"
+
+
+def _get_counters_table():
+    global _COUNTERS_TBL
+    if _COUNTERS_TBL is None:
+        name = os.getenv("QUOTA_COUNTERS_TABLE_NAME")
+        if not name:
+            raise RuntimeError("QUOTA_COUNTERS_TABLE_NAME not set")
+        _get_tables()
+        _COUNTERS_TBL = _DDB.Table(name)
+    return _COUNTERS_TBL
+
+
+def _consume_counters(user_id, tenant_id, token_count, tenants_table, requests=1):
+    """(429 / 500 response or None, charge to release later or None)."""
+    if not _use_quota_counters():
+        return None, None
+    from services.quota.enforcer import QuotaStatus, consume_quota  # counters mode only
+    from services.quota.plans_limits import UnknownPlanError
+
+    plan_id = "free-plan-dev"
+    if tenants_table is not None:
+        plan_id = _load_tenant(tenant_id, tenants_table).get("plan_id", plan_id)
+    charge = (str(user_id or tenant_id), plan_id, now_utc())
+    try:
+        status = consume_quota(charge[0], plan_id, token_count, table=_get_counters_table(), now=charge[2],
+                               requests=requests)
+    except UnknownPlanError:
+        metrics.add_metric(name="UnknownPlan", unit=MetricUnit.Count, value=1)
+        logger.error("unknown_plan", extra={"plan_id": plan_id})
+        return {"statusCode": 500, "body": json.dumps({"message": "No rate limits for plan"})}, None
+    if status == QuotaStatus.BLOCKED:
+        metrics.add_metric(name="RateLimited", unit=MetricUnit.Count, value=1)
+        logger.info("rate_limited", extra={"tokens": token_count, "requests": requests})
+        return {"statusCode": 429, "body": json.dumps({"message": "Rate limit exceeded"})}, None
+    if status == QuotaStatus.WARNING:
+        metrics.add_metric(name="QuotaWarning", unit=MetricUnit.Count, value=1)
+    return None, charge
+
+
+def _release_counters(charge, token_count, requests=1) -> None:
+    if charge is None:
+        return
+    from services.quota.enforcer import release_quota
+
+    user_id, plan_id, charged_at = charge
+    release_quota(user_id, plan_id, token_count, table=_get_counters_table(), now=charged_at, requests=requests)
+
+
+def _use_fused_writes(tenants_table, quota_table) -> bool:
+    """HARD_QUOTA_FUSED=true collapses quota + idempotency + usage into one transaction."""
+    if os.getenv("HARD_QUOTA", "false").lower() != "true":
+        return False
+    if os.getenv("HARD_QUOTA_FUSED", "false").lower() != "true":
+        return False
+    if _use_quota_leases():
+        return False  # leases already took quota off the request path
+    return tenants_table is not None and quota_table is not None
+
+
+def _request_id(event, body) -> str:
+    # API Gateway requestId preferred; client request_id as fallback
+    return (
+            event.get("requestContext", {}).get("requestId")
+            or (body.get("request_id") if isinstance(body, dict) else "")
+            or ""
+    )
+
+
+def _build_usage_items(request_id, tenant_id, token_count, endpoint, timestamp=None):
+    """Deterministic usage_id plus the IDEMP marker and usage row for this request."""
+    m_key = month_key()
+
+    # Build a deterministic ID from the request id
+    usage_id = hashlib.sha256(
+        f"{tenant_id}|{m_key}|{endpoint}|{request_id}".encode("utf-8")
+    ).hexdigest()
+
+    # Key is (tenant_month, timestamp="IDEMP#<usage_id>")
+    marker_item = {
+        "tenant_month": f"{tenant_id}#{m_key}",
+        "timestamp": f"IDEMP#{usage_id}",
+        "created_at": iso_utc_now(),
+    }
+
+    item = {
+        "usage_id": usage_id,  # deterministic, not a random UUID
+        "tenant_month": f"{tenant_id}#{m_key}",
+        # sort key: sub-second precision so concurrent requests don't collide
+        "timestamp": timestamp or iso_utc_now(timespec="microseconds"),
+        "tenant_id": tenant_id,
+        "token_count": token_count,
+        "endpoint": endpoint,
+    }
+    return usage_id, marker_item, item
+
+
+def _fused_record_usage(usage_table, token_count, quota_limit, marker_item, item, shard=None) -> str:
+    """
+    One TransactWriteItems round trip: AGG (or AGG shard) increment, IDEMP marker, usage row.
+    Returns "recorded", "duplicate" or "quota_denied".
+    """
+    table_name = usage_table.name
+    if shard is None:
+        agg = _agg_increment_args(item["tenant_month"], token_count, quota_limit)
+    else:
+        agg = shard_increment_args(item["tenant_month"], shard, token_count)
+    try:
+        usage_table.meta.client.transact_write_items(
+            TransactItems=[
+                {"Update": {"TableName": table_name, **agg}},
+                {
+                    "Put": {
+                        "TableName": table_name,
+                        "Item": marker_item,
+                        "ConditionExpression": "attribute_not_exists(#ts)",
+                        "ExpressionAttributeNames": {"#ts": "timestamp"},
+                    }
+                },
+                {
+                    "Put": {
+                        "TableName": table_name,
+                        "Item": item,
+                        "ConditionExpression": "attribute_not_exists(usage_id)",
+                    }
+                },
+            ]
+        )
+        return "recorded"
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+            raise
+        reasons = [r.get("Code") for r in e.response.get("CancellationReasons", [])]
+        # A duplicate wins over a quota failure: the original request already counted.
+        if len(reasons) > 1 and reasons[1] == "ConditionalCheckFailed":
+            return "duplicate"
+        if reasons and reasons[0] == "ConditionalCheckFailed":
+            return "quota_denied"
+        raise
+
+
+def _handle_fused(event, body, tenant_id, token_count, endpoint, usage_table, tenants_table, quota_table):
+    tenant = _load_tenant(tenant_id, tenants_table)
+    if tenant.get("subscription_status", "active") not in {"active", "trialing"}:
+        metrics.add_metric(name="PaymentRequired", unit=MetricUnit.Count, value=1)
+        logger.warning("subscription_inactive")
+        return {"statusCode": 402, "body": json.dumps({"message": "Payment required"})}
+
+    limited, charge = _consume_counters(body.get("user_id"), tenant_id, token_count, tenants_table)
+    if limited:
+        return limited
+
+    plan = _load_plan(tenant.get("plan_id", "free-plan-dev"), quota_table)
+    quota_limit = int(plan.get("quota_limit", 0))
+    request_id = _request_id(event, body)
+    usage_id, marker_item, item = _build_usage_items(request_id, tenant_id, token_count, endpoint)
+
+    shards = _counter_shards(plan)
+    shard = pick_shard(request_id, shards) if shards > 1 else None
+    outcome = _fused_record_usage(usage_table, token_count, quota_limit, marker_item, item, shard)
+    if outcome == "quota_denied" and shard is not None:
+        # the shard's allowance ran out; re-split the month's headroom and retry once
+        if rebalance_shards(usage_table, item["tenant_month"], shards, quota_limit,
+                            prefer=shard, need=token_count) >= token_count:
+            outcome = _fused_record_usage(usage_table, token_count, quota_limit, marker_item, item, shard)
+    if outcome == "quota_denied":
+        _release_counters(charge, token_count)
+        metrics.add_metric(name="QuotaDenied", unit=MetricUnit.Count, value=1)
+        logger.info("quota_denied", extra={"tokens": token_count})
+        return {"statusCode": 403, "body": json.dumps({"message": "Quota exceeded"})}
+
+    if outcome == "duplicate":
+        _release_counters(charge, token_count)
+        metrics.add_metric(name="IdempotencyHit", unit=MetricUnit.Count, value=1)
+        logger.info("idempotency_hit")
+    else:
+        metrics.add_metric(name="UsageRecorded", unit=MetricUnit.Count, value=1)
+        logger.info("usage_recorded", extra={"tokens": token_count, "usage_id": usage_id})
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"message": "Usage recorded", "usage_id": usage_id}),
+    }
+
+
+
+def _use_async_ingest() -> bool:
+    """USAGE_INGEST_MODE=async: validate + quota-check here, write in the usage_consumer Lambda."""
+    return os.getenv("USAGE_INGEST_MODE", "sync").lower() == "async" and bool(os.getenv("USAGE_QUEUE_URL"))
+
+
+def _handle_async(event, body, tenant_id, token_count, endpoint, usage_table, tenants_table, quota_table):
+    """
+    Enqueue the usage row and answer 202. The consumer writes the row, the IDEMP
+    marker and the AGG increment. Over-admission is bounded by queue lag plus
+    COUNTER_CACHE_TTL_SECONDS.
+    """
+    if not _is_subscription_active(tenant_id, tenants_table):
+        metrics.add_metric(name="PaymentRequired", unit=MetricUnit.Count, value=1)
+        logger.warning("subscription_inactive")
+        return {"statusCode": 402, "body": json.dumps({"message": "Payment required"})}
+
+    limited, charge = _consume_counters(body.get("user_id"), tenant_id, token_count, tenants_table)
+    if limited:
+        return limited
+
+    usage_id, _marker_item, item = _build_usage_items(_request_id(event, body), tenant_id, token_count, endpoint)
+    tenant_month = item["tenant_month"]
+
+    if tenants_table is not None and quota_table is not None:
+        plan_id = _load_tenant(tenant_id, tenants_table).get("plan_id", "free-plan-dev")
+        quota_limit = _load_quota_limit(plan_id, quota_table)
+        shards = _tenant_shards(tenant_id, tenants_table, quota_table)
+        used = _COUNTER_CACHE.get_or_load(tenant_month, lambda: read_month_total(usage_table, tenant_month, shards))
+        if used + token_count > quota_limit:
+            _release_counters(charge, token_count)
+            metrics.add_metric(name="QuotaDenied", unit=MetricUnit.Count, value=1)
+            logger.info("quota_denied", extra={"tokens": token_count})
+            return {"statusCode": 403, "body": json.dumps({"message": "Quota exceeded"})}
+        # count our own admissions until the cached counter refreshes
+        _COUNTER_CACHE.put(tenant_month, used + token_count)
+
+    _get_queue().send([item])
+
+    metrics.add_metric(name="UsageQueued", unit=MetricUnit.Count, value=1)
+    logger.info("usage_queued", extra={"tokens": token_count, "usage_id": usage_id})
+    return {
+        "statusCode": 202,
+        "body": json.dumps({"message": "Usage accepted", "usage_id": usage_id}),
+    }
+
+
+# ---- Batch ingestion ----
+# POST body {"records": [{tenant_id, token_count, endpoint, request_id?}, ...]} (or a bare array).
+# Quota is checked once per tenant for the summed tokens; rows go out in conditional
+# TransactWriteItems chunks (IDEMP marker + row per record).
+MAX_BATCH_RECORDS = 500
+
+
+def _is_batch(body) -> bool:
+    return isinstance(body, list) or (isinstance(body, dict) and isinstance(body.get("records"), list))
+
+
+def _existing_markers(usage_table, marker_keys) -> set:
+    """(tenant_month, timestamp) of IDEMP markers that already exist, via BatchGetItem."""
+    return {
+        (it["tenant_month"], it["timestamp"])
+        for it in batch_get(usage_table, marker_keys, projection="tenant_month, #ts", names={"#ts": "timestamp"})
+    }
+
+
+def _admit_tenant_batch(tenant_id, total_tokens, use_hard_quota, usage_table, tenants_table, quota_table,
+                        batch_id="") -> str:
+    """Month quota for a tenant's summed tokens (the subscription gate runs first, in _handle_batch)."""
+    if use_hard_quota:
+        allowed = _try_consume_quota(tenant_id, total_tokens, tenants_table, quota_table, usage_table,
+                                     request_id=batch_id)
+    else:
+        allowed = is_within_quota(tenant_id, total_tokens, tenants_table, quota_table, usage_table)
+    return "recorded" if allowed else "quota_denied"
+
+
+def _charge_batch_counters(tenant_id, fresh, results, tenants_table):
+    """
+    Charge each caller's share of a tenant's fresh records to the daily / burst
+    counters. Returns (records still admitted, {caller: charge}); records of a
+    refused caller get status rate_limited (unknown_plan when the plan has no limits).
+    """
+    if not _use_quota_counters():
+        return fresh, {}
+    shares = {}
+    for rec in fresh:
+        shares.setdefault(rec[3], []).append(rec)
+    admitted, charges = [], {}
+    for caller, share in shares.items():
+        limited, charge = _consume_counters(caller, tenant_id, sum(item["token_count"] for _, _, item, _ in share),
+                                            tenants_table, requests=len(share))
+        if limited:
+            status = "rate_limited" if limited["statusCode"] == 429 else "unknown_plan"
+            for i, _, _, _ in share:
+                results[i]["status"] = status
+            continue
+        admitted.extend(share)
+        charges[caller] = charge
+    return sorted(admitted, key=lambda rec: rec[0]), charges
+
+
+def _release_batch_counters(charges, recs) -> None:
+    """Hand back the counter charge of records that were not written."""
+    unused = {}
+    for _, _, item, caller in recs:
+        acc = unused.setdefault(caller, [0, 0])
+        acc[0] += item["token_count"]
+        acc[1] += 1
+    for caller, (tokens, requests) in unused.items():
+        _release_counters(charges.get(caller), tokens, requests)
+
+
+def _write_tenant_batch(usage_table, tenant_month, items, use_hard_quota) -> set:
+    """
+    Markers + rows for one tenant's admitted records; returns the usage_ids
+    actually written. Soft quota adds the AGG increment inside each chunk's
+    transaction; hard quota already charged the total, so tokens of records
+    that lost a race for their marker are handed back.
+    """
+    written = set()
+    for start in range(0, len(items), TRANSACT_MAX_RECORDS):
+        chunk = items[start:start + TRANSACT_MAX_RECORDS]
+        written.update(it["usage_id"] for it in
+                       write_usage_chunk(usage_table, tenant_month, chunk, increment=not use_hard_quota))
+    if use_hard_quota:
+        lost = sum(it["token_count"] for it in items if it["usage_id"] not in written)
+        if lost:
+            increment_month_total(usage_table, tenant_month, -lost)
+    return written
+
+
+def _handle_batch(event, body, usage_table, tenants_table, quota_table):
+    """
+    Per-record statuses: recorded / duplicate / quota_denied / payment_required /
+    rate_limited / unknown_plan / bad_payload.
+
+    Duplicates are detected within the batch and against existing IDEMP markers
+    (BatchGetItem) before quota is charged. With QUOTA_COUNTERS_ENABLED each
+    caller's records are charged to the daily / burst counters as one share
+    before the month quota, and handed back if they end up not written. Markers are then written with
+    conditional transactions, so when two copies of the same batch race only
+    the first write of each record is recorded and counted; the other copy
+    reports it as a duplicate.
+    """
+    records = body if isinstance(body, list) else body["records"]
+    if not records or len(records) > MAX_BATCH_RECORDS:
+        metrics.add_metric(name="BadPayload", unit=MetricUnit.Count, value=1)
+        return {
+            "statusCode": 400,
+            "body": json.dumps({"message": f"Bad payload: batch must hold 1-{MAX_BATCH_RECORDS} records"}),
+        }
+
+    api_request_id = event.get("requestContext", {}).get("requestId") or ""
+    base_ts = now_utc()
+    results = []
+    by_tenant = {}
+    seen = set()
+
+    for i, raw in enumerate(records):
+        try:
+            tenant_id = raw["tenant_id"]
+            token_count = int(raw["token_count"])
+            endpoint = raw["endpoint"]
+        except (KeyError, ValueError, TypeError):
+            results.append({"index": i, "status": "bad_payload"})
+            continue
+        if token_count < 0:
+            results.append({"index": i, "status": "bad_payload"})
+            continue
+
+        caller = str(raw.get("user_id") or tenant_id)
+        request_id = raw.get("request_id") or f"{api_request_id}#{i}"
+        # distinct sort keys within the batch; a clash with another writer's row is retried
+        # under a fresh timestamp by write_usage_chunk
+        ts = to_iso_z(base_ts + timedelta(microseconds=i), timespec="microseconds")
+        usage_id, marker_item, item = _build_usage_items(request_id, tenant_id, token_count, endpoint, timestamp=ts)
+        results.append({"index": i, "status": "duplicate", "usage_id": usage_id})
+        if usage_id in seen:
+            continue
+        seen.add(usage_id)
+        by_tenant.setdefault(tenant_id, []).append((i, marker_item, item, caller))
+
+    existing = _existing_markers(usage_table, [
+        {"tenant_month": marker["tenant_month"], "timestamp": marker["timestamp"]}
+        for recs in by_tenant.values() for _, marker, _, _ in recs
+    ])
+
+    use_hard_quota = os.getenv("HARD_QUOTA", "false").lower() == "true"
+    for tenant_id, recs in by_tenant.items():
+        fresh = [r for r in recs if (r[1]["tenant_month"], r[1]["timestamp"]) not in existing]
+        if not fresh:
+            continue
+        if not _is_subscription_active(tenant_id, tenants_table):
+            for i, _, _, _ in fresh:
+                results[i]["status"] = "payment_required"
+            continue
+        fresh, charges = _charge_batch_counters(tenant_id, fresh, results, tenants_table)
+        if not fresh:
+            continue
+        total = sum(item["token_count"] for _, _, item, _ in fresh)
+        status = _admit_tenant_batch(tenant_id, total, use_hard_quota, usage_table, tenants_table, quota_table,
+                                     batch_id=fresh[0][2]["usage_id"])
+        if status != "recorded":
+            _release_batch_counters(charges, fresh)
+            for i, _, _, _ in fresh:
+                results[i]["status"] = status
+            continue
+        written = _write_tenant_batch(usage_table, fresh[0][2]["tenant_month"],
+                                      [item for _, _, item, _ in fresh], use_hard_quota)
+        _release_batch_counters(charges, [r for r in fresh if r[2]["usage_id"] not in written])
+        for i, _, item, _ in fresh:
+            if item["usage_id"] in written:
+                results[i]["status"] = "recorded"
+
+    summary = {}
+    for r in results:
+        summary[r["status"]] = summary.get(r["status"], 0) + 1
+    for status, metric in (("recorded", "UsageRecorded"), ("duplicate", "IdempotencyHit"),
+                           ("quota_denied", "QuotaDenied"), ("payment_required", "PaymentRequired"),
+                           ("bad_payload", "BadPayload")):
+        if summary.get(status):
+            metrics.add_metric(name=metric, unit=MetricUnit.Count, value=summary[status])
+    logger.info("usage_batch", extra={"records": len(records), "summary": summary})
+
+    return {
+        "statusCode": 200,
+        "body": json.dumps({"message": "Batch processed", "summary": summary, "results": results}),
+    }
+
 
 @logger.inject_lambda_context
 @metrics.log_metrics(capture_cold_start_metric=True)
@@ -203,56 +839,63 @@ def handler(event, context):
     usage_table, tenants_table, quota_table = _get_tables()
     try:
         body = json.loads(event.get("body", "{}"))
-        tenant_id = body["tenant_id"]
-        token_count = int(body["token_count"])
-        endpoint = body["endpoint"]
-    except (KeyError, ValueError):
+        batch = _is_batch(body)
+        if not batch:
+            tenant_id = body["tenant_id"]
+            token_count = int(body["token_count"])
+            endpoint = body["endpoint"]
+            if token_count < 0:
+                raise ValueError("token_count must not be negative")
+    except (KeyError, ValueError, TypeError):
         metrics.add_metric(name="BadPayload", unit=MetricUnit.Count, value=1)  # 👈 add
         logger.warning("bad_payload")
         return {"statusCode": 400, "body": json.dumps({"message": "Bad payload"})}
 
+    if batch:
+        return _handle_batch(event, body, usage_table, tenants_table, quota_table)
+
     logger.append_keys(tenant_id=tenant_id, endpoint=endpoint)
 
+    # --- async path: enqueue for the usage_consumer Lambda ---
+    if _use_async_ingest():
+        return _handle_async(event, body, tenant_id, token_count, endpoint,
+                             usage_table, tenants_table, quota_table)
+
+    # --- fused single-round-trip path (HARD_QUOTA + HARD_QUOTA_FUSED) ---
+    if _use_fused_writes(tenants_table, quota_table):
+        return _handle_fused(event, body, tenant_id, token_count, endpoint,
+                             usage_table, tenants_table, quota_table)
+
     # --- subscription gate ---
     if not _is_subscription_active(tenant_id, tenants_table):
         metrics.add_metric(name="PaymentRequired", unit=MetricUnit.Count, value=1)
         logger.warning("subscription_inactive")
         return {"statusCode": 402, "body": json.dumps({"message": "Payment required"})}
 
+    # --- per-caller daily / burst counters (feature-flagged) ---
+    limited, charge = _consume_counters(body.get("user_id"), tenant_id, token_count, tenants_table)
+    if limited:
+        return limited
+
     # --- quota enforcement (feature-flagged) ---
     use_hard_quota = os.getenv("HARD_QUOTA", "false").lower() == "true"
     if use_hard_quota:
-        allowed = _try_consume_quota(tenant_id, token_count, tenants_table, quota_table, usage_table)
+        allowed = _try_consume_quota(tenant_id, token_count, tenants_table, quota_table, usage_table,
+                                     request_id=_request_id(event, body))
     else:
         # existing soft check preserved for backward compatibility
         allowed = is_within_quota(tenant_id, token_count, tenants_table, quota_table, usage_table)
 
     if not allowed:
+        _release_counters(charge, token_count)
         metrics.add_metric(name="QuotaDenied", unit=MetricUnit.Count, value=1)
         logger.info("quota_denied", extra={"tokens": token_count})
         return {"statusCode": 403, "body": json.dumps({"message": "Quota exceeded"})}
 
     # normal usage write (unchanged)
-    m_key = month_key()
-
-    # Build a deterministic ID (API Gateway requestId preferred; client request_id as fallback)
-    request_id = (
-            event.get("requestContext", {}).get("requestId")
-            or (body.get("request_id") if isinstance(body, dict) else "")
-            or ""
-    )
-    usage_id = hashlib.sha256(
-        f"{tenant_id}|{m_key}|{endpoint}|{request_id}".encode("utf-8")
-    ).hexdigest()
+    usage_id, marker_item, item = _build_usage_items(_request_id(event, body), tenant_id, token_count, endpoint)
 
     # --- Idempotency marker (pre-write) ---
-    # Key is (tenant_month, timestamp="IDEMP#<usage_id>")
-    marker_item = {
-        "tenant_month": f"{tenant_id}#{m_key}",
-        "timestamp": f"IDEMP#{usage_id}",
-        "created_at": iso_utc_now(),
-    }
-
     try:
         usage_table.put_item(
             Item=marker_item,
@@ -263,6 +906,7 @@ def handler(event, context):
     except ClientError as e:
         if e.response.get("Error", {}).get("Code") == "ConditionalCheckFailedException":
             # Duplicate -> idempotent success (do NOT write another usage row)
+            _release_counters(charge, token_count)
             metrics.add_metric(name="IdempotencyHit", unit=MetricUnit.Count, value=1)  # 👈 add
             logger.info("idempotency_hit")
             return {
@@ -272,21 +916,16 @@ def handler(event, context):
         raise
 
     # --- Normal usage write (first time only) ---
-    item = {
-        "usage_id": usage_id,  # deterministic, not a random UUID
-        "tenant_month": f"{tenant_id}#{m_key}",
-        "timestamp": iso_utc_now(),
-        "tenant_id": tenant_id,
-        "token_count": token_count,
-        "endpoint": endpoint,
-    }
-
     # (Optional) keep a condition as a safety net; it won't run on duplicates anyway
     usage_table.put_item(
         Item=item,
         ConditionExpression="attribute_not_exists(usage_id)"
     )
 
+    # Hard quota already bumped the AGG counter; soft quota keeps it current here
+    if not use_hard_quota:
+        increment_month_total(usage_table, item["tenant_month"], token_count)
+
     # on success, after you put_item:
     metrics.add_metric(name="UsageRecorded", unit=MetricUnit.Count, value=1)
     logger.info("usage_recorded", extra={"tokens": token_count, "usage_id": item["usage_id"]})
@@ -297,19 +936,12 @@ def handler(event, context):
 
 
 def is_within_quota(tenant_id, new_tokens, tenants_table, quota_table, usage_table):
-    tenant_resp = tenants_table.get_item(Key={"tenant_id": tenant_id})
-    plan_id = tenant_resp["Item"].get("plan_id", "free-plan-dev")
-
-    plan_resp = quota_table.get_item(Key={"plan_id": plan_id})
-    quota_limit = int(plan_resp["Item"]["quota_limit"])
+    plan_id = _load_tenant(tenant_id, tenants_table).get("plan_id", "free-plan-dev")
+    plan = _load_plan(plan_id, quota_table)
+    quota_limit = int(plan.get("quota_limit", 0))
 
-    m_key = month_key()
-    month_prefix = f"{tenant_id}#{m_key}"
-    usage_resp = usage_table.query(
-        KeyConditionExpression=Key("tenant_month").eq(month_prefix),
-        ProjectionExpression="token_count"
-    )
-    total_used = sum(int(item.get("token_count", 0)) for item in usage_resp["Items"])
+    # O(1): the month's AGG counter (plus its shards), not a query over every raw row
+    total_used = read_month_total(usage_table, tenant_month_key(tenant_id, month_key()), _counter_shards(plan))
     return (total_used + new_tokens) <= quota_limit
 
 
@@ -324,3 +956,8 @@ def _check_quota(*_args, **_kwargs):
     return True
 
 
+
+
+# Build the DynamoDB resource during Lambda init (boosted CPU, and no request is waiting on it yet)
+if os.getenv("AWS_LAMBDA_FUNCTION_NAME") and os.getenv("USAGE_TABLE_NAME"):
+    _get_tables()
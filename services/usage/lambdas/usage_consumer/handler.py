@@ -0,0 +1,97 @@
+# services/usage/lambdas/usage_consumer/handler.py
+"""
+SQS consumer for the async usage pipeline.
+
+Each message is a usage row produced by log_usage in async mode. Per batch:
+messages are deduped by usage_id, grouped by tenant_month, and written in
+TransactWriteItems chunks (one AGG increment + an IDEMP marker and the row per
+record). Redeliveries hit the conditional marker put and are dropped from the
+chunk, so the AGG counter is never double-counted. Failed chunks are reported
+through `batchItemFailures` (ReportBatchItemFailures on the event source).
+"""
+
+import json
+import os
+
+import boto3
+
+from aws_lambda_powertools import Logger, Metrics
+from aws_lambda_powertools.metrics import MetricUnit
+
+from services.usage.counters import TRANSACT_MAX_RECORDS, write_usage_chunk
+
+logger = Logger(service="usage-consumer")
+metrics = Metrics(namespace="MerlinSigma", service="usage-consumer")
+
+_REQUIRED = ("usage_id", "tenant_month", "timestamp", "tenant_id", "token_count", "endpoint")
+
+_DDB = None
+_USAGE_TBL = None
+
+
+def _get_table():
+    global _DDB, _USAGE_TBL
+    if _USAGE_TBL is None:
+        name = os.getenv("USAGE_TABLE_NAME")
+        if not name:
+            raise RuntimeError("USAGE_TABLE_NAME not set")
+        if _DDB is None:
+            _DDB = boto3.resource("dynamodb")
+        _USAGE_TBL = _DDB.Table(name)
+    return _USAGE_TBL
+
+
+def _parse(record):
+    item = json.loads(record["body"])
+    if not all(k in item for k in _REQUIRED):
+        raise ValueError("missing fields")
+    item["token_count"] = int(item["token_count"])
+    return item
+
+
+def _write_chunk(usage_table, tenant_month, items) -> int:
+    """Write one transaction's worth of records; returns how many were new."""
+    return len(write_usage_chunk(usage_table, tenant_month, items))
+
+
+@logger.inject_lambda_context
+@metrics.log_metrics
+def handler(event, context):
+    usage_table = _get_table()
+
+    # usage_id -> (item, [messageId, ...]); SQS may deliver the same usage twice in one batch
+    by_usage_id = {}
+    for record in event.get("Records", []):
+        try:
+            item = _parse(record)
+        except (KeyError, ValueError, TypeError):
+            # poison message: retrying will never help
+            metrics.add_metric(name="BadMessage", unit=MetricUnit.Count, value=1)
+            logger.warning("bad_message", extra={"message_id": record.get("messageId")})
+            continue
+        entry = by_usage_id.setdefault(item["usage_id"], (item, []))
+        entry[1].append(record["messageId"])
+
+    by_partition = {}
+    for item, message_ids in by_usage_id.values():
+        by_partition.setdefault(item["tenant_month"], []).append((item, message_ids))
+
+    failures = []
+    recorded = 0
+    for tenant_month, entries in by_partition.items():
+        for start in range(0, len(entries), TRANSACT_MAX_RECORDS):
+            chunk = entries[start:start + TRANSACT_MAX_RECORDS]
+            try:
+                recorded += _write_chunk(usage_table, tenant_month, [item for item, _ in chunk])
+            except Exception:
+                logger.exception("chunk_write_failed", extra={"tenant_month": tenant_month})
+                failures.extend(mid for _, mids in chunk for mid in mids)
+
+    received = sum(len(mids) for _, mids in by_usage_id.values())
+    if recorded:
+        metrics.add_metric(name="UsageRecorded", unit=MetricUnit.Count, value=recorded)
+    duplicates = received - recorded - len(failures)
+    if duplicates > 0:
+        metrics.add_metric(name="IdempotencyHit", unit=MetricUnit.Count, value=duplicates)
+
+    return {"batchItemFailures": [{"itemIdentifier": mid} for mid in failures]}
@@ -44,12 +44,10 @@ class UsageRecord(BaseModel):
         return float(v)
 
     def for_dynamodb(self) -> dict:
-        # Use python mode; don’t produce JSON types
-        d = self.model_dump(mode="python")
-        # Ensure timestamp is a string
-        d["timestamp"] = to_iso_z(self.timestamp)
-        # Recursively convert floats->Decimal, datetime->ISO, etc.
-        return ddb_safe(d)
+        # Use python mode; don’t produce JSON types. The dump is a fresh dict,
+        # so one ddb_safe pass (timestamp -> ISO Z, floats -> Decimal, ...)
+        # makes it writable; callers must not convert it again.
+        return ddb_safe(self.model_dump(mode="python"))
 
 
 class UsageSummary(BaseModel):
@@ -0,0 +1,101 @@
+# services/usage/quota_leases.py
+"""
+Quota leases for log_usage (QUOTA_LEASE_MODE=true).
+
+A warm container reserves a slice of a tenant's remaining monthly quota with
+one conditional AGG increment and admits later requests from that in-memory
+lease, with no DynamoDB round trip. Unused allowance goes back (negative ADD on
+the AGG item) when the lease expires or the container shuts down.
+
+The AGG counter therefore runs ahead of real usage by the outstanding leases:
+the limit is never exceeded, but other containers may be refused up to that
+much early. Nothing reclaims a lease lost with a killed container (no
+SIGTERM, no atexit): its unused tokens stay counted against the tenant until
+the month rolls over, at most one lease per lost container. Running
+`rebuild_month_total` is not a repair either, since it also drops the
+reservations of leases that are still live.
+
+Lease size per plan: `lease_tokens` on the plan row, else `lease_pct` percent of
+the limit (default QUOTA_LEASE_PCT, 5).
+"""
+
+import math
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+DEFAULT_LEASE_PCT = float(os.getenv("QUOTA_LEASE_PCT", "5"))
+
+
+def lease_size(plan: dict, quota_limit: int) -> int:
+    """Tokens to reserve per lease for this plan (at least 1)."""
+    if plan.get("lease_tokens") is not None:
+        return max(1, int(plan["lease_tokens"]))
+    pct = float(plan.get("lease_pct", DEFAULT_LEASE_PCT))
+    return max(1, math.ceil(quota_limit * pct / 100))
+
+
+def reserve_lease(consume: Callable[[int], bool], headroom: Callable[[], int], want: int, need: int) -> int:
+    """
+    Reserve up to `want` tokens (at least `need`) through `consume(tokens) -> bool`.
+
+    When the full lease doesn't fit, retries once with whatever headroom is
+    left. Returns the tokens reserved, 0 if not even `need` fits.
+    """
+    if consume(want):
+        return want
+    if want <= need:
+        return 0
+    left = min(headroom(), want)
+    if left >= need and consume(left):
+        return left
+    return 0
+
+
+class QuotaLeases:
+    """Per-container lease book: {tenant_month: (remaining tokens, expires_at)}."""
+
+    def __init__(self, ttl: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.ttl = ttl
+        self._clock = clock
+        self._leases: Dict[str, Tuple[int, float]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._leases)
+
+    def remaining(self, key: str) -> int:
+        with self._lock:
+            entry = self._leases.get(key)
+            return entry[0] if entry and entry[1] > self._clock() else 0
+
+    def take(self, key: str, tokens: int) -> bool:
+        """Admit `tokens` from a live lease; False if it is missing, expired or too small."""
+        with self._lock:
+            entry = self._leases.get(key)
+            if entry is None or entry[1] <= self._clock() or entry[0] < tokens:
+                return False
+            self._leases[key] = (entry[0] - tokens, entry[1])
+            return True
+
+    def grant(self, key: str, tokens: int, ttl: Optional[float] = None) -> None:
+        """Add freshly reserved tokens to the lease and restart its expiry."""
+        with self._lock:
+            entry = self._leases.get(key)
+            current = entry[0] if entry else 0
+            self._leases[key] = (current + tokens, self._clock() + (self.ttl if ttl is None else ttl))
+
+    def pop_expired(self) -> List[Tuple[str, int]]:
+        """Remove expired leases; returns [(key, unused tokens)] to hand back."""
+        now = self._clock()
+        with self._lock:
+            expired = [k for k, (_, exp) in self._leases.items() if exp <= now]
+            return [(k, self._leases.pop(k)[0]) for k in expired]
+
+    def drain(self) -> List[Tuple[str, int]]:
+        """Remove every lease (shutdown); returns [(key, unused tokens)]."""
+        with self._lock:
+            out = [(k, rem) for k, (rem, _) in self._leases.items()]
+            self._leases.clear()
+            return out
@@ -0,0 +1,382 @@
+# services/usage/rollups.py
+"""
+Hourly / daily usage rollups.
+
+UsageRollups table: PK `scope` ("tenant#<id>" | "user#<id>"), SK `bucket`
+("H#YYYY-MM-DDTHH" | "D#YYYY-MM-DD"). Each bucket carries `tokens`, `requests`,
+`cost_usd` plus per-endpoint (`ep:<endpoint>`) and, on tenant buckets,
+per-user (`user:<id>`) token counters. Buckets are maintained with ADD
+updates, from the UsageLogs stream (rollup_stream Lambda) or on write.
+
+Stream delivery is at-least-once, so `apply_once` writes a conditional
+marker per usage row (scope "applied#<id>", expiring after
+MARKER_TTL_SECONDS) in the same transaction as the bucket ADDs: a
+redelivered row finds its marker and is not counted again.
+
+Range reads cost at most three queries: leading hours, whole days, trailing
+hours.
+
+Buckets are only complete from the watermark item (scope "meta#rollups",
+`valid_since` = "YYYY-MM-DD") on: the stream consumer sets it to the UTC
+midnight after its first batch, since rows written before the stream was
+enabled never reach it. `backfill_rollups` rebuilds older buckets from raw
+rows and moves the watermark back. Readers use raw rows before
+`valid_since(table)`, and raw rows only while it is unset.
+"""
+
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from services.common.parallel_scan import ParallelScan
+from services.common.time_utils import iso_utc_now
+from services.common.ttl_cache import TTLCache
+
+ROLLUPS_TABLE_ENV = "USAGE_ROLLUPS_TABLE_NAME"
+HOUR_PREFIX = "H#"
+DAY_PREFIX = "D#"
+ENDPOINT_PREFIX = "ep:"
+USER_PREFIX = "user:"
+MARKER_PREFIX = "applied#"
+MARKER_SK = "applied"
+# stream records live 24h, so retries of a batch end well within this
+MARKER_TTL_SECONDS = int(os.getenv("ROLLUP_MARKER_TTL_SECONDS", str(3 * 24 * 3600)))
+TRANSACT_MAX_ACTIONS = 100
+WATERMARK_KEY = {"scope": "meta#rollups", "bucket": "valid_since"}
+# late stream retries must have landed before a backfill overwrites their buckets
+BACKFILL_SETTLE = timedelta(hours=1)
+
+# the watermark only moves back (backfill) or appears once; a stale read just means more raw reads
+_VALID_SINCE = TTLCache(
+    "RollupWatermark",
+    maxsize=16,
+    ttl=float(os.getenv("ROLLUP_WATERMARK_TTL_SECONDS", "300")),
+    negative_ttl=60,
+)
+
+
+def get_rollups_table(dynamodb=None):
+    """UsageRollups table, or None when rollups are not configured."""
+    name = os.getenv(ROLLUPS_TABLE_ENV)
+    if not name:
+        return None
+    if dynamodb is None:
+        import boto3
+        dynamodb = boto3.resource("dynamodb")
+    return dynamodb.Table(name)
+
+
+def tenant_scope(tenant_id: str) -> str:
+    return f"tenant#{tenant_id}"
+
+
+def user_scope(user_id: str) -> str:
+    return f"user#{user_id}"
+
+
+def hour_bucket(ts: str) -> str:
+    """"2025-08-25T12:34:56Z" -> "H#2025-08-25T12" (UTC timestamps only)."""
+    return f"{HOUR_PREFIX}{ts[:13]}"
+
+
+def day_bucket(ts: str) -> str:
+    return f"{DAY_PREFIX}{ts[:10]}"
+
+
+def parse_usage_row(row: dict) -> Optional[dict]:
+    """Normalise a UsageLogs row (log_usage or crud shape); None if it isn't a usage row."""
+    ts = row.get("timestamp")
+    if not isinstance(ts, str) or len(ts) < 13 or not ts[:4].isdigit():
+        return None  # AGG / IDEMP# markers
+    tokens = row.get("token_count", row.get("tokens_used", 0))
+    return {
+        "ts": ts,
+        "tenant_id": row.get("tenant_id"),
+        "user_id": row.get("user_id"),
+        "endpoint": row.get("endpoint"),
+        "tokens": int(tokens or 0),
+        "cost_usd": Decimal(str(row.get("cost_usd", "0") or "0")),
+    }
+
+
+def usage_increments(rows: Iterable[dict]) -> Dict[Tuple[str, str], Dict[str, Decimal]]:
+    """Fold usage rows into {(scope, bucket): {attribute: delta}}."""
+    out: Dict[Tuple[str, str], Dict[str, Decimal]] = defaultdict(lambda: defaultdict(Decimal))
+    for row in rows:
+        v = parse_usage_row(row)
+        if v is None:
+            continue
+        scopes = []
+        if v["tenant_id"]:
+            scopes.append(tenant_scope(v["tenant_id"]))
+        if v["user_id"]:
+            scopes.append(user_scope(v["user_id"]))
+        for scope in scopes:
+            for bucket in (hour_bucket(v["ts"]), day_bucket(v["ts"])):
+                inc = out[(scope, bucket)]
+                inc["tokens"] += v["tokens"]
+                inc["requests"] += 1
+                inc["cost_usd"] += v["cost_usd"]
+                if v["endpoint"]:
+                    inc[f"{ENDPOINT_PREFIX}{v['endpoint']}"] += v["tokens"]
+                if scope.startswith("tenant#"):
+                    inc[f"{USER_PREFIX}{v['user_id'] or 'unknown'}"] += v["tokens"]
+    return out
+
+
+def _update_args(scope: str, bucket: str, deltas: Dict[str, Decimal], now: str) -> dict:
+    names = {"#u": "updated_at"}
+    values = {":now": now}
+    adds = []
+    for i, (attr, delta) in enumerate(sorted(deltas.items())):
+        names[f"#a{i}"] = attr
+        values[f":v{i}"] = delta
+        adds.append(f"#a{i} :v{i}")
+    return {
+        "Key": {"scope": scope, "bucket": bucket},
+        "UpdateExpression": f"ADD {', '.join(adds)} SET #u = :now",
+        "ExpressionAttributeNames": names,
+        "ExpressionAttributeValues": values,
+    }
+
+
+def apply_increments(table, increments: Dict[Tuple[str, str], Dict[str, Decimal]]) -> int:
+    """One ADD update per touched bucket; returns the number of updates issued."""
+    now = iso_utc_now()
+    for (scope, bucket), deltas in increments.items():
+        table.update_item(**_update_args(scope, bucket, deltas, now))
+    return len(increments)
+
+
+def once_chunks(entries: Iterable[Tuple[str, dict]]) -> Iterator[List[Tuple[str, dict]]]:
+    """
+    Split (marker id, usage row) pairs, in order, into chunks that fit one
+    transaction: a marker per row plus one update per distinct bucket.
+    Non-usage rows (AGG / IDEMP# markers) are dropped.
+    """
+    chunk: List[Tuple[str, dict]] = []
+    buckets: set = set()
+    for marker_id, row in entries:
+        touched = set(usage_increments([row]))
+        if not touched:
+            continue
+        if chunk and len(chunk) + 1 + len(buckets | touched) > TRANSACT_MAX_ACTIONS:
+            yield chunk
+            chunk, buckets = [], set()
+        chunk.append((marker_id, row))
+        buckets |= touched
+    if chunk:
+        yield chunk
+
+
+def apply_once(table, chunk: List[Tuple[str, dict]]) -> Tuple[int, int]:
+    """
+    Apply one `once_chunks` chunk in a TransactWriteItems call: a conditional
+    marker per row plus the chunk's folded bucket ADDs. Rows whose marker
+    already exists were applied by an earlier delivery; they are dropped and
+    the rest retried. Returns (rows applied, bucket updates).
+    """
+    pending = list(chunk)
+    while pending:
+        now = iso_utc_now()
+        expires_at = int(time.time()) + MARKER_TTL_SECONDS
+        actions = [{
+            "Put": {
+                "TableName": table.name,
+                "Item": {"scope": f"{MARKER_PREFIX}{marker_id}", "bucket": MARKER_SK,
+                         "created_at": now, "expires_at": expires_at},
+                "ConditionExpression": "attribute_not_exists(#s)",
+                "ExpressionAttributeNames": {"#s": "scope"},
+            }
+        } for marker_id, _ in pending]
+        increments = usage_increments(row for _, row in pending)
+        actions.extend({"Update": {"TableName": table.name, **_update_args(scope, bucket, deltas, now)}}
+                       for (scope, bucket), deltas in increments.items())
+        try:
+            table.meta.client.transact_write_items(TransactItems=actions)
+            return len(pending), len(increments)
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") != "TransactionCanceledException":
+                raise
+            reasons = [r.get("Code") for r in e.response.get("CancellationReasons", [])]
+            # markers come first, one per pending row
+            applied = {i for i, code in enumerate(reasons[:len(pending)]) if code == "ConditionalCheckFailed"}
+            if not applied:
+                raise
+            pending = [entry for i, entry in enumerate(pending) if i not in applied]
+    return 0, 0
+
+
+def record_usage(table, row: dict) -> int:
+    """Roll one usage row into its hour/day buckets (write-time maintenance)."""
+    return apply_increments(table, usage_increments([row]))
+
+
+def _read_valid_since(table) -> Optional[str]:
+    return ((table.get_item(Key=WATERMARK_KEY) or {}).get("Item") or {}).get("valid_since")
+
+
+def _parse_day(day: str) -> datetime:
+    return datetime.strptime(day, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+
+
+def valid_since(table) -> Optional[datetime]:
+    """UTC midnight from which buckets are complete; None until the stream consumer has run."""
+    day = _VALID_SINCE.get_or_load(table.name, lambda: _read_valid_since(table))
+    return _parse_day(day) if day else None
+
+
+def mark_stream_start(table, now: Optional[datetime] = None) -> str:
+    """
+    Set the watermark to the UTC midnight after `now` unless it is already set
+    (first stream batch). Rows before then may predate the stream. Returns the
+    stored `valid_since`.
+    """
+    day = (_floor_hour(now or datetime.now(timezone.utc)).replace(hour=0) + timedelta(days=1)).strftime("%Y-%m-%d")
+    try:
+        table.put_item(
+            Item={**WATERMARK_KEY, "valid_since": day, "updated_at": iso_utc_now()},
+            ConditionExpression="attribute_not_exists(#s)",
+            ExpressionAttributeNames={"#s": "scope"},
+        )
+        return day
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") != "ConditionalCheckFailedException":
+            raise
+        return _read_valid_since(table)
+
+
+def backfill_rollups(usage_table, table, since: datetime, now: Optional[datetime] = None) -> dict:
+    """
+    Rebuild the buckets of [since, valid_since) from raw UsageLogs rows (one
+    filtered parallel scan) and move the watermark back to `since` (floored
+    to UTC midnight).
+
+    Buckets are overwritten, not added to, so a rerun is harmless and stream
+    increments that landed before the watermark are replaced by the full raw
+    count. Runs only once the watermark is BACKFILL_SETTLE in the past, so no
+    stream retry for those hours is still pending. Folded buckets are held in
+    memory: on large tables walk back a month at a time (each run starts
+    where the previous one left the watermark).
+
+    Returns {"rows", "buckets", "valid_since"}.
+    """
+    day = _read_valid_since(table)
+    if not day:
+        raise RuntimeError("rollup stream has not started; no watermark to backfill up to")
+    until = _parse_day(day)
+    since = _floor_hour(since).replace(hour=0)
+    if since >= until:
+        return {"rows": 0, "buckets": 0, "valid_since": day}
+    if (now or datetime.now(timezone.utc)) < until + BACKFILL_SETTLE:
+        raise RuntimeError(f"wait until {until + BACKFILL_SETTLE:%Y-%m-%dT%H:%MZ} to backfill up to {day}")
+
+    lo = since.strftime("%Y-%m-%d")
+    scan = ParallelScan(usage_table, filter_expression=Attr("timestamp").gte(lo) & Attr("timestamp").lt(day))
+    increments = usage_increments(scan)
+    updated_at = iso_utc_now()
+    with table.batch_writer() as batch:
+        for (scope, bucket), values in increments.items():
+            batch.put_item(Item={"scope": scope, "bucket": bucket, **values, "updated_at": updated_at})
+
+    table.update_item(
+        Key=WATERMARK_KEY,
+        UpdateExpression="SET #v = :since, #u = :now",
+        ConditionExpression="#v = :until",
+        ExpressionAttributeNames={"#v": "valid_since", "#u": "updated_at"},
+        ExpressionAttributeValues={":since": lo, ":until": day, ":now": updated_at},
+    )
+    _VALID_SINCE.invalidate(table.name)
+    return {"rows": scan.items_read, "buckets": len(increments), "valid_since": lo}
+
+
+def _floor_hour(dt: datetime) -> datetime:
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _query_buckets(table, scope: str, first: str, last: str):
+    kwargs = {"KeyConditionExpression": Key("scope").eq(scope) & Key("bucket").between(first, last)}
+    while True:
+        resp = table.query(**kwargs)
+        yield from resp.get("Items", [])
+        if "LastEvaluatedKey" not in resp:
+            return
+        kwargs["ExclusiveStartKey"] = resp["LastEvaluatedKey"]
+
+
+def range_buckets(start: datetime, end: datetime):
+    """
+    Bucket ranges covering the whole hours of [start, end): a list of
+    (first_sk, last_sk) pairs — leading hours, whole days, trailing hours.
+    """
+    start = _floor_hour(start)
+    end = _floor_hour(end)
+    if end <= start:
+        return []
+
+    def hours(a, b):  # [a, b)
+        last = b - timedelta(hours=1)
+        return (f"{HOUR_PREFIX}{a:%Y-%m-%dT%H}", f"{HOUR_PREFIX}{last:%Y-%m-%dT%H}")
+
+    first_midnight = start if start.hour == 0 else (start + timedelta(days=1)).replace(hour=0)
+    last_midnight = end.replace(hour=0)
+    if first_midnight >= last_midnight:
+        return [hours(start, end)]
+
+    ranges = []
+    if start < first_midnight:
+        ranges.append(hours(start, first_midnight))
+    last_day = last_midnight - timedelta(days=1)
+    ranges.append((f"{DAY_PREFIX}{first_midnight:%Y-%m-%d}", f"{DAY_PREFIX}{last_day:%Y-%m-%d}"))
+    if last_midnight < end:
+        ranges.append(hours(last_midnight, end))
+    return ranges
+
+
+def _empty_totals() -> dict:
+    return {"tokens": 0, "requests": 0, "cost_usd": Decimal("0"),
+            "by_endpoint": {}, "by_user": {}, "buckets": 0}
+
+
+def range_totals(table, scope: str, start: datetime, end: datetime) -> dict:
+    """
+    Totals for the whole hours in [start, end) (start floored, end floored).
+
+    Returns {"tokens", "requests", "cost_usd", "by_endpoint", "by_user", "buckets"}.
+    """
+    totals = _empty_totals()
+    for first, last in range_buckets(start, end):
+        for item in _query_buckets(table, scope, first, last):
+            _add_bucket(totals, item)
+    return totals
+
+
+def day_totals(table, scope: str, date_str: str) -> dict:
+    """Totals for one UTC day ("YYYY-MM-DD") from its daily bucket (one get_item)."""
+    totals = _empty_totals()
+    item = (table.get_item(Key={"scope": scope, "bucket": f"{DAY_PREFIX}{date_str}"}) or {}).get("Item")
+    if item:
+        _add_bucket(totals, item)
+    return totals
+
+
+def _add_bucket(totals: dict, item: dict) -> None:
+    totals["buckets"] += 1
+    totals["tokens"] += int(item.get("tokens", 0))
+    totals["requests"] += int(item.get("requests", 0))
+    totals["cost_usd"] += Decimal(str(item.get("cost_usd", 0)))
+    for attr, value in item.items():
+        if attr.startswith(ENDPOINT_PREFIX):
+            key = attr[len(ENDPOINT_PREFIX):]
+            totals["by_endpoint"][key] = totals["by_endpoint"].get(key, 0) + int(value)
+        elif attr.startswith(USER_PREFIX):
+            key = attr[len(USER_PREFIX):]
+            totals["by_user"][key] = totals["by_user"].get(key, 0) + int(value)
@@ -0,0 +1,160 @@
+# services/usage/tests/test_async_ingest.py
+import json
+
+import boto3
+import pytest
+from boto3.dynamodb.conditions import Key
+from moto import mock_aws
+
+import services.usage.lambdas.log_usage.handler as mod
+import services.usage.lambdas.usage_consumer.handler as consumer
+from services.usage.ingest_queue import InMemoryUsageQueue, SqsUsageQueue
+
+
+@pytest.fixture
+def async_pipeline(monkeypatch):
+    monkeypatch.setenv("USAGE_TABLE_NAME", "UsageTable")
+    monkeypatch.setenv("TENANTS_TABLE_NAME", "TenantsTable")
+    monkeypatch.setenv("QUOTA_TABLE_NAME", "QuotaTable")
+    monkeypatch.setenv("USAGE_INGEST_MODE", "async")
+    monkeypatch.setenv("USAGE_QUEUE_URL", "https://sqs.local/usage")
+    monkeypatch.delenv("HARD_QUOTA", raising=False)
+
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        usage = ddb.create_table(
+            TableName="UsageTable",
+            KeySchema=[
+                {"AttributeName": "tenant_month", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_month", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants = ddb.create_table(
+            TableName="TenantsTable",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        quota = ddb.create_table(
+            TableName="QuotaTable",
+            KeySchema=[{"AttributeName": "plan_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "plan_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants.put_item(Item={"tenant_id": "t1", "plan_id": "pro", "subscription_status": "active"})
+        tenants.put_item(Item={"tenant_id": "t2", "plan_id": "pro", "subscription_status": "past_due"})
+        quota.put_item(Item={"plan_id": "pro", "quota_limit": 100})
+
+        queue = InMemoryUsageQueue()
+        monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+        monkeypatch.setattr(mod, "_get_queue", lambda: queue)
+        monkeypatch.setattr(consumer, "_get_table", lambda: usage)
+        yield usage, queue
+
+
+def _event(request_id, tenant_id="t1", tokens=10):
+    return {
+        "requestContext": {"requestId": request_id},
+        "body": json.dumps({"tenant_id": tenant_id, "token_count": tokens, "endpoint": "/x"}),
+    }
+
+
+def _month_rows(usage, tenant_id="t1"):
+    items = usage.query(KeyConditionExpression=Key("tenant_month").eq(f"{tenant_id}#{mod.month_key()}"))["Items"]
+    return {it["timestamp"]: it for it in items}
+
+
+def test_async_mode_enqueues_and_consumer_writes(async_pipeline, lambda_ctx):
+    usage, queue = async_pipeline
+
+    resp = mod.handler(_event("req-1", tokens=40), lambda_ctx)
+
+    assert resp["statusCode"] == 202
+    assert len(queue) == 1
+    assert _month_rows(usage) == {}
+
+    stats = queue.drain(consumer.handler, lambda_ctx)
+
+    assert stats == {"batches": 1, "failed": 0, "dead_letters": 0}
+    rows = _month_rows(usage)
+    assert rows["AGG"]["token_total"] == 40
+    usage_rows = [it for it in rows.values() if it.get("usage_id")]
+    assert [it["usage_id"] for it in usage_rows] == [json.loads(resp["body"])["usage_id"]]
+
+
+def test_consumer_drops_redelivered_usage(async_pipeline, lambda_ctx):
+    usage, queue = async_pipeline
+
+    mod.handler(_event("req-dup", tokens=30), lambda_ctx)
+    mod.handler(_event("req-dup", tokens=30), lambda_ctx)
+    queue.drain(consumer.handler, lambda_ctx, batch_size=1)
+
+    rows = _month_rows(usage)
+    assert rows["AGG"]["token_total"] == 30
+    assert sum(1 for it in rows.values() if it.get("usage_id")) == 1
+
+
+def test_async_mode_denies_over_quota_before_enqueue(async_pipeline, lambda_ctx):
+    _, queue = async_pipeline
+
+    assert mod.handler(_event("req-a", tokens=90), lambda_ctx)["statusCode"] == 202
+    # the consumer hasn't run yet; the cached counter still counts req-a
+    resp = mod.handler(_event("req-b", tokens=20), lambda_ctx)
+
+    assert resp["statusCode"] == 403
+    assert len(queue) == 1
+
+
+def test_async_mode_inactive_subscription_returns_402(async_pipeline, lambda_ctx):
+    _, queue = async_pipeline
+
+    resp = mod.handler(_event("req-1", tenant_id="t2"), lambda_ctx)
+
+    assert resp["statusCode"] == 402
+    assert len(queue) == 0
+
+
+def test_consumer_reports_failed_chunks_and_dead_letters(async_pipeline, lambda_ctx, monkeypatch):
+    usage, queue = async_pipeline
+    mod.handler(_event("req-1"), lambda_ctx)
+
+    def boom(*_args, **_kwargs):
+        raise RuntimeError("ddb down")
+
+    monkeypatch.setattr(consumer, "_write_chunk", boom)
+    stats = queue.drain(consumer.handler, lambda_ctx)
+
+    assert stats == {"batches": 3, "failed": 3, "dead_letters": 1}
+    assert _month_rows(usage) == {}
+
+
+def test_consumer_skips_poison_messages(async_pipeline, lambda_ctx):
+    usage, queue = async_pipeline
+    queue.send([{"not": "usage"}])
+    mod.handler(_event("req-1", tokens=5), lambda_ctx)
+
+    stats = queue.drain(consumer.handler, lambda_ctx)
+
+    assert stats["failed"] == 0
+    assert _month_rows(usage)["AGG"]["token_total"] == 5
+
+
+def test_sqs_queue_sends_in_batches_of_ten():
+    class FakeSqs:
+        def __init__(self):
+            self.calls = []
+
+        def send_message_batch(self, QueueUrl, Entries):
+            self.calls.append(len(Entries))
+            return {"Successful": [{"Id": e["Id"]} for e in Entries]}
+
+    client = FakeSqs()
+    SqsUsageQueue("https://sqs.local/usage", client=client).send([{"i": i} for i in range(23)])
+
+    assert client.calls == [10, 10, 3]
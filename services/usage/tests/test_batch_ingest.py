@@ -0,0 +1,201 @@
+# services/usage/tests/test_batch_ingest.py
+import json
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from boto3.dynamodb.conditions import Key
+from moto import mock_aws
+
+import services.usage.lambdas.log_usage.handler as mod
+from services.usage.counters import read_month_total, tenant_month_key
+
+
+@pytest.fixture
+def tables(monkeypatch):
+    monkeypatch.setenv("USAGE_TABLE_NAME", "UsageTable")
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        usage = ddb.create_table(
+            TableName="UsageTable",
+            KeySchema=[
+                {"AttributeName": "tenant_month", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_month", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants, quota = MagicMock(), MagicMock()
+        tenants.get_item.side_effect = lambda Key: {"Item": {
+            "tenant_id": Key["tenant_id"],
+            "plan_id": "small" if Key["tenant_id"] == "small" else "pro",
+            "subscription_status": "canceled" if Key["tenant_id"] == "lapsed" else "active",
+        }}
+        quota.get_item.side_effect = lambda Key: {"Item": {
+            "plan_id": Key["plan_id"],
+            "quota_limit": 50 if Key["plan_id"] == "small" else 10_000,
+        }}
+        monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+        yield usage, tenants, quota
+
+
+def _send(records, lambda_ctx, request_id="api-req-1"):
+    event = {"requestContext": {"requestId": request_id}, "body": json.dumps({"records": records})}
+    resp = mod.handler(event, lambda_ctx)
+    return resp["statusCode"], json.loads(resp["body"])
+
+
+def _rows(usage, tenant_id):
+    items = usage.query(KeyConditionExpression=Key("tenant_month").eq(tenant_month_key(tenant_id, mod.month_key())))["Items"]
+    return [it for it in items if it.get("usage_id")]
+
+
+@pytest.mark.parametrize("hard_quota", ["false", "true"])
+def test_batch_mixed_statuses(tables, lambda_ctx, monkeypatch, hard_quota):
+    monkeypatch.setenv("HARD_QUOTA", hard_quota)
+    usage, tenants, _ = tables
+    records = [
+        {"tenant_id": "t1", "token_count": 10, "endpoint": "/a", "request_id": "r1"},
+        {"tenant_id": "t1", "token_count": 15, "endpoint": "/a", "request_id": "r2"},
+        {"tenant_id": "t1", "token_count": 10, "endpoint": "/a", "request_id": "r1"},   # in-batch duplicate
+        {"tenant_id": "t2", "token_count": 5, "endpoint": "/b"},
+        {"tenant_id": "t2", "token_count": "lots", "endpoint": "/b"},                   # bad payload
+        {"tenant_id": "lapsed", "token_count": 5, "endpoint": "/b"},
+    ]
+
+    status, body = _send(records, lambda_ctx)
+
+    assert status == 200
+    assert [r["status"] for r in body["results"]] == [
+        "recorded", "recorded", "duplicate", "recorded", "bad_payload", "payment_required",
+    ]
+    assert body["summary"] == {"recorded": 3, "duplicate": 1, "bad_payload": 1, "payment_required": 1}
+    assert len(_rows(usage, "t1")) == 2 and len(_rows(usage, "t2")) == 1
+    assert read_month_total(usage, tenant_month_key("t1", mod.month_key())) == 25
+    # one tenant lookup per tenant, not per record
+    assert tenants.get_item.call_count == 3
+
+
+def test_batch_resubmission_is_idempotent(tables, lambda_ctx):
+    usage, _, _ = tables
+    records = [{"tenant_id": "t1", "token_count": 10, "endpoint": "/a"} for _ in range(3)]
+
+    _send(records, lambda_ctx)
+    status, body = _send(records, lambda_ctx)
+
+    assert status == 200
+    assert body["summary"] == {"duplicate": 3}
+    assert len(_rows(usage, "t1")) == 3
+    assert read_month_total(usage, tenant_month_key("t1", mod.month_key())) == 30
+
+
+def test_batch_quota_checked_once_per_tenant_with_summed_tokens(tables, lambda_ctx, monkeypatch):
+    monkeypatch.setenv("HARD_QUOTA", "true")
+    usage, _, _ = tables
+    records = [{"tenant_id": "small", "token_count": 20, "endpoint": "/a"} for _ in range(3)]
+    records.append({"tenant_id": "t1", "token_count": 20, "endpoint": "/a"})
+
+    status, body = _send(records, lambda_ctx)
+
+    assert status == 200
+    assert [r["status"] for r in body["results"]] == ["quota_denied"] * 3 + ["recorded"]
+    assert _rows(usage, "small") == []
+
+
+def test_batch_size_limits(tables, lambda_ctx, monkeypatch):
+    monkeypatch.setattr(mod, "MAX_BATCH_RECORDS", 2)
+
+    assert _send([], lambda_ctx)[0] == 400
+    too_many = [{"tenant_id": "t1", "token_count": 1, "endpoint": "/a"}] * 3
+    assert _send(too_many, lambda_ctx)[0] == 400
+
+
+@pytest.mark.parametrize("hard_quota", ["false", "true"])
+def test_racing_batch_copies_are_counted_once(tables, lambda_ctx, monkeypatch, hard_quota):
+    monkeypatch.setenv("HARD_QUOTA", hard_quota)
+    usage, _, _ = tables
+    records = [{"tenant_id": "t1", "token_count": 10, "endpoint": "/a", "request_id": f"r{i}"} for i in range(3)]
+    _send(records[:2], lambda_ctx)
+
+    # the other copy passed the BatchGetItem marker check before the first one wrote
+    monkeypatch.setattr(mod, "_existing_markers", lambda usage_table, keys: set())
+    status, body = _send(records, lambda_ctx)
+
+    assert status == 200
+    assert [r["status"] for r in body["results"]] == ["duplicate", "duplicate", "recorded"]
+    assert len(_rows(usage, "t1")) == 3
+    assert read_month_total(usage, tenant_month_key("t1", mod.month_key())) == 30
+
+
+def test_negative_token_count_is_rejected(tables, lambda_ctx):
+    usage, _, _ = tables
+    status, body = _send([{"tenant_id": "t1", "token_count": -5, "endpoint": "/a"},
+                          {"tenant_id": "t1", "token_count": 5, "endpoint": "/a"}], lambda_ctx)
+
+    assert [r["status"] for r in body["results"]] == ["bad_payload", "recorded"]
+    assert read_month_total(usage, tenant_month_key("t1", mod.month_key())) == 5
+
+    event = {"requestContext": {"requestId": "single"},
+             "body": json.dumps({"tenant_id": "t1", "token_count": -5, "endpoint": "/a"})}
+    assert mod.handler(event, lambda_ctx)["statusCode"] == 400
+
+
+@pytest.fixture
+def counters(tables, monkeypatch):
+    from services.quota import enforcer
+
+    ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+    table = ddb.create_table(
+        TableName="QuotaCounters",
+        KeySchema=[{"AttributeName": "scope", "KeyType": "HASH"}, {"AttributeName": "window", "KeyType": "RANGE"}],
+        AttributeDefinitions=[{"AttributeName": "scope", "AttributeType": "S"},
+                              {"AttributeName": "window", "AttributeType": "S"}],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    monkeypatch.setenv("QUOTA_COUNTERS_ENABLED", "true")
+    monkeypatch.setattr(mod, "_get_counters_table", lambda: table)
+    monkeypatch.setattr(enforcer, "get_plan_limits",
+                        lambda plan_id: {"max_tokens_per_day": 1000, "max_requests_per_day": 2})
+    return table
+
+
+def _day_counter(counters, user_id):
+    return next(it for it in counters.scan()["Items"] if it["scope"] == f"user#{user_id}")
+
+
+def test_batch_records_are_charged_to_the_counters(tables, counters, lambda_ctx):
+    usage, _, _ = tables
+    one = lambda i: [{"tenant_id": "t1", "user_id": "u1", "token_count": 10, "endpoint": "/a", "request_id": f"r{i}"}]
+
+    # one-record batches can't get around the daily request limit
+    statuses = [_send(one(i), lambda_ctx, request_id=f"api-{i}")[1]["results"][0]["status"] for i in range(3)]
+
+    assert statuses == ["recorded", "recorded", "rate_limited"]
+    assert len(_rows(usage, "t1")) == 2
+    day = _day_counter(counters, "u1")
+    assert (day["tokens"], day["requests"]) == (20, 2)
+
+
+def test_batch_charges_each_callers_share(tables, counters, lambda_ctx):
+    records = [{"tenant_id": "t1", "user_id": "u1", "token_count": 10, "endpoint": "/a"} for _ in range(3)]
+    records.append({"tenant_id": "t1", "user_id": "u2", "token_count": 10, "endpoint": "/a"})
+
+    status, body = _send(records, lambda_ctx)
+
+    assert [r["status"] for r in body["results"]] == ["rate_limited"] * 3 + ["recorded"]
+    assert [it["scope"] for it in counters.scan()["Items"]] == ["user#u2"]  # u1's share was refused whole
+
+
+def test_batch_quota_refusal_hands_the_counter_charge_back(tables, counters, lambda_ctx, monkeypatch):
+    monkeypatch.setenv("HARD_QUOTA", "true")
+    records = [{"tenant_id": "small", "user_id": "u1", "token_count": 40, "endpoint": "/a"} for _ in range(2)]
+
+    status, body = _send(records, lambda_ctx)
+
+    assert [r["status"] for r in body["results"]] == ["quota_denied"] * 2
+    day = _day_counter(counters, "u1")
+    assert (day["tokens"], day["requests"]) == (0, 0)
@@ -0,0 +1,23 @@
+# services/usage/tests/test_cold_start.py
+from scripts import bench_import_time as bench
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       221 |     153802 |   boto3
+import time:     12181 |     190891 | services.usage.lambdas.log_usage.handler
+"""
+
+
+def test_parse_importtime():
+    report = bench.parse_importtime(SAMPLE)
+    assert report == {
+        "boto3": (221, 153802),
+        "services.usage.lambdas.log_usage.handler": (12181, 190891),
+    }
+
+
+def test_log_usage_cold_import_stays_lazy():
+    # only the import graph here; the wall-clock budget is gated by `python -m scripts.bench_import_time`
+    result = bench.run(runs=1)
+
+    assert result["forbidden_imported"] == []
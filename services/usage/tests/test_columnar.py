@@ -0,0 +1,84 @@
+# services/usage/tests/test_columnar.py
+import tracemalloc
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from services.usage.columnar import UsageBatch, UsageRow
+from services.usage.models import UsageRecord
+
+ITEMS = [
+    {"tenant_id": "t1", "user_id": "u1", "timestamp": "2025-08-24T22:15:00Z", "token_count": 10,
+     "endpoint": "/a", "cost_usd": Decimal("0.25")},
+    {"usage_id": "id-2", "user_id": "u2", "plan_id": "plan_pro", "timestamp": "2025-08-25T03:00:00.5Z",
+     "tokens_used": Decimal("20"), "duration_ms": Decimal("7"), "success": False, "cost_usd": "0.0000015"},
+    {"tenant_month": "t1#2025-08", "timestamp": "AGG", "token_total": 35},
+    {"tenant_month": "t1#2025-08", "timestamp": "IDEMP#abc"},
+]
+
+
+def test_batch_columns_from_items():
+    batch = UsageBatch.from_items(ITEMS)
+
+    assert len(batch) == 2  # AGG / IDEMP markers skipped
+    assert list(batch.tokens) == [10, 20]
+    assert list(batch.cost_micros) == [250_000, 2]  # half-even to the micro-dollar
+    assert batch.total_tokens() == 30 and batch.total_cost() == Decimal("0.250002")
+    assert batch.user_ids[0] is batch.row(0).user_id
+
+    row = batch.row(1)
+    assert row == UsageRow.from_item(ITEMS[1])
+    assert (row.timestamp, row.duration_ms, row.success) == ("2025-08-25T03:00:00.500000Z", 7, False)
+    assert UsageRow.from_item(ITEMS[2]) is None
+
+
+def test_record_round_trip():
+    rec = UsageRecord(user_id="u1", plan_id="p1", endpoint="/x", tokens_used=5, duration_ms=3,
+                      success=True, timestamp=datetime(2025, 9, 25, 12, tzinfo=timezone.utc),
+                      cost_usd=Decimal("1.20"))
+    batch = UsageBatch.from_records([rec], tenant_id="t1")
+
+    back = next(batch.records())
+    assert back.model_dump() == rec.model_dump()
+    assert batch.tenant_ids == ["t1"] and batch.row(0).cost_usd == Decimal("1.20")
+
+    lean = UsageBatch.from_items([rec.for_dynamodb()], with_ids=False)
+    assert lean.usage_ids == [] and lean.row(0).usage_id is None
+    assert lean.row(0).to_record().usage_id != rec.usage_id  # fresh id without the column
+
+
+def test_batch_uses_a_fraction_of_record_memory():
+    items = [
+        {"usage_id": f"{i:036d}", "user_id": f"u{i % 20}", "plan_id": "plan_pro", "endpoint": "/v1/chat",
+         "timestamp": f"2025-09-{1 + i % 28:02d}T{i % 24:02d}:00:00Z", "tokens_used": Decimal(i),
+         "duration_ms": Decimal(12), "success": True, "cost_usd": Decimal("0.0125")}
+        for i in range(2000)
+    ]
+
+    def allocated(build):
+        tracemalloc.start()
+        kept = build()
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        return size
+
+    records = allocated(lambda: [UsageRecord(**it) for it in items])
+    batch = allocated(lambda: UsageBatch.from_items(items, with_ids=False))
+    assert batch * 5 < records
+
+
+def test_batch_timestamps_and_rounded_costs():
+    import pytest
+
+    batch = UsageBatch.from_items([
+        {"user_id": "u1", "timestamp": "2025-08-24", "cost_usd": "0.0000015"},
+        {"user_id": "u1", "timestamp": "2025-08-24T00:00:00+02:00", "cost_usd": "0.25"},
+    ])
+    assert [batch.row(i).timestamp for i in range(2)] == ["2025-08-24T00:00:00Z", "2025-08-23T22:00:00Z"]
+    assert batch.rounded_costs == 1
+
+    with pytest.raises(ValueError):
+        UsageBatch.from_items([{"timestamp": "2025-8"}])
+
+    lean = UsageBatch.from_items(ITEMS + [{"timestamp": "2025-8"}], with_ids=False, with_ts=False)
+    assert len(lean) == 3 and len(lean.ts_us) == 0 and lean.row(0).ts_us == 0
@@ -0,0 +1,142 @@
+# services/usage/tests/test_counter_shards.py
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import services.usage.lambdas.log_usage.handler as mod
+from services.usage import counters
+
+TM = "t1#2025-08"
+
+
+def _create_usage(ddb):
+    return ddb.create_table(
+        TableName="UsageTable",
+        KeySchema=[
+            {"AttributeName": "tenant_month", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "tenant_month", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+
+
+@pytest.fixture
+def usage_table():
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        yield _create_usage(boto3.session.Session(region_name="us-east-1").resource("dynamodb"))
+
+
+def _shard_totals(usage, shards):
+    return [
+        int((usage.get_item(Key=counters.shard_key(TM, i)).get("Item") or {}).get("token_total", 0))
+        for i in range(shards)
+    ]
+
+
+def test_plan_counter_shards_is_clamped():
+    assert counters.plan_counter_shards({}) == 1
+    assert counters.plan_counter_shards({"counter_shards": None}) == 1
+    assert counters.plan_counter_shards({"counter_shards": "x"}) == 1
+    assert counters.plan_counter_shards({"counter_shards": 0}) == 1
+    assert counters.plan_counter_shards({"counter_shards": 8}) == 8
+    assert counters.plan_counter_shards({"counter_shards": 1000}) == counters.MAX_SHARDS
+
+
+def test_rebalance_splits_headroom_and_counts_base_row(usage_table):
+    usage_table.put_item(Item={**counters.agg_key(TM), "token_total": 10})  # soft / consumer writes
+
+    assert counters.rebalance_shards(usage_table, TM, 4, 110) == 100
+
+    rem = [usage_table.get_item(Key=counters.shard_key(TM, i))["Item"]["remaining"] for i in range(4)]
+    assert rem == [25, 25, 25, 25]
+    assert counters.read_month_total(usage_table, TM, shards=4) == 10
+
+
+def test_sharded_consume_never_exceeds_the_limit(usage_table):
+    admitted = sum(
+        30 for i in range(10)
+        if counters.try_consume_sharded(usage_table, TM, 4, 100, 30, f"req-{i}")
+    )
+
+    # 30-token requests against a 100 limit: three fit, the rest are refused
+    assert admitted == 90
+    assert sum(_shard_totals(usage_table, 4)) == 90
+    assert counters.read_month_total(usage_table, TM, shards=4) == 90
+    assert usage_table.get_item(Key=counters.agg_key(TM)).get("Item") is None
+
+
+def test_exhausted_shard_borrows_headroom_from_the_others(usage_table):
+    counters.rebalance_shards(usage_table, TM, 4, 100)  # 25 per shard
+
+    # larger than any single shard's share, still within the month's headroom
+    assert counters.try_consume_sharded(usage_table, TM, 4, 100, 60, "big")
+    assert counters.read_month_total(usage_table, TM, shards=4) == 60
+    assert not counters.try_consume_sharded(usage_table, TM, 4, 100, 41, "too-big")
+
+
+def test_rebuild_zeroes_shards_so_the_month_is_counted_once(usage_table):
+    for i, n in enumerate([30, 30, 20]):  # sharded writes: counter first, then the raw row
+        assert counters.try_consume_sharded(usage_table, TM, 4, 100, n, f"req-{i}")
+        usage_table.put_item(Item={"tenant_month": TM, "timestamp": f"2025-08-01T00:00:0{i}Z",
+                                   "usage_id": f"u{i}", "token_count": n})
+    assert counters.read_month_total(usage_table, TM, shards=4) == 80
+
+    assert counters.rebuild_month_total(usage_table, TM) == 80
+
+    assert counters.read_month_total(usage_table, TM, shards=4) == 80  # base 80, shards 0
+    assert _shard_totals(usage_table, 4) == [0, 0, 0, 0]
+    # cleared allowances: the next write rebalances against the rebuilt total
+    assert counters.try_consume_sharded(usage_table, TM, 4, 100, 20, "req-3")
+    assert not counters.try_consume_sharded(usage_table, TM, 4, 100, 1, "req-4")
+
+
+@pytest.fixture
+def fused_sharded(monkeypatch):
+    monkeypatch.setenv("USAGE_TABLE_NAME", "UsageTable")
+    monkeypatch.setenv("HARD_QUOTA", "true")
+    monkeypatch.setenv("HARD_QUOTA_FUSED", "true")
+    monkeypatch.delenv("USAGE_INGEST_MODE", raising=False)
+    with mock_aws():
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        usage = _create_usage(ddb)
+        tenants = ddb.create_table(
+            TableName="TenantsTable",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        quota = ddb.create_table(
+            TableName="QuotaTable",
+            KeySchema=[{"AttributeName": "plan_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "plan_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants.put_item(Item={"tenant_id": "t1", "plan_id": "hot", "subscription_status": "active"})
+        quota.put_item(Item={"plan_id": "hot", "quota_limit": 100, "counter_shards": 8})
+        monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+        yield usage
+
+
+def _event(request_id, tokens):
+    return {
+        "requestContext": {"requestId": request_id},
+        "body": json.dumps({"tenant_id": "t1", "token_count": tokens, "endpoint": "/x"}),
+    }
+
+
+def test_fused_path_uses_the_plans_counter_shards(fused_sharded, lambda_ctx):
+    codes = [mod.handler(_event(f"req-{i}", 20), lambda_ctx)["statusCode"] for i in range(6)]
+    # a retried request is still a duplicate, not a second charge
+    assert mod.handler(_event("req-0", 20), lambda_ctx)["statusCode"] == 200
+
+    assert codes == [200] * 5 + [403]
+    tenant_month = counters.tenant_month_key("t1", mod.month_key())
+    assert counters.read_month_total(fused_sharded, tenant_month, shards=8) == 100
+    assert fused_sharded.get_item(Key=counters.agg_key(tenant_month)).get("Item") is None
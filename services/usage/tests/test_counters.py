@@ -0,0 +1,111 @@
+# services/usage/tests/test_counters.py
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import services.usage.lambdas.log_usage.handler as mod
+from services.usage import counters
+
+
+@pytest.fixture
+def usage_table():
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        yield ddb.create_table(
+            TableName="UsageTable",
+            KeySchema=[
+                {"AttributeName": "tenant_month", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_month", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+def _seed_raw(table, tenant_month, counts):
+    for i, n in enumerate(counts):
+        table.put_item(Item={
+            "tenant_month": tenant_month,
+            "timestamp": f"2025-09-01T00:00:{i:02d}.000000Z",
+            "usage_id": f"u{i}",
+            "token_count": n,
+        })
+    table.put_item(Item={"tenant_month": tenant_month, "timestamp": "IDEMP#u0"})
+
+
+def test_read_month_total_defaults_to_zero(usage_table):
+    assert counters.read_month_total(usage_table, "t1#2025-09") == 0
+
+
+def test_increment_then_read(usage_table):
+    counters.increment_month_total(usage_table, "t1#2025-09", 7)
+    counters.increment_month_total(usage_table, "t1#2025-09", 5)
+    assert counters.read_month_total(usage_table, "t1#2025-09") == 12
+
+
+def test_rebuild_month_total_ignores_markers_and_overwrites_drift(usage_table):
+    _seed_raw(usage_table, "t1#2025-09", [10, 20, 30])
+    counters.increment_month_total(usage_table, "t1#2025-09", 999)  # drifted counter
+
+    assert counters.rebuild_month_total(usage_table, "t1#2025-09") == 60
+    assert counters.read_month_total(usage_table, "t1#2025-09") == 60
+
+
+def test_backfill_discovers_month_partitions(usage_table):
+    _seed_raw(usage_table, "t1#2025-09", [1, 2])
+    _seed_raw(usage_table, "t2#2025-09", [5])
+    _seed_raw(usage_table, "t1#2025-08", [100])
+
+    assert counters.backfill_month_totals(usage_table, "2025-09") == {"t1#2025-09": 3, "t2#2025-09": 5}
+    assert counters.read_month_total(usage_table, "t1#2025-08") == 0
+
+
+def test_write_usage_chunk_moves_a_row_whose_timestamp_is_taken(usage_table):
+    _seed_raw(usage_table, "t1#2025-09", [10])  # another batch's row at ...00:00:00.000000Z
+    items = [
+        {"tenant_month": "t1#2025-09", "timestamp": f"2025-09-01T00:00:0{i}.000000Z", "usage_id": f"v{i}",
+         "token_count": n}
+        for i, n in enumerate([3, 4])
+    ]
+
+    written = counters.write_usage_chunk(usage_table, "t1#2025-09", items)
+
+    assert [it["usage_id"] for it in written] == ["v0", "v1"]
+    assert written[0]["timestamp"] > "2025-09-01T00:00:00.000000Z" and written[1] == items[1]
+    rows = usage_table.scan()["Items"]
+    assert sorted(r["usage_id"] for r in rows if "usage_id" in r) == ["u0", "v0", "v1"]
+    assert counters.read_month_total(usage_table, "t1#2025-09") == 7
+    # replaying the chunk writes nothing: the markers are there
+    assert counters.write_usage_chunk(usage_table, "t1#2025-09", items) == []
+
+
+def test_soft_quota_reads_counter_and_keeps_it_current(usage_table, monkeypatch, lambda_ctx):
+    from unittest.mock import MagicMock
+
+    monkeypatch.setenv("USAGE_TABLE_NAME", "UsageTable")
+    monkeypatch.setenv("HARD_QUOTA", "false")
+    tenants, quota = MagicMock(), MagicMock()
+    tenants.get_item.return_value = {"Item": {"tenant_id": "t1", "plan_id": "pro"}}
+    quota.get_item.return_value = {"Item": {"plan_id": "pro", "quota_limit": 100}}
+    monkeypatch.setattr(mod, "_get_tables", lambda: (usage_table, tenants, quota))
+
+    def send(req_id, tokens):
+        event = {
+            "requestContext": {"requestId": req_id},
+            "body": json.dumps({"tenant_id": "t1", "token_count": tokens, "endpoint": "/x"}),
+        }
+        return mod.handler(event, lambda_ctx)["statusCode"]
+
+    assert send("r1", 30) == 200
+    assert send("r1", 30) == 200   # duplicate: not counted twice
+    assert send("r2", 50) == 200
+    assert send("r3", 30) == 403
+
+    tenant_month = counters.tenant_month_key("t1", mod.month_key())
+    assert counters.read_month_total(usage_table, tenant_month) == 80
@@ -0,0 +1,113 @@
+# services/usage/tests/test_engine.py
+import random
+from decimal import Decimal
+
+import pytest
+
+from services.usage import engine
+from services.usage.engine import UsageAggregator
+
+ROWS = [
+    {"tenant_id": "t1", "user_id": "u1", "timestamp": "2025-08-24T22:15:00Z", "token_count": 10, "endpoint": "/a"},
+    {"tenant_id": "t1", "user_id": "u2", "timestamp": "2025-08-25T03:00:00.5Z", "token_count": 20, "endpoint": "/b"},
+    {"tenant_id": "t1", "user_id": "u1", "timestamp": "2025-08-26T01:59:59Z", "token_count": 5, "endpoint": "/a",
+     "cost_usd": "0.25"},
+    {"tenant_month": "t1#2025-08", "timestamp": "AGG", "token_total": 35},
+    {"tenant_month": "t1#2025-08", "timestamp": "IDEMP#abc"},
+]
+
+ENGINES = ["python", pytest.param("numpy", marks=pytest.mark.skipif(engine.np is None, reason="numpy not installed"))]
+
+
+@pytest.fixture(params=ENGINES)
+def use(request, monkeypatch):
+    monkeypatch.setattr(engine, "_USE_NUMPY", request.param == "numpy")
+    return request.param
+
+
+def test_totals_and_groups(use):
+    agg = UsageAggregator(group_by=("user", "day"))
+    assert agg.add_items(ROWS[:2]) == 2
+    assert agg.add_items(ROWS[2:]) == 1  # markers skipped; pages merge
+
+    assert agg.totals() == {"tokens": 35, "requests": 3, "cost_usd": Decimal("0.25")}
+    assert agg.results() == {
+        ("u1", "2025-08-24"): {"tokens": 10, "requests": 1, "cost_usd": Decimal("0.00")},
+        ("u2", "2025-08-25"): {"tokens": 20, "requests": 1, "cost_usd": Decimal("0.00")},
+        ("u1", "2025-08-26"): {"tokens": 5, "requests": 1, "cost_usd": Decimal("0.25")},
+    }
+
+    hourly = UsageAggregator(group_by=("tenant", "hour"))
+    hourly.add_items(ROWS)
+    assert sorted(hourly.results()) == [("t1", "2025-08-24T22"), ("t1", "2025-08-25T03"), ("t1", "2025-08-26T01")]
+
+
+def test_engines_agree_on_random_rows(monkeypatch):
+    if engine.np is None:
+        pytest.skip("numpy not installed")
+    rng = random.Random(7)
+    rows = [
+        {"tenant_id": rng.choice(["t1", "t2", None]), "user_id": f"u{rng.randrange(30)}",
+         "endpoint": rng.choice(["/a", "/b"]), "token_count": Decimal(rng.randrange(5000)),
+         "cost_usd": Decimal(rng.randrange(10 ** 6)).scaleb(-6),
+         "timestamp": f"2025-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}T{rng.randrange(24):02d}:00:00Z"}
+        for _ in range(3000)
+    ]
+    out = {}
+    for use_numpy in (False, True):
+        monkeypatch.setattr(engine, "_USE_NUMPY", use_numpy)
+        agg = UsageAggregator(group_by=("tenant", "endpoint", "month"))
+        for start in range(0, len(rows), 700):
+            agg.add_items(rows[start:start + 700])
+        out[use_numpy] = (agg.totals(), agg.results())
+    assert out[False] == out[True]
+    assert sum(r["cost_usd"] for r in out[True][1].values()) == sum(r["cost_usd"] for r in rows)
+
+
+def test_group_keys_are_validated():
+    with pytest.raises(ValueError):
+        UsageAggregator(group_by=("plan",))
+    with pytest.raises(ValueError):
+        UsageAggregator(group_by=("hour", "day"))
+
+
+def test_offset_timestamps_and_batches(use):
+    from services.usage.columnar import UsageBatch
+
+    rows = [
+        {"user_id": "u1", "timestamp": "2025-08-25T01:30:00+02:00", "token_count": 4},  # 2025-08-24T23:30Z
+        {"user_id": "u1", "timestamp": "2025-08-24T23:59:59Z", "token_count": 6},
+        {"user_id": "u2", "token_count": 1},  # no timestamp: epoch bucket
+    ]
+    agg = UsageAggregator(group_by=("day",))
+    agg.add_items(rows)
+    assert {k: v["tokens"] for k, v in agg.results().items()} == {("2025-08-24",): 10, ("1970-01-01",): 1}
+
+    from_batch = UsageAggregator(group_by=("day",))
+    from_batch.add_batch(UsageBatch.from_items(rows))
+    assert from_batch.results() == agg.results()
+
+
+def test_short_and_malformed_timestamps(use):
+    rows = [
+        {"user_id": "u1", "timestamp": "2025-08-24", "token_count": 3},  # a date alone: midnight UTC
+        {"user_id": "u1", "timestamp": "2025-08-24T22:15:00Z", "token_count": 4},
+        {"tenant_month": "t1#2025-08", "timestamp": "AGG", "token_total": 7},
+    ]
+    agg = UsageAggregator(group_by=("user", "day"))
+    assert agg.add_items(rows) == 2
+    assert agg.results()[("u1", "2025-08-24")]["tokens"] == 7
+
+    for bad in ("2025-8", "yesterday", 1724537700):
+        with pytest.raises(ValueError):
+            UsageAggregator(group_by=("hour",)).add_items([{"timestamp": bad, "token_count": 1}])
+    with pytest.raises(ValueError):
+        UsageAggregator().add_items([{"timestamp": 1724537700, "token_count": 1}])
+
+
+def test_sub_micro_dollar_costs_stay_exact(use):
+    rows = [{"user_id": "u1", "timestamp": "2025-08-24T22:15:00Z", "token_count": 1, "cost_usd": "0.0000015"}] * 2
+    agg = UsageAggregator(group_by=("user",))
+    agg.add_items(rows)
+    assert agg.results()[("u1",)]["cost_usd"] == Decimal("0.000003")
+    assert agg.totals()["cost_usd"] == Decimal("0.000003")
@@ -0,0 +1,137 @@
+# services/usage/tests/test_fused_write.py
+import json
+
+import boto3
+import pytest
+from boto3.dynamodb.conditions import Key
+from moto import mock_aws
+
+import services.usage.lambdas.log_usage.handler as mod
+
+
+@pytest.fixture
+def fused_tables(monkeypatch):
+    monkeypatch.setenv("USAGE_TABLE_NAME", "UsageTable")
+    monkeypatch.setenv("TENANTS_TABLE_NAME", "TenantsTable")
+    monkeypatch.setenv("QUOTA_TABLE_NAME", "QuotaTable")
+    monkeypatch.setenv("HARD_QUOTA", "true")
+    monkeypatch.setenv("HARD_QUOTA_FUSED", "true")
+
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        usage = ddb.create_table(
+            TableName="UsageTable",
+            KeySchema=[
+                {"AttributeName": "tenant_month", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_month", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants = ddb.create_table(
+            TableName="TenantsTable",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        quota = ddb.create_table(
+            TableName="QuotaTable",
+            KeySchema=[{"AttributeName": "plan_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "plan_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants.put_item(Item={"tenant_id": "t1", "plan_id": "pro", "subscription_status": "active"})
+        tenants.put_item(Item={"tenant_id": "t2", "plan_id": "pro", "subscription_status": "past_due"})
+        quota.put_item(Item={"plan_id": "pro", "quota_limit": 100})
+
+        monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+        yield usage, tenants, quota
+
+
+def _event(request_id, tenant_id="t1", tokens=10):
+    return {
+        "requestContext": {"requestId": request_id},
+        "body": json.dumps({"tenant_id": tenant_id, "token_count": tokens, "endpoint": "/x"}),
+    }
+
+
+def _month_rows(usage, tenant_id="t1"):
+    items = usage.query(KeyConditionExpression=Key("tenant_month").eq(f"{tenant_id}#{mod.month_key()}"))["Items"]
+    return {it["timestamp"]: it for it in items}
+
+
+def test_fused_write_records_agg_marker_and_row(fused_tables, lambda_ctx):
+    usage, _, _ = fused_tables
+
+    resp = mod.handler(_event("req-1", tokens=40), lambda_ctx)
+
+    assert resp["statusCode"] == 200
+    rows = _month_rows(usage)
+    assert rows["AGG"]["token_total"] == 40
+    assert sum(1 for ts in rows if ts.startswith("IDEMP#")) == 1
+    assert sum(1 for it in rows.values() if it.get("usage_id")) == 1
+
+
+def test_fused_write_duplicate_is_idempotent_and_not_double_counted(fused_tables, lambda_ctx):
+    usage, _, _ = fused_tables
+
+    r1 = mod.handler(_event("req-dup", tokens=30), lambda_ctx)
+    r2 = mod.handler(_event("req-dup", tokens=30), lambda_ctx)
+
+    assert r1["statusCode"] == r2["statusCode"] == 200
+    assert json.loads(r1["body"])["usage_id"] == json.loads(r2["body"])["usage_id"]
+    assert _month_rows(usage)["AGG"]["token_total"] == 30
+
+
+def test_fused_write_over_quota_returns_403_without_writes(fused_tables, lambda_ctx):
+    usage, _, _ = fused_tables
+
+    assert mod.handler(_event("req-a", tokens=90), lambda_ctx)["statusCode"] == 200
+    resp = mod.handler(_event("req-b", tokens=20), lambda_ctx)
+
+    assert resp["statusCode"] == 403
+    rows = _month_rows(usage)
+    assert rows["AGG"]["token_total"] == 90
+    assert sum(1 for it in rows.values() if it.get("usage_id")) == 1
+
+
+def test_fused_write_request_larger_than_plan_returns_403(fused_tables, lambda_ctx):
+    usage, _, _ = fused_tables
+
+    resp = mod.handler(_event("req-big", tokens=150), lambda_ctx)
+
+    assert resp["statusCode"] == 403
+    assert _month_rows(usage) == {}
+
+
+def test_fused_write_inactive_subscription_returns_402(fused_tables, lambda_ctx):
+    usage, _, _ = fused_tables
+
+    resp = mod.handler(_event("req-1", tenant_id="t2"), lambda_ctx)
+
+    assert resp["statusCode"] == 402
+    assert _month_rows(usage, "t2") == {}
+
+
+def test_fused_write_serves_tenant_and_plan_from_cache(fused_tables, lambda_ctx, monkeypatch):
+    _, tenants, quota = fused_tables
+    calls = {"tenants": 0, "quota": 0}
+    orig_tenant_get, orig_quota_get = tenants.get_item, quota.get_item
+
+    def count(name, fn):
+        def wrapped(**kwargs):
+            calls[name] += 1
+            return fn(**kwargs)
+        return wrapped
+
+    monkeypatch.setattr(tenants, "get_item", count("tenants", orig_tenant_get))
+    monkeypatch.setattr(quota, "get_item", count("quota", orig_quota_get))
+
+    for i in range(3):
+        assert mod.handler(_event(f"req-{i}"), lambda_ctx)["statusCode"] == 200
+
+    assert calls == {"tenants": 1, "quota": 1}
@@ -31,6 +31,8 @@ def _mk_tables(quota_limit: int, already_used: int = 0):
     tenants_table.get_item.return_value = {"Item": {"plan_id": "free-plan-dev"}}
     quota_table.get_item.return_value = {"Item": {"quota_limit": quota_limit}}
     usage_table.query.return_value = {"Items": [{"token_count": already_used}]}
+    # soft quota reads the month's AGG counter
+    usage_table.get_item.return_value = {"Item": {"token_total": already_used}}
     usage_table.put_item.return_value = {}
 
     return usage_table, tenants_table, quota_table
@@ -17,8 +17,8 @@ def test_duplicate_request_is_idempotent(monkeypatch, lambda_ctx):
     tenants_table.get_item.return_value = {"Item": {"tenant_id": "t1", "plan_id": "pro", "subscription_status": "active"}}
     quota_table.get_item.return_value = {"Item": {"plan_id": "pro", "quota_limit": 1000000}}
 
-    # Soft-quota path (default) will query usage_table; return empty to allow
-    usage_table.query.return_value = {"Items": []}
+    # Soft-quota path (default) reads the AGG counter; no counter yet -> allowed
+    usage_table.get_item.return_value = {}
 
     # Simulate sequence of put_item calls on the *same* usage_table:
     # 1) first request: marker write OK
@@ -91,6 +91,9 @@ def test_handler_idempotency_hit(monkeypatch, lambda_context):
         def query(self, **kwargs):
             # handler may call query() during validation, so just return empty
             return {"Items": []}
+        def get_item(self, **kwargs):
+            # soft quota reads the AGG counter; none yet
+            return {}
 
     monkeypatch.setattr(H, "_USAGE_TBL", FakeUsageTable())
 
@@ -0,0 +1,102 @@
+# services/usage/tests/test_quota_counter_gate.py
+import json
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+
+import services.usage.lambdas.log_usage.handler as mod
+from services.quota import enforcer
+
+
+@pytest.fixture
+def counters(monkeypatch):
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        table = ddb.create_table(
+            TableName="QuotaCounters",
+            KeySchema=[
+                {"AttributeName": "scope", "KeyType": "HASH"},
+                {"AttributeName": "window", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "scope", "AttributeType": "S"},
+                {"AttributeName": "window", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        monkeypatch.setenv("USAGE_TABLE_NAME", "UsageLogs-dev")
+        monkeypatch.setenv("QUOTA_COUNTERS_ENABLED", "true")
+        monkeypatch.setenv("HARD_QUOTA", "true")
+        monkeypatch.setattr(mod, "_get_counters_table", lambda: table)
+        yield table
+
+
+@pytest.fixture
+def small_plan(monkeypatch):
+    monkeypatch.setattr(enforcer, "get_plan_limits",
+                        lambda plan_id: {"max_tokens_per_day": 1000, "max_requests_per_day": 2})
+
+
+def _tables(tenant_id, plan_id="pro", quota_limit=1000):
+    usage, tenants, quota = MagicMock(), MagicMock(), MagicMock()
+    tenants.get_item.return_value = {"Item": {"tenant_id": tenant_id, "plan_id": plan_id,
+                                              "subscription_status": "active"}}
+    quota.get_item.return_value = {"Item": {"plan_id": plan_id, "quota_limit": quota_limit}}
+    usage.update_item.return_value = {"Attributes": {"token_total": 100}}
+    return usage, tenants, quota
+
+
+def _event(tenant_id, request_id, token_count=50):
+    return {"body": json.dumps({"tenant_id": tenant_id, "user_id": "u1", "token_count": token_count,
+                                "endpoint": "/x", "request_id": request_id})}
+
+
+def test_daily_request_limit_returns_429_before_writing(counters, small_plan, monkeypatch, lambda_ctx):
+    usage, tenants, quota = _tables("t-counters")
+    monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+
+    codes = [mod.handler(_event("t-counters", f"r{i}"), lambda_ctx)["statusCode"] for i in range(3)]
+
+    assert codes == [200, 200, 429]
+    assert usage.update_item.call_count == 2  # the refused call never reached the month counter
+    day = counters.scan()["Items"][0]
+    assert day["scope"] == "user#u1" and day["requests"] == 2
+
+
+def test_month_quota_refusal_hands_the_counter_charge_back(counters, small_plan, monkeypatch, lambda_ctx):
+    usage, tenants, quota = _tables("t-counters-over")
+    usage.update_item.side_effect = ClientError(
+        {"Error": {"Code": "ConditionalCheckFailedException", "Message": "over quota"}}, "UpdateItem"
+    )
+    monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+
+    resp = mod.handler(_event("t-counters-over", "r1"), lambda_ctx)
+
+    assert resp["statusCode"] == 403
+    day = counters.scan()["Items"][0]
+    assert day["tokens"] == 0 and day["requests"] == 0
+
+
+def test_pro_tenant_gets_pro_limits(counters, monkeypatch, lambda_ctx):
+    # 5000 tokens is five times the free tier's day; "pro" tenants map to plan_pro
+    usage, tenants, quota = _tables("t-pro", plan_id="pro", quota_limit=10 ** 6)
+    monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+
+    resp = mod.handler(_event("t-pro", "r1", token_count=5000), lambda_ctx)
+
+    assert resp["statusCode"] == 200
+    assert counters.scan()["Items"][0]["tokens"] == 5000
+
+
+def test_unknown_plan_fails_instead_of_defaulting_to_free(counters, monkeypatch, lambda_ctx):
+    usage, tenants, quota = _tables("t-gold", plan_id="gold")
+    monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+
+    resp = mod.handler(_event("t-gold", "r1"), lambda_ctx)
+
+    assert resp["statusCode"] == 500
+    assert usage.update_item.call_count == 0 and counters.scan()["Items"] == []
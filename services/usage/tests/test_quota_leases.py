@@ -0,0 +1,134 @@
+# services/usage/tests/test_quota_leases.py
+import json
+
+import boto3
+import pytest
+from moto import mock_aws
+
+import services.usage.lambdas.log_usage.handler as mod
+from services.usage import counters
+from services.usage.quota_leases import QuotaLeases, lease_size, reserve_lease
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_lease_book_takes_expires_and_drains():
+    clock = FakeClock()
+    leases = QuotaLeases(ttl=30, clock=clock)
+    leases.grant("t1#2025-08", 100)
+
+    assert leases.take("t1#2025-08", 60)
+    assert not leases.take("t1#2025-08", 41)
+    assert leases.remaining("t1#2025-08") == 40
+
+    clock.now += 31
+    assert not leases.take("t1#2025-08", 1)
+    assert leases.pop_expired() == [("t1#2025-08", 40)]
+    assert leases.drain() == []
+
+
+def test_lease_size_and_reserve_fallback():
+    assert lease_size({"lease_tokens": 250}, 10_000) == 250
+    assert lease_size({"lease_pct": 1}, 10_000) == 100
+    assert lease_size({}, 1_000) == 50  # QUOTA_LEASE_PCT default 5%
+
+    headroom = {"left": 30}
+
+    def consume(tokens):
+        if tokens > headroom["left"]:
+            return False
+        headroom["left"] -= tokens
+        return True
+
+    # full lease doesn't fit: shrink to what is left
+    assert reserve_lease(consume, lambda: headroom["left"], want=100, need=10) == 30
+    assert reserve_lease(consume, lambda: headroom["left"], want=100, need=10) == 0
+
+
+@pytest.fixture
+def lease_mode(monkeypatch):
+    monkeypatch.setenv("USAGE_TABLE_NAME", "UsageTable")
+    monkeypatch.setenv("HARD_QUOTA", "true")
+    monkeypatch.setenv("QUOTA_LEASE_MODE", "true")
+    monkeypatch.delenv("USAGE_INGEST_MODE", raising=False)
+    monkeypatch.delenv("HARD_QUOTA_FUSED", raising=False)
+
+    clock = FakeClock()
+    monkeypatch.setattr(mod, "_LEASES", QuotaLeases(ttl=30, clock=clock))
+    monkeypatch.setattr(mod, "_LEASE_TABLE", None)
+
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        usage = ddb.create_table(
+            TableName="UsageTable",
+            KeySchema=[
+                {"AttributeName": "tenant_month", "KeyType": "HASH"},
+                {"AttributeName": "timestamp", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "tenant_month", "AttributeType": "S"},
+                {"AttributeName": "timestamp", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants = ddb.create_table(
+            TableName="TenantsTable",
+            KeySchema=[{"AttributeName": "tenant_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "tenant_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        quota = ddb.create_table(
+            TableName="QuotaTable",
+            KeySchema=[{"AttributeName": "plan_id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "plan_id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        tenants.put_item(Item={"tenant_id": "t1", "plan_id": "pro", "subscription_status": "active"})
+        quota.put_item(Item={"plan_id": "pro", "quota_limit": 250, "lease_tokens": 100})
+        monkeypatch.setattr(mod, "_get_tables", lambda: (usage, tenants, quota))
+        yield usage, clock
+
+
+def _event(request_id, tokens):
+    return {
+        "requestContext": {"requestId": request_id},
+        "body": json.dumps({"tenant_id": "t1", "token_count": tokens, "endpoint": "/x"}),
+    }
+
+
+def _agg(usage):
+    return counters.read_month_total(usage, counters.tenant_month_key("t1", mod.month_key()))
+
+
+def test_requests_are_admitted_from_one_reservation(lease_mode, lambda_ctx):
+    usage, _clock = lease_mode
+
+    codes = [mod.handler(_event(f"req-{i}", 10), lambda_ctx)["statusCode"] for i in range(5)]
+
+    assert codes == [200] * 5
+    assert _agg(usage) == 100  # one lease reserved, 50 of it still unused
+    mod._release_all_leases()
+    assert _agg(usage) == 50
+
+
+def test_expired_lease_is_returned_and_limit_still_holds(lease_mode, lambda_ctx):
+    usage, clock = lease_mode
+
+    assert mod.handler(_event("a", 40), lambda_ctx)["statusCode"] == 200
+    clock.now += 31
+    # expiry hands back 60, then a fresh 100-token lease is reserved
+    assert mod.handler(_event("b", 40), lambda_ctx)["statusCode"] == 200
+    assert _agg(usage) == 140
+
+    codes = [mod.handler(_event(f"c{i}", 40), lambda_ctx)["statusCode"] for i in range(5)]
+    # one more full lease fits (AGG 240); after it only 10 of the 250 limit is left
+    assert codes == [200, 200, 200, 200, 403]
+    mod._release_all_leases()
+    assert _agg(usage) == 240
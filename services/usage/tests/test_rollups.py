@@ -0,0 +1,235 @@
+# services/usage/tests/test_rollups.py
+import json
+from datetime import datetime, timezone
+from decimal import Decimal
+from unittest.mock import MagicMock
+
+import boto3
+import pytest
+from boto3.dynamodb.types import TypeSerializer
+from moto import mock_aws
+
+from services.usage import rollups
+from services.usage.lambdas.aggregate import handler as range_handler
+from services.usage.lambdas.rollup_stream import handler as stream_handler
+
+
+def _utc(*args):
+    return datetime(*args, tzinfo=timezone.utc)
+
+
+@pytest.fixture
+def rollups_table():
+    with mock_aws():
+        # conftest patches boto3.resource with a MagicMock; use a real session for moto
+        ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+        yield ddb.create_table(
+            TableName="UsageRollups",
+            KeySchema=[
+                {"AttributeName": "scope", "KeyType": "HASH"},
+                {"AttributeName": "bucket", "KeyType": "RANGE"},
+            ],
+            AttributeDefinitions=[
+                {"AttributeName": "scope", "AttributeType": "S"},
+                {"AttributeName": "bucket", "AttributeType": "S"},
+            ],
+            BillingMode="PAY_PER_REQUEST",
+        )
+
+
+ROWS = [
+    {"tenant_id": "t1", "user_id": "u1", "timestamp": "2025-08-24T22:15:00Z", "token_count": 10, "endpoint": "/a"},
+    {"tenant_id": "t1", "user_id": "u2", "timestamp": "2025-08-25T03:00:00.5Z", "token_count": 20, "endpoint": "/b"},
+    {"tenant_id": "t1", "user_id": "u1", "timestamp": "2025-08-26T01:59:59Z", "token_count": 5, "endpoint": "/a",
+     "cost_usd": "0.25"},
+    {"tenant_month": "t1#2025-08", "timestamp": "AGG", "token_total": 35},
+    {"tenant_month": "t1#2025-08", "timestamp": "IDEMP#abc"},
+]
+
+
+def test_increments_fold_rows_per_bucket():
+    inc = rollups.usage_increments(ROWS)
+
+    day = inc[("tenant#t1", "D#2025-08-25")]
+    assert day["tokens"] == 20 and day["requests"] == 1
+    assert day["ep:/b"] == 20 and day["user:u2"] == 20
+    assert inc[("user#u1", "H#2025-08-26T01")]["cost_usd"] == Decimal("0.25")
+    # AGG / IDEMP rows are not usage; two scopes x (hour, day) x 3 rows
+    assert len(inc) == 12
+
+
+def test_range_buckets_split_hours_and_days():
+    assert rollups.range_buckets(_utc(2025, 8, 24, 22, 30), _utc(2025, 8, 26, 2, 10)) == [
+        ("H#2025-08-24T22", "H#2025-08-24T23"),
+        ("D#2025-08-25", "D#2025-08-25"),
+        ("H#2025-08-26T00", "H#2025-08-26T01"),
+    ]
+    assert rollups.range_buckets(_utc(2025, 8, 25, 3), _utc(2025, 8, 25, 5)) == [
+        ("H#2025-08-25T03", "H#2025-08-25T04"),
+    ]
+    assert rollups.range_buckets(_utc(2025, 8, 25), _utc(2025, 8, 25)) == []
+
+
+def test_range_totals_sum_a_few_buckets(rollups_table):
+    rollups.apply_increments(rollups_table, rollups.usage_increments(ROWS))
+
+    totals = rollups.range_totals(rollups_table, "tenant#t1", _utc(2025, 8, 24, 22), _utc(2025, 8, 26, 2))
+
+    assert totals["tokens"] == 35
+    assert totals["requests"] == 3
+    assert totals["cost_usd"] == Decimal("0.25")
+    assert totals["by_endpoint"] == {"/a": 15, "/b": 20}
+    assert totals["by_user"] == {"u1": 15, "u2": 20}
+    assert totals["buckets"] == 3  # H#..24T22, D#..25, H#..26T01
+
+    assert rollups.day_totals(rollups_table, "user#u1", "2025-08-26")["tokens"] == 5
+
+
+def _stream_event(records):
+    ser = TypeSerializer()
+    return {"Records": [
+        {"eventName": name, "dynamodb": {"SequenceNumber": str(100 + i),
+                                         "NewImage": {k: ser.serialize(v) for k, v in row.items()}}}
+        for i, (name, row) in enumerate(records)
+    ]}
+
+
+def test_stream_handler_rolls_up_inserts_only(rollups_table, monkeypatch, lambda_ctx):
+    event = _stream_event([("INSERT", r) for r in ROWS] + [("MODIFY", ROWS[0])])
+    monkeypatch.setattr(stream_handler, "_get_table", lambda: rollups_table)
+
+    resp = stream_handler.handler(event, lambda_ctx)
+
+    assert resp == {"buckets": 12, "batchItemFailures": []}
+    day = rollups_table.get_item(Key={"scope": "tenant#t1", "bucket": "D#2025-08-24"})["Item"]
+    assert day["tokens"] == 10 and day["requests"] == 1
+
+
+def test_stream_handler_redelivery_counts_rows_once(rollups_table, monkeypatch, lambda_ctx):
+    rows = [dict(r, usage_id=f"u-{i}") for i, r in enumerate(ROWS[:3])]
+    monkeypatch.setattr(stream_handler, "_get_table", lambda: rollups_table)
+
+    stream_handler.handler(_stream_event([("INSERT", r) for r in rows[:2]]), lambda_ctx)
+    # retried batch overlapping the first one, plus a new row
+    resp = stream_handler.handler(_stream_event([("INSERT", r) for r in rows]), lambda_ctx)
+
+    assert resp["batchItemFailures"] == []
+    day = rollups.day_totals(rollups_table, "tenant#t1", "2025-08-24")
+    assert day["tokens"] == 10 and day["requests"] == 1
+    assert rollups.day_totals(rollups_table, "user#u1", "2025-08-26")["tokens"] == 5
+    marker = rollups_table.get_item(Key={"scope": "applied#u-0", "bucket": "applied"})["Item"]
+    assert marker["expires_at"] > 0
+
+
+def test_stream_handler_reports_failed_chunk(rollups_table, monkeypatch, lambda_ctx):
+    monkeypatch.setattr(stream_handler, "_get_table", lambda: rollups_table)
+    monkeypatch.setattr(rollups, "TRANSACT_MAX_ACTIONS", 5)  # one row (marker + 4 buckets) per chunk
+    calls = []
+
+    def flaky(table, chunk):
+        calls.append(chunk)
+        if len(calls) == 2:
+            raise RuntimeError("throttled")
+        return 1, 4
+
+    monkeypatch.setattr(stream_handler, "apply_once", flaky)
+
+    resp = stream_handler.handler(_stream_event([("INSERT", r) for r in ROWS[:3]]), lambda_ctx)
+
+    assert resp["batchItemFailures"] == [{"itemIdentifier": "101"}]
+    assert len(calls) == 2  # later chunks are left to the retry
+
+
+def _range_api(monkeypatch, rollups_table, raw):
+    monkeypatch.setattr(range_handler, "_tables", lambda: (raw, None))
+    monkeypatch.setattr(range_handler, "_rollups", lambda: rollups_table)
+    monkeypatch.setattr(range_handler, "_resolve_tenant", lambda e, t: "t1")
+    event = {"queryStringParameters": {"start": "2025-08-24T21:30:00Z", "end": "2025-08-26T02:00:00Z"}}
+    return json.loads(range_handler.handler(event, None)["body"])
+
+
+def test_range_api_reads_raw_rows_only_for_partial_edge_hours(rollups_table, monkeypatch):
+    rollups.apply_increments(rollups_table, rollups.usage_increments(ROWS))
+    rollups.mark_stream_start(rollups_table, now=_utc(2025, 8, 23, 12))  # valid since 2025-08-24
+    raw = MagicMock()
+    raw.query.return_value = {"Items": [{"user_id": "u3", "token_count": 7}]}
+
+    body = _range_api(monkeypatch, rollups_table, raw)
+
+    # one raw query for 21:30-22:00; 22:00 -> 02:00 comes from buckets
+    assert raw.query.call_count == 1
+    assert body["total_tokens"] == "42"
+    assert body["count"] == 4
+    assert body["by_user"] == {"u1": "15", "u2": "20", "u3": "7"}
+
+
+def test_range_api_reads_raw_rows_before_the_watermark(rollups_table, monkeypatch):
+    rollups.apply_increments(rollups_table, rollups.usage_increments(ROWS))
+    raw = MagicMock()
+    raw.query.return_value = {"Items": []}
+
+    # no watermark yet: buckets may be missing older rows, so everything is raw
+    body = _range_api(monkeypatch, rollups_table, raw)
+    assert raw.query.call_count == 1 and body["total_tokens"] == "0"
+
+    rollups.mark_stream_start(rollups_table, now=_utc(2025, 8, 24, 9))  # valid since 2025-08-25
+    rollups._VALID_SINCE.clear()
+    raw.reset_mock()
+    body = _range_api(monkeypatch, rollups_table, raw)
+
+    (call,) = raw.query.call_args_list
+    between = call.kwargs["KeyConditionExpression"].get_expression()["values"][1]
+    assert between.get_expression()["values"][1:] == ("2025-08-24T21:30:00+00:00", "2025-08-25T00:00:00+00:00")
+    assert body["total_tokens"] == "25"  # 25th and 26th from buckets, the 24th from (empty) raw rows
+
+
+def _usage_table():
+    ddb = boto3.session.Session(region_name="us-east-1").resource("dynamodb")
+    table = ddb.create_table(
+        TableName="UsageLogs",
+        KeySchema=[
+            {"AttributeName": "tenant_month", "KeyType": "HASH"},
+            {"AttributeName": "timestamp", "KeyType": "RANGE"},
+        ],
+        AttributeDefinitions=[
+            {"AttributeName": "tenant_month", "AttributeType": "S"},
+            {"AttributeName": "timestamp", "AttributeType": "S"},
+        ],
+        BillingMode="PAY_PER_REQUEST",
+    )
+    for row in ROWS:
+        table.put_item(Item=dict(row, tenant_month=row.get("tenant_month", "t1#2025-08")))
+    return table
+
+
+def test_backfill_rebuilds_buckets_before_the_watermark(rollups_table):
+    usage = _usage_table()
+    with pytest.raises(RuntimeError, match="not started"):
+        rollups.backfill_rollups(usage, rollups_table, _utc(2025, 8, 1))
+
+    rollups.mark_stream_start(rollups_table, now=_utc(2025, 8, 25, 9))  # valid since 2025-08-26
+    # the stream caught the 26th and half of the 25th; a stale partial bucket gets replaced
+    rollups.apply_increments(rollups_table, rollups.usage_increments(ROWS[2:3]))
+    rollups.apply_increments(rollups_table, {("tenant#t1", "D#2025-08-25"): {"tokens": Decimal(3), "requests": Decimal(1)}})
+    with pytest.raises(RuntimeError, match="wait until"):
+        rollups.backfill_rollups(usage, rollups_table, _utc(2025, 8, 1), now=_utc(2025, 8, 26, 0, 30))
+
+    result = rollups.backfill_rollups(usage, rollups_table, _utc(2025, 8, 1, 13), now=_utc(2025, 8, 27))
+
+    assert result == {"rows": 2, "buckets": 8, "valid_since": "2025-08-01"}
+    assert rollups.valid_since(rollups_table) == _utc(2025, 8, 1)
+    totals = rollups.range_totals(rollups_table, "tenant#t1", _utc(2025, 8, 24), _utc(2025, 8, 27))
+    assert totals["tokens"] == 35 and totals["requests"] == 3
+    # rerunning up to the new watermark is a no-op
+    assert rollups.backfill_rollups(usage, rollups_table, _utc(2025, 8, 1), now=_utc(2025, 8, 27))["buckets"] == 0
+
+
+def test_stream_handler_sets_the_watermark_once(rollups_table, monkeypatch, lambda_ctx):
+    monkeypatch.setattr(stream_handler, "_get_table", lambda: rollups_table)
+    monkeypatch.setattr(stream_handler, "_WATERMARK", None)
+    rollups.mark_stream_start(rollups_table, now=_utc(2025, 8, 1))
+
+    stream_handler.handler(_stream_event([("INSERT", ROWS[0])]), lambda_ctx)
+
+    assert rollups.valid_since(rollups_table) == _utc(2025, 8, 2)  # the first start wins
+    assert stream_handler._WATERMARK == "2025-08-02"
@@ -27,3 +27,85 @@ def test_json_dumps_safe_raises_for_invalid_type():
         assert "NonSerializable" in str(e)
     else:
         raise AssertionError("Expected TypeError not raised")
+
+
+def test_ddb_dumps_numbers_and_types():
+    from shared.utils.json_encoders import ddb_dumps
+
+    data = {
+        "count": Decimal("42"),
+        "whole": Decimal("5.000"),
+        "rate": Decimal("5.5"),
+        "missing": Decimal("NaN"),
+        "tags": {"a"},
+        "at": datetime.datetime(2025, 1, 2, 3, 4, 5),
+        "blob": b"\x00\x01",
+        7: "int key",
+    }
+    assert json.loads(ddb_dumps(data)) == {
+        "count": 42,
+        "whole": 5,
+        "rate": 5.5,
+        "missing": None,
+        "tags": ["a"],
+        "at": "2025-01-02T03:04:05",
+        "blob": "AAE=",
+        "7": "int key",
+    }
+    assert ddb_dumps({"a": [1, "é"]}) == '{"a":[1,"é"]}'
+
+
+def test_ddb_dumps_python_path_matches_orjson(monkeypatch):
+    from shared.utils import json_encoders
+
+    if json_encoders.orjson is None:
+        import pytest
+        pytest.skip("orjson not installed")
+
+    data = {
+        "usage": [{"tokens": Decimal(i), "cost": Decimal(f"0.{i:03d}5"), "d": datetime.date(2025, 1, 1)}
+                  for i in range(50)],
+        "nan": float("nan"),
+        True: None,
+    }
+    fast = json_encoders.ddb_dumps(data)
+    # ints past 64 bits fall back to the Python path
+    assert json_encoders.ddb_dumps({"n": 10 ** 30}) == '{"n":1000000000000000000000000000000}'
+
+    monkeypatch.setattr(json_encoders, "_USE_ORJSON", False)
+    assert json_encoders.ddb_dumps(data) == fast
+
+
+def test_ddb_dumps_exponent_floats_are_byte_identical_without_orjson(monkeypatch):
+    import random
+    import struct
+
+    import pytest
+    from shared.utils import json_encoders
+
+    if json_encoders.orjson is None:
+        pytest.skip("orjson not installed")
+
+    values = [1e-05, 1.5e-05, 9.99e-05, 1e-04, 1.5e-07, -2.5e-10, 5e-324, 1e15, 1e16, -1.2345e20,
+              1.7976931348623157e308, 123456789012345678.0, 0.1, 0.0, -0.0]
+    values += [m * 10.0 ** e for e in range(-30, 30) for m in (1, -3.3, 1.2345678901234567)]
+    rng = random.Random(7)
+    values += [v for v in (struct.unpack("d", struct.pack("Q", rng.getrandbits(64)))[0] for _ in range(2000))
+               if v == v and abs(v) != float("inf")]
+    data = {
+        "floats": values,
+        "decimals": [Decimal("0.00001234"), Decimal("1.5E+20"), Decimal("-7E-9")],
+        "nested": {"x": [{"f": 1e-05, "s": "3e-4 in a string", "n": None, True: 1e22}]},
+        "nan": float("nan"),
+    }
+
+    fast = json_encoders.ddb_dumps(data)
+    assert json_encoders.ddb_dumps({"f": 1e-05, "g": 1e16}) == '{"f":0.00001,"g":1e16}'
+
+    monkeypatch.setattr(json_encoders, "_USE_ORJSON", False)
+    assert json_encoders.ddb_dumps(data) == fast
+    for v in values:
+        monkeypatch.setattr(json_encoders, "_USE_ORJSON", True)
+        expected = json_encoders.ddb_dumps([v])
+        monkeypatch.setattr(json_encoders, "_USE_ORJSON", False)
+        assert json_encoders.ddb_dumps([v]) == expected
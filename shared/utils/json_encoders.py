@@ -1,7 +1,19 @@
 # shared/utils/json_encoders.py
 
+import base64
 import json
+import math
+import os
+import re
+from datetime import date, datetime, time
 from decimal import Decimal
+from enum import Enum
+from json.encoder import encode_basestring
+
+try:  # optional: ~5-10x faster encoding
+    import orjson
+except ImportError:  # pragma: no cover - exercised where orjson is absent
+    orjson = None
 
 
 class DecimalEncoder(json.JSONEncoder):
@@ -17,3 +29,188 @@ def json_dumps_safe(obj) -> str:
             return float(o)
         raise TypeError(f"Object of type {type(o).__name__} is not JSON serializable")
     return json.dumps(obj, default=convert)
+
+
+# ---------------------------------------------------------------------------
+# ddb_dumps: compact JSON for DynamoDB items (API response bodies)
+#
+# - integer-valued Decimals -> ints, other Decimals -> floats, NaN / Infinity -> null
+# - sets -> lists, bytes / Binary -> base64, date / datetime / time -> isoformat()
+# - anything else -> str(o) (what the handlers' `default=str` used to do)
+#
+# With orjson installed (and DDB_JSON_ORJSON not "false") encoding is one
+# orjson pass with a `default` hook for the non-native types. Without it the
+# C json encoder does the same job with the same hook. Output is byte-identical
+# either way: Python spells exponent-range floats differently (`1e-05` /
+# `1e+16` vs orjson's `0.00001` / `1e16`), so when the C encoder's text holds
+# one, the payload is re-encoded with orjson's float spelling (_float_text).
+# ---------------------------------------------------------------------------
+
+_USE_ORJSON = orjson is not None and os.getenv("DDB_JSON_ORJSON", "true").lower() != "false"
+_ORJSON_OPTS = (
+    (orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+    if orjson is not None else 0
+)
+
+
+def _decimal(d: Decimal):
+    if not d.is_finite():
+        return None
+    i = int(d)
+    return i if i == d else float(d)
+
+
+def _other(o):
+    """JSON-ready form of a non-container, non-native value."""
+    if isinstance(o, Decimal):
+        return _decimal(o)
+    if isinstance(o, Enum):
+        return o.value
+    if isinstance(o, (datetime, date, time)):
+        return o.isoformat()
+    if isinstance(o, (bytes, bytearray)):
+        return base64.b64encode(bytes(o)).decode("ascii")
+    value = getattr(o, "value", None)  # boto3.dynamodb.types.Binary
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    return str(o)
+
+
+def _default(o):
+    if type(o) is Decimal:  # by far the most common case
+        return _decimal(o)
+    if isinstance(o, (set, frozenset)):
+        return list(o)
+    return _other(o)
+
+
+_FAST = json.JSONEncoder(separators=(",", ":"), ensure_ascii=False, allow_nan=False, default=_default)
+
+
+def _key(k):
+    if isinstance(k, str):
+        return k
+    if k is True:
+        return "true"
+    if k is False:
+        return "false"
+    if k is None:
+        return "null"
+    if isinstance(k, int):
+        return str(k)
+    return str(_other(k))
+
+
+def to_plain(obj):
+    """
+    JSON-ready copy of `obj` (str keys, no NaN, only native types). Iterative,
+    so nesting depth is not limited by recursion.
+    """
+    out = [None]
+    stack = [(out, 0, obj)]
+    while stack:
+        dst, slot, v = stack.pop()
+        t = type(v)
+        if t is str or t is int or t is bool or v is None:
+            dst[slot] = v
+        elif t is Decimal:
+            dst[slot] = _decimal(v)
+        elif t is float:
+            dst[slot] = v if math.isfinite(v) else None
+        elif isinstance(v, dict):
+            d = {}
+            dst[slot] = d
+            for k, x in v.items():
+                k = _key(k)
+                d[k] = None  # placeholder keeps key order
+                stack.append((d, k, x))
+        elif isinstance(v, (list, tuple, set, frozenset)):
+            items = list(v)
+            lst = [None] * len(items)
+            dst[slot] = lst
+            stack.extend((lst, i, x) for i, x in enumerate(items))
+        elif isinstance(v, (bool, int, str)):  # subclasses (IntEnum, ...)
+            dst[slot] = v
+        else:
+            stack.append((dst, slot, _other(v)))
+    return out[0]
+
+
+def _float_text(f: float) -> str:
+    """
+    orjson's spelling of a finite float. Both print the shortest round-trip
+    digits and agree on plain notation, except that orjson keeps 1e-5 <= |f| <
+    1e-4 in plain notation and writes exponents without sign padding.
+    """
+    r = repr(f)
+    if "e" not in r:
+        return r
+    mantissa, exp = r.split("e")
+    exp = int(exp)
+    if exp == -5:
+        sign = "-" if mantissa.startswith("-") else ""
+        return f"{sign}0.0000{mantissa.lstrip('-').replace('.', '')}"
+    return f"{mantissa}e{exp}"
+
+
+def _encode_plain(obj) -> str:
+    """Compact JSON for to_plain() output, floats spelled by _float_text. Iterative, like to_plain."""
+    parts = []
+    stack = [(False, obj)]
+    while stack:
+        literal, v = stack.pop()
+        if literal:
+            parts.append(v)
+        elif v is None:
+            parts.append("null")
+        elif v is True:
+            parts.append("true")
+        elif v is False:
+            parts.append("false")
+        elif type(v) is float:
+            parts.append(_float_text(v))
+        elif isinstance(v, str):
+            parts.append(encode_basestring(v))
+        elif isinstance(v, int):
+            parts.append(int.__repr__(v))
+        elif isinstance(v, dict):
+            stack.append((True, "}"))
+            items = list(v.items())
+            for i in range(len(items) - 1, -1, -1):
+                k, x = items[i]
+                stack.append((False, x))
+                stack.append((True, f"{',' if i else ''}{encode_basestring(k)}:"))
+            stack.append((True, "{"))
+        else:  # list
+            stack.append((True, "]"))
+            for i in range(len(v) - 1, -1, -1):
+                stack.append((False, v[i]))
+                if i:
+                    stack.append((True, ","))
+            stack.append((True, "["))
+    return "".join(parts)
+
+
+# a digit, then Python's signed exponent: the C encoder may have spelled a float
+# differently from orjson (strings can match too; that only costs a re-encode)
+_EXP_FLOAT = re.compile(r"\de[+-]\d")
+
+
+def _dumps_python(obj) -> str:
+    try:
+        text = _FAST.encode(obj)
+    except (TypeError, ValueError):  # NaN / Infinity floats, keys the C encoder rejects
+        text = None
+    if text is not None and not _EXP_FLOAT.search(text):
+        return text
+    return _encode_plain(to_plain(obj))
+
+
+def ddb_dumps(obj) -> str:
+    """Compact JSON text for DynamoDB-shaped data (see the rules above)."""
+    if _USE_ORJSON:
+        try:
+            return orjson.dumps(obj, default=_default, option=_ORJSON_OPTS).decode("utf-8")
+        except TypeError:
+            pass  # e.g. ints beyond 64 bits, which the Python path handles
+    return _dumps_python(obj)